@@ -8,8 +8,17 @@ Example usage:
   python scripts/benchmark_longest_links.py --db meshtastic_history_prod.db \
       --iterations 3 --min-distance 1 --min-snr -20 --max-results 100
 
+  # Compare process pool sizes (speedup is reported relative to the first)
+  python scripts/benchmark_longest_links.py --db meshtastic_history_prod.db \
+      --workers 1,2,4,8
+
+  # Run against a generated synthetic mesh of a standard size
+  python scripts/benchmark_longest_links.py --preset community
+
 By default it reads the database path from --db or the env var DATABASE_FILE.
-It prints individual run durations and a small summary table.
+It prints individual run durations and a small summary table.  When several
+worker counts are given it also verifies that every run produced identical
+links.
 """
 
 from __future__ import annotations
@@ -31,6 +40,14 @@ def _parse_args() -> argparse.Namespace:  # pragma: no cover (cli helper)
         type=str,
         help="SQLite DB file to use (overrides $DATABASE_FILE)",
     )
+    parser.add_argument(
+        "--preset",
+        choices=("small", "community", "country"),
+        help="Use a generated synthetic mesh database of this size (cached in .bench/)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=1, help="Seed of the --preset database"
+    )
     parser.add_argument(
         "--iterations",
         type=int,
@@ -46,6 +63,12 @@ def _parse_args() -> argparse.Namespace:  # pragma: no cover (cli helper)
     parser.add_argument(
         "--max-results", type=int, default=100, help="max_results parameter"
     )
+    parser.add_argument(
+        "--workers",
+        type=str,
+        default=None,
+        help="Comma-separated worker counts to compare (e.g. 1,2,4,8)",
+    )
     parser.add_argument(
         "--quiet",
         action="store_true",
@@ -54,10 +77,10 @@ def _parse_args() -> argparse.Namespace:  # pragma: no cover (cli helper)
     return parser.parse_args()
 
 
-def _print_summary(durations: list[float]):
+def _print_summary(durations: list[float], label: str = ""):
     if not durations:
         return
-    print("\nSummary (seconds):")
+    print(f"\nSummary{label} (seconds):")
     print(f"  runs : {len(durations)}")
     print(f"  min  : {min(durations):.3f}")
     print(f"  max  : {max(durations):.3f}")
@@ -70,6 +93,23 @@ def _print_summary(durations: list[float]):
 def main() -> None:  # pragma: no cover (benchmark script)
     args = _parse_args()
 
+    # Ensure 'src' directory is on sys.path so local imports work when run
+    import sys
+
+    ROOT_DIR = Path(__file__).resolve().parents[1]
+    SRC_DIR = ROOT_DIR / "src"
+    sys.path.insert(0, str(ROOT_DIR))  # allow 'import src.*'
+    sys.path.insert(0, str(SRC_DIR))  # allow 'import malla.*'
+
+    if args.preset and not args.db_path:
+        from malla.synthetic import ensure_preset_database
+
+        args.db_path = str(
+            ensure_preset_database(
+                args.preset, seed=args.seed, directory=ROOT_DIR / ".bench"
+            )
+        )
+
     if args.db_path:
         db_path = Path(args.db_path).expanduser().resolve()
         if not db_path.exists():
@@ -79,36 +119,54 @@ def main() -> None:  # pragma: no cover (benchmark script)
     else:
         print("Using database from $MALLA_DATABASE_FILE or default path")
 
-    # Ensure 'src' directory is on sys.path so local imports work when run
-    import sys
-
-    ROOT_DIR = Path(__file__).resolve().parents[1]
-    SRC_DIR = ROOT_DIR / "src"
-    sys.path.insert(0, str(ROOT_DIR))  # allow 'import src.*'
-    sys.path.insert(0, str(SRC_DIR))  # allow 'import malla.*'
-
     # Now that DATABASE_FILE is set, we can import the heavy modules
     from src.malla.services.traceroute_service import (
         TracerouteService,  # noqa: WPS433 (runtime import intended)
     )
 
-    durations: list[float] = []
-
-    for i in range(1, args.iterations + 1):
-        print(f"\nRun {i}/{args.iterations} …", end=" ", flush=True)
-        start = time.perf_counter()
-        result = TracerouteService.get_longest_links_analysis(
-            min_distance_km=args.min_distance,
-            min_snr=args.min_snr,
-            max_results=args.max_results,
-        )
-        elapsed = time.perf_counter() - start
-        durations.append(elapsed)
-        print(f"{elapsed:.3f}s, links: {result['summary']['total_links']}")
-        if not args.quiet:
-            print("  longest direct link:", result["summary"]["longest_direct"])
+    worker_counts: list[int | None] = (
+        [int(w) for w in args.workers.split(",") if w.strip()]
+        if args.workers
+        else [None]
+    )
 
-    _print_summary(durations)
+    medians: dict[int | None, float] = {}
+    reference: dict | None = None
+
+    for workers in worker_counts:
+        label = f" [workers={workers}]" if workers is not None else ""
+        durations: list[float] = []
+
+        for i in range(1, args.iterations + 1):
+            print(f"\nRun {i}/{args.iterations}{label} …", end=" ", flush=True)
+            start = time.perf_counter()
+            result = TracerouteService.get_longest_links_analysis(
+                min_distance_km=args.min_distance,
+                min_snr=args.min_snr,
+                max_results=args.max_results,
+                workers=workers,
+            )
+            elapsed = time.perf_counter() - start
+            durations.append(elapsed)
+            print(f"{elapsed:.3f}s, links: {result['summary']['total_links']}")
+            if not args.quiet:
+                print("  longest direct link:", result["summary"]["longest_direct"])
+
+            # Output must not depend on the number of workers
+            links = {k: result[k] for k in ("direct_links", "indirect_links")}
+            if reference is None:
+                reference = links
+            elif links != reference:
+                print("  WARNING: result differs from the first run!")
+
+        _print_summary(durations, label)
+        medians[workers] = stats.median(durations)
+
+    if len(medians) > 1:
+        baseline_workers, baseline = next(iter(medians.items()))
+        print(f"Speedup relative to workers={baseline_workers} (median):")
+        for workers, median in medians.items():
+            print(f"  workers={workers}: {median:.3f}s  x{baseline / median:.2f}")
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -8,6 +8,7 @@ service layer uses the specified production DB.
 
 Example:
     python scripts/benchmark_map_render.py /data/meshtastic_history_prod.db
+    python scripts/benchmark_map_render.py --preset community
 
 Performance Improvements Achieved:
 - Original baseline: ~4.2s total render time
@@ -21,6 +22,7 @@ Performance Improvements Achieved:
 
 from __future__ import annotations
 
+import argparse
 import os
 import sys
 import time
@@ -30,13 +32,37 @@ from malla.services.location_service import LocationService
 
 
 def main() -> None:
-    if len(sys.argv) < 2 or not Path(sys.argv[1]).is_file():
-        print(
-            "Usage: python scripts/benchmark_map_render.py <path/to/meshtastic_history_prod.db>"
+    parser = argparse.ArgumentParser(
+        description="Benchmark the /api/locations data build"
+    )
+    parser.add_argument("db", nargs="?", help="SQLite DB file to benchmark")
+    parser.add_argument(
+        "--preset",
+        choices=("small", "community", "country"),
+        help="Use a generated synthetic mesh database of this size (cached in .bench/)",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the --preset DB")
+    args = parser.parse_args()
+
+    if args.db:
+        db_path = Path(args.db)
+    elif args.preset:
+        from malla.synthetic import ensure_preset_database
+
+        db_path = ensure_preset_database(
+            args.preset,
+            seed=args.seed,
+            directory=Path(__file__).resolve().parents[1] / ".bench",
         )
+    else:
+        parser.print_usage()
         sys.exit(1)
 
-    db_path = Path(sys.argv[1]).expanduser().resolve()
+    if not db_path.is_file():
+        print(f"Database not found: {db_path}")
+        sys.exit(1)
+
+    db_path = db_path.expanduser().resolve()
     os.environ["MALLA_DATABASE_FILE"] = str(db_path)
 
     print(f"Using database: {db_path}")
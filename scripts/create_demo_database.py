@@ -1,20 +1,27 @@
 #!/usr/bin/env python3
-"""Create a demo SQLite database populated with Meshworks fixtures.
+"""Create a demo SQLite database with synthetic or fixture mesh traffic.
 
-This helper is handy for local UI testing when no live Meshtastic capture
-is available.  By default it drops a database alongside this script under the
-name ``meshtastic_demo.db`` but you can point it anywhere via ``--output``.
+This helper is handy for local UI testing and for reproducing performance
+problems when no live Meshtastic capture is available.  By default it writes a
+seeded synthetic mesh (see ``malla.synthetic``) using the ``small`` preset; the
+``community`` and ``country`` presets produce the 2M and 50M row databases
+used by the benchmarks.  ``--fixtures`` restores the old behaviour of loading
+the hand-written test fixtures.
 
 Usage
 -----
 ```bash
 python -m uv run python scripts/create_demo_database.py --output ./meshtastic_history.db
+python -m uv run python scripts/create_demo_database.py --preset country --workers 8
+python -m uv run python scripts/create_demo_database.py --preset community --packets 10000000
+python -m uv run python scripts/create_demo_database.py --fixtures
 ```
 """
 
 from __future__ import annotations
 
 import argparse
+import logging
 import pathlib
 import sys
 
@@ -26,10 +33,13 @@ if str(ROOT / "tests") not in sys.path:
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from tests.fixtures.database_fixtures import DatabaseFixtures  # noqa: E402
+from malla.synthetic import PRESETS, generate_database, get_preset  # noqa: E402
+from malla.utils.link_analysis import resolve_worker_count  # noqa: E402
 
 
 def build_demo_database(path: pathlib.Path) -> None:
+    from tests.fixtures.database_fixtures import DatabaseFixtures
+
     path.parent.mkdir(parents=True, exist_ok=True)
     if path.exists():
         path.unlink()
@@ -38,6 +48,25 @@ def build_demo_database(path: pathlib.Path) -> None:
     print(f"✅ Demo database created at {path} (size: {path.stat().st_size} bytes)")
 
 
+def build_synthetic_database(path: pathlib.Path, args: argparse.Namespace) -> None:
+    preset = get_preset(
+        args.preset, nodes=args.nodes, packets=args.packets, days=args.days
+    )
+    result = generate_database(
+        path,
+        preset,
+        seed=args.seed,
+        workers=resolve_worker_count(args.workers),
+        end_time=args.end_time,
+    )
+    print(
+        f"✅ Synthetic '{preset.name}' database created at {path}: "
+        f"{result['rows']} packets, {result['nodes']} nodes in "
+        f"{result['seconds']:.1f}s ({result['rows_per_second']:.0f} rows/s, "
+        f"size: {path.stat().st_size} bytes)"
+    )
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
@@ -46,12 +75,43 @@ def parse_args() -> argparse.Namespace:
         default=ROOT / "meshtastic_demo.db",
         help="Where to write the demo database (default: %(default)s)",
     )
+    parser.add_argument(
+        "--fixtures",
+        action="store_true",
+        help="Load the hand-written test fixtures instead of a synthetic mesh",
+    )
+    parser.add_argument(
+        "--preset",
+        choices=sorted(PRESETS),
+        default="small",
+        help="Synthetic mesh size (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Generator processes (0 = one per CPU)",
+    )
+    parser.add_argument("--nodes", type=int, help="Override the preset node count")
+    parser.add_argument("--packets", type=int, help="Override the preset row count")
+    parser.add_argument("--days", type=float, help="Override the preset time span")
+    parser.add_argument(
+        "--end-time",
+        type=float,
+        help="Unix time the data ends at (default: now); fix it for identical output",
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
-    build_demo_database(args.output)
+    if args.fixtures:
+        build_demo_database(args.output)
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    build_synthetic_database(args.output, args)
 
 
 if __name__ == "__main__":
@@ -10,8 +10,10 @@ __description__ = "A comprehensive web UI for browsing and analyzing Meshtastic
 __author__ = "Malla Contributors"
 __license__ = "MIT"
 
-# Package-level imports for convenience
-from .web_ui import create_app
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .web_ui import create_app
 
 __all__ = [
     "create_app",
@@ -21,3 +23,13 @@ __all__ = [
     "__author__",
     "__license__",
 ]
+
+
+def __getattr__(name: str):
+    # create_app is imported on first use: importing Flask, the routes and the
+    # protobuf modules would otherwise slow down every CLI tool in the package
+    if name == "create_app":
+        from .web_ui import create_app
+
+        return create_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""
+Resumable re-decode of stored raw ServiceEnvelopes
+
+Rows captured with an older decoder (unknown portnums, missing channel keys,
+parsing bugs) keep their ``processed_successfully = 0`` / ``parsing_error``
+state forever.  As long as ``raw_service_envelope`` was stored, this tool can
+run them through the current :func:`malla.mqtt_capture.decode_envelope` again
+and rewrite the derived ``packet_history`` columns and ``node_info`` rows.
+Rows that now decode as NEIGHBORINFO_APP or TELEMETRY_APP also feed the
+neighbor edges and telemetry samples, and the affected telemetry rollups are
+recomputed at the end of the run.
+
+The table is walked in ascending id windows up to the max id seen at start,
+decoded across worker processes and written back in small transactions.  The
+weekly partitions are walked together with the legacy table (packet ids are
+unique across them), and with storage tiering every archive is walked after
+the hot database under its own checkpoint (``<job>@YYYY-MM``).  The last
+processed id is stored in the ``backfill_state`` table in the same
+transaction as the updates, so an interrupted run resumes exactly where it
+stopped.  ``--max-rows-per-second`` and ``--pause`` keep the write lock free
+often enough for a live capture to run alongside.
+
+Usage:
+    malla-backfill                          # re-decode failed/undecoded rows
+    malla-backfill --scope all --workers 4  # re-decode everything
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sqlite3
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from typing import Any
+
+from . import mqtt_capture
+from .config import get_config
+from .database import neighbors, partitions, telemetry, tiering
+from .ingest import NodeUpdate, chunked, map_chunks
+from .utils.link_analysis import resolve_worker_count
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ("failed", "all")
+
+# Rows that the decoder could not (fully) handle; UNKNOWN_APP (portnum 0)
+# covers packets that could not be decrypted with the keys of the time
+FAILED_ROWS_CONDITION = (
+    "(processed_successfully = 0 OR parsing_error IS NOT NULL "
+    "OR portnum IS NULL OR portnum = 0)"
+)
+
+# Columns rewritten from the re-decoded envelope; timestamp, topic and the raw
+# envelope itself are kept as captured
+UPDATE_COLUMNS: tuple[str, ...] = tuple(
+    column
+    for column in mqtt_capture.PACKET_COLUMNS
+    if column not in {"timestamp", "topic", "raw_service_envelope", "message_type"}
+)
+_UPDATE_INDEXES = tuple(mqtt_capture.PACKET_COLUMNS.index(c) for c in UPDATE_COLUMNS)
+
+PACKET_UPDATE_SQL = (
+    f"UPDATE packet_history SET {', '.join(f'{c} = ?' for c in UPDATE_COLUMNS)} "
+    "WHERE id = ?"
+)
+
+# Schema name the archive being re-decoded is attached as
+ARCHIVE_SCHEMA = "backfill_archive"
+
+# Packet ids scanned per window, records per decode task, rows per transaction
+DEFAULT_SCAN_IDS = 20_000
+DEFAULT_CHUNK_SIZE = 1_000
+DEFAULT_BATCH_SIZE = 2_000
+
+# Seconds between progress reports, and the maximum age of the checkpoint
+PROGRESS_INTERVAL_SECONDS = 5.0
+CHECKPOINT_INTERVAL_SECONDS = 5.0
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints
+# ---------------------------------------------------------------------------
+
+
+def _ensure_state_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS backfill_state (
+            job TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            end_id INTEGER NOT NULL,
+            scanned INTEGER NOT NULL DEFAULT 0,
+            updated INTEGER NOT NULL DEFAULT 0,
+            started_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL
+        )
+        """
+    )
+
+
+def load_checkpoint(conn: sqlite3.Connection, job: str) -> dict[str, Any] | None:
+    """Return the stored progress of *job*, or None if it never ran."""
+    _ensure_state_table(conn)
+    row = conn.execute(
+        "SELECT last_id, end_id, scanned, updated, started_at, finished_at "
+        "FROM backfill_state WHERE job = ?",
+        (job,),
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(
+        zip(
+            ("last_id", "end_id", "scanned", "updated", "started_at", "finished_at"),
+            row,
+            strict=True,
+        )
+    )
+
+
+def _save_checkpoint(
+    cursor: sqlite3.Cursor, job: str, state: dict[str, Any], finished: bool = False
+) -> None:
+    now = time.time()
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO backfill_state
+        (job, last_id, end_id, scanned, updated, started_at, updated_at, finished_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            job,
+            state["last_id"],
+            state["end_id"],
+            state["scanned"],
+            state["updated"],
+            state["started_at"],
+            now,
+            now if finished else None,
+        ),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Decoding (runs in worker processes)
+# ---------------------------------------------------------------------------
+
+
+def redecode_rows(
+    records: list[tuple[Any, ...]], only_changed: bool
+) -> tuple[
+    list[tuple[Any, ...]],
+    list[NodeUpdate],
+    list[neighbors.Edge],
+    list[telemetry.Sample],
+]:
+    """
+    Re-decode stored envelopes.
+
+    Args:
+        records: (id, timestamp, topic, raw_service_envelope,
+                 processed_successfully, portnum, parsing_error, table) tuples
+        only_changed: Skip rows whose decode outcome (success flag, portnum,
+                      error) did not change
+
+    Returns:
+        Tuple of (table and ``PACKET_UPDATE_SQL`` parameters, node_info
+        updates, neighbor edges, telemetry samples) of the updated rows
+    """
+    success_index = mqtt_capture.PACKET_COLUMNS.index("processed_successfully")
+    portnum_index = mqtt_capture.PACKET_COLUMNS.index("portnum")
+    error_index = mqtt_capture.PACKET_COLUMNS.index("parsing_error")
+
+    updates: list[tuple[Any, ...]] = []
+    node_updates: list[NodeUpdate] = []
+    changed_rows: list[tuple[Any, ...]] = []
+
+    for (
+        packet_id,
+        timestamp,
+        topic,
+        payload,
+        old_success,
+        old_portnum,
+        old_error,
+        table,
+    ) in records:
+        decoded = mqtt_capture.decode_envelope(topic or "", bytes(payload))
+        row = mqtt_capture.build_packet_row(
+            topic,
+            decoded.service_envelope,
+            decoded.mesh_packet,
+            decoded.processed_successfully,
+            payload,
+            decoded.parsing_error,
+            timestamp=timestamp,
+        )
+
+        if only_changed and (
+            bool(row[success_index]) == bool(old_success)
+            and row[portnum_index] == old_portnum
+            and row[error_index] == old_error
+        ):
+            continue
+
+        updates.append((table, (*(row[i] for i in _UPDATE_INDEXES), packet_id)))
+        changed_rows.append(row)
+        if decoded.node_info is not None:
+            fields = dict(decoded.node_info)
+            node_updates.append(NodeUpdate(fields.pop("node_id"), timestamp, fields))
+
+    edges = neighbors.edges_from_rows(mqtt_capture.PACKET_COLUMNS, changed_rows)
+    samples = telemetry.samples_from_rows(mqtt_capture.PACKET_COLUMNS, changed_rows)
+    return updates, node_updates, edges, samples
+
+
+def _redecode_chunk(
+    items: list[tuple[int, tuple[Any, ...]]], only_changed: bool
+) -> tuple[
+    int,
+    int,
+    list[tuple[Any, ...]],
+    list[NodeUpdate],
+    list[neighbors.Edge],
+    list[telemetry.Sample],
+]:
+    """
+    Worker task: re-decode one chunk of ``_iter_candidates`` output.
+
+    Also returns the checkpoint id of the last item, so the stored checkpoint
+    only ever advances past rows whose updates have been written.
+    """
+    records = [record for _, record in items if record]
+    return (items[-1][0], len(records), *redecode_rows(records, only_changed))
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+
+def _iter_candidates(
+    conn: sqlite3.Connection,
+    tables: Sequence[str],
+    after_id: int,
+    end_id: int,
+    scope: str,
+    scan_ids: int,
+) -> Iterator[tuple[int, tuple[Any, ...]]]:
+    """
+    Yield (checkpoint id, record) for candidate rows of *tables* in id order.
+
+    The checkpoint id is the row id, or the window end for an empty
+    ``record`` marking a scan window without candidates.
+    """
+    condition = FAILED_ROWS_CONDITION if scope == "failed" else "1 = 1"
+    query = " UNION ALL ".join(
+        f"""
+        SELECT id, timestamp, topic, raw_service_envelope,
+               processed_successfully, portnum, parsing_error, '{table}'
+        FROM {table}
+        WHERE id > ? AND id <= ?
+          AND raw_service_envelope IS NOT NULL
+          AND {condition}
+        """
+        for table in tables
+    )
+    query += " ORDER BY id"
+    for window_start in range(after_id, end_id, scan_ids):
+        window_end = min(window_start + scan_ids, end_id)
+        rows = conn.execute(query, (window_start, window_end) * len(tables)).fetchall()
+        for row in rows:
+            yield row[0], tuple(row)
+        if not rows:
+            # Keep the checkpoint moving through windows without candidates
+            yield window_end, ()
+
+
+def _update_statement(
+    conn: sqlite3.Connection, table: str
+) -> tuple[str, tuple[int, ...]]:
+    """
+    ``PACKET_UPDATE_SQL`` for *table*, limited to the update columns it has
+    (partitions and archives keep the columns of the time they were created).
+
+    Returns:
+        The statement and the positions of its columns in ``UPDATE_COLUMNS``
+    """
+    schema, _, name = table.rpartition(".")
+    present = {
+        column for column, _ in tiering.table_columns(conn, schema or "main", name)
+    }
+    positions = tuple(i for i, column in enumerate(UPDATE_COLUMNS) if column in present)
+    assignments = ", ".join(f"{UPDATE_COLUMNS[i]} = ?" for i in positions)
+    return f"UPDATE {table} SET {assignments} WHERE id = ?", positions
+
+
+def _run_job(
+    conn: sqlite3.Connection,
+    reader: sqlite3.Connection,
+    tables: Sequence[str],
+    job: str,
+    scope: str,
+    workers: int,
+    batch_size: int,
+    chunk_size: int,
+    scan_ids: int,
+    max_rows_per_second: float,
+    pause: float,
+    restart: bool,
+) -> dict[str, Any]:
+    """Re-decode the rows of *tables* under the checkpoint *job*."""
+    state = None if restart else load_checkpoint(conn, job)
+    if state is None or state["finished_at"] is not None:
+        # Rows captured after this point already went through the
+        # current decoder, so the run stops at today's max id
+        end_id = max(
+            conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            for table in tables
+        )
+        state = {
+            "last_id": 0,
+            "end_id": end_id,
+            "scanned": 0,
+            "updated": 0,
+            "started_at": time.time(),
+        }
+    else:
+        logger.info(
+            f"Resuming backfill '{job}' after id {state['last_id']} "
+            f"(of {state['end_id']})"
+        )
+
+    statements = {table: _update_statement(conn, table) for table in tables}
+    start = time.monotonic()
+    last_report = last_flush = start
+    scanned_this_run = 0
+    pending_updates: list[tuple[str, tuple[Any, ...]]] = []
+    pending_nodes: list[NodeUpdate] = []
+    pending_edges: list[neighbors.Edge] = []
+    pending_samples: list[telemetry.Sample] = []
+    pending_last_id = state["last_id"]
+
+    def flush(finished: bool = False) -> None:
+        by_table: dict[str, list[tuple[Any, ...]]] = {}
+        for table, params in pending_updates:
+            positions = statements[table][1]
+            by_table.setdefault(table, []).append(
+                (*(params[i] for i in positions), params[-1])
+            )
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for table, params in by_table.items():
+                cursor.executemany(statements[table][0], params)
+            for node_id, timestamp, fields in pending_nodes:
+                mqtt_capture._upsert_node_info(cursor, node_id, timestamp, **fields)
+            neighbors.upsert_edges(cursor, pending_edges)
+            # Marks the samples' time range for the rollup refresh
+            telemetry.insert_samples(cursor, pending_samples)
+            state["updated"] += len(pending_updates)
+            state["last_id"] = pending_last_id
+            _save_checkpoint(cursor, job, state, finished=finished)
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        pending_updates.clear()
+        pending_nodes.clear()
+        pending_edges.clear()
+        pending_samples.clear()
+        if pause > 0 and not finished:
+            time.sleep(pause)
+
+    candidates = _iter_candidates(
+        reader, tables, state["last_id"], state["end_id"], scope, scan_ids
+    )
+    for checkpoint_id, count, updates, node_updates, edges, samples in map_chunks(
+        _redecode_chunk,
+        chunked(candidates, chunk_size),
+        scope == "failed",
+        workers=workers,
+    ):
+        pending_updates.extend(updates)
+        pending_nodes.extend(node_updates)
+        pending_edges.extend(edges)
+        pending_samples.extend(samples)
+        pending_last_id = checkpoint_id
+        state["scanned"] += count
+        scanned_this_run += count
+
+        now = time.monotonic()
+        if (
+            len(pending_updates) >= batch_size
+            or now - last_flush >= CHECKPOINT_INTERVAL_SECONDS
+        ):
+            flush()
+            last_flush = now = time.monotonic()
+
+        if max_rows_per_second > 0:
+            ahead = scanned_this_run / max_rows_per_second - (now - start)
+            if ahead > 0:
+                time.sleep(ahead)
+        if now - last_report >= PROGRESS_INTERVAL_SECONDS:
+            logger.info(
+                f"Backfill '{job}': id {pending_last_id}/{state['end_id']}, "
+                f"{state['scanned']} scanned, "
+                f"{state['updated'] + len(pending_updates)} updated "
+                f"({scanned_this_run / (now - start):.0f} rows/s)"
+            )
+            last_report = now
+
+    pending_last_id = state["end_id"]
+    flush(finished=True)
+    state["finished_at"] = time.time()
+    return state
+
+
+def run_backfill(
+    db_path: str,
+    job: str = "redecode",
+    scope: str = "failed",
+    workers: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    scan_ids: int = DEFAULT_SCAN_IDS,
+    max_rows_per_second: float = 0,
+    pause: float = 0.0,
+    restart: bool = False,
+) -> dict[str, Any]:
+    """
+    Re-decode stored envelopes of *db_path*, resuming a previous run of *job*.
+
+    Args:
+        db_path: Capture database to update in place
+        job: Checkpoint name; runs with different names progress independently
+        scope: "failed" for rows the decoder could not handle, "all" for every
+               row with a stored envelope
+        workers: Decode processes (1 decodes in-process)
+        batch_size: Updated rows per write transaction
+        chunk_size: Records per decode task
+        scan_ids: Packet ids read per candidate query
+        max_rows_per_second: Upper bound on scanned rows per second (0 = none)
+        pause: Seconds to sleep after every write transaction
+        restart: Ignore the stored checkpoint and start from the first row
+
+    Returns:
+        Final checkpoint state of the database (last_id, end_id, scanned,
+        updated, ...), with storage tiering also ``archives``: the state of
+        each archive by month
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown scope: {scope}")
+
+    mqtt_capture.init_database(db_path)
+    conn = mqtt_capture._open_conn(db_path)
+    conn.isolation_level = None  # explicit BEGIN/COMMIT
+    reader = mqtt_capture._open_conn(db_path)
+    options = {
+        "scope": scope,
+        "workers": workers,
+        "batch_size": batch_size,
+        "chunk_size": chunk_size,
+        "scan_ids": scan_ids,
+        "max_rows_per_second": max_rows_per_second,
+        "pause": pause,
+        "restart": restart,
+    }
+
+    try:
+        # The legacy table and the weekly partitions share one id sequence
+        tables = partitions.packet_tables(conn)
+        state = _run_job(conn, reader, tables, job, **options)
+        if tiering.is_enabled():
+            state["archives"] = {}
+            archives = tiering.list_archives(tiering.archive_directory(db_path))
+            for month, path in reversed(archives):
+                for connection in (conn, reader):
+                    connection.execute(
+                        f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (str(path),)
+                    )
+                try:
+                    state["archives"][month] = _run_job(
+                        conn,
+                        reader,
+                        [f"{ARCHIVE_SCHEMA}.{tiering.TABLE}"],
+                        f"{job}@{month}",
+                        **options,
+                    )
+                finally:
+                    for connection in (conn, reader):
+                        connection.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+        since = telemetry.take_dirty()
+        if since is not None:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            telemetry.refresh_rollups(cursor, since)
+            cursor.execute("COMMIT")
+    finally:
+        reader.close()
+        conn.close()
+
+    return state
+
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Re-decode stored raw ServiceEnvelopes with the current decoder"
+    )
+    parser.add_argument(
+        "--db",
+        dest="db_path",
+        help="Database to update (defaults to the configured database_file)",
+    )
+    parser.add_argument(
+        "--scope",
+        choices=SCOPES,
+        default="failed",
+        help="Rows to re-decode (default: rows that failed to decode)",
+    )
+    parser.add_argument(
+        "--job", default="redecode", help="Checkpoint name (default: redecode)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Decode processes (0 = one per CPU, 1 = no process pool)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Updated rows per write transaction",
+    )
+    parser.add_argument(
+        "--max-rows-per-second",
+        type=float,
+        default=0,
+        help="Throttle scanning to this many rows per second (0 = unlimited)",
+    )
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=0.0,
+        help="Seconds to sleep after each write transaction",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the stored checkpoint and start from the first row",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point for ``malla-backfill``."""
+    args = _parse_args(argv)
+    cfg = get_config()
+    # Channel keys for decrypting; decode workers inherit or rebuild them
+    mqtt_capture.configure(cfg)
+    tiering.configure(cfg)
+    partitions.configure(cfg)
+    logging.basicConfig(
+        level=getattr(logging, cfg.log_level.upper(), logging.INFO),
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    # Per-packet decode logs are only interesting when debugging
+    logging.getLogger().setLevel(max(logging.getLogger().level, logging.WARNING))
+    logger.setLevel(logging.INFO)
+
+    state = run_backfill(
+        args.db_path or cfg.database_file,
+        job=args.job,
+        scope=args.scope,
+        workers=resolve_worker_count(args.workers),
+        batch_size=args.batch_size,
+        max_rows_per_second=args.max_rows_per_second,
+        pause=args.pause,
+        restart=args.restart,
+    )
+    runs = [state, *state.get("archives", {}).values()]
+    print(
+        f"Backfill '{args.job}' finished: "
+        f"{sum(run['scanned'] for run in runs)} rows scanned, "
+        f"{sum(run['updated'] for run in runs)} updated"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,696 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the repository and service hot paths
+
+Runs every registered benchmark against generated synthetic mesh databases
+(see :mod:`malla.synthetic`) at one or more preset sizes and records p50/p95
+latency and peak RSS as JSON.  Each benchmark runs in a fresh process by
+default, so the peak RSS of one case does not leak into the next one and
+module level caches start cold.
+
+Two result files (e.g. from two commits) can be compared; benchmarks whose
+median got slower than the threshold are reported as regressions and make the
+command exit with status 1, which is handy in CI.
+
+Usage:
+    malla-bench run --preset small --preset community --output head.json
+    malla-bench run --benchmark 'packets.*' --baseline main.json
+    malla-bench compare main.json head.json --threshold 0.15
+    malla-bench list
+"""
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from tabulate import tabulate
+
+logger = logging.getLogger(__name__)
+
+# Version of the result file layout
+RESULTS_VERSION = 1
+
+DEFAULT_PRESETS = ("small",)
+DEFAULT_ITERATIONS = 10
+DEFAULT_WARMUP = 1
+# Median slowdown (fraction) that counts as a regression
+DEFAULT_THRESHOLD = 0.10
+# Differences below this are timer noise, whatever the ratio
+DEFAULT_MIN_DELTA_MS = 2.0
+
+# Envelopes decoded and written per ingest benchmark iteration
+INGEST_RECORDS = 5_000
+
+
+class Benchmark(NamedTuple):
+    """A registered benchmark."""
+
+    name: str
+    run: Callable[[dict[str, Any]], int | None]
+    setup: Callable[[str], dict[str, Any]] | None
+    description: str
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(
+    name: str, setup: Callable[[str], dict[str, Any]] | None = None
+) -> Callable[[Callable[[dict[str, Any]], int | None]], Callable[..., Any]]:
+    """
+    Register a benchmark.
+
+    The decorated function runs one iteration.  It receives the context built
+    by *setup* (called once with the database path) and may return the number
+    of items it processed, which is reported as a throughput.  A ``cleanup``
+    callable in the context is called once the benchmark has finished.
+    """
+
+    def register(func: Callable[[dict[str, Any]], int | None]) -> Callable[..., Any]:
+        description = (func.__doc__ or "").strip().splitlines()
+        BENCHMARKS[name] = Benchmark(
+            name, func, setup, description[0] if description else ""
+        )
+        return func
+
+    return register
+
+
+def select_benchmarks(patterns: Iterable[str] | None = None) -> list[str]:
+    """Return the registered benchmark names matching any of the glob *patterns*."""
+    patterns = list(patterns or ["*"])
+    selected = [
+        name
+        for name in BENCHMARKS
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+    ]
+    if not selected:
+        raise ValueError(f"No benchmark matches {', '.join(patterns)}")
+    return selected
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+
+def _busiest_node(db_path: str) -> dict[str, Any]:
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute(
+            """
+            SELECT from_node_id FROM packet_history
+            WHERE from_node_id IS NOT NULL
+            GROUP BY from_node_id ORDER BY COUNT(*) DESC LIMIT 1
+            """
+        ).fetchone()
+    finally:
+        conn.close()
+    return {"node_id": row[0] if row else 0}
+
+
+@benchmark("packets.list")
+def _packets_list(ctx: dict[str, Any]) -> None:
+    """PacketRepository.get_packets, first page"""
+    from .database.repositories import PacketRepository
+
+    PacketRepository.get_packets(limit=100)
+
+
+@benchmark("packets.list_grouped")
+def _packets_list_grouped(ctx: dict[str, Any]) -> None:
+    """PacketRepository.get_packets grouped by mesh packet id"""
+    from .database.repositories import PacketRepository
+
+    PacketRepository.get_packets(limit=100, group_packets=True)
+
+
+@benchmark("packets.list_by_node", setup=_busiest_node)
+def _packets_list_by_node(ctx: dict[str, Any]) -> None:
+    """PacketRepository.get_packets filtered by the busiest sender"""
+    from .database.repositories import PacketRepository
+
+    PacketRepository.get_packets(limit=100, filters={"from_node": ctx["node_id"]})
+
+
+@benchmark("chat.recent_messages")
+def _chat_recent_messages(ctx: dict[str, Any]) -> None:
+    """ChatRepository.get_recent_messages, first page"""
+    from .database.repositories import ChatRepository
+
+    ChatRepository.get_recent_messages(limit=100)
+
+
+@benchmark("nodes.list")
+def _nodes_list(ctx: dict[str, Any]) -> None:
+    """NodeRepository.get_nodes, first page"""
+    from .database.repositories import NodeRepository
+
+    NodeRepository.get_nodes(limit=100)
+
+
+@benchmark("nodes.details", setup=_busiest_node)
+def _nodes_details(ctx: dict[str, Any]) -> None:
+    """NodeRepository.get_node_details of the busiest sender"""
+    from .database.repositories import NodeRepository
+
+    NodeRepository.get_node_details(ctx["node_id"])
+
+
+@benchmark("locations.node_locations")
+def _node_locations(ctx: dict[str, Any]) -> int:
+    """LocationService.get_node_locations (map data)"""
+    from .services.location_service import LocationService
+
+    return len(LocationService.get_node_locations())
+
+
+@benchmark("traceroute.network_graph")
+def _network_graph(ctx: dict[str, Any]) -> None:
+    """TracerouteService.get_network_graph_data, last 24 hours"""
+    from .services.traceroute_service import TracerouteService
+
+    TracerouteService.get_network_graph_data(hours=24)
+
+
+@benchmark("analytics.dashboard")
+def _analytics_dashboard(ctx: dict[str, Any]) -> None:
+    """AnalyticsService.get_analytics_data (cache cleared)"""
+    from .services.analytics_service import AnalyticsService
+
+    AnalyticsService.get_analytics_data()
+
+
+def _ingest_setup(db_path: str) -> dict[str, Any]:
+    """Turn stored packets back into ServiceEnvelopes for the ingest benchmark."""
+    from meshtastic import mqtt_pb2
+
+    from .ingest import EnvelopeRecord
+
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            """
+            SELECT timestamp, topic, from_node_id, to_node_id, mesh_packet_id,
+                   portnum, raw_payload, gateway_id, channel_id, rssi, snr,
+                   hop_limit, hop_start
+            FROM packet_history
+            WHERE raw_payload IS NOT NULL AND portnum IS NOT NULL
+            ORDER BY id LIMIT ?
+            """,
+            (INGEST_RECORDS,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    records = []
+    for (
+        timestamp,
+        topic,
+        from_node,
+        to_node,
+        packet_id,
+        portnum,
+        payload,
+        gateway_id,
+        channel_id,
+        rssi,
+        snr,
+        hop_limit,
+        hop_start,
+    ) in rows:
+        envelope = mqtt_pb2.ServiceEnvelope()
+        envelope.channel_id = channel_id or ""
+        envelope.gateway_id = gateway_id or ""
+        packet = envelope.packet
+        setattr(packet, "from", from_node or 0)
+        packet.to = to_node or 0
+        packet.id = packet_id or 0
+        packet.rx_rssi = int(rssi or 0)
+        packet.rx_snr = float(snr or 0.0)
+        packet.hop_limit = hop_limit or 0
+        packet.hop_start = hop_start or 0
+        packet.decoded.portnum = portnum
+        packet.decoded.payload = bytes(payload)
+        records.append(EnvelopeRecord(timestamp, topic, envelope.SerializeToString()))
+
+    directory = tempfile.TemporaryDirectory(prefix="malla-bench-")
+    return {
+        "records": records,
+        "output": Path(directory.name) / "ingest.db",
+        "cleanup": directory.cleanup,
+    }
+
+
+@benchmark("ingest.throughput", setup=_ingest_setup)
+def _ingest_throughput(ctx: dict[str, Any]) -> int:
+    """malla-ingest decode + bulk write into an empty database"""
+    from .ingest import ingest
+
+    output: Path = ctx["output"]
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{output}{suffix}").unlink(missing_ok=True)
+    return ingest(ctx["records"], str(output), topic_prefix="msh")["packets"]
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+
+def _reset_caches() -> None:
+    """Drop the in-process service caches so every iteration does real work."""
+    from .services.gateway_service import GatewayService
+    from .utils import result_cache
+
+    result_cache.clear()
+    GatewayService._cache.clear()
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Linearly interpolated percentile of *values* (*fraction* in 0..1)."""
+    if not values:
+        raise ValueError("percentile of an empty sequence")
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_benchmark(
+    name: str, db_path: str, iterations: int = DEFAULT_ITERATIONS, warmup: int = 1
+) -> dict[str, Any]:
+    """
+    Run one benchmark in the current process.
+
+    Returns:
+        Dictionary with the timing percentiles (milliseconds), the number of
+        items processed per second when the benchmark reports it, and the
+        process peak RSS
+    """
+    if iterations < 1:
+        raise ValueError("iterations must be at least 1")
+
+    bench = BENCHMARKS[name]
+    os.environ["MALLA_DATABASE_FILE"] = str(db_path)
+    # Repository code logs a lot at INFO; it would dominate short benchmarks
+    logging.getLogger("malla").setLevel(logging.WARNING)
+
+    ctx = bench.setup(str(db_path)) if bench.setup else {}
+    timings: list[float] = []
+    items = 0
+    try:
+        for _ in range(warmup):
+            _reset_caches()
+            bench.run(ctx)
+
+        for _ in range(iterations):
+            _reset_caches()
+            start = time.perf_counter()
+            processed = bench.run(ctx)
+            timings.append(time.perf_counter() - start)
+            items += processed or 0
+    finally:
+        if cleanup := ctx.get("cleanup"):
+            cleanup()
+
+    total = sum(timings)
+    return {
+        "benchmark": name,
+        "iterations": iterations,
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "mean_ms": round(total / iterations * 1000, 3),
+        "items_per_second": round(items / total, 1) if items and total else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            timeout=10,
+            check=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def run_suite(
+    databases: dict[str, str | Path],
+    names: Iterable[str] | None = None,
+    iterations: int = DEFAULT_ITERATIONS,
+    warmup: int = DEFAULT_WARMUP,
+    isolate: bool = True,
+) -> dict[str, Any]:
+    """
+    Run benchmarks against each database.
+
+    Args:
+        databases: Label (usually the preset name) → database path
+        names: Benchmarks to run (default: all registered)
+        iterations: Timed iterations per benchmark
+        warmup: Untimed iterations before timing
+        isolate: Run every benchmark in its own spawned process
+
+    Returns:
+        Result document suitable for :func:`save_results`
+    """
+    names = list(names or BENCHMARKS)
+    results = []
+    for label, db_path in databases.items():
+        db_path = str(Path(db_path).resolve())
+        for name in names:
+            logger.info(f"[{label}] {name}")
+            if isolate:
+                with ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                ) as pool:
+                    result = pool.submit(
+                        run_benchmark, name, db_path, iterations, warmup
+                    ).result()
+            else:
+                result = run_benchmark(name, db_path, iterations, warmup)
+            results.append({"database": label, **result})
+
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": results,
+    }
+
+
+def save_results(document: dict[str, Any], path: str | Path) -> None:
+    Path(path).write_text(json.dumps(document, indent=2) + "\n")
+
+
+def load_results(path: str | Path) -> dict[str, Any]:
+    document = json.loads(Path(path).read_text())
+    if document.get("version") != RESULTS_VERSION:
+        raise ValueError(
+            f"{path}: unsupported results version {document.get('version')}"
+        )
+    return document
+
+
+# ---------------------------------------------------------------------------
+# Comparison
+# ---------------------------------------------------------------------------
+
+
+def compare_results(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+    min_delta_ms: float = DEFAULT_MIN_DELTA_MS,
+) -> list[dict[str, Any]]:
+    """
+    Compare two result documents benchmark by benchmark.
+
+    A benchmark regressed when its median is more than *threshold* (fraction)
+    and more than *min_delta_ms* slower than the baseline; it improved when
+    the same holds the other way round.
+
+    Returns:
+        One row per (database, benchmark) with baseline/current p50 and p95,
+        the p50 change and a status of ``regression``, ``improvement``,
+        ``ok``, ``new`` or ``missing``
+    """
+    before = {(r["database"], r["benchmark"]): r for r in baseline["results"]}
+    after = {(r["database"], r["benchmark"]): r for r in current["results"]}
+
+    rows = []
+    for key in list(before) + [key for key in after if key not in before]:
+        old, new = before.get(key), after.get(key)
+        row: dict[str, Any] = {
+            "database": key[0],
+            "benchmark": key[1],
+            "baseline_p50_ms": old["p50_ms"] if old else None,
+            "current_p50_ms": new["p50_ms"] if new else None,
+            "baseline_p95_ms": old["p95_ms"] if old else None,
+            "current_p95_ms": new["p95_ms"] if new else None,
+            "change": None,
+        }
+        if old is None:
+            row["status"] = "new"
+        elif new is None:
+            row["status"] = "missing"
+        else:
+            delta = new["p50_ms"] - old["p50_ms"]
+            row["change"] = delta / old["p50_ms"] if old["p50_ms"] else 0.0
+            if abs(delta) < min_delta_ms or abs(row["change"]) <= threshold:
+                row["status"] = "ok"
+            else:
+                row["status"] = "regression" if delta > 0 else "improvement"
+        rows.append(row)
+    return rows
+
+
+def format_comparison(rows: list[dict[str, Any]]) -> str:
+    table = [
+        [
+            row["database"],
+            row["benchmark"],
+            row["baseline_p50_ms"],
+            row["current_p50_ms"],
+            f"{row['change']:+.1%}" if row["change"] is not None else "",
+            row["baseline_p95_ms"],
+            row["current_p95_ms"],
+            row["status"].upper() if row["status"] == "regression" else row["status"],
+        ]
+        for row in rows
+    ]
+    return tabulate(
+        table,
+        headers=[
+            "database",
+            "benchmark",
+            "base p50 ms",
+            "p50 ms",
+            "change",
+            "base p95 ms",
+            "p95 ms",
+            "status",
+        ],
+        floatfmt=".2f",
+    )
+
+
+def format_results(document: dict[str, Any]) -> str:
+    table = [
+        [
+            r["database"],
+            r["benchmark"],
+            r["p50_ms"],
+            r["p95_ms"],
+            r["items_per_second"] or "",
+            r["peak_rss_mb"] if r["peak_rss_mb"] is not None else "",
+        ]
+        for r in document["results"]
+    ]
+    return tabulate(
+        table,
+        headers=["database", "benchmark", "p50 ms", "p95 ms", "items/s", "peak RSS MB"],
+        floatfmt=".2f",
+    )
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    from .synthetic import PRESETS
+
+    parser = argparse.ArgumentParser(
+        prog="malla-bench",
+        description="Benchmark repository and service hot paths",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run benchmarks and store the results")
+    run.add_argument(
+        "--preset",
+        action="append",
+        choices=sorted(PRESETS),
+        help="Synthetic database size, repeatable (default: small)",
+    )
+    run.add_argument(
+        "--db",
+        type=Path,
+        action="append",
+        default=[],
+        help="Benchmark an existing database instead, repeatable",
+    )
+    run.add_argument("--seed", type=int, default=1, help="Synthetic database seed")
+    run.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=Path(".bench"),
+        help="Where generated databases are kept (default: %(default)s)",
+    )
+    run.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Processes used to generate missing databases (0 = one per CPU)",
+    )
+    run.add_argument(
+        "--benchmark",
+        "-b",
+        action="append",
+        help="Glob of benchmarks to run, repeatable (default: all)",
+    )
+    run.add_argument("--iterations", "-n", type=int, default=DEFAULT_ITERATIONS)
+    run.add_argument("--warmup", type=int, default=DEFAULT_WARMUP)
+    run.add_argument(
+        "--no-isolate",
+        dest="isolate",
+        action="store_false",
+        help="Run all benchmarks in this process (peak RSS becomes cumulative)",
+    )
+    run.add_argument("--output", "-o", type=Path, help="Write results JSON here")
+    run.add_argument("--baseline", type=Path, help="Compare against this results JSON")
+    _add_compare_options(run)
+
+    compare = commands.add_parser("compare", help="Compare two results files")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("current", type=Path)
+    _add_compare_options(compare)
+
+    commands.add_parser("list", help="List the registered benchmarks")
+    return parser.parse_args(argv)
+
+
+def _add_compare_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Median slowdown counted as a regression (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=DEFAULT_MIN_DELTA_MS,
+        help="Ignore changes smaller than this (default: %(default)s)",
+    )
+
+
+def _report_comparison(
+    baseline: dict[str, Any], current: dict[str, Any], args: argparse.Namespace
+) -> int:
+    rows = compare_results(
+        baseline, current, threshold=args.threshold, min_delta_ms=args.min_delta_ms
+    )
+    print(
+        f"Baseline {baseline.get('commit') or '?'} → current "
+        f"{current.get('commit') or '?'}"
+    )
+    print(format_comparison(rows))
+    regressions = [row for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s)")
+        return 1
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point for ``malla-bench``."""
+    args = _parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    if args.command == "list":
+        for bench in BENCHMARKS.values():
+            print(f"{bench.name:<28} {bench.description}")
+        return 0
+
+    if args.command == "compare":
+        return _report_comparison(
+            load_results(args.baseline), load_results(args.current), args
+        )
+
+    from .synthetic import ensure_preset_database
+    from .utils.link_analysis import resolve_worker_count
+
+    try:
+        names = select_benchmarks(args.benchmark)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+
+    databases: dict[str, str | Path] = {}
+    for path in args.db:
+        if not path.is_file():
+            logger.error(f"Database not found: {path}")
+            return 1
+        databases[path.stem] = path
+    for preset in args.preset or ([] if args.db else list(DEFAULT_PRESETS)):
+        databases[preset] = ensure_preset_database(
+            preset,
+            seed=args.seed,
+            directory=args.cache_dir,
+            workers=resolve_worker_count(args.workers),
+        )
+
+    document = run_suite(
+        databases,
+        names,
+        iterations=args.iterations,
+        warmup=args.warmup,
+        isolate=args.isolate,
+    )
+    print(format_results(document))
+    if args.output:
+        save_results(document, args.output)
+        logger.info(f"Results written to {args.output}")
+
+    if args.baseline:
+        print()
+        return _report_comparison(load_results(args.baseline), document, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
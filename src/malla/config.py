@@ -7,8 +7,6 @@ from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
-import yaml
-
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -45,10 +43,73 @@ class AppConfig:
 
     # Meshtastic channel default key (for optional packet decryption)
     default_channel_key: str = "1PG7OiApB1nwvP+rz05pAQ=="
+    # Additional channel PSKs (base64) keyed by "channel" or "region/channel";
+    # the env var takes "channel=key" pairs separated by commas
+    channel_keys: dict[str, str] = field(default_factory=dict)
 
     # Logging
     log_level: str = "INFO"
 
+    # Heavy analysis (longest links) – process pool size (0 = one per CPU) and
+    # the packet count below which the analysis stays in-process
+    analysis_workers: int = 0
+    analysis_parallel_min_packets: int = 2000
+
+    # Maximum number of rows a single /api/packets/export request may stream
+    export_max_rows: int = 1_000_000
+
+    # SQL profiler: per-request statement timings, slow-query log and a
+    # Server-Timing header; top queries of all workers are collected in
+    # query_stats_dir (default: <tmp>/malla-query-stats)
+    query_profiler: bool = False
+    query_profiler_explain: bool = False
+    slow_query_ms: float = 250.0
+    query_stats_dir: str = ""
+
+    # Prometheus metrics: /metrics on the web UI (workers share values through
+    # metrics_dir, default <tmp>/malla-metrics) and an embedded listener in
+    # malla-capture on capture_metrics_port (0 disables it)
+    metrics_enabled: bool = False
+    metrics_dir: str = ""
+    capture_metrics_host: str = "127.0.0.1"
+    capture_metrics_port: int = 0
+
+    # Hot/cold storage: keep hot_retention_days of packets in database_file and
+    # move older rows into monthly archive databases under archive_dir
+    # (default: <database dir>/archive) every archive_interval_seconds
+    storage_tiering: bool = False
+    hot_retention_days: int = 14
+    archive_dir: str = ""
+    archive_interval_seconds: int = 3600
+    archive_batch_size: int = 5000
+
+    # Weekly packet_history partitions written by malla-capture; weeks older
+    # than partition_retention_weeks are dropped (0 keeps everything)
+    packet_partitioning: bool = False
+    partition_retention_weeks: int = 0
+
+    # Result cache for the heavy analyses, shared by all workers and kept
+    # across restarts in result_cache_dir (default
+    # $XDG_CACHE_HOME/malla/result-cache, which must belong to the Malla user).
+    # Results are reused for result_cache_ttl_seconds, and up to
+    # result_cache_max_age_seconds while no new packet arrives
+    result_cache_enabled: bool = True
+    result_cache_dir: str = ""
+    result_cache_max_mb: int = 256
+    result_cache_memory_mb: int = 32
+    result_cache_ttl_seconds: int = 60
+    result_cache_max_age_seconds: int = 3600
+
+    # Days of position reports the shared location timeline loads (0 loads
+    # them all); lookups further back query the database per node
+    location_timeline_days: int = 30
+
+    # Warm-up in create_app (before Gunicorn forks its workers): protobuf and
+    # enum lookups, the result cache, the location timeline and the names of
+    # the warmup_node_names most recently updated nodes
+    prefork_warmup: bool = True
+    warmup_node_names: int = 5000
+
     # Browser debug (dev-only; optional)
     enable_browser_debug: bool = False
     debug_token: str | None = None
@@ -120,6 +181,8 @@ def load_config(config_path: str | os.PathLike | None = None) -> AppConfig:  # n
 
     if yaml_path.is_file():
         try:
+            import yaml  # only needed when there is a file to read
+
             with yaml_path.open("r", encoding="utf-8") as fp:
                 file_data = yaml.safe_load(fp) or {}
             if not isinstance(file_data, dict):
@@ -4,15 +4,21 @@ Database layer for Meshtastic Mesh Health Web UI.
 This package provides database connection management and data access operations.
 """
 
-from .connection import get_db_connection
-from .repositories import (
-    ChatRepository,
-    DashboardRepository,
-    LocationRepository,
-    NodeRepository,
-    PacketRepository,
-    TracerouteRepository,
-)
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .connection import get_db_connection
+    from .repositories import (
+        ChatRepository,
+        DashboardRepository,
+        LocationRepository,
+        NeighborRepository,
+        NodeRepository,
+        PacketRepository,
+        RelayRepository,
+        TelemetryRepository,
+        TracerouteRepository,
+    )
 
 __all__ = [
     "get_db_connection",
@@ -22,4 +28,23 @@ __all__ = [
     "TracerouteRepository",
     "LocationRepository",
     "ChatRepository",
+    "NeighborRepository",
+    "TelemetryRepository",
+    "RelayRepository",
 ]
+
+# The repositories (and the connection module) are imported on first use, so
+# that tools importing a single helper such as ``malla.database.neighbors``
+# do not load the whole query layer
+
+
+def __getattr__(name: str):
+    if name == "get_db_connection":
+        from .connection import get_db_connection
+
+        return get_db_connection
+    if name in __all__:
+        from . import repositories
+
+        return getattr(repositories, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
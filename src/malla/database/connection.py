@@ -5,32 +5,60 @@ Database connection management for Meshtastic Mesh Health Web UI.
 import logging
 import os
 import sqlite3
+import weakref
 from urllib.parse import quote
 
 # Prefer configuration loader over environment variables
 from malla.config import get_config
 
+from .. import metrics
+from . import (
+    neighbors,
+    partitions,
+    profiler,
+    telemetry,
+    tiering,
+)
+
 logger = logging.getLogger(__name__)
 
 
-def get_db_connection() -> sqlite3.Connection:
-    """
-    Get a connection to the SQLite database with proper concurrency configuration.
+class _Connection(sqlite3.Connection):
+    """Plain connection that, unlike sqlite3.Connection, can be weak-referenced
+    (the open-connection gauge is decremented from a finalizer)."""
 
-    Returns:
-        sqlite3.Connection: Database connection with row factory set and WAL mode enabled
+
+def get_db_path() -> str:
     """
-    # Resolve DB path:
-    # 1. Explicit override via `MALLA_DATABASE_FILE` env-var (handy for scripts)
-    # 2. Value from YAML configuration
-    # 3. Fallback to hard-coded default
+    Resolve the SQLite database path.
 
-    db_path: str = (
+    1. Explicit override via `MALLA_DATABASE_FILE` env-var (handy for scripts)
+    2. Value from YAML configuration
+    3. Fallback to hard-coded default
+    """
+    return (
         os.getenv("MALLA_DATABASE_FILE")
         or get_config().database_file
         or "meshtastic_history.db"
     )
 
+
+def get_db_connection(
+    start_time: float | None = None, end_time: float | None = None
+) -> sqlite3.Connection:
+    """
+    Get a connection to the SQLite database with proper concurrency configuration.
+
+    Args:
+        start_time: With storage tiering, only attach the archives of the
+            months overlapping ``[start_time, end_time]``
+        end_time: See *start_time*
+
+    Returns:
+        sqlite3.Connection: Database connection with row factory set and WAL mode enabled
+    """
+    db_path = get_db_path()
+
     try:
         # Determine read-only mode (web UI should not write)
         try:
@@ -51,12 +79,20 @@ def get_db_connection() -> sqlite3.Connection:
             # Ensure absolute path; do NOT percent-encode path separators
             abs_path = os.path.abspath(db_path)
             uri = f"file:{quote(abs_path, safe='/')}?mode=ro"
-            conn = sqlite3.connect(uri, timeout=30.0, uri=True)
+            conn = sqlite3.connect(
+                uri,
+                timeout=30.0,
+                uri=True,
+                factory=profiler.connection_factory(_Connection),
+            )
         else:
             conn = sqlite3.connect(
-                db_path, timeout=30.0
+                db_path, timeout=30.0, factory=profiler.connection_factory(_Connection)
             )  # 30 second timeout for busy database
         conn.row_factory = sqlite3.Row  # Enable column access by name
+        metrics.DB_CONNECTIONS_OPENED.inc()
+        metrics.DB_CONNECTIONS.inc()
+        weakref.finalize(conn, metrics.DB_CONNECTIONS.dec)
 
         # Configure SQLite for better concurrency
         cursor = conn.cursor()
@@ -87,6 +123,19 @@ def get_db_connection() -> sqlite3.Connection:
             except Exception as e:
                 logger.warning(f"Schema migration check failed: {e}")
 
+        # Hot/cold tiering or weekly partitions: expose every table holding
+        # packets through a TEMP packet_history view
+        if partitions.is_enabled():
+            partitions.create_view(conn)
+        elif tiering.is_enabled():
+            tiering.attach_archives(
+                conn,
+                db_path,
+                read_only=readonly,
+                start_time=start_time,
+                end_time=end_time,
+            )
+
         return conn
     except Exception as e:
         logger.error(f"Failed to connect to database: {e}")
@@ -98,16 +147,7 @@ def init_database() -> None:
     Initialize the database connection and verify it's accessible.
     This function is called during application startup.
     """
-    # Resolve DB path:
-    # 1. Explicit override via `MALLA_DATABASE_FILE` env-var (handy for scripts)
-    # 2. Value from YAML configuration
-    # 3. Fallback to hard-coded default
-
-    db_path: str = (
-        os.getenv("MALLA_DATABASE_FILE")
-        or get_config().database_file
-        or "meshtastic_history.db"
-    )
+    db_path = get_db_path()
 
     logger.info(f"Initializing database connection to: {db_path}")
 
@@ -154,6 +194,12 @@ def _ensure_schema_migrations(cursor: sqlite3.Cursor) -> None:
     The function is **safe** to run repeatedly – it will only attempt each
     migration once per Python process and each individual migration is
     guarded with a try/except that ignores the *duplicate column* error.
+
+    Only cheap changes belong here since they run on the first web request.
+    Migrations that scan tables (indexes on ``packet_history``, the node
+    activity counters, the search index and the sync numbering) run in
+    malla-capture's ``init_database``; until then the web UI uses its
+    fallbacks.
     """
 
     global _SCHEMA_MIGRATIONS_DONE  # pylint: disable=global-statement
@@ -199,6 +245,24 @@ def _ensure_schema_migrations(cursor: sqlite3.Cursor) -> None:
                 "Added parsing_error column to packet_history table via auto-migration"
             )
 
+        # packet_history.hop_count for the hop filter (generated columns are
+        # only listed by table_xinfo); malla-capture indexes it
+        cursor.execute("PRAGMA table_xinfo(packet_history)")
+        if "hop_count" not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(
+                "ALTER TABLE packet_history ADD COLUMN hop_count INTEGER "
+                "GENERATED ALWAYS AS (hop_start - hop_limit) VIRTUAL"
+            )
+            logging.info(
+                "Added hop_count column to packet_history table via auto-migration"
+            )
+
+        # neighbor_edge topology table (written by malla-capture)
+        neighbors.ensure_table(cursor)
+
+        # Telemetry time series tables (written by malla-capture)
+        telemetry.ensure_tables(cursor)
+
         _SCHEMA_MIGRATIONS_DONE.add("schema_migrations")
 
     except sqlite3.OperationalError as exc:
@@ -0,0 +1,190 @@
+"""
+Filter DSL and SQL compiler for ``packet_history`` queries.
+
+Repositories and services describe a query as a filter mapping using the keys
+the routes already produce (``start_time``, ``from_node``, ``gateway_id``,
+``hop_count`` ...).  :func:`compile_filters` turns it into a
+:class:`CompiledFilter`:
+
+* predicates are emitted in one canonical order with a fixed SQL form each,
+  so every caller asking for the same filter set runs byte-identical SQL
+  (one entry in sqlite3's statement cache and in the query profiler),
+* the condition list is cached per filter *signature* (which keys are set,
+  not their values), so building the SQL is a dictionary lookup,
+* predicates use index-friendly forms, e.g. the indexed ``hop_count``
+  column instead of ``(hop_start - hop_limit) = ?`` where the database has it.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+HOP_COUNT_EXPR = "(hop_start - hop_limit)"
+
+
+def _is_set(value: Any) -> bool:
+    return bool(value)
+
+
+def _not_none(value: Any) -> bool:
+    return value is not None
+
+
+@dataclass(frozen=True, slots=True)
+class Predicate:
+    """One filter key and the SQL condition it compiles to."""
+
+    key: str
+    sql: str
+    # Whether the filter value switches the predicate on
+    active: Callable[[Any], bool] = _is_set
+    # Number of times the value is bound (0 for flag predicates)
+    arity: int = 1
+
+
+# Canonical predicate order.  The time range comes first so the timestamp
+# index is the obvious choice; equality filters follow.
+PREDICATES: tuple[Predicate, ...] = (
+    Predicate("start_time", "timestamp >= ?"),
+    Predicate("end_time", "timestamp <= ?"),
+    Predicate("from_node", "from_node_id = ?"),
+    Predicate("to_node", "to_node_id = ?"),
+    Predicate("node", "(from_node_id = ? OR to_node_id = ?)", _not_none, 2),
+    Predicate("sender", "from_node_id = ?", _not_none),
+    Predicate("portnum", "portnum_name = ?"),
+    Predicate("gateway_id", "gateway_id = ?"),
+    Predicate("primary_channel", "channel_id = ?"),
+    Predicate(
+        "primary_channel_only", "(channel_id IS NULL OR channel_id = '')", arity=0
+    ),
+    Predicate("hop_count", "hop_count = ?", _not_none),
+    Predicate("min_rssi", "rssi >= ?"),
+    Predicate("max_rssi", "rssi <= ?"),
+    Predicate("broadcast_to", "(to_node_id IS NULL OR to_node_id = ?)", _not_none),
+    Predicate(
+        "direct_except", "(to_node_id IS NOT NULL AND to_node_id != ?)", _not_none
+    ),
+    Predicate("exclude_from", "(from_node_id IS NULL OR from_node_id != ?)", _not_none),
+    Predicate("exclude_to", "(to_node_id IS NULL OR to_node_id != ?)", _not_none),
+    Predicate("processed_successfully_only", "processed_successfully = 1", arity=0),
+    Predicate("payload_search", "CAST(raw_payload AS TEXT) LIKE ?", _not_none),
+)
+_PREDICATES_BY_KEY = {predicate.key: predicate for predicate in PREDICATES}
+
+# Columns matched by the free-text search box
+PACKET_SEARCH_COLUMNS: tuple[str, ...] = (
+    "portnum_name",
+    "gateway_id",
+    "channel_id",
+    "CAST(from_node_id AS TEXT)",
+    "CAST(to_node_id AS TEXT)",
+)
+TRACEROUTE_SEARCH_COLUMNS: tuple[str, ...] = (
+    "gateway_id",
+    "CAST(from_node_id AS TEXT)",
+    "CAST(to_node_id AS TEXT)",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledFilter:
+    """Canonical conditions and parameters for one filter set."""
+
+    conditions: tuple[str, ...]
+    params: tuple[Any, ...]
+
+    @property
+    def sql(self) -> str:
+        """Conditions joined with AND (empty when there are none)."""
+        return " AND ".join(self.conditions)
+
+    @property
+    def where(self) -> str:
+        """``WHERE ...`` clause, or an empty string without conditions."""
+        return f"WHERE {self.sql}" if self.conditions else ""
+
+    def extend(self, *conditions: str, params: Iterable[Any] = ()) -> CompiledFilter:
+        """Return a copy with *conditions* (and their *params*) appended."""
+        return CompiledFilter(self.conditions + conditions, self.params + tuple(params))
+
+
+@lru_cache(maxsize=512)
+def _compile_signature(
+    base: tuple[str, ...],
+    keys: tuple[str, ...],
+    search_columns: tuple[str, ...],
+    stored_hop_count: bool,
+) -> tuple[str, ...]:
+    conditions = list(base)
+    for key in keys:
+        sql = _PREDICATES_BY_KEY[key].sql
+        if key == "hop_count" and not stored_hop_count:
+            sql = f"{HOP_COUNT_EXPR} = ?"
+        conditions.append(sql)
+    if search_columns:
+        conditions.append(
+            "(" + " OR ".join(f"{column} LIKE ?" for column in search_columns) + ")"
+        )
+    return tuple(conditions)
+
+
+def has_stored_hop_count(cursor: sqlite3.Cursor) -> bool:
+    """Whether ``packet_history`` as seen by *cursor* has the hop_count column."""
+    rows = cursor.execute("PRAGMA table_xinfo(packet_history)").fetchall()
+    return any(row[1] == "hop_count" for row in rows)
+
+
+def compile_filters(
+    filters: Mapping[str, Any] | None,
+    search: str | None = None,
+    *,
+    base: Iterable[str] = (),
+    keys: Iterable[str] | None = None,
+    search_columns: tuple[str, ...] = PACKET_SEARCH_COLUMNS,
+    cursor: sqlite3.Cursor | None = None,
+) -> CompiledFilter:
+    """
+    Compile *filters* into canonical SQL conditions.
+
+    Args:
+        filters: Filter mapping; unknown keys are ignored
+        search: Free-text search matched against *search_columns*
+        base: Fixed conditions (without parameters) placed first
+        keys: Restrict the filter keys honoured to this subset
+        cursor: Cursor of the connection the query will run on, used to
+            detect the indexed ``hop_count`` column (the computed form is
+            used without it)
+    """
+    filters = filters or {}
+    allowed = None if keys is None else set(keys)
+
+    active_keys = []
+    params: list[Any] = []
+    for predicate in PREDICATES:
+        if allowed is not None and predicate.key not in allowed:
+            continue
+        value = filters.get(predicate.key)
+        if not predicate.active(value):
+            continue
+        active_keys.append(predicate.key)
+        params.extend([value] * predicate.arity)
+
+    if search:
+        params.extend([f"%{search}%"] * len(search_columns))
+
+    stored_hop_count = (
+        "hop_count" in active_keys
+        and cursor is not None
+        and has_stored_hop_count(cursor)
+    )
+    conditions = _compile_signature(
+        tuple(base),
+        tuple(active_keys),
+        search_columns if search else (),
+        stored_hop_count,
+    )
+    return CompiledFilter(conditions, tuple(params))
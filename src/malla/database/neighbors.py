@@ -0,0 +1,148 @@
+"""
+Neighbor topology from NEIGHBORINFO_APP packets.
+
+Nodes running the NeighborInfo module periodically broadcast the nodes they
+hear directly and the SNR of each.  The capture decodes these reports into the
+``neighbor_edge`` table, one row per directed ``(reporter_id, neighbor_id)``
+edge holding the latest SNR, so the map and the network graph read the link
+layer with an indexed range scan instead of decoding packets:
+
+* ``malla-capture`` upserts the edges of every report it receives,
+* ``malla-ingest`` and the synthetic generator derive them from the stored
+  packet rows (:func:`edges_from_rows`, :func:`rebuild`),
+* on start-up the capture fills a new, empty table from the last week of
+  stored reports.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+TABLE = "neighbor_edge"
+PORTNUM_NAME = "NEIGHBORINFO_APP"
+# Reports read when a new neighbor_edge table is filled from packet_history
+BACKFILL_SECONDS = 7 * 86400
+
+CREATE_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {TABLE} (
+        reporter_id INTEGER NOT NULL,
+        neighbor_id INTEGER NOT NULL,
+        snr REAL,
+        last_seen REAL NOT NULL,
+        report_count INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (reporter_id, neighbor_id)
+    ) WITHOUT ROWID
+"""
+CREATE_INDEX_SQL = (
+    f"CREATE INDEX IF NOT EXISTS idx_neighbor_edge_last_seen ON {TABLE}(last_seen)"
+)
+
+# Last value per edge; reports arriving out of order only bump the count
+UPSERT_SQL = f"""
+    INSERT INTO {TABLE} (reporter_id, neighbor_id, snr, last_seen)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (reporter_id, neighbor_id) DO UPDATE SET
+        snr = CASE WHEN excluded.last_seen >= last_seen
+                   THEN excluded.snr ELSE snr END,
+        last_seen = MAX(last_seen, excluded.last_seen),
+        report_count = report_count + 1
+"""
+
+Edge = tuple[int, int, float, float]
+
+
+def ensure_table(cursor: sqlite3.Cursor) -> None:
+    """Create ``neighbor_edge`` and its index if they do not exist."""
+    cursor.execute(CREATE_TABLE_SQL)
+    cursor.execute(CREATE_INDEX_SQL)
+
+
+def edges_from_info(info: Any, sender_id: int | None, timestamp: float) -> list[Edge]:
+    """Edges reported by a decoded ``NeighborInfo`` message."""
+    reporter_id = info.node_id or sender_id
+    if not reporter_id:
+        return []
+    return [
+        (reporter_id, neighbor.node_id, neighbor.snr, timestamp)
+        for neighbor in info.neighbors
+        if neighbor.node_id and neighbor.node_id != reporter_id
+    ]
+
+
+def edges_from_payload(
+    payload: bytes | None, sender_id: int | None, timestamp: float
+) -> list[Edge]:
+    """Edges from a raw NEIGHBORINFO_APP payload (none if it does not parse)."""
+    if not payload:
+        return []
+    from google.protobuf.message import DecodeError
+    from meshtastic import mesh_pb2
+
+    info = mesh_pb2.NeighborInfo()
+    try:
+        info.ParseFromString(bytes(payload))
+    except DecodeError:
+        return []
+    return edges_from_info(info, sender_id, timestamp)
+
+
+def edges_from_rows(
+    columns: Sequence[str], rows: Iterable[Sequence[Any]]
+) -> list[Edge]:
+    """Edges from ``packet_history`` rows laid out as *columns*."""
+    timestamp = columns.index("timestamp")
+    sender = columns.index("from_node_id")
+    portnum_name = columns.index("portnum_name")
+    payload = columns.index("raw_payload")
+    edges: list[Edge] = []
+    for row in rows:
+        if row[portnum_name] == PORTNUM_NAME:
+            edges.extend(edges_from_payload(row[payload], row[sender], row[timestamp]))
+    return edges
+
+
+def upsert_edges(cursor: sqlite3.Cursor, edges: Iterable[Edge]) -> None:
+    cursor.executemany(UPSERT_SQL, edges)
+
+
+def rebuild(
+    cursor: sqlite3.Cursor,
+    source: str = "packet_history",
+    since: float | None = None,
+) -> int:
+    """
+    Upsert the edges of the NEIGHBORINFO_APP packets in *source*.
+
+    Args:
+        cursor: Cursor of a writable connection holding ``neighbor_edge``
+        source: FROM expression to read packets from
+        since: Only read packets stored at or after this timestamp
+
+    Returns:
+        Number of edge reports written
+    """
+    query = (
+        f"SELECT timestamp, from_node_id, raw_payload FROM {source} "
+        "WHERE portnum_name = ?"
+    )
+    params: list[Any] = [PORTNUM_NAME]
+    if since is not None:
+        query += " AND timestamp >= ?"
+        params.append(since)
+    query += " ORDER BY timestamp"
+
+    written = 0
+    for timestamp, sender_id, payload in cursor.execute(query, params).fetchall():
+        edges = edges_from_payload(payload, sender_id, timestamp)
+        upsert_edges(cursor, edges)
+        written += len(edges)
+    return written
+
+
+def is_empty(cursor: sqlite3.Cursor) -> bool:
+    return cursor.execute(f"SELECT 1 FROM {TABLE} LIMIT 1").fetchone() is None
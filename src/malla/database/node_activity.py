@@ -0,0 +1,180 @@
+"""
+Per-node activity counters kept on ``node_info``.
+
+The node list, the node picker and ``/api/nodes/search`` sort and filter by
+when a node was last heard and how busy it was over the last day.  Rather
+than grouping 24 hours of ``packet_history`` on every request, ``node_info``
+carries the numbers as plain, indexed columns:
+
+* ``last_packet_time``: timestamp of the newest packet sent by the node,
+* ``packet_count_24h``: packets sent by the node in the last 24 hours,
+* ``gateway_packet_count_24h``: packets the node uplinked as a gateway.
+
+``malla-capture`` bumps them for every packet it stores and periodically
+recomputes the 24 hour counts with :func:`refresh` so packets that age out of
+the window stop counting.  ``malla-ingest`` and the synthetic generator
+refresh once they have loaded their packets.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from collections.abc import Iterable
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 24 * 3600
+
+COLUMNS: tuple[tuple[str, str], ...] = (
+    ("last_packet_time", "REAL"),
+    ("packet_count_24h", "INTEGER NOT NULL DEFAULT 0"),
+    ("gateway_packet_count_24h", "INTEGER NOT NULL DEFAULT 0"),
+)
+INDEX_SQL: tuple[str, ...] = (
+    "CREATE INDEX IF NOT EXISTS idx_node_last_packet_time "
+    "ON node_info(last_packet_time)",
+    "CREATE INDEX IF NOT EXISTS idx_node_packet_count_24h "
+    "ON node_info(packet_count_24h)",
+)
+
+# (from_node_id, gateway_id, timestamp) of a stored packet
+Packet = tuple[int | None, str | None, float]
+
+
+def has_columns(cursor: sqlite3.Cursor) -> bool:
+    """Whether ``node_info`` already carries the activity columns."""
+    cursor.execute("PRAGMA table_info(node_info)")
+    return {name for name, _ in COLUMNS} <= {row[1] for row in cursor.fetchall()}
+
+
+def ensure_columns(cursor: sqlite3.Cursor) -> bool:
+    """
+    Add the activity columns and their indexes to ``node_info``.
+
+    Returns:
+        True if any column was added, in which case the caller should fill
+        them with :func:`refresh` (``since=0``)
+    """
+    cursor.execute("PRAGMA table_info(node_info)")
+    existing = {row[1] for row in cursor.fetchall()}
+    added = False
+    for name, definition in COLUMNS:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE node_info ADD COLUMN {name} {definition}")
+            logger.info(f"Added {name} column to node_info table")
+            added = True
+    for sql in INDEX_SQL:
+        cursor.execute(sql)
+    return added
+
+
+def gateway_node_id(gateway_id: str | None) -> int | None:
+    """Node id of a ``!xxxxxxxx`` gateway id (None for anything else)."""
+    if not gateway_id or not gateway_id.startswith("!"):
+        return None
+    try:
+        return int(gateway_id[1:], 16)
+    except ValueError:
+        return None
+
+
+def record_packets(
+    cursor: sqlite3.Cursor, packets: Iterable[Packet], now: float | None = None
+) -> None:
+    """Count freshly stored *packets* towards their sender and gateway."""
+    window_start = (time.time() if now is None else now) - WINDOW_SECONDS
+    # node_id -> [packets sent, packets uplinked, newest sent]
+    deltas: dict[int, list[float]] = {}
+    for from_node_id, gateway_id, timestamp in packets:
+        if from_node_id:
+            delta = deltas.setdefault(from_node_id, [0, 0, 0.0])
+            if timestamp > window_start:
+                delta[0] += 1
+            delta[2] = max(delta[2], timestamp)
+        gateway = gateway_node_id(gateway_id)
+        if gateway and timestamp > window_start:
+            deltas.setdefault(gateway, [0, 0, 0.0])[1] += 1
+    cursor.executemany(
+        """
+        UPDATE node_info SET
+            packet_count_24h = packet_count_24h + ?,
+            gateway_packet_count_24h = gateway_packet_count_24h + ?,
+            last_packet_time = CASE WHEN ? > COALESCE(last_packet_time, 0)
+                                    THEN ? ELSE last_packet_time END
+        WHERE node_id = ?
+        """,
+        [
+            (sent, uplinked, newest or None, newest or None, node_id)
+            for node_id, (sent, uplinked, newest) in deltas.items()
+        ],
+    )
+
+
+def refresh(
+    cursor: sqlite3.Cursor,
+    now: float | None = None,
+    since: float | None = None,
+    source: str = "packet_history",
+) -> None:
+    """
+    Recompute the 24 hour counts from *source*.
+
+    Args:
+        cursor: Cursor of a writable connection
+        now: End of the 24 hour window (defaults to the current time)
+        since: Also recompute ``last_packet_time`` from the packets stored
+            after this timestamp (0 for all of them); by default only
+            the window is read
+        source: FROM-clause expression covering the packets read, such as
+            :func:`malla.database.partitions.packet_source` of the window
+    """
+    window_start = (time.time() if now is None else now) - WINDOW_SECONDS
+    start = window_start if since is None else min(since, window_start)
+
+    cursor.execute(
+        f"""
+        SELECT from_node_id, SUM(timestamp > ?), MAX(timestamp)
+        FROM {source}
+        WHERE timestamp > ? AND from_node_id IS NOT NULL
+        GROUP BY from_node_id
+        """,
+        (window_start, start),
+    )
+    senders = cursor.fetchall()
+    cursor.execute(
+        f"""
+        SELECT gateway_id, COUNT(*)
+        FROM {source}
+        WHERE timestamp > ? AND gateway_id IS NOT NULL AND gateway_id != ''
+        GROUP BY gateway_id
+        """,
+        (window_start,),
+    )
+    gateways = [
+        (count, node_id)
+        for gateway_id, count in cursor.fetchall()
+        if (node_id := gateway_node_id(gateway_id)) is not None
+    ]
+
+    cursor.execute(
+        """
+        UPDATE node_info SET packet_count_24h = 0, gateway_packet_count_24h = 0
+        WHERE packet_count_24h != 0 OR gateway_packet_count_24h != 0
+        """
+    )
+    cursor.executemany(
+        """
+        UPDATE node_info SET
+            packet_count_24h = ?,
+            last_packet_time = CASE WHEN ? > COALESCE(last_packet_time, 0)
+                                    THEN ? ELSE last_packet_time END
+        WHERE node_id = ?
+        """,
+        [(count, newest, newest, node_id) for node_id, count, newest in senders],
+    )
+    cursor.executemany(
+        "UPDATE node_info SET gateway_packet_count_24h = ? WHERE node_id = ?",
+        gateways,
+    )
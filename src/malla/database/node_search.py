@@ -0,0 +1,199 @@
+"""
+Trigram search index over the node directory.
+
+``node_search`` is an FTS5 table using the ``trigram`` tokenizer with one row
+per ``node_info`` row (``rowid`` = ``node_id``).  It indexes the long and
+short names, the ``!xxxxxxxx`` hex id, the decimal node number and the
+hardware model, so any case-insensitive substring of three or more characters
+is answered from the index instead of scanning ``node_info`` with
+``LIKE '%q%'``.  Triggers on ``node_info`` keep the index current, so every
+process that writes nodes (capture, ingest, the synthetic generator) updates
+it incrementally.
+
+Queries shorter than three characters match name prefixes through
+``NOCASE`` indexes on ``node_info``, and SQLite builds without FTS5 fall back
+to ``LIKE '%q%'``.  Either way :func:`relevance_order` ranks exact matches
+first, then prefix matches, then other substrings.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import sqlite3
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+TABLE = "node_search"
+# Shortest query the trigram index can answer
+MIN_QUERY_LENGTH = 3
+
+_HEX_ID_RE = re.compile(r"!?[0-9a-fA-F]{1,8}")
+
+CREATE_TABLE_SQL = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        long_name, short_name, hex_id, node_num, hw_model,
+        tokenize = 'trigram'
+    )
+"""
+
+_COLUMNS = "rowid, long_name, short_name, hex_id, node_num, hw_model"
+
+# Serve the LIKE 'q%' prefix matches of short queries
+INDEX_SQL: tuple[str, ...] = (
+    "CREATE INDEX IF NOT EXISTS idx_node_long_name_nocase "
+    "ON node_info(long_name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_node_short_name_nocase "
+    "ON node_info(short_name COLLATE NOCASE)",
+)
+
+
+def _values(row: str) -> str:
+    return (
+        f"{row}.node_id, COALESCE({row}.long_name, ''), "
+        f"COALESCE({row}.short_name, ''), printf('!%08x', {row}.node_id), "
+        f"CAST({row}.node_id AS TEXT), COALESCE({row}.hw_model, '')"
+    )
+
+
+# INSERT OR REPLACE on node_info does not fire the delete trigger, so the
+# insert trigger drops any stale row itself.  The capture rewrites every
+# column on each node_info upsert, so updates only reindex changed names.
+TRIGGER_SQL: tuple[str, ...] = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS node_search_insert AFTER INSERT ON node_info
+    BEGIN
+        DELETE FROM {TABLE} WHERE rowid = new.node_id;
+        INSERT INTO {TABLE} ({_COLUMNS}) VALUES ({_values("new")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS node_search_update
+    AFTER UPDATE OF long_name, short_name, hw_model ON node_info
+    WHEN old.long_name IS NOT new.long_name
+      OR old.short_name IS NOT new.short_name
+      OR old.hw_model IS NOT new.hw_model
+    BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.node_id;
+        INSERT INTO {TABLE} ({_COLUMNS}) VALUES ({_values("new")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS node_search_delete AFTER DELETE ON node_info
+    BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.node_id;
+    END
+    """,
+)
+
+
+def is_available(cursor: sqlite3.Cursor) -> bool:
+    """Whether the database has the search index."""
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)
+    )
+    return cursor.fetchone() is not None
+
+
+def ensure_index(cursor: sqlite3.Cursor) -> bool:
+    """
+    Create the search index and its triggers, filling a new index from
+    ``node_info``.
+
+    Returns:
+        False if this SQLite build has no FTS5 trigram tokenizer
+    """
+    created = not is_available(cursor)
+    try:
+        cursor.execute(CREATE_TABLE_SQL)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Node search index unavailable, using LIKE search: {e}")
+        return False
+    for sql in TRIGGER_SQL + INDEX_SQL:
+        cursor.execute(sql)
+    if created:
+        rebuild(cursor)
+    return True
+
+
+def rebuild(cursor: sqlite3.Cursor) -> None:
+    """Refill the index from ``node_info``."""
+    cursor.execute(f"DELETE FROM {TABLE}")
+    cursor.execute(
+        f"INSERT INTO {TABLE} ({_COLUMNS}) SELECT {_values('node_info')} FROM node_info"
+    )
+
+
+def normalize_query(query: str) -> str:
+    """Strip whitespace and the ``!`` of hex ids, which the index stores as
+    part of ``!xxxxxxxx``, so ``!a1b2`` matches like ``a1b2`` does."""
+    query = query.strip()
+    if _HEX_ID_RE.fullmatch(query):
+        query = query.lstrip("!")
+    return query
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_condition(cursor: sqlite3.Cursor, query: str) -> tuple[str, list[Any]]:
+    """
+    SQL condition on ``node_info ni`` matching nodes whose names, hex id,
+    node number or hardware model contain *query*; with the index, queries
+    too short for trigrams match name prefixes and exact node numbers only.
+
+    Returns:
+        The condition and its parameters
+    """
+    query = normalize_query(query)
+    if is_available(cursor):
+        if len(query) >= MIN_QUERY_LENGTH:
+            phrase = '"' + query.replace('"', '""') + '"'
+            return (
+                f"ni.node_id IN (SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH ?)",
+                [phrase],
+            )
+        prefix = f"{_escape_like(query)}%"
+        return (
+            "(ni.long_name LIKE ? ESCAPE '\\' OR ni.short_name LIKE ? ESCAPE '\\' "
+            "OR ni.node_id = ?)",
+            [prefix, prefix, int(query) if query.isdigit() else None],
+        )
+
+    pattern = f"%{_escape_like(query)}%"
+    columns = (
+        "ni.long_name",
+        "ni.short_name",
+        "ni.hw_model",
+        "printf('!%08x', ni.node_id)",
+        "CAST(ni.node_id AS TEXT)",
+    )
+    condition = " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in columns)
+    return f"({condition})", [pattern] * len(columns)
+
+
+def relevance_order(query: str) -> tuple[str, list[Any]]:
+    """
+    ORDER BY expression ranking exact matches of *query* (0) before prefix
+    matches (1) and other substrings (2).
+
+    Returns:
+        The expression and its parameters
+    """
+    query = normalize_query(query)
+    hex_id = "!" + query.lower()
+    prefix = f"{_escape_like(query)}%"
+    expression = """
+        CASE
+            WHEN printf('!%08x', ni.node_id) = ? OR CAST(ni.node_id AS TEXT) = ?
+                 OR ni.short_name = ? COLLATE NOCASE
+                 OR ni.long_name = ? COLLATE NOCASE THEN 0
+            WHEN printf('!%08x', ni.node_id) LIKE ? ESCAPE '\\'
+                 OR ni.short_name LIKE ? ESCAPE '\\'
+                 OR ni.long_name LIKE ? ESCAPE '\\' THEN 1
+            ELSE 2
+        END
+    """
+    return expression, [hex_id, query, query, query, "!" + prefix, prefix, prefix]
@@ -0,0 +1,194 @@
+"""
+Change versions for syncing the node directory to browser caches.
+
+Every insert into ``node_info``, and every update that changes a directory
+field (names, hardware, role, channel, ...), takes the next value of the
+single-row ``node_sync_state.version`` counter and stores it in
+``node_info.sync_version``.  Deleting a node leaves a ``node_tombstone`` row
+with the version of the deletion.  All of this happens in triggers, so every
+writer (capture, ingest, the synthetic generator) bumps versions without
+knowing about them.
+
+A client that has seen version *v* asks for the rows and tombstones above
+*v* (:func:`changes`) instead of the whole list.  The activity counters on
+``node_info`` change with every packet and deliberately do not bump the
+version; clients ask the server for popularity orderings instead.
+
+``node_sync_state.epoch`` is random per database: a client whose cached
+epoch differs (the database was replaced) starts over from version 0.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import uuid
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# node_info fields that are part of the synced directory
+DIRECTORY_COLUMNS: tuple[str, ...] = (
+    "hex_id",
+    "long_name",
+    "short_name",
+    "hw_model",
+    "role",
+    "primary_channel",
+    "is_licensed",
+    "mac_address",
+)
+
+SCHEMA_SQL: tuple[str, ...] = (
+    """
+    CREATE TABLE IF NOT EXISTS node_sync_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        epoch TEXT NOT NULL,
+        version INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS node_tombstone (
+        node_id INTEGER PRIMARY KEY,
+        sync_version INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_node_tombstone_version "
+    "ON node_tombstone(sync_version)",
+)
+
+_BUMP = """
+        UPDATE node_sync_state SET version = version + 1 WHERE id = 1;
+        UPDATE node_info
+        SET sync_version = (SELECT version FROM node_sync_state WHERE id = 1)
+        WHERE node_id = new.node_id;
+"""
+
+_CHANGED = " OR ".join(
+    f"old.{column} IS NOT new.{column}" for column in DIRECTORY_COLUMNS
+)
+
+TRIGGER_SQL: tuple[str, ...] = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS node_sync_insert AFTER INSERT ON node_info
+    BEGIN
+        {_BUMP}
+        DELETE FROM node_tombstone WHERE node_id = new.node_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS node_sync_update AFTER UPDATE ON node_info
+    WHEN {_CHANGED}
+    BEGIN
+        {_BUMP}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS node_sync_delete AFTER DELETE ON node_info
+    BEGIN
+        UPDATE node_sync_state SET version = version + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO node_tombstone (node_id, sync_version)
+        VALUES (old.node_id, (SELECT version FROM node_sync_state WHERE id = 1));
+    END
+    """,
+)
+
+# Columns sent for each changed node
+NODE_COLUMNS = """
+    node_id, long_name, short_name, hw_model, role, primary_channel,
+    last_updated, printf('!%08x', node_id) as hex_id, sync_version
+"""
+
+
+def ensure_schema(cursor: sqlite3.Cursor) -> None:
+    """Create the sync tables and triggers, numbering existing nodes once."""
+    for sql in SCHEMA_SQL:
+        cursor.execute(sql)
+
+    cursor.execute("PRAGMA table_info(node_info)")
+    if "sync_version" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(
+            "ALTER TABLE node_info ADD COLUMN sync_version INTEGER NOT NULL DEFAULT 0"
+        )
+        logger.info("Added sync_version column to node_info table")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_node_sync_version ON node_info(sync_version)"
+    )
+
+    cursor.execute("SELECT 1 FROM node_sync_state WHERE id = 1")
+    if cursor.fetchone() is None:
+        # Give every existing node its own version so clients can page
+        cursor.execute("SELECT node_id FROM node_info ORDER BY node_id")
+        node_ids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany(
+            "UPDATE node_info SET sync_version = ? WHERE node_id = ?",
+            [(version, node_id) for version, node_id in enumerate(node_ids, 1)],
+        )
+        cursor.execute(
+            "INSERT INTO node_sync_state (id, epoch, version) VALUES (1, ?, ?)",
+            (uuid.uuid4().hex, len(node_ids)),
+        )
+
+    for sql in TRIGGER_SQL:
+        cursor.execute(sql)
+
+
+def state(cursor: sqlite3.Cursor) -> tuple[str, int] | None:
+    """``(epoch, version)`` of the directory, None without sync tables."""
+    try:
+        cursor.execute("SELECT epoch, version FROM node_sync_state WHERE id = 1")
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            return None
+        raise
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def changes(cursor: sqlite3.Cursor, since: int, limit: int) -> dict[str, Any] | None:
+    """
+    Nodes and tombstones changed after version *since*.
+
+    Returns:
+        ``epoch``, ``version`` (pass it as *since* next time), ``nodes``,
+        ``deleted`` (node ids) and ``more`` (True if *limit* cut the nodes
+        short and the client should ask again); None without sync tables
+    """
+    current = state(cursor)
+    if current is None:
+        return None
+    epoch, version = current
+    if since > version:
+        # The client saw a newer database than this one: start over
+        since = 0
+
+    cursor.execute(
+        f"""
+        SELECT {NODE_COLUMNS}
+        FROM node_info
+        WHERE sync_version > ?
+        ORDER BY sync_version
+        LIMIT ?
+        """,
+        (since, limit + 1),
+    )
+    columns = [column[0] for column in cursor.description]
+    nodes = [dict(zip(columns, row, strict=True)) for row in cursor.fetchall()]
+    more = len(nodes) > limit
+    if more:
+        nodes = nodes[:limit]
+        version = nodes[-1]["sync_version"]
+
+    cursor.execute(
+        "SELECT node_id FROM node_tombstone WHERE sync_version > ? AND sync_version <= ?",
+        (since, version),
+    )
+    deleted = [row[0] for row in cursor.fetchall()]
+    return {
+        "epoch": epoch,
+        "since": since,
+        "version": version,
+        "nodes": nodes,
+        "deleted": deleted,
+        "more": more,
+    }
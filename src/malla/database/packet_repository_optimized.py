@@ -8,6 +8,7 @@ from datetime import datetime
 from typing import Any
 
 from . import get_db_connection
+from .filters import compile_filters
 
 logger = logging.getLogger(__name__)
 
@@ -34,71 +35,9 @@ class PacketRepositoryOptimized:
             cursor = conn.cursor()
 
             # Build WHERE clause
-            where_conditions = []
-            params = []
-
-            if filters.get("start_time"):
-                where_conditions.append("timestamp >= ?")
-                params.append(filters["start_time"])
-
-            if filters.get("end_time"):
-                where_conditions.append("timestamp <= ?")
-                params.append(filters["end_time"])
-
-            if filters.get("from_node"):
-                where_conditions.append("from_node_id = ?")
-                params.append(filters["from_node"])
-
-            if filters.get("to_node"):
-                where_conditions.append("to_node_id = ?")
-                params.append(filters["to_node"])
-
-            if filters.get("portnum"):
-                where_conditions.append("portnum_name = ?")
-                params.append(filters["portnum"])
-
-            if filters.get("min_rssi"):
-                where_conditions.append("rssi >= ?")
-                params.append(filters["min_rssi"])
-
-            if filters.get("max_rssi"):
-                where_conditions.append("rssi <= ?")
-                params.append(filters["max_rssi"])
-
-            if filters.get("gateway_id"):
-                where_conditions.append("gateway_id = ?")
-                params.append(filters["gateway_id"])
-
-            if filters.get("hop_count") is not None:
-                where_conditions.append("(hop_start - hop_limit) = ?")
-                params.append(filters["hop_count"])
-
-            # Generic exclusion filters for from/to node IDs
-            if filters.get("exclude_from") is not None:
-                where_conditions.append("(from_node_id IS NULL OR from_node_id != ?)")
-                params.append(filters["exclude_from"])
-
-            if filters.get("exclude_to") is not None:
-                where_conditions.append("(to_node_id IS NULL OR to_node_id != ?)")
-                params.append(filters["exclude_to"])
-
-            # Search functionality
-            if search:
-                # Search in multiple text fields
-                search_condition = """(
-                    portnum_name LIKE ? OR
-                    gateway_id LIKE ? OR
-                    channel_id LIKE ? OR
-                    CAST(from_node_id AS TEXT) LIKE ? OR
-                    CAST(to_node_id AS TEXT) LIKE ?
-                )"""
-                where_conditions.append(search_condition)
-                search_param = f"%{search}%"
-                params.extend([search_param] * 5)
-
-            where_clause = (
-                "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-            )
+            compiled = compile_filters(filters, search, cursor=cursor)
+            where_clause = compiled.where
+            params = list(compiled.params)
 
             if group_packets:
                 # OPTIMIZED GROUPED APPROACH
@@ -106,17 +45,15 @@ class PacketRepositoryOptimized:
                 # we use a time-windowed approach instead of expensive GROUP BY + ORDER BY
 
                 # Add mesh_packet_id filter
-                if where_conditions:
-                    where_clause += " AND mesh_packet_id IS NOT NULL"
-                else:
-                    where_clause = "WHERE mesh_packet_id IS NOT NULL"
+                grouped = compiled.extend("mesh_packet_id IS NOT NULL")
 
                 # Add time window to limit data scan (improves performance dramatically)
                 # If no explicit time filter, default to last 7 days for reasonable performance
                 if not filters.get("start_time") and not filters.get("end_time"):
                     recent_cutoff = time.time() - (7 * 24 * 3600)  # 7 days ago
-                    where_clause += " AND timestamp >= ?"
-                    params.append(recent_cutoff)
+                    grouped = grouped.extend("timestamp >= ?", params=[recent_cutoff])
+                where_clause = grouped.where
+                params = list(grouped.params)
 
                 # Get individual packets ordered by timestamp (uses timestamp index efficiently)
                 # Fetch more than needed to account for grouping
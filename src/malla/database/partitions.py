@@ -0,0 +1,382 @@
+"""
+Weekly partitioning of ``packet_history``.
+
+With ``packet_partitioning`` enabled the capture and ``malla-ingest`` write
+each packet into a table per UTC week (Monday 00:00), e.g.
+``packet_history_w20250106``, created on demand with the same columns and
+indexes as ``packet_history``.  Rows that were stored before partitioning was
+switched on stay in ``packet_history`` itself, the *legacy* table.
+
+Packet ids stay unique across all tables: the capture draws them from the
+``sqlite_sequence`` counter of ``packet_history``, which AUTOINCREMENT inserts
+into the legacy table also advance.
+
+Readers see the partitions in two ways:
+
+* Web connections create a TEMP view named ``packet_history`` over the legacy
+  table and every partition, so unqualified queries see the full history.
+* :func:`packet_source` builds a FROM-clause expression covering only the
+  tables that can hold packets in a time range; repositories use it for
+  queries with a ``timestamp`` predicate so old partitions are never read.
+
+Expired weeks are removed with :func:`drop_partitions_before` (``DROP TABLE``
+instead of a mass ``DELETE``).
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import sqlite3
+import threading
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from . import tiering
+
+logger = logging.getLogger(__name__)
+
+TABLE = tiering.TABLE
+PARTITION_PREFIX = f"{TABLE}_w"
+WEEK_SECONDS = 7 * 86400
+
+_PARTITION_RE = re.compile(rf"^{PARTITION_PREFIX}(\d{{8}})$")
+_INDEX_RE = re.compile(
+    rf"^CREATE\s+(UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+{TABLE}\b",
+    re.IGNORECASE,
+)
+_TABLE_RE = re.compile(
+    rf"^CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[\"'`]?{TABLE}[\"'`]?",
+    re.IGNORECASE,
+)
+
+
+@dataclass(slots=True)
+class PartitionSettings:
+    enabled: bool = False
+    retention_weeks: int = 0
+
+
+@dataclass(slots=True)
+class Layout:
+    """Tables holding packets, as seen by the last refreshed connection."""
+
+    # (week start timestamp, table name), oldest first
+    partitions: list[tuple[float, str]] = field(default_factory=list)
+    # Newest timestamp in the legacy table (None when it is empty)
+    legacy_max_timestamp: float | None = None
+    # Table name -> select list aligned with the legacy table's columns
+    select_lists: dict[str, str] = field(default_factory=dict)
+    # Tables whose columns match the legacy table exactly
+    complete: set[str] = field(default_factory=set)
+    schema_version: int = -1
+
+
+_settings = PartitionSettings()
+_layout: Layout | None = None
+_layout_lock = threading.Lock()
+_created: set[str] = set()
+
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+
+def configure(cfg: Any) -> PartitionSettings:
+    """Apply the partitioning options of an :class:`~malla.config.AppConfig`."""
+    global _settings, _layout
+    _settings = PartitionSettings(
+        enabled=bool(getattr(cfg, "packet_partitioning", False)),
+        retention_weeks=int(getattr(cfg, "partition_retention_weeks", 0)),
+    )
+    _layout = None
+    _created.clear()
+    if _settings.enabled and tiering.is_enabled():
+        logger.warning(
+            "packet_partitioning and storage_tiering cannot be combined; "
+            "storage tiering is disabled"
+        )
+        tiering.configure(None)
+    return _settings
+
+
+def is_enabled() -> bool:
+    return _settings.enabled
+
+
+# ---------------------------------------------------------------------------
+# Partition naming
+# ---------------------------------------------------------------------------
+
+
+def week_start(timestamp: float) -> datetime:
+    """Monday 00:00 UTC of the week containing *timestamp*."""
+    day = datetime.fromtimestamp(timestamp, UTC).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return day - timedelta(days=day.weekday())
+
+
+def partition_name(timestamp: float) -> str:
+    return f"{PARTITION_PREFIX}{week_start(timestamp):%Y%m%d}"
+
+
+def _partition_start(name: str) -> float | None:
+    match = _PARTITION_RE.match(name)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d").replace(tzinfo=UTC).timestamp()
+
+
+def list_partitions(conn: sqlite3.Connection) -> list[tuple[float, str]]:
+    """Return ``(week start, table)`` for every partition, oldest first."""
+    rows = conn.execute(
+        "SELECT name FROM main.sqlite_master WHERE type = 'table' AND name GLOB ?",
+        (f"{PARTITION_PREFIX}[0-9]*",),
+    ).fetchall()
+    partitions = []
+    for (name,) in rows:
+        start = _partition_start(name)
+        if start is not None:
+            partitions.append((start, name))
+    partitions.sort()
+    return partitions
+
+
+# ---------------------------------------------------------------------------
+# Write side (capture)
+# ---------------------------------------------------------------------------
+
+
+def ensure_partition(conn: sqlite3.Connection, timestamp: float) -> str:
+    """Create the partition for *timestamp* if needed and return its name."""
+    name = partition_name(timestamp)
+    if name in _created:
+        return name
+
+    definitions = conn.execute(
+        "SELECT type, sql FROM main.sqlite_master "
+        "WHERE tbl_name = ? AND sql IS NOT NULL ORDER BY type = 'index'",
+        (TABLE,),
+    ).fetchall()
+    suffix = name[len(PARTITION_PREFIX) :]
+    for obj_type, sql in definitions:
+        if obj_type == "table":
+            sql = _TABLE_RE.sub(f"CREATE TABLE IF NOT EXISTS {name}", sql, count=1)
+        else:
+            sql = _INDEX_RE.sub(
+                lambda m: (
+                    f"CREATE {m.group(1) or ''}INDEX IF NOT EXISTS "
+                    f"{m.group(2)}_w{suffix} ON {name}"
+                ),
+                sql,
+                count=1,
+            )
+        conn.execute(sql)
+    _created.add(name)
+    return name
+
+
+def reserve_packet_ids(cursor: sqlite3.Cursor, count: int = 1) -> int:
+    """
+    Reserve *count* consecutive packet ids from ``packet_history``'s
+    AUTOINCREMENT counter.
+
+    Returns:
+        The first reserved id
+    """
+    row = cursor.execute(
+        "UPDATE sqlite_sequence SET seq = seq + ? WHERE name = ? RETURNING seq",
+        (count, TABLE),
+    ).fetchone()
+    if row is not None:
+        return row[0] - count + 1
+    # The legacy table never had a row: start the counter after its ids
+    first = cursor.execute(
+        f"SELECT COALESCE(MAX(id), 0) + 1 FROM main.{TABLE}"
+    ).fetchone()[0]
+    cursor.execute(
+        "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+        (TABLE, first + count - 1),
+    )
+    return first
+
+
+def next_packet_id(cursor: sqlite3.Cursor) -> int:
+    """Reserve the next packet id from ``packet_history``'s AUTOINCREMENT counter."""
+    return reserve_packet_ids(cursor)
+
+
+def insert_packet(
+    cursor: sqlite3.Cursor, columns: Sequence[str], row: Sequence[Any]
+) -> tuple[str, int]:
+    """
+    Insert *row* (values for *columns*, ``timestamp`` first) into its partition.
+
+    Returns:
+        Tuple of (partition name, packet id)
+    """
+    table = ensure_partition(cursor.connection, row[0])
+    packet_id = next_packet_id(cursor)
+    cursor.execute(
+        f"INSERT INTO {table} (id, {', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * (len(columns) + 1))})",
+        (packet_id, *row),
+    )
+    return table, packet_id
+
+
+def insert_packets(
+    cursor: sqlite3.Cursor, columns: Sequence[str], rows: Sequence[Sequence[Any]]
+) -> None:
+    """Insert *rows* like :func:`insert_packet`, with one id reservation and one
+    ``executemany`` per partition."""
+    if not rows:
+        return
+    packet_id = reserve_packet_ids(cursor, len(rows))
+    by_table: dict[str, list[tuple[Any, ...]]] = {}
+    for row in rows:
+        table = ensure_partition(cursor.connection, row[0])
+        by_table.setdefault(table, []).append((packet_id, *row))
+        packet_id += 1
+    for table, params in by_table.items():
+        cursor.executemany(
+            f"INSERT INTO {table} (id, {', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * (len(columns) + 1))})",
+            params,
+        )
+
+
+def packet_tables(conn: sqlite3.Connection) -> list[str]:
+    """The legacy table and every partition, whether or not partitioning is on."""
+    return [TABLE] + [name for _start, name in list_partitions(conn)]
+
+
+def drop_partitions_before(conn: sqlite3.Connection, cutoff: float) -> list[str]:
+    """Drop every partition whose week ended before *cutoff*."""
+    dropped = []
+    for start, name in list_partitions(conn):
+        if start + WEEK_SECONDS <= cutoff:
+            conn.execute(f"DROP TABLE {name}")
+            _created.discard(name)
+            dropped.append(name)
+    if dropped:
+        conn.commit()
+        logger.info(f"Dropped {len(dropped)} expired packet partitions: {dropped}")
+    return dropped
+
+
+def maintain(conn: sqlite3.Connection, now: float) -> None:
+    """Pre-create this and next week's partitions and drop expired ones."""
+    ensure_partition(conn, now)
+    ensure_partition(conn, now + WEEK_SECONDS)
+    conn.commit()
+    if _settings.retention_weeks > 0:
+        drop_partitions_before(
+            conn, week_start(now).timestamp() - _settings.retention_weeks * WEEK_SECONDS
+        )
+
+
+# ---------------------------------------------------------------------------
+# Read side
+# ---------------------------------------------------------------------------
+
+
+def refresh_layout(conn: sqlite3.Connection) -> Layout:
+    """Re-read the partition list (and column lists when the schema changed)."""
+    global _layout
+    schema_version = conn.execute("PRAGMA main.schema_version").fetchone()[0]
+    legacy_max = conn.execute(f"SELECT MAX(timestamp) FROM main.{TABLE}").fetchone()[0]
+
+    with _layout_lock:
+        current = _layout
+    if current is not None and current.schema_version == schema_version:
+        layout = Layout(
+            partitions=current.partitions,
+            legacy_max_timestamp=legacy_max,
+            select_lists=current.select_lists,
+            complete=current.complete,
+            schema_version=schema_version,
+        )
+    else:
+        columns = tiering.readable_columns(conn, "main")
+        partitions = list_partitions(conn)
+        select_lists = {TABLE: ", ".join(columns)}
+        complete = {TABLE}
+        for _start, name in partitions:
+            present = set(tiering.readable_columns(conn, "main", name))
+            select_lists[name] = tiering.select_list(columns, present)
+            if present.issuperset(columns):
+                complete.add(name)
+        layout = Layout(partitions, legacy_max, select_lists, complete, schema_version)
+
+    with _layout_lock:
+        _layout = layout
+    return layout
+
+
+def _current_layout() -> Layout:
+    if _layout is not None:
+        return _layout
+    from .connection import get_db_connection
+
+    # get_db_connection() refreshes the layout when partitioning is enabled
+    conn = get_db_connection()
+    conn.close()
+    return _layout or Layout()
+
+
+def _union(tables: list[str], layout: Layout) -> str:
+    if len(tables) == 1 and tables[0] in layout.complete:
+        return f"main.{tables[0]} AS {TABLE}"
+    if not tables:
+        return f"(SELECT * FROM main.{TABLE} WHERE 0) AS {TABLE}"
+    selects = " UNION ALL ".join(
+        f"SELECT {layout.select_lists[table]} FROM main.{table}" for table in tables
+    )
+    return f"({selects}) AS {TABLE}"
+
+
+def create_view(conn: sqlite3.Connection) -> Layout:
+    """Refresh the layout and create the TEMP ``packet_history`` view on *conn*."""
+    layout = refresh_layout(conn)
+    if layout.partitions:
+        tables = [TABLE] + [name for _start, name in layout.partitions]
+        selects = " UNION ALL ".join(
+            f"SELECT {layout.select_lists[table]} FROM main.{table}" for table in tables
+        )
+        conn.execute(f"CREATE TEMP VIEW {TABLE} AS {selects}")
+    return layout
+
+
+def packet_source(
+    start_time: float | None = None, end_time: float | None = None
+) -> str:
+    """
+    FROM-clause expression for packets with ``start_time <= timestamp <= end_time``.
+
+    With partitioning enabled this expands to the legacy table and the weekly
+    partitions overlapping the range, aliased as ``packet_history``; otherwise
+    it defers to :func:`malla.database.tiering.packet_source`.
+    """
+    if not _settings.enabled:
+        return tiering.packet_source(start_time)
+
+    start = start_time if isinstance(start_time, int | float) else None
+    end = end_time if isinstance(end_time, int | float) else None
+    layout = _current_layout()
+
+    tables = []
+    legacy_max = layout.legacy_max_timestamp
+    if legacy_max is not None and (start is None or legacy_max >= start):
+        tables.append(TABLE)
+    for week, name in layout.partitions:
+        if start is not None and week + WEEK_SECONDS <= start:
+            continue
+        if end is not None and week > end:
+            continue
+        tables.append(name)
+    return _union(tables, layout)
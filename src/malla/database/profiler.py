@@ -0,0 +1,405 @@
+"""
+Per-request SQL profiler for the web UI.
+
+When ``query_profiler`` is enabled, :func:`~malla.database.connection.get_db_connection`
+hands out :class:`ProfilingConnection` objects.  Every statement executed while
+a request is active is recorded with its normalized text, the time spent in
+``execute`` plus fetching, and the number of rows returned.  At the end of the
+request the records feed:
+
+* a slow-query log (``malla.slow_query`` logger, ``slow_query_ms`` threshold),
+  optionally with the ``EXPLAIN QUERY PLAN`` output of the statement,
+* a ``Server-Timing`` header (``db`` and ``app`` metrics),
+* per-process aggregates that are periodically written to ``query_stats_dir``
+  so the debug page can show the top queries across all Gunicorn workers.
+
+With the profiler disabled none of this is installed and connections are plain
+:class:`sqlite3.Connection` objects.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("malla.slow_query")
+
+# Seconds between writes of this process' aggregates to the stats directory
+STATS_FLUSH_SECONDS = 5.0
+# Distinct statements tracked per process; the rest is folded into OTHER_SQL
+MAX_STATEMENTS = 500
+OTHER_SQL = "(other statements)"
+
+
+@dataclass(slots=True)
+class ProfilerSettings:
+    enabled: bool = False
+    slow_query_ms: float = 250.0
+    explain: bool = False
+    stats_dir: Path | None = None
+
+
+@dataclass(slots=True)
+class QueryRecord:
+    """One statement executed during a request."""
+
+    sql: str
+    seconds: float = 0.0
+    rows: int = 0
+
+
+_settings = ProfilerSettings()
+_current: ContextVar[list[QueryRecord] | None] = ContextVar(
+    "malla_request_queries", default=None
+)
+
+# normalized SQL -> [calls, total seconds, max seconds, rows]
+_stats: dict[str, list[float]] = {}
+_plans: dict[str, str] = {}
+_stats_lock = threading.Lock()
+_stats_since = time.time()
+_last_flush = 0.0
+
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+
+def configure(cfg: Any) -> ProfilerSettings:
+    """Apply the profiler options of an :class:`~malla.config.AppConfig`."""
+    global _settings
+    stats_dir = getattr(cfg, "query_stats_dir", "") or os.path.join(
+        tempfile.gettempdir(), "malla-query-stats"
+    )
+    _settings = ProfilerSettings(
+        enabled=bool(getattr(cfg, "query_profiler", False)),
+        slow_query_ms=float(getattr(cfg, "slow_query_ms", 250.0)),
+        explain=bool(getattr(cfg, "query_profiler_explain", False)),
+        stats_dir=Path(stats_dir),
+    )
+    return _settings
+
+
+def is_enabled() -> bool:
+    return _settings.enabled
+
+
+# ---------------------------------------------------------------------------
+# Statement normalization
+# ---------------------------------------------------------------------------
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Reduce *sql* to a stable shape for aggregation.
+
+    Literals become ``?``, ``IN (?, ?, ...)`` lists collapse to ``(?...)`` and
+    whitespace is squashed, so the same query with different arguments is
+    counted as one statement.
+    """
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("(?...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+# ---------------------------------------------------------------------------
+# Instrumented connection
+# ---------------------------------------------------------------------------
+
+
+def _start_record(
+    conn: sqlite3.Connection, sql: str, parameters: Any
+) -> QueryRecord | None:
+    queries = _current.get()
+    if queries is None:
+        return None
+    record = QueryRecord(normalize_sql(sql))
+    queries.append(record)
+    if _settings.explain and record.sql not in _plans:
+        _plans[record.sql] = _explain(conn, sql, parameters)
+    return record
+
+
+def _explain(conn: sqlite3.Connection, sql: str, parameters: Any) -> str:
+    keyword = sql.split(None, 1)[0].upper() if sql.strip() else ""
+    if keyword not in ("SELECT", "WITH"):
+        return ""
+    try:
+        rows = sqlite3.Connection.execute(
+            conn, f"EXPLAIN QUERY PLAN {sql}", parameters
+        ).fetchall()
+    except sqlite3.Error as e:
+        return f"(plan unavailable: {e})"
+    # Columns are (id, parent, notused, detail)
+    return "\n".join(str(row[3]) for row in rows)
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor that charges execute and fetch time to the current request."""
+
+    _record: QueryRecord | None = None
+
+    def execute(self, sql: str, parameters: Any = (), /) -> ProfilingCursor:
+        record = _start_record(self.connection, sql, parameters)
+        self._record = record
+        if record is None:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            record.seconds += time.perf_counter() - start
+        if self.rowcount > 0:
+            record.rows = self.rowcount
+        return self
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> ProfilingCursor:
+        record = _start_record(self.connection, sql, ())
+        self._record = record
+        if record is None:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            record.seconds += time.perf_counter() - start
+        record.rows = max(self.rowcount, 0)
+        return self
+
+    def fetchone(self) -> Any:
+        if self._record is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._record.seconds += time.perf_counter() - start
+        if row is not None:
+            self._record.rows += 1
+        return row
+
+    def fetchmany(self, size: int | None = None) -> list[Any]:
+        if size is None:
+            size = self.arraysize
+        if self._record is None:
+            return super().fetchmany(size)
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._record.seconds += time.perf_counter() - start
+        self._record.rows += len(rows)
+        return rows
+
+    def fetchall(self) -> list[Any]:
+        if self._record is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._record.seconds += time.perf_counter() - start
+        self._record.rows += len(rows)
+        return rows
+
+    def __next__(self) -> Any:
+        if self._record is None:
+            return super().__next__()
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        finally:
+            self._record.seconds += time.perf_counter() - start
+        self._record.rows += 1
+        return row
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """Connection whose cursors (including ``conn.execute``) are profiled."""
+
+    def cursor(self, factory: Any = ProfilingCursor) -> Any:  # type: ignore[override]
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Any = (), /) -> Any:  # type: ignore[override]
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> Any:  # type: ignore[override]
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory(
+    default: type[sqlite3.Connection] = sqlite3.Connection,
+) -> type[sqlite3.Connection]:
+    """Connection class :func:`sqlite3.connect` should use."""
+    return ProfilingConnection if _settings.enabled else default
+
+
+# ---------------------------------------------------------------------------
+# Request lifecycle
+# ---------------------------------------------------------------------------
+
+
+def begin_request() -> None:
+    _current.set([])
+
+
+def end_request(label: str = "") -> list[QueryRecord]:
+    """
+    Stop recording for the current request and account its queries.
+
+    Logs the slow ones, folds them into the process aggregates and flushes
+    those to the stats directory when due.
+    """
+    queries = _current.get()
+    _current.set(None)
+    if not queries:
+        return []
+
+    threshold = _settings.slow_query_ms / 1000.0
+    for record in queries:
+        if record.seconds >= threshold:
+            plan = _plans.get(record.sql)
+            slow_query_logger.warning(
+                f"Slow query {record.seconds * 1000:.1f}ms rows={record.rows} "
+                f"[{label}]: {record.sql}" + (f"\n{plan}" if plan else "")
+            )
+
+    with _stats_lock:
+        for record in queries:
+            key = record.sql
+            if key not in _stats and len(_stats) >= MAX_STATEMENTS:
+                key = OTHER_SQL
+            entry = _stats.setdefault(key, [0, 0.0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += record.seconds
+            entry[2] = max(entry[2], record.seconds)
+            entry[3] += record.rows
+
+    if time.monotonic() - _last_flush >= STATS_FLUSH_SECONDS:
+        flush_stats()
+    return queries
+
+
+def server_timing(queries: list[QueryRecord], total_seconds: float) -> str:
+    """``Server-Timing`` header value for a request."""
+    db_ms = sum(record.seconds for record in queries) * 1000
+    return (
+        f'db;dur={db_ms:.1f};desc="{len(queries)} queries", '
+        f"app;dur={total_seconds * 1000:.1f}"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Cross-process aggregates
+# ---------------------------------------------------------------------------
+
+
+def _stats_file() -> Path | None:
+    if _settings.stats_dir is None:
+        return None
+    return _settings.stats_dir / f"queries-{os.getpid()}.json"
+
+
+def flush_stats() -> None:
+    """Write this process' aggregates to the stats directory."""
+    global _last_flush, _stats_since
+    _last_flush = time.monotonic()
+    path = _stats_file()
+    if path is None:
+        return
+    try:
+        reset_at = (path.parent / "reset").stat().st_mtime
+    except OSError:
+        reset_at = 0.0
+    with _stats_lock:
+        # Another worker served a reset since these numbers were collected
+        if reset_at > _stats_since:
+            _stats.clear()
+            _plans.clear()
+            _stats_since = time.time()
+        document = {
+            "pid": os.getpid(),
+            "updated_at": time.time(),
+            "statements": {
+                sql: {"stats": entry, "plan": _plans.get(sql, "")}
+                for sql, entry in _stats.items()
+            },
+        }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(document))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write query stats to {path}: {e}")
+
+
+def top_queries(limit: int = 50, order_by: str = "total_ms") -> dict[str, Any]:
+    """
+    Merge the aggregates of all worker processes.
+
+    Returns:
+        Dictionary with ``queries`` (normalized SQL, calls, total/mean/max ms,
+        rows, plan) sorted by *order_by* and the number of ``workers`` seen
+    """
+    flush_stats()
+    merged: dict[str, dict[str, Any]] = {}
+    workers = 0
+    stats_dir = _settings.stats_dir
+    paths = sorted(stats_dir.glob("queries-*.json")) if stats_dir else []
+    for path in paths:
+        try:
+            document = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        workers += 1
+        for sql, item in document.get("statements", {}).items():
+            calls, total, peak, rows = item["stats"]
+            entry = merged.setdefault(
+                sql,
+                {"sql": sql, "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0},
+            )
+            entry["calls"] += calls
+            entry["total_ms"] += total * 1000
+            entry["max_ms"] = max(entry["max_ms"], peak * 1000)
+            entry["rows"] += rows
+            entry["plan"] = entry.get("plan") or item.get("plan", "")
+
+    queries = list(merged.values())
+    for entry in queries:
+        entry["mean_ms"] = entry["total_ms"] / entry["calls"] if entry["calls"] else 0
+    if order_by not in ("total_ms", "mean_ms", "max_ms", "calls", "rows"):
+        order_by = "total_ms"
+    queries.sort(key=lambda entry: entry[order_by], reverse=True)
+    return {"queries": queries[:limit], "workers": workers, "order_by": order_by}
+
+
+def reset_stats() -> None:
+    """
+    Forget the aggregates of all workers.
+
+    Files on disk are removed right away; other workers notice the ``reset``
+    marker on their next flush and drop their in-memory numbers.
+    """
+    global _stats_since
+    with _stats_lock:
+        _stats.clear()
+        _plans.clear()
+        _stats_since = time.time()
+    if _settings.stats_dir is not None:
+        _settings.stats_dir.mkdir(parents=True, exist_ok=True)
+        (_settings.stats_dir / "reset").touch()
+        for path in _settings.stats_dir.glob("queries-*.json"):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,227 @@
+"""
+Relay and next-hop rollups built from the packet header.
+
+Since firmware 2.6 every ``MeshPacket`` carries ``relay_node``, the last byte
+of the node number that transmitted the copy a gateway heard, and
+``next_hop``, the last byte of the node a next-hop routed packet was handed to
+(0 while flooding).  Both are stored for every packet, decrypted or not, so
+they describe far more traffic than the occasional traceroute.
+
+``relay_rollup`` counts packets per :data:`RESOLUTIONS` bucket (1 h, 1 d) and
+``(from_node_id, gateway_id, relay_node, next_hop)``, together with the hops
+taken (``hop_start - hop_limit``) where the header allows computing them.
+Writers add their packets with :func:`record` in the transaction that stores
+them; :func:`rebuild` recomputes the buckets from ``packet_history``.  Hourly
+buckets are dropped after :data:`HOURLY_RETENTION_SECONDS` by :func:`prune`;
+daily buckets are kept, so the rollups outlive packets moved to the archives.
+
+Since ``relay_node`` is a single byte, it has to be matched against the known
+nodes ending in that byte; see :class:`malla.services.relay_service.RelayService`.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Bucket sizes of the rollups, finest first
+RESOLUTIONS: tuple[int, ...] = (3600, 86400)
+HOURLY_RETENTION_SECONDS = 30 * 86400
+# Longer windows are read from the daily buckets
+MAX_BUCKETS = 168
+
+SCHEMA_SQL: tuple[str, ...] = (
+    """
+    CREATE TABLE IF NOT EXISTS relay_rollup (
+        resolution INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        from_node_id INTEGER NOT NULL,
+        gateway_id TEXT NOT NULL,
+        relay_node INTEGER NOT NULL,
+        next_hop INTEGER NOT NULL,
+        packet_count INTEGER NOT NULL,
+        direct_count INTEGER NOT NULL,
+        hop_sum INTEGER NOT NULL,
+        hop_samples INTEGER NOT NULL,
+        last_seen REAL NOT NULL,
+        PRIMARY KEY (resolution, bucket, from_node_id, gateway_id, relay_node,
+                     next_hop)
+    ) WITHOUT ROWID
+    """,
+)
+
+_UPSERT_SQL = """
+    INSERT INTO relay_rollup (
+        resolution, bucket, from_node_id, gateway_id, relay_node, next_hop,
+        packet_count, direct_count, hop_sum, hop_samples, last_seen
+    )
+    {select}
+    ON CONFLICT (resolution, bucket, from_node_id, gateway_id, relay_node, next_hop)
+    DO UPDATE SET
+        packet_count = packet_count + excluded.packet_count,
+        direct_count = direct_count + excluded.direct_count,
+        hop_sum = hop_sum + excluded.hop_sum,
+        hop_samples = hop_samples + excluded.hop_samples,
+        last_seen = MAX(last_seen, excluded.last_seen)
+"""
+
+# Hops taken, NULL when the header does not allow computing them
+_HOPS_SQL = (
+    "CASE WHEN hop_start > 0 AND hop_limit BETWEEN 0 AND hop_start "
+    "THEN hop_start - hop_limit END"
+)
+
+# (timestamp, from_node_id, gateway_id, relay_node, next_hop, hops taken)
+Observation = tuple[float, int, str, int, int, int | None]
+
+
+def ensure_table(cursor: sqlite3.Cursor) -> bool:
+    """
+    Create ``relay_rollup`` if it does not exist.
+
+    Returns:
+        True if the table was created, in which case the caller should fill
+        it with :func:`rebuild`
+    """
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'relay_rollup'"
+    )
+    if cursor.fetchone():
+        return False
+    for sql in SCHEMA_SQL:
+        cursor.execute(sql)
+    return True
+
+
+def hops_taken(hop_start: int | None, hop_limit: int | None) -> int | None:
+    """Hops a packet travelled, None when the header does not tell."""
+    if not hop_start or hop_limit is None or not 0 <= hop_limit <= hop_start:
+        return None
+    return hop_start - hop_limit
+
+
+def observations_from_rows(
+    columns: Sequence[str], rows: Iterable[Sequence[Any]]
+) -> list[Observation]:
+    """Observations from ``packet_history`` rows laid out as *columns*."""
+    timestamp = columns.index("timestamp")
+    sender = columns.index("from_node_id")
+    gateway = columns.index("gateway_id")
+    relay = columns.index("relay_node")
+    next_hop = columns.index("next_hop")
+    hop_start = columns.index("hop_start")
+    hop_limit = columns.index("hop_limit")
+    observations: list[Observation] = []
+    for row in rows:
+        if not row[sender] or not row[gateway]:
+            continue
+        observations.append(
+            (
+                row[timestamp],
+                row[sender],
+                row[gateway],
+                (row[relay] or 0) & 0xFF,
+                (row[next_hop] or 0) & 0xFF,
+                hops_taken(row[hop_start], row[hop_limit]),
+            )
+        )
+    return observations
+
+
+def record(cursor: sqlite3.Cursor, observations: Sequence[Observation]) -> None:
+    """Add freshly stored packets to the rollups."""
+    if not observations:
+        return
+    params = [
+        (
+            resolution,
+            int(timestamp // resolution * resolution),
+            from_node_id,
+            gateway_id,
+            relay_node,
+            next_hop,
+            1 if hops == 0 else 0,
+            hops or 0,
+            0 if hops is None else 1,
+            timestamp,
+        )
+        for resolution in RESOLUTIONS
+        for timestamp, from_node_id, gateway_id, relay_node, next_hop, hops in (
+            observations
+        )
+    ]
+    cursor.executemany(
+        _UPSERT_SQL.format(select="VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?)"),
+        params,
+    )
+
+
+def rebuild(
+    cursor: sqlite3.Cursor, since: float = 0.0, source: str = "packet_history"
+) -> None:
+    """
+    Recompute every bucket that contains timestamps >= *since* from *source*.
+
+    Buckets before *since* are left alone, so packets already moved to the
+    archives keep counting.
+    """
+    now = time.time()
+    for resolution in RESOLUTIONS:
+        start = int(since // resolution * resolution)
+        if resolution == RESOLUTIONS[0]:
+            start = max(start, int(prune_cutoff(now) // resolution * resolution))
+        cursor.execute(
+            "DELETE FROM relay_rollup WHERE resolution = ? AND bucket >= ?",
+            (resolution, start),
+        )
+        cursor.execute(
+            _UPSERT_SQL.format(
+                select=f"""
+                SELECT ?, CAST(timestamp / ? AS INTEGER) * ? AS bucket,
+                       from_node_id, gateway_id,
+                       COALESCE(relay_node, 0) & 255 AS relay,
+                       COALESCE(next_hop, 0) & 255 AS hop,
+                       COUNT(*), COALESCE(SUM({_HOPS_SQL} = 0), 0),
+                       COALESCE(SUM({_HOPS_SQL}), 0), COUNT({_HOPS_SQL}),
+                       MAX(timestamp)
+                FROM {source}
+                WHERE timestamp >= ? AND from_node_id IS NOT NULL
+                  AND from_node_id != 0 AND gateway_id IS NOT NULL
+                  AND gateway_id != ''
+                GROUP BY bucket, from_node_id, gateway_id, relay, hop
+                """
+            ),
+            (resolution, resolution, resolution, start),
+        )
+
+
+def prune_cutoff(now: float | None = None) -> float:
+    """Oldest timestamp still kept at hourly resolution."""
+    return (time.time() if now is None else now) - HOURLY_RETENTION_SECONDS
+
+
+def prune(cursor: sqlite3.Cursor, now: float | None = None) -> int:
+    """Drop the hourly buckets older than the retention; returns rows removed."""
+    cursor.execute(
+        "DELETE FROM relay_rollup WHERE resolution = ? AND bucket < ?",
+        (RESOLUTIONS[0], prune_cutoff(now) - RESOLUTIONS[0]),
+    )
+    return cursor.rowcount
+
+
+def choose_resolution(start_time: float, now: float | None = None) -> int:
+    """
+    Resolution to read a window starting at *start_time* from: hourly while
+    the buckets are kept and the window spans at most :data:`MAX_BUCKETS` of
+    them, daily otherwise.
+    """
+    now = time.time() if now is None else now
+    finest = RESOLUTIONS[0]
+    if start_time >= prune_cutoff(now) and now - start_time <= MAX_BUCKETS * finest:
+        return finest
+    return RESOLUTIONS[-1]
@@ -10,6 +10,7 @@ import logging
 import re
 import sqlite3
 import time
+from collections.abc import Iterator
 from datetime import UTC, datetime
 from typing import Any
 
@@ -17,7 +18,10 @@ from meshtastic import mesh_pb2
 
 from ..utils.formatting import format_time_ago
 from ..utils.node_utils import get_bulk_node_names
+from . import node_activity, node_search, node_sync
 from .connection import get_db_connection
+from .filters import TRACEROUTE_SEARCH_COLUMNS, CompiledFilter, compile_filters
+from .partitions import packet_source
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +33,27 @@ ISO_TIMESTAMP_RE = re.compile(
 class DashboardRepository:
     """Repository for dashboard statistics."""
 
+    # Heartbeat rows older than this are ignored (capture stopped or lagging)
+    CAPTURE_STATS_MAX_AGE = 10 * 60
+
+    @staticmethod
+    def _get_capture_stats(cursor: sqlite3.Cursor) -> dict[str, Any] | None:
+        """Return the capture heartbeat row if it exists and is recent."""
+        try:
+            cursor.execute(
+                "SELECT total_nodes, total_packets, updated_at FROM capture_stats WHERE id = 1"
+            )
+        except sqlite3.OperationalError:
+            # Database written by an older capture without the table
+            return None
+        row = cursor.fetchone()
+        if (
+            row is None
+            or time.time() - row["updated_at"] > DashboardRepository.CAPTURE_STATS_MAX_AGE
+        ):
+            return None
+        return dict(row)
+
     @staticmethod
     def get_stats(gateway_id: str | None = None) -> dict[str, Any]:
         """Get overview statistics for the dashboard using optimized single query."""
@@ -50,12 +75,22 @@ class DashboardRepository:
                 gateway_filter = " AND gateway_id = ?"
                 gateway_params = [gateway_id]
 
+            # The capture keeps running totals in capture_stats; use them when
+            # fresh instead of counting every row of both tables.
+            capture_stats = None
+            if not gateway_id:
+                capture_stats = DashboardRepository._get_capture_stats(cursor)
+
             # Get basic node count (this is fast and separate)
-            cursor.execute("SELECT COUNT(*) as total_nodes FROM node_info")
-            total_nodes = cursor.fetchone()["total_nodes"]
+            if capture_stats:
+                total_nodes = capture_stats["total_nodes"]
+            else:
+                cursor.execute("SELECT COUNT(*) as total_nodes FROM node_info")
+                total_nodes = cursor.fetchone()["total_nodes"]
 
             # Single optimized query for all packet statistics
             params = [one_hour_ago, twenty_four_hours_ago] + gateway_params
+            recent_source = packet_source(twenty_four_hours_ago)
 
             cursor.execute(
                 f"""
@@ -69,7 +104,7 @@ class DashboardRepository:
                     CASE WHEN COUNT(*) > 0
                          THEN ROUND(SUM(CASE WHEN processed_successfully = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1)
                          ELSE 0 END as success_rate
-                FROM packet_history
+                FROM {recent_source}
                 WHERE timestamp > ?{gateway_filter}
             """,
                 params,
@@ -78,17 +113,20 @@ class DashboardRepository:
             stats_row = cursor.fetchone()
 
             # Get total packet count (all time) separately
-            cursor.execute(
-                f"SELECT COUNT(*) as total FROM packet_history WHERE 1=1{gateway_filter}",
-                gateway_params,
-            )
-            total_packets_all_time = cursor.fetchone()["total"]
+            if capture_stats:
+                total_packets_all_time = capture_stats["total_packets"]
+            else:
+                cursor.execute(
+                    f"SELECT COUNT(*) as total FROM packet_history WHERE 1=1{gateway_filter}",
+                    gateway_params,
+                )
+                total_packets_all_time = cursor.fetchone()["total"]
 
             # Get packet types separately (more efficient than JSON aggregation in SQLite)
             cursor.execute(
                 f"""
                 SELECT portnum_name, COUNT(*) as count
-                FROM packet_history
+                FROM {recent_source}
                 WHERE portnum_name IS NOT NULL AND timestamp > ?{gateway_filter}
                 GROUP BY portnum_name
                 ORDER BY count DESC
@@ -138,12 +176,16 @@ class PacketRepository:
     """Repository for packet operations."""
 
     @staticmethod
-    def _decode_text_content(packet: dict[str, Any]) -> str | None:
+    def _decode_text_content(
+        packet: dict[str, Any], max_length: int | None = 100
+    ) -> str | None:
         """
         Decode text message content from raw payload.
 
         Args:
             packet: Packet dictionary containing raw_payload and portnum_name
+            max_length: Truncate longer messages (for table display), None keeps
+                        the full text
 
         Returns:
             Decoded text content or None if not a text message or decoding fails
@@ -163,8 +205,8 @@ class PacketRepository:
                 text_content = str(raw_payload)
 
             # Truncate long messages for table display
-            if len(text_content) > 100:
-                text_content = text_content[:97] + "..."
+            if max_length is not None and len(text_content) > max_length:
+                text_content = text_content[: max_length - 3] + "..."
 
             return text_content
         except (AttributeError, TypeError, UnicodeDecodeError):
@@ -193,6 +235,183 @@ class PacketRepository:
         except (AttributeError, TypeError, UnicodeDecodeError):
             return None
 
+    # Grouped view: one row per (mesh_packet_id, from, to, portnum)
+    GROUP_KEY = (
+        "mesh_packet_id",
+        "from_node_id",
+        "to_node_id",
+        "portnum",
+        "portnum_name",
+    )
+    # Sort key -> aggregate it orders by (missing values sort as before)
+    GROUPED_SORT_EXPRESSIONS = {
+        "timestamp": "MIN(timestamp)",
+        "gateway_id": "COUNT(DISTINCT NULLIF(gateway_id, ''))",
+        "payload_length": "COALESCE(AVG(payload_length), 0)",
+        "rssi": "COALESCE(MIN(rssi), -999)",
+        "snr": "COALESCE(MIN(snr), -999)",
+        "hop_count": "COALESCE(MIN(hop_count), 999)",
+    }
+
+    @staticmethod
+    def _get_grouped_packets(
+        cursor: sqlite3.Cursor,
+        source: str,
+        compiled: CompiledFilter,
+        *,
+        limit: int,
+        offset: int,
+        order_by: str,
+        order_dir: str,
+    ) -> tuple[list[dict[str, Any]], int]:
+        """
+        Aggregate receptions of the same mesh packet in SQL and return one page.
+
+        SQLite groups, sorts and slices the groups, so only the page's groups
+        are returned; ``COUNT(*) OVER ()`` yields the exact number of groups
+        in the same pass.  Text content and channel come from the earliest
+        reception of each group, read for the page's groups only.
+
+        Returns:
+            Tuple of (grouped packet dicts, total number of groups)
+        """
+        group_key = ", ".join(PacketRepository.GROUP_KEY)
+        sort_expr = PacketRepository.GROUPED_SORT_EXPRESSIONS.get(
+            order_by, "MIN(timestamp)"
+        )
+        direction = "DESC" if str(order_dir).lower() == "desc" else "ASC"
+
+        cursor.execute(
+            f"""
+            SELECT
+                {group_key},
+                MIN(timestamp) AS timestamp,
+                COUNT(*) AS reception_count,
+                COUNT(DISTINCT NULLIF(gateway_id, '')) AS gateway_count,
+                GROUP_CONCAT(DISTINCT NULLIF(gateway_id, '')) AS gateway_list,
+                MIN(rssi) AS min_rssi,
+                MAX(rssi) AS max_rssi,
+                MIN(snr) AS min_snr,
+                MAX(snr) AS max_snr,
+                MIN(hop_count) AS min_hops,
+                MAX(hop_count) AS max_hops,
+                AVG(payload_length) AS avg_payload_length,
+                MIN(processed_successfully) AS processed_successfully,
+                COUNT(*) OVER () AS total_groups
+            FROM {source}
+            {compiled.where}
+            GROUP BY {group_key}
+            ORDER BY {sort_expr} {direction}, MIN(timestamp) {direction},
+                mesh_packet_id, from_node_id, to_node_id, portnum
+            LIMIT ? OFFSET ?
+            """,
+            (*compiled.params, limit, offset),
+        )
+        rows = [dict(row) for row in cursor.fetchall()]
+
+        if rows:
+            total_count = rows[0]["total_groups"]
+        else:
+            # Past the last page: the window count has no row to ride on
+            cursor.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {source} {compiled.where} "
+                f"GROUP BY {group_key})",
+                compiled.params,
+            )
+            total_count = cursor.fetchone()[0]
+            return [], total_count
+
+        # Earliest reception of each group on the page
+        mesh_ids = list({row["mesh_packet_id"] for row in rows})
+        page = compiled.extend(
+            f"mesh_packet_id IN ({', '.join('?' * len(mesh_ids))})", params=mesh_ids
+        )
+        cursor.execute(
+            f"""
+            SELECT id, {group_key}, channel_id, raw_payload
+            FROM {source}
+            {page.where}
+            ORDER BY timestamp, id
+            """,
+            page.params,
+        )
+        representatives: dict[tuple, dict[str, Any]] = {}
+        for detail in cursor.fetchall():
+            key = tuple(detail[column] for column in PacketRepository.GROUP_KEY)
+            representatives.setdefault(key, dict(detail))
+
+        packets = []
+        for row in rows:
+            key = tuple(row[column] for column in PacketRepository.GROUP_KEY)
+            representative = representatives.get(key, {})
+            packet = {
+                "id": representative.get("id"),
+                "timestamp": row["timestamp"],
+                "from_node_id": row["from_node_id"],
+                "to_node_id": row["to_node_id"],
+                "portnum": row["portnum"],
+                "portnum_name": row["portnum_name"],
+                "mesh_packet_id": row["mesh_packet_id"],
+                "channel_id": representative.get("channel_id"),
+                "gateway_count": row["gateway_count"],
+                "gateway_list": row["gateway_list"] or "",
+                "min_rssi": row["min_rssi"],
+                "max_rssi": row["max_rssi"],
+                "min_snr": row["min_snr"],
+                "max_snr": row["max_snr"],
+                "min_hops": row["min_hops"],
+                "max_hops": row["max_hops"],
+                "avg_payload_length": row["avg_payload_length"],
+                "processed_successfully": row["processed_successfully"],
+                "timestamp_str": datetime.fromtimestamp(row["timestamp"]).strftime(
+                    "%Y-%m-%d %H:%M:%S"
+                ),
+                "reception_count": row["reception_count"],
+                "is_grouped": True,
+                "success": row["processed_successfully"],
+                # Decode text content from representative packet
+                "text_content": PacketRepository._decode_text_content(
+                    {
+                        "portnum_name": row["portnum_name"],
+                        "raw_payload": representative.get("raw_payload"),
+                    }
+                ),
+            }
+
+            # Format hop range
+            if packet["min_hops"] is not None and packet["max_hops"] is not None:
+                if packet["min_hops"] == packet["max_hops"]:
+                    packet["hop_range"] = str(packet["min_hops"])
+                else:
+                    packet["hop_range"] = f"{packet['min_hops']}-{packet['max_hops']}"
+            else:
+                packet["hop_range"] = None
+
+            # Format RSSI range
+            if packet["min_rssi"] is not None and packet["max_rssi"] is not None:
+                if packet["min_rssi"] == packet["max_rssi"]:
+                    packet["rssi_range"] = f"{packet['min_rssi']:.1f} dBm"
+                else:
+                    packet["rssi_range"] = (
+                        f"{packet['min_rssi']:.1f} to {packet['max_rssi']:.1f} dBm"
+                    )
+            else:
+                packet["rssi_range"] = None
+
+            # Format SNR range
+            if packet["min_snr"] is not None and packet["max_snr"] is not None:
+                if packet["min_snr"] == packet["max_snr"]:
+                    packet["snr_range"] = f"{packet['min_snr']:.2f} dB"
+                else:
+                    packet["snr_range"] = (
+                        f"{packet['min_snr']:.2f} to {packet['max_snr']:.2f} dB"
+                    )
+            else:
+                packet["snr_range"] = None
+
+            packets.append(packet)
+
+        return packets, total_count
 
     @staticmethod
     def get_packets(
@@ -209,327 +428,46 @@ class PacketRepository:
             filters = {}
 
         try:
-            conn = get_db_connection()
+            conn = get_db_connection(filters.get("start_time"), filters.get("end_time"))
             cursor = conn.cursor()
 
             # Build WHERE clause
-            where_conditions = []
-            params = []
-
-            if filters.get("start_time"):
-                where_conditions.append("timestamp >= ?")
-                params.append(filters["start_time"])
-
-            if filters.get("end_time"):
-                where_conditions.append("timestamp <= ?")
-                params.append(filters["end_time"])
-
-            if filters.get("from_node"):
-                where_conditions.append("from_node_id = ?")
-                params.append(filters["from_node"])
-
-            if filters.get("to_node"):
-                where_conditions.append("to_node_id = ?")
-                params.append(filters["to_node"])
-
-            if filters.get("portnum"):
-                where_conditions.append("portnum_name = ?")
-                params.append(filters["portnum"])
-
-            if filters.get("min_rssi"):
-                where_conditions.append("rssi >= ?")
-                params.append(filters["min_rssi"])
-
-            if filters.get("max_rssi"):
-                where_conditions.append("rssi <= ?")
-                params.append(filters["max_rssi"])
-
-            if filters.get("gateway_id"):
-                where_conditions.append("gateway_id = ?")
-                params.append(filters["gateway_id"])
-
-            # New: filter by primary_channel when provided (matches ServiceEnvelope channel_id)
-            if filters.get("primary_channel"):
-                where_conditions.append("channel_id = ?")
-                params.append(filters["primary_channel"])
-
-            if filters.get("hop_count") is not None:
-                where_conditions.append("(hop_start - hop_limit) = ?")
-                params.append(filters["hop_count"])
-
-            # Generic exclusion filters for from/to node IDs
-            if filters.get("exclude_from") is not None:
-                # Exclude packets whose sender matches the specified node ID
-                where_conditions.append("(from_node_id IS NULL OR from_node_id != ?)")
-                params.append(filters["exclude_from"])
-
-            if filters.get("exclude_to") is not None:
-                # Exclude packets whose destination matches the specified node ID
-                where_conditions.append("(to_node_id IS NULL OR to_node_id != ?)")
-                params.append(filters["exclude_to"])
-
-            # Search functionality
-            if search:
-                # Search in multiple text fields
-                search_condition = """(
-                    portnum_name LIKE ? OR
-                    gateway_id LIKE ? OR
-                    channel_id LIKE ? OR
-                    CAST(from_node_id AS TEXT) LIKE ? OR
-                    CAST(to_node_id AS TEXT) LIKE ?
-                )"""
-                where_conditions.append(search_condition)
-                search_param = f"%{search}%"
-                params.extend([search_param] * 5)
-
-            where_clause = (
-                "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-            )
+            compiled = compile_filters(filters, search, cursor=cursor)
+            where_clause = compiled.where
+            params = list(compiled.params)
+            # Only read the tiers/partitions that overlap the requested window
+            source = packet_source(filters.get("start_time"), filters.get("end_time"))
 
             if group_packets:
-                # OPTIMIZED GROUPED APPROACH
-                # Since grouped packets are usually within ~10 min of each other,
-                # we use a time-windowed approach instead of expensive GROUP BY + ORDER BY
+                # Grouping, sorting and pagination happen in SQL (see
+                # _get_grouped_packets); the filters below bound the scan
 
                 # Add mesh_packet_id filter (exclude 0 as it's often a special case)
-                if where_conditions:
-                    where_clause += (
-                        " AND mesh_packet_id IS NOT NULL AND mesh_packet_id != 0"
-                    )
-                else:
-                    where_clause = (
-                        "WHERE mesh_packet_id IS NOT NULL AND mesh_packet_id != 0"
-                    )
+                grouped = compiled.extend(
+                    "mesh_packet_id IS NOT NULL", "mesh_packet_id != 0"
+                )
 
                 # Add time window to limit data scan (improves performance dramatically)
                 # If no explicit time filter, default to last 7 days for reasonable performance
                 if not filters.get("start_time") and not filters.get("end_time"):
                     recent_cutoff = time.time() - (7 * 24 * 3600)  # 7 days ago
-                    where_clause += " AND timestamp >= ?"
-                    params.append(recent_cutoff)
-
-                # PERFORMANCE FIX: Skip expensive total count for grouped queries
-                # The COUNT(DISTINCT ...) query was taking 9+ seconds on large datasets
-                # Instead, estimate total count based on results (much faster)
-                total_count = None  # Will be estimated after getting results
-
-                # ULTRA-OPTIMIZED: Use much smaller fetch limits for better performance
-                # The original approach was fetching 50k-1M records which is too expensive
-                # Instead, use a more reasonable approach with smaller multipliers
-                if offset == 0:
-                    # For first page, use a much smaller multiplier - most packets are unique anyway
-                    fetch_limit = min(
-                        limit * 10, 5000
-                    )  # Much smaller: 250-5000 instead of 50k-100k
-                else:
-                    # For subsequent pages, use a reasonable multiplier
-                    grouping_ratio = 2.0  # More realistic estimate
-                    estimated_individual_needed = (offset + limit) * grouping_ratio
-
-                    # Cap at much smaller limits for performance
-                    fetch_limit = min(
-                        max(estimated_individual_needed, limit * 5), 10000
-                    )  # Max 10k instead of 1M
-
-                query = f"""
-                    SELECT
-                        id, timestamp, from_node_id, to_node_id, portnum, portnum_name,
-                        gateway_id, channel_id, mesh_packet_id, rssi, snr, hop_limit, hop_start,
-                        payload_length, processed_successfully, raw_payload,
-                        datetime(timestamp, 'unixepoch') as timestamp_str,
-                        (hop_start - hop_limit) as hop_count
-                    FROM packet_history
-                    {where_clause}
-                    ORDER BY timestamp DESC
-                    LIMIT ?
-                """
-
-                cursor.execute(query, params + [fetch_limit])
-                individual_packets = cursor.fetchall()
-
-                # Group packets in memory by (mesh_packet_id, from_node_id, to_node_id, portnum, portnum_name)
-                groups = {}
-                for packet in individual_packets:
-                    # Create group key
-                    group_key = (
-                        packet["mesh_packet_id"],
-                        packet["from_node_id"],
-                        packet["to_node_id"],
-                        packet["portnum"],
-                        packet["portnum_name"],
-                    )
-
-                    if group_key not in groups:
-                        groups[group_key] = {
-                            "packets": [],
-                            "min_timestamp": packet["timestamp"],
-                        }
-
-                    groups[group_key]["packets"].append(packet)
-                    groups[group_key]["min_timestamp"] = min(
-                        groups[group_key]["min_timestamp"], packet["timestamp"]
-                    )
-
-                # Convert groups to result format
-                packets = []
-                for group_key, group_data in groups.items():
-                    mesh_packet_id, from_node_id, to_node_id, portnum, portnum_name = (
-                        group_key
-                    )
-                    packets_in_group = group_data["packets"]
-
-                    # Calculate aggregated values
-                    gateway_ids = list(
-                        {p["gateway_id"] for p in packets_in_group if p["gateway_id"]}
-                    )
-                    rssi_values = [
-                        p["rssi"] for p in packets_in_group if p["rssi"] is not None
-                    ]
-                    snr_values = [
-                        p["snr"] for p in packets_in_group if p["snr"] is not None
-                    ]
-                    hop_values = [
-                        p["hop_count"]
-                        for p in packets_in_group
-                        if p["hop_count"] is not None
-                    ]
-                    payload_lengths = [
-                        p["payload_length"]
-                        for p in packets_in_group
-                        if p["payload_length"] is not None
-                    ]
-
-                    # Use the earliest packet as the representative
-                    representative_packet = min(
-                        packets_in_group, key=lambda p: p["timestamp"]
-                    )
-
-                    packet = {
-                        "id": representative_packet["id"],
-                        "timestamp": group_data["min_timestamp"],
-                        "from_node_id": from_node_id,
-                        "to_node_id": to_node_id,
-                        "portnum": portnum,
-                        "portnum_name": portnum_name,
-                        "mesh_packet_id": mesh_packet_id,
-                        "channel_id": dict(representative_packet).get("channel_id"),
-                        "gateway_count": len(gateway_ids),
-                        "gateway_list": ",".join(gateway_ids),
-                        "min_rssi": min(rssi_values) if rssi_values else None,
-                        "max_rssi": max(rssi_values) if rssi_values else None,
-                        "min_snr": min(snr_values) if snr_values else None,
-                        "max_snr": max(snr_values) if snr_values else None,
-                        "min_hops": min(hop_values) if hop_values else None,
-                        "max_hops": max(hop_values) if hop_values else None,
-                        "avg_payload_length": sum(payload_lengths)
-                        / len(payload_lengths)
-                        if payload_lengths
-                        else None,
-                        "processed_successfully": min(
-                            p["processed_successfully"] for p in packets_in_group
-                        ),
-                        "timestamp_str": datetime.fromtimestamp(
-                            group_data["min_timestamp"]
-                        ).strftime("%Y-%m-%d %H:%M:%S"),
-                        "reception_count": len(packets_in_group),
-                        "is_grouped": True,
-                        "success": min(
-                            p["processed_successfully"] for p in packets_in_group
-                        ),
-                        # Decode text content from representative packet
-                        "text_content": PacketRepository._decode_text_content(
-                            dict(representative_packet)
-                        ),
-                    }
-
-                    # Format hop range
-                    if (
-                        packet["min_hops"] is not None
-                        and packet["max_hops"] is not None
-                    ):
-                        if packet["min_hops"] == packet["max_hops"]:
-                            packet["hop_range"] = str(packet["min_hops"])
-                        else:
-                            packet["hop_range"] = (
-                                f"{packet['min_hops']}-{packet['max_hops']}"
-                            )
-                    else:
-                        packet["hop_range"] = None
-
-                    # Format RSSI range
-                    if (
-                        packet["min_rssi"] is not None
-                        and packet["max_rssi"] is not None
-                    ):
-                        if packet["min_rssi"] == packet["max_rssi"]:
-                            packet["rssi_range"] = f"{packet['min_rssi']:.1f} dBm"
-                        else:
-                            packet["rssi_range"] = (
-                                f"{packet['min_rssi']:.1f} to {packet['max_rssi']:.1f} dBm"
-                            )
-                    else:
-                        packet["rssi_range"] = None
-
-                    # Format SNR range
-                    if packet["min_snr"] is not None and packet["max_snr"] is not None:
-                        if packet["min_snr"] == packet["max_snr"]:
-                            packet["snr_range"] = f"{packet['min_snr']:.2f} dB"
-                        else:
-                            packet["snr_range"] = (
-                                f"{packet['min_snr']:.2f} to {packet['max_snr']:.2f} dB"
-                            )
-                    else:
-                        packet["snr_range"] = None
-
-                    packets.append(packet)
-
-                # Sort by the requested field (fast in-memory sort)
-                if order_by == "gateway_id":
-                    # For gateway_id sorting in grouped mode, sort by gateway_count
-                    packets.sort(
-                        key=lambda x: x["gateway_count"],
-                        reverse=(order_dir.lower() == "desc"),
-                    )
-                elif order_by == "payload_length":
-                    # Sort by average payload length for grouped packets
-                    packets.sort(
-                        key=lambda x: x.get("avg_payload_length", 0) or 0,
-                        reverse=(order_dir.lower() == "desc"),
-                    )
-                elif order_by == "rssi":
-                    # Sort by minimum RSSI for grouped packets
-                    packets.sort(
-                        key=lambda x: x.get("min_rssi", -999) or -999,
-                        reverse=(order_dir.lower() == "desc"),
-                    )
-                elif order_by == "snr":
-                    # Sort by minimum SNR for grouped packets
-                    packets.sort(
-                        key=lambda x: x.get("min_snr", -999) or -999,
-                        reverse=(order_dir.lower() == "desc"),
-                    )
-                elif order_by == "hop_count":
-                    # Sort by minimum hop count for grouped packets
-                    packets.sort(
-                        key=lambda x: x.get("min_hops", 999) or 999,
-                        reverse=(order_dir.lower() == "desc"),
-                    )
-                else:
-                    # Default to timestamp sorting
-                    packets.sort(
-                        key=lambda x: x["timestamp"],
-                        reverse=(order_dir.lower() == "desc"),
-                    )
-
-                # Apply pagination
-                paginated_packets = packets[offset : offset + limit]
-
-                packets = paginated_packets
+                    grouped = grouped.extend("timestamp >= ?", params=[recent_cutoff])
+                    source = packet_source(recent_cutoff)
+
+                packets, total_count = PacketRepository._get_grouped_packets(
+                    cursor,
+                    source,
+                    grouped,
+                    limit=limit,
+                    offset=offset,
+                    order_by=order_by,
+                    order_dir=order_dir,
+                )
 
             else:
                 # Original ungrouped behavior (defense-in-depth: sanitize ordering)
                 # Get total count first
-                count_query = f"SELECT COUNT(*) FROM packet_history {where_clause}"
+                count_query = f"SELECT COUNT(*) FROM {source} {where_clause}"
                 cursor.execute(count_query, params)
                 total_count = cursor.fetchone()[0]
 
@@ -558,7 +496,7 @@ class PacketRepository:
                         pki_encrypted, next_hop, relay_node, tx_after,
                         datetime(timestamp, 'unixepoch') as timestamp_str,
                         (hop_start - hop_limit) as hop_count
-                    FROM packet_history
+                    FROM {source}
                     {where_clause}
                     ORDER BY {order_by} {order_dir_sql}
                     LIMIT ? OFFSET ?
@@ -598,38 +536,6 @@ class PacketRepository:
 
             conn.close()
 
-            # Handle None total_count for grouped queries
-            if total_count is None:
-                # For exclude filters, provide a conservative estimate that ensures tests pass
-                # The complex count query optimization is causing issues, so use a simpler approach
-                if (
-                    filters.get("exclude_from") is not None
-                    or filters.get("exclude_to") is not None
-                ):
-                    # Conservative estimate: assume some packets were excluded
-                    if len(packets) == limit:
-                        # If we got a full page, estimate there are more pages but fewer than without filter
-                        total_count = offset + limit + 1
-                    else:
-                        # Partial page - this is the total
-                        total_count = offset + len(packets)
-
-                    # Ensure total_count shows reduction when filters are applied
-                    # This is primarily for UI feedback rather than exact pagination
-                    total_count = max(
-                        len(packets), total_count - 1
-                    )  # Ensure it's at least reduced by 1
-                else:
-                    # Estimate total_count based on results for grouped queries without exclude filters
-                    if len(packets) == limit:
-                        total_count = (
-                            offset + limit + 1
-                        )  # Estimate at least one more page
-                    else:
-                        total_count = offset + len(
-                            packets
-                        )  # Exact count for partial page
-
             return {
                 "packets": packets,
                 "total_count": total_count,
@@ -641,6 +547,99 @@ class PacketRepository:
             logger.error(f"Error getting packets: {e}")
             raise
 
+    # Columns written by the streaming export (in output order)
+    EXPORT_COLUMNS = (
+        "id",
+        "timestamp",
+        "timestamp_str",
+        "from_node_id",
+        "to_node_id",
+        "portnum",
+        "portnum_name",
+        "gateway_id",
+        "channel_id",
+        "mesh_packet_id",
+        "rssi",
+        "snr",
+        "hop_limit",
+        "hop_start",
+        "hop_count",
+        "payload_length",
+        "processed_successfully",
+        "via_mqtt",
+        "want_ack",
+        "priority",
+        "channel_index",
+        "rx_time",
+        "pki_encrypted",
+        "next_hop",
+        "relay_node",
+        "text_content",
+    )
+
+    @staticmethod
+    def iter_packets_for_export(
+        filters: dict | None = None,
+        search: str | None = None,
+        after_id: int = 0,
+        max_rows: int | None = None,
+        batch_size: int = 1000,
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Stream packets matching the packet browser filters in id order.
+
+        Rows are fetched with ``fetchmany`` so memory stays bounded by
+        *batch_size* regardless of how many packets match.  Ordering by id
+        makes the last exported id a stable resume cursor (*after_id*).
+
+        Yields:
+            Lists of up to *batch_size* packet dicts with EXPORT_COLUMNS keys
+        """
+        compiled = compile_filters(filters, search).extend("id > ?", params=[after_id])
+        params = list(compiled.params)
+
+        query = f"""
+            SELECT
+                id, timestamp, datetime(timestamp, 'unixepoch') as timestamp_str,
+                from_node_id, to_node_id, portnum, portnum_name,
+                gateway_id, channel_id, mesh_packet_id, rssi, snr, hop_limit, hop_start,
+                (hop_start - hop_limit) as hop_count,
+                payload_length, processed_successfully,
+                via_mqtt, want_ack, priority, channel_index, rx_time,
+                pki_encrypted, next_hop, relay_node,
+                CASE WHEN portnum_name = 'TEXT_MESSAGE_APP' THEN raw_payload END
+                    as raw_payload
+            FROM packet_history
+            {compiled.where}
+            ORDER BY id
+        """
+        if max_rows is not None:
+            query += " LIMIT ?"
+            params.append(max_rows)
+
+        filters = filters or {}
+        conn = get_db_connection(filters.get("start_time"), filters.get("end_time"))
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                batch = []
+                for row in rows:
+                    packet = dict(row)
+                    packet["text_content"] = PacketRepository._decode_text_content(
+                        packet, max_length=None
+                    )
+                    del packet["raw_payload"]
+                    batch.append(packet)
+                yield batch
+        finally:
+            conn.close()
+
     @staticmethod
     def get_signal_data(filters: dict | None = None) -> list[dict[str, Any]]:
         """Get packet signal quality data."""
@@ -652,26 +651,13 @@ class PacketRepository:
             cursor = conn.cursor()
 
             # Build WHERE clause
-            where_conditions = ["rssi IS NOT NULL", "snr IS NOT NULL"]
-            params = []
-
-            if filters.get("gateway_id"):
-                where_conditions.append("gateway_id = ?")
-                params.append(filters["gateway_id"])
-
-            if filters.get("from_node"):
-                where_conditions.append("from_node_id = ?")
-                params.append(filters["from_node"])
-
-            if filters.get("start_time"):
-                where_conditions.append("timestamp >= ?")
-                params.append(filters["start_time"])
-
-            if filters.get("end_time"):
-                where_conditions.append("timestamp <= ?")
-                params.append(filters["end_time"])
-
-            where_clause = "WHERE " + " AND ".join(where_conditions)
+            compiled = compile_filters(
+                filters,
+                base=("rssi IS NOT NULL", "snr IS NOT NULL"),
+                keys=("gateway_id", "from_node", "start_time", "end_time"),
+            )
+            where_clause = compiled.where
+            params = compiled.params
 
             query = f"""
                 SELECT
@@ -959,44 +945,30 @@ class ChatRepository:
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        where_clauses = ["portnum_name = ?"]
-        params: list[Any] = [ChatRepository._TEXT_PORT]
+        chat_filters: dict[str, Any] = {
+            "portnum": ChatRepository._TEXT_PORT,
+            "node": node_id,
+            "sender": sender_id,
+        }
 
         channel_value = ChatRepository._normalize_channel_param(channel)
-        if channel_value is not None:
-            if channel_value == "__primary__":
-                where_clauses.append("(channel_id IS NULL OR channel_id = '')")
-            else:
-                where_clauses.append("channel_id = ?")
-                params.append(channel_value)
-
-        if node_id is not None:
-            where_clauses.append("(from_node_id = ? OR to_node_id = ?)")
-            params.extend([node_id, node_id])
-
-        if sender_id is not None:
-            where_clauses.append("from_node_id = ?")
-            params.append(sender_id)
+        if channel_value == "__primary__":
+            chat_filters["primary_channel_only"] = True
+        elif channel_value is not None:
+            chat_filters["primary_channel"] = channel_value
 
         search_term = ChatRepository._normalize_search_param(search)
         if search_term is not None:
-            where_clauses.append("CAST(raw_payload AS TEXT) LIKE ?")
-            params.append(f"%{search_term}%")
+            chat_filters["payload_search"] = f"%{search_term}%"
 
         if audience == "broadcast":
-            where_clauses.append(
-                "(to_node_id IS NULL OR to_node_id = ?)"
-            )
-            params.append(ChatRepository._BROADCAST_NODE_ID)
+            chat_filters["broadcast_to"] = ChatRepository._BROADCAST_NODE_ID
         elif audience == "direct":
-            where_clauses.append(
-                "(to_node_id IS NOT NULL AND to_node_id != ?)"
-            )
-            params.append(ChatRepository._BROADCAST_NODE_ID)
+            chat_filters["direct_except"] = ChatRepository._BROADCAST_NODE_ID
 
-        where_sql = " AND ".join(where_clauses)
-        where_clause = f"WHERE {where_sql}" if where_sql else ""
-        base_params = list(params)
+        compiled = compile_filters(chat_filters)
+        where_clause = compiled.where
+        base_params = list(compiled.params)
 
         now_ts = time.time()
         one_hour_ago = now_ts - 3600
@@ -1026,12 +998,14 @@ class ChatRepository:
                 SUM(CASE WHEN timestamp >= ? THEN 1 ELSE 0 END) AS count_24h
             FROM (
                 SELECT MAX(timestamp) AS timestamp
-                FROM packet_history
-                {where_clause}
+                FROM {packet_source(twenty_four_hours_ago)}
+                {where_clause} AND timestamp >= ?
                 GROUP BY {group_expr}, from_node_id, to_node_id, channel_id
             ) AS grouped_counts
             """,
-                [one_hour_ago, twenty_four_hours_ago] + base_params,
+                [one_hour_ago, twenty_four_hours_ago]
+                + base_params
+                + [twenty_four_hours_ago],
             )
             counts_row = cursor.fetchone()
             hourly_count = 0
@@ -1548,7 +1522,11 @@ class NodeRepository:
         search: str | None = None,
         filters: dict | None = None,
     ) -> dict[str, Any]:
-        """Get node information with activity statistics (optimized version)."""
+        """Get node information with activity statistics (optimized version).
+
+        With a *search* term, ``order_by="relevance"`` ranks exact matches of
+        the term first, then prefix matches, then other substrings.
+        """
         if filters is None:
             filters = {}
 
@@ -1561,15 +1539,12 @@ class NodeRepository:
             params = []
 
             if search:
-                search_conditions = [
-                    "ni.long_name LIKE ?",
-                    "ni.short_name LIKE ?",
-                    "ni.hw_model LIKE ?",
-                    "printf('!%08x', ni.node_id) LIKE ?",
-                ]
-                search_param = f"%{search}%"
-                where_conditions.append("(" + " OR ".join(search_conditions) + ")")
-                params.extend([search_param] * len(search_conditions))
+                # Trigram index when available, LIKE over node_info otherwise
+                search_condition, search_params = node_search.search_condition(
+                    cursor, search
+                )
+                where_conditions.append(search_condition)
+                params.extend(search_params)
 
             # Add filter conditions
             if filters.get("hw_model"):
@@ -1590,6 +1565,24 @@ class NodeRepository:
                     "ni.long_name IS NOT NULL AND ni.long_name != ''"
                 )
 
+            # Activity counters maintained on node_info by malla-capture; a
+            # database it has not migrated yet falls back to last_updated
+            has_activity = node_activity.has_columns(cursor)
+            if has_activity:
+                activity_columns = """
+                        ni.packet_count_24h,
+                        ni.gateway_packet_count_24h,
+                        COALESCE(ni.last_packet_time, ni.last_updated) as last_packet_time,
+                        datetime(COALESCE(ni.last_packet_time, ni.last_updated), 'unixepoch') as last_packet_str"""
+                if filters.get("active_only"):
+                    where_conditions.append("ni.packet_count_24h > 0")
+            else:
+                activity_columns = """
+                        0 as packet_count_24h,
+                        0 as gateway_packet_count_24h,
+                        ni.last_updated as last_packet_time,
+                        datetime(ni.last_updated, 'unixepoch') as last_packet_str"""
+
             where_clause = ""
             if where_conditions:
                 where_clause = "WHERE " + " AND ".join(where_conditions)
@@ -1604,117 +1597,51 @@ class NodeRepository:
             total_count = cursor.fetchone()["total"]
 
             # Determine sort column mapping
-            valid_order_columns = [
-                "node_id",
-                "long_name",
-                "hw_model",
-                "last_updated",
-                "packet_count_24h",
-            ]
-            if order_by not in valid_order_columns:
-                order_by = "last_packet_time"  # Default to last seen time
-
-            order_dir = "DESC" if order_dir.lower() == "desc" else "ASC"
-
-            # Check if we need 24h stats for sorting or filtering
-            needs_24h_stats = (
-                order_by == "packet_count_24h"
-                or filters.get("active_only")
-                or order_by == "last_packet_time"
+            order_mappings = {
+                "node_id": "ni.node_id",
+                "long_name": "ni.long_name",
+                "hw_model": "ni.hw_model",
+                "last_updated": "ni.last_updated",
+                "packet_count_24h": "ni.packet_count_24h",
+                "gateway_packet_count_24h": "ni.gateway_packet_count_24h",
+                "last_packet_time": "COALESCE(ni.last_packet_time, ni.last_updated)",
+            }
+            if not has_activity:
+                order_mappings["packet_count_24h"] = "ni.last_updated"
+                order_mappings["gateway_packet_count_24h"] = "ni.last_updated"
+                order_mappings["last_packet_time"] = "ni.last_updated"
+            order_column = order_mappings.get(
+                order_by, order_mappings["last_packet_time"]
             )
-
-            if needs_24h_stats:
-                # Use the more complex query with 24h stats
-                order_mappings = {
-                    "node_id": "ni.node_id",
-                    "long_name": "ni.long_name",
-                    "hw_model": "ni.hw_model",
-                    "last_updated": "ni.last_updated",
-                    "packet_count_24h": "stats.packet_count_24h",
-                    "last_packet_time": "COALESCE(stats.last_packet_time, ni.last_updated)",
-                }
-                order_column = order_mappings.get(
-                    order_by, "COALESCE(stats.last_packet_time, ni.last_updated)"
+            order_dir = "DESC" if order_dir.lower() == "desc" else "ASC"
+            order_params: list[Any] = []
+            if order_by == "relevance" and search:
+                # Exact, then prefix, then substring matches; busiest first
+                relevance, order_params = node_search.relevance_order(search)
+                order_column = (
+                    f"{relevance}, {order_mappings['packet_count_24h']} DESC, "
+                    f"ni.node_id"
                 )
+                order_dir = ""
 
-                # Add active_only filter if needed
-                if filters.get("active_only"):
-                    where_conditions.append("stats.packet_count_24h > 0")
-                    where_clause = (
-                        "WHERE " + " AND ".join(where_conditions)
-                        if where_conditions
-                        else ""
-                    )
-
-                query = f"""
-                    SELECT
-                        ni.node_id,
-                        ni.long_name,
-                        ni.short_name,
-                        ni.hw_model,
-                        ni.role,
-                        ni.primary_channel,
-                        ni.last_updated,
-                        printf('!%08x', ni.node_id) as hex_id,
-                        COALESCE(stats.packet_count_24h, 0) as packet_count_24h,
-                        COALESCE(gstats.gateway_packet_count_24h, 0) as gateway_packet_count_24h,
-                        COALESCE(stats.last_packet_time, ni.last_updated) as last_packet_time,
-                        datetime(COALESCE(stats.last_packet_time, ni.last_updated), 'unixepoch') as last_packet_str
-                    FROM node_info ni
-                    LEFT JOIN (
-                        SELECT
-                            from_node_id as node_id,
-                            COUNT(*) as packet_count_24h,
-                            MAX(timestamp) as last_packet_time
-                        FROM packet_history
-                        WHERE timestamp > (strftime('%s', 'now') - 86400)
-                        GROUP BY from_node_id
-                    ) stats ON ni.node_id = stats.node_id
-                    LEFT JOIN (
-                        SELECT
-                            gateway_id,
-                            COUNT(*) as gateway_packet_count_24h
-                        FROM packet_history
-                        WHERE timestamp > (strftime('%s', 'now') - 86400)
-                          AND gateway_id IS NOT NULL AND gateway_id != ''
-                        GROUP BY gateway_id
-                    ) gstats ON gstats.gateway_id = printf('!%08x', ni.node_id)
-                    {where_clause}
-                    ORDER BY {order_column} {order_dir}
-                    LIMIT ? OFFSET ?
-                """
-            else:
-                # Use fast query with only node_info
-                order_mappings = {
-                    "node_id": "ni.node_id",
-                    "long_name": "ni.long_name",
-                    "hw_model": "ni.hw_model",
-                    "last_updated": "ni.last_updated",
-                }
-                order_column = order_mappings.get(order_by, "ni.last_updated")
-
-                query = f"""
-                    SELECT
-                        ni.node_id,
-                        ni.long_name,
-                        ni.short_name,
-                        ni.hw_model,
-                        ni.role,
-                        ni.primary_channel,
-                        ni.last_updated,
-                        printf('!%08x', ni.node_id) as hex_id,
-                        0 as packet_count_24h,
-                        0 as gateway_packet_count_24h,
-                        ni.last_updated as last_packet_time,
-                        datetime(ni.last_updated, 'unixepoch') as last_packet_str
-                    FROM node_info ni
-                    {where_clause}
-                    ORDER BY {order_column} {order_dir}
-                    LIMIT ? OFFSET ?
-                """
+            query = f"""
+                SELECT
+                    ni.node_id,
+                    ni.long_name,
+                    ni.short_name,
+                    ni.hw_model,
+                    ni.role,
+                    ni.primary_channel,
+                    ni.last_updated,
+                    printf('!%08x', ni.node_id) as hex_id,{activity_columns}
+                FROM node_info ni
+                {where_clause}
+                ORDER BY {order_column} {order_dir}
+                LIMIT ? OFFSET ?
+            """
 
             # Execute query with parameters
-            query_params = params + [limit, offset]
+            query_params = params + order_params + [limit, offset]
             cursor.execute(query, query_params)
             nodes = [dict(row) for row in cursor.fetchall()]
 
@@ -1731,6 +1658,25 @@ class NodeRepository:
             logger.error(f"Error getting nodes: {e}")
             raise
 
+    @staticmethod
+    def get_node_changes(since: int = 0, limit: int = 5000) -> dict[str, Any] | None:
+        """
+        Get the directory entries changed after sync version *since*.
+
+        Returns:
+            Dictionary with epoch, version, nodes, deleted (node ids) and more;
+            None when the database has no sync tables yet
+        """
+        try:
+            conn = get_db_connection()
+            try:
+                return node_sync.changes(conn.cursor(), since, limit)
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Error getting node changes: {e}")
+            raise
+
     @staticmethod
     def get_node_details(node_id: int) -> dict[str, Any] | None:
         """Get comprehensive details about a specific node."""
@@ -3076,57 +3022,34 @@ class TracerouteRepository:
             filters = {}
 
         try:
-            conn = get_db_connection()
+            conn = get_db_connection(filters.get("start_time"), filters.get("end_time"))
             cursor = conn.cursor()
 
             # Build WHERE clause
-            where_conditions = ["portnum_name = 'TRACEROUTE_APP'"]
-            params = []
-
-            if filters.get("start_time"):
-                where_conditions.append("timestamp >= ?")
-                params.append(filters["start_time"])
-
-            if filters.get("end_time"):
-                where_conditions.append("timestamp <= ?")
-                params.append(filters["end_time"])
-
-            if filters.get("from_node"):
-                where_conditions.append("from_node_id = ?")
-                params.append(filters["from_node"])
-
-            if filters.get("to_node"):
-                where_conditions.append("to_node_id = ?")
-                params.append(filters["to_node"])
-
-            if filters.get("gateway_id"):
-                where_conditions.append("gateway_id = ?")
-                params.append(filters["gateway_id"])
-
-            # New: Optional filtering by primary_channel (matches packet.channel_id field)
-            if filters.get("primary_channel"):
-                where_conditions.append("channel_id = ?")
-                params.append(filters["primary_channel"])
-
-            if filters.get("processed_successfully_only"):
-                where_conditions.append("processed_successfully = 1")
+            compiled = compile_filters(
+                filters,
+                search,
+                base=("portnum_name = 'TRACEROUTE_APP'",),
+                keys=(
+                    "start_time",
+                    "end_time",
+                    "from_node",
+                    "to_node",
+                    "gateway_id",
+                    "primary_channel",
+                    "processed_successfully_only",
+                ),
+                search_columns=TRACEROUTE_SEARCH_COLUMNS,
+            )
 
             # Check if route_node filtering is needed
             route_node_filter = filters.get("route_node")
             needs_route_filtering = route_node_filter is not None
 
-            # Add search functionality
-            if search:
-                search_conditions = [
-                    "gateway_id LIKE ?",
-                    "CAST(from_node_id AS TEXT) LIKE ?",
-                    "CAST(to_node_id AS TEXT) LIKE ?",
-                ]
-                search_param = f"%{search}%"
-                where_conditions.append(f"({' OR '.join(search_conditions)})")
-                params.extend([search_param] * len(search_conditions))
-
-            where_clause = "WHERE " + " AND ".join(where_conditions)
+            where_clause = compiled.where
+            params = list(compiled.params)
+            # Only read the tiers/partitions that overlap the requested window
+            source = packet_source(filters.get("start_time"), filters.get("end_time"))
 
             if group_packets:
                 # Determine time window (default: 7 days for traceroutes)
@@ -3138,14 +3061,17 @@ class TracerouteRepository:
 
                     current_time = time.time()
                     window_start = current_time - (time_window_days * 24 * 3600)
-                    where_conditions.append("timestamp >= ?")
-                    params.append(window_start)
+                    compiled = compiled.extend("timestamp >= ?", params=[window_start])
+                    source = packet_source(window_start)
 
                 # Add mesh_packet_id filter and exclude special cases
-                where_conditions.append("mesh_packet_id IS NOT NULL")
-                where_conditions.append("mesh_packet_id != 0")  # Exclude problematic ID
+                compiled = compiled.extend(
+                    "mesh_packet_id IS NOT NULL",
+                    "mesh_packet_id != 0",  # Exclude problematic ID
+                )
 
-                where_clause = "WHERE " + " AND ".join(where_conditions)
+                where_clause = compiled.where
+                params = list(compiled.params)
 
                 # PERFORMANCE FIX: Skip expensive total count for grouped traceroute queries
                 # The COUNT(DISTINCT ...) query was taking too long on large datasets
@@ -3177,7 +3103,7 @@ class TracerouteRepository:
                         hop_start, hop_limit, rssi, snr, payload_length, raw_payload,
                         processed_successfully, mesh_packet_id,
                         datetime(timestamp, 'unixepoch') as timestamp_str
-                    FROM packet_history
+                    FROM {source}
                     {where_clause}
                     ORDER BY timestamp DESC
                     LIMIT ?
@@ -3469,7 +3395,7 @@ class TracerouteRepository:
 
                 # Get total count (before route filtering)
                 cursor.execute(
-                    f"SELECT COUNT(*) as total FROM packet_history {where_clause}",
+                    f"SELECT COUNT(*) as total FROM {source} {where_clause}",
                     params,
                 )
                 total_count_before_filter = cursor.fetchone()["total"]
@@ -3497,7 +3423,7 @@ class TracerouteRepository:
                         processed_successfully, mesh_packet_id,
                         datetime(timestamp, 'unixepoch') as timestamp_str,
                         (hop_start - hop_limit) AS hop_count
-                    FROM packet_history
+                    FROM {source}
                     {where_clause}
                     ORDER BY {order_by} {order_dir_sql}
                     LIMIT ? OFFSET ?
@@ -3708,7 +3634,7 @@ class LocationRepository:
             # Ensure we have optimal indexes for this query
             try:
                 cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_packet_history_position_lookup
+                    CREATE INDEX IF NOT EXISTS main.idx_packet_history_position_lookup
                     ON packet_history(portnum, from_node_id, timestamp DESC)
                     WHERE portnum = 3 AND raw_payload IS NOT NULL
                 """)
@@ -4147,3 +4073,437 @@ class LocationRepository:
         except Exception as e:
             logger.error(f"Error getting node location at timestamp: {e}")
             raise
+
+    @staticmethod
+    def get_packet_id_bounds(
+        since: float | None = None,
+    ) -> tuple[int | None, int | None]:
+        """
+        Return the (min, max) packet id, used as a cheap data version.
+
+        With *since*, min is the id of the first packet stored at or after it,
+        and only the tiers and weeks from *since* on are read.
+        """
+        try:
+            conn = get_db_connection(start_time=since)
+            cursor = conn.cursor()
+            source = packet_source(since)
+            if since is None:
+                # Separate sub-selects so both use the rowid min/max optimisation
+                cursor.execute(
+                    f"""
+                    SELECT
+                        (SELECT MIN(id) FROM {source}) AS min_id,
+                        (SELECT MAX(id) FROM {source}) AS max_id
+                    """
+                )
+            else:
+                cursor.execute(
+                    f"""
+                    SELECT
+                        (SELECT id FROM {source} WHERE timestamp >= ?
+                         ORDER BY timestamp LIMIT 1) AS min_id,
+                        (SELECT MAX(id) FROM {source}) AS max_id
+                    """,
+                    (since,),
+                )
+            row = cursor.fetchone()
+            conn.close()
+            return row["min_id"], row["max_id"]
+        except Exception as e:
+            logger.error(f"Error getting packet id bounds: {e}")
+            raise
+
+    @staticmethod
+    def get_position_points(
+        after_id: int, up_to_id: int, since: float | None = None
+    ) -> list[tuple[int, float, float, float, float | None]]:
+        """
+        Decode the position packets with after_id < id <= up_to_id, stored at
+        or after *since* if given.
+
+        Returns:
+            List of (node_id, timestamp, latitude, longitude, altitude) tuples,
+            skipping packets without valid coordinates
+        """
+        try:
+            conn = get_db_connection(start_time=since)
+            cursor = conn.cursor()
+
+            params: list[Any] = [after_id, up_to_id]
+            time_filter = ""
+            if since is not None:
+                time_filter = "AND timestamp >= ?"
+                params.append(since)
+
+            # "+portnum" keeps SQLite on the rowid range instead of a portnum
+            # index, so each call only touches the requested id window.
+            cursor.execute(
+                f"""
+                SELECT from_node_id, timestamp, raw_payload
+                FROM {packet_source(since)}
+                WHERE id > ? AND id <= ?
+                AND +portnum = 3  -- POSITION_APP
+                AND raw_payload IS NOT NULL
+                AND from_node_id IS NOT NULL
+                {time_filter}
+                """,
+                params,
+            )
+
+            points = []
+            position = mesh_pb2.Position()
+            for row in cursor.fetchall():
+                try:
+                    position.Clear()
+                    position.ParseFromString(row["raw_payload"])
+                except Exception as e:
+                    logger.debug(
+                        f"Failed to decode position for node {row['from_node_id']}: {e}"
+                    )
+                    continue
+
+                latitude = position.latitude_i / 1e7 if position.latitude_i else None
+                longitude = position.longitude_i / 1e7 if position.longitude_i else None
+                if not latitude or not longitude:
+                    continue
+
+                points.append(
+                    (
+                        row["from_node_id"],
+                        row["timestamp"],
+                        latitude,
+                        longitude,
+                        position.altitude if position.altitude else None,
+                    )
+                )
+
+            conn.close()
+            return points
+
+        except Exception as e:
+            logger.error(f"Error getting position points: {e}")
+            raise
+
+
+class NeighborRepository:
+    """Repository for the neighbor_edge topology table."""
+
+    @staticmethod
+    def get_edges(
+        start_time: float | None = None,
+        end_time: float | None = None,
+        min_snr: float | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Get the directed neighbor edges last reported within a time range.
+
+        Returns:
+            List of edge dictionaries (reporter_id, neighbor_id, snr, last_seen,
+            report_count), newest first; empty when the database has no
+            neighbor_edge table yet
+        """
+        conditions = []
+        params: list[Any] = []
+        if start_time:
+            conditions.append("last_seen >= ?")
+            params.append(start_time)
+        if end_time:
+            conditions.append("last_seen <= ?")
+            params.append(end_time)
+        if min_snr is not None:
+            conditions.append("snr >= ?")
+            params.append(min_snr)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT reporter_id, neighbor_id, snr, last_seen, report_count
+                FROM neighbor_edge
+                {where}
+                ORDER BY last_seen DESC
+                """,
+                params,
+            )
+            edges = [dict(row) for row in cursor.fetchall()]
+            conn.close()
+            return edges
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                return []
+            logger.error(f"Error getting neighbor edges: {e}")
+            raise
+
+
+class TelemetryRepository:
+    """Repository for the telemetry time series tables."""
+
+    @staticmethod
+    def get_metric_names(node_id: int) -> list[str]:
+        """Get the names of the metrics a node has reported, sorted."""
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT name FROM telemetry_metric m
+                WHERE EXISTS (
+                    SELECT 1 FROM telemetry_sample s
+                    WHERE s.node_id = ? AND s.metric_id = m.metric_id
+                )
+                ORDER BY name
+                """,
+                (node_id,),
+            )
+            names = [row[0] for row in cursor.fetchall()]
+            conn.close()
+            return names
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                return []
+            logger.error(f"Error getting telemetry metrics: {e}")
+            raise
+
+    @staticmethod
+    def get_series(
+        node_id: int,
+        metrics: list[str] | None = None,
+        start_time: float | None = None,
+        end_time: float | None = None,
+        resolution: int = 0,
+    ) -> dict[str, list[dict[str, Any]]]:
+        """
+        Get a node's telemetry series.
+
+        Args:
+            node_id: Reporting node
+            metrics: Metric names such as ``device.battery_level`` (all if None)
+            start_time: Only points at or after this timestamp
+            end_time: Only points at or before this timestamp
+            resolution: 0 for the raw samples, otherwise one of
+                ``telemetry.RESOLUTIONS`` (seconds per bucket)
+
+        Returns:
+            Points per metric name, oldest first.  Raw points have timestamp
+            and value; rollup points have timestamp (bucket start), min, avg,
+            max and count.  Empty when the database has no telemetry tables yet
+        """
+        if resolution:
+            table = "telemetry_rollup"
+            time_column = "bucket"
+            columns = (
+                "d.bucket AS timestamp, d.min_value AS min, "
+                "d.sum_value / d.sample_count AS avg, d.max_value AS max, "
+                "d.sample_count AS count"
+            )
+            conditions = ["d.resolution = ?", "d.node_id = ?"]
+            params: list[Any] = [resolution, node_id]
+            if start_time:
+                # Include the bucket the window starts in
+                start_time = start_time // resolution * resolution
+        else:
+            table = "telemetry_sample"
+            time_column = "timestamp"
+            columns = "d.timestamp, d.value"
+            conditions = ["d.node_id = ?"]
+            params = [node_id]
+
+        if metrics:
+            conditions.append(f"m.name IN ({','.join('?' * len(metrics))})")
+            params.extend(metrics)
+        if start_time:
+            conditions.append(f"d.{time_column} >= ?")
+            params.append(start_time)
+        if end_time:
+            conditions.append(f"d.{time_column} <= ?")
+            params.append(end_time)
+
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT m.name, {columns}
+                FROM {table} d
+                JOIN telemetry_metric m ON m.metric_id = d.metric_id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY m.name, d.{time_column}
+                """,
+                params,
+            )
+            series: dict[str, list[dict[str, Any]]] = {}
+            for row in cursor.fetchall():
+                point = dict(row)
+                series.setdefault(point.pop("name"), []).append(point)
+            conn.close()
+            return series
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                return {}
+            logger.error(f"Error getting telemetry series: {e}")
+            raise
+
+
+class RelayRepository:
+    """Repository for the relay_rollup table."""
+
+    # Copies a node other than the sender transmitted to the gateway
+    RELAYED_CONDITION = "relay_node != 0 AND relay_node != (from_node_id & 255)"
+
+    @staticmethod
+    def _query(sql: str, params: list[Any]) -> list[dict[str, Any]]:
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = [dict(row) for row in cursor.fetchall()]
+            conn.close()
+            return rows
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                return []
+            logger.error(f"Error querying relay rollups: {e}")
+            raise
+
+    @staticmethod
+    def get_relay_totals(
+        start_time: float, resolution: int, gateway_id: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Get the relayed traffic per relay byte since *start_time*.
+
+        Returns:
+            List of dictionaries (relay_node, packets, senders, gateways,
+            last_seen), busiest relay first
+        """
+        conditions = [
+            "resolution = ?",
+            "bucket >= ?",
+            RelayRepository.RELAYED_CONDITION,
+        ]
+        params: list[Any] = [resolution, start_time // resolution * resolution]
+        if gateway_id:
+            conditions.append("gateway_id = ?")
+            params.append(gateway_id)
+        return RelayRepository._query(
+            f"""
+            SELECT relay_node, SUM(packet_count) AS packets,
+                   COUNT(DISTINCT from_node_id) AS senders,
+                   COUNT(DISTINCT gateway_id) AS gateways,
+                   MAX(last_seen) AS last_seen
+            FROM relay_rollup
+            WHERE {' AND '.join(conditions)}
+            GROUP BY relay_node
+            ORDER BY packets DESC, relay_node
+            """,
+            params,
+        )
+
+    @staticmethod
+    def get_last_hop_links(
+        start_time: float, resolution: int, gateway_id: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Get the relayed traffic per (relay byte, gateway) since *start_time*.
+
+        Returns:
+            List of dictionaries (relay_node, gateway_id, packets, senders,
+            hop_sum, hop_samples, last_seen), busiest link first
+        """
+        conditions = [
+            "resolution = ?",
+            "bucket >= ?",
+            RelayRepository.RELAYED_CONDITION,
+        ]
+        params: list[Any] = [resolution, start_time // resolution * resolution]
+        if gateway_id:
+            conditions.append("gateway_id = ?")
+            params.append(gateway_id)
+        return RelayRepository._query(
+            f"""
+            SELECT relay_node, gateway_id, SUM(packet_count) AS packets,
+                   COUNT(DISTINCT from_node_id) AS senders,
+                   SUM(hop_sum) AS hop_sum, SUM(hop_samples) AS hop_samples,
+                   MAX(last_seen) AS last_seen
+            FROM relay_rollup
+            WHERE {' AND '.join(conditions)}
+            GROUP BY relay_node, gateway_id
+            ORDER BY packets DESC, relay_node, gateway_id
+            """,
+            params,
+        )
+
+    @staticmethod
+    def get_node_paths(
+        from_node_id: int, start_time: float, resolution: int
+    ) -> list[dict[str, Any]]:
+        """
+        Get how a node's packets reached each gateway since *start_time*.
+
+        Returns:
+            List of dictionaries (gateway_id, relay_node, next_hop, packets,
+            direct_count, hop_sum, hop_samples, last_seen), busiest first
+        """
+        return RelayRepository._query(
+            """
+            SELECT gateway_id, relay_node, next_hop,
+                   SUM(packet_count) AS packets,
+                   SUM(direct_count) AS direct_count,
+                   SUM(hop_sum) AS hop_sum, SUM(hop_samples) AS hop_samples,
+                   MAX(last_seen) AS last_seen
+            FROM relay_rollup
+            WHERE resolution = ? AND bucket >= ? AND from_node_id = ?
+            GROUP BY gateway_id, relay_node, next_hop
+            ORDER BY packets DESC, gateway_id, relay_node, next_hop
+            """,
+            [resolution, start_time // resolution * resolution, from_node_id],
+        )
+
+    @staticmethod
+    def get_direct_receptions(
+        start_time: float, resolution: int
+    ) -> list[dict[str, Any]]:
+        """
+        Get the (from_node_id, gateway_id) pairs with zero-hop packets since
+        *start_time*.
+        """
+        return RelayRepository._query(
+            """
+            SELECT from_node_id, gateway_id, SUM(direct_count) AS packets
+            FROM relay_rollup
+            WHERE resolution = ? AND bucket >= ? AND direct_count > 0
+            GROUP BY from_node_id, gateway_id
+            """,
+            [resolution, start_time // resolution * resolution],
+        )
+
+    @staticmethod
+    def get_nodes_by_last_byte(
+        last_bytes: list[int],
+    ) -> dict[int, list[dict[str, Any]]]:
+        """
+        Get the known nodes whose node number ends in each of *last_bytes*.
+
+        Returns:
+            Candidates per byte (node_id, long_name, short_name,
+            last_packet_time), most recently heard first
+        """
+        if not last_bytes:
+            return {}
+        rows = RelayRepository._query(
+            f"""
+            SELECT node_id & 255 AS last_byte, node_id, long_name, short_name,
+                   last_packet_time
+            FROM node_info
+            WHERE node_id & 255 IN ({','.join('?' * len(last_bytes))})
+            ORDER BY COALESCE(last_packet_time, last_updated, 0) DESC
+            """,
+            list(last_bytes),
+        )
+        candidates: dict[int, list[dict[str, Any]]] = {}
+        for row in rows:
+            candidates.setdefault(row.pop("last_byte"), []).append(row)
+        return candidates
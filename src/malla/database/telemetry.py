@@ -0,0 +1,263 @@
+"""
+Telemetry time series decoded from TELEMETRY_APP packets.
+
+Every numeric field set in a report's device, environment, power, air quality
+or local stats metrics becomes one row of the narrow ``telemetry_sample``
+table ``(node_id, metric_id, timestamp, value)``; metric names such as
+``device.battery_level`` or ``environment.temperature`` are numbered in
+``telemetry_metric`` the first time they are seen.  The same report heard by
+several gateways carries the same device time and is stored once.
+
+``telemetry_rollup`` keeps min/avg/max per :data:`RESOLUTIONS` bucket (5 min,
+1 h, 1 d).  :func:`refresh_rollups` recomputes the buckets from a given
+timestamp on, each resolution from the next finer one, and ``malla-capture``
+runs it in the background for the time range it has written to.  Charts ask
+:func:`choose_resolution` for the finest series that covers their window in
+at most :data:`MAX_POINTS` points per metric.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+PORTNUM_NAME = "TELEMETRY_APP"
+# Bucket sizes of the rollups, finest first
+RESOLUTIONS: tuple[int, ...] = (300, 3600, 86400)
+# Nominal spacing of raw samples when choosing a resolution
+RAW_RESOLUTION = 60
+MAX_POINTS = 2500
+# Device clocks further off than this are ignored in favour of capture time
+MAX_CLOCK_SKEW_SECONDS = 86400
+
+# Telemetry sub-messages and the prefix of their metric names
+METRIC_GROUPS: tuple[tuple[str, str], ...] = (
+    ("device_metrics", "device"),
+    ("environment_metrics", "environment"),
+    ("power_metrics", "power"),
+    ("air_quality_metrics", "air_quality"),
+    ("local_stats", "local_stats"),
+)
+
+SCHEMA_SQL: tuple[str, ...] = (
+    """
+    CREATE TABLE IF NOT EXISTS telemetry_metric (
+        metric_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS telemetry_sample (
+        node_id INTEGER NOT NULL,
+        metric_id INTEGER NOT NULL,
+        timestamp REAL NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (node_id, metric_id, timestamp)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_telemetry_sample_timestamp "
+    "ON telemetry_sample(timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS telemetry_rollup (
+        resolution INTEGER NOT NULL,
+        node_id INTEGER NOT NULL,
+        metric_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        min_value REAL NOT NULL,
+        max_value REAL NOT NULL,
+        sum_value REAL NOT NULL,
+        sample_count INTEGER NOT NULL,
+        PRIMARY KEY (resolution, node_id, metric_id, bucket)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_telemetry_rollup_bucket "
+    "ON telemetry_rollup(resolution, bucket)",
+)
+
+# (node_id, metric name, timestamp, value)
+Sample = tuple[int, str, float, float]
+
+_dirty_lock = threading.Lock()
+_dirty_since: float | None = None
+
+
+def ensure_tables(cursor: sqlite3.Cursor) -> None:
+    """Create the telemetry tables and indexes if they do not exist."""
+    for sql in SCHEMA_SQL:
+        cursor.execute(sql)
+
+
+def samples_from_telemetry(
+    telemetry: Any, node_id: int | None, timestamp: float
+) -> list[Sample]:
+    """Samples of every numeric metric set in a decoded ``Telemetry`` message."""
+    if not node_id:
+        return []
+    if telemetry.time and abs(telemetry.time - timestamp) <= MAX_CLOCK_SKEW_SECONDS:
+        timestamp = float(telemetry.time)
+
+    samples: list[Sample] = []
+    for group, prefix in METRIC_GROUPS:
+        if not telemetry.HasField(group):
+            continue
+        for field, value in getattr(telemetry, group).ListFields():
+            if isinstance(value, int | float) and not isinstance(value, bool):
+                samples.append((node_id, f"{prefix}.{field.name}", timestamp, value))
+    return samples
+
+
+def samples_from_rows(
+    columns: Sequence[str], rows: Iterable[Sequence[Any]]
+) -> list[Sample]:
+    """Samples from ``packet_history`` rows laid out as *columns*."""
+    from google.protobuf.message import DecodeError
+    from meshtastic import telemetry_pb2
+
+    timestamp = columns.index("timestamp")
+    sender = columns.index("from_node_id")
+    portnum_name = columns.index("portnum_name")
+    payload = columns.index("raw_payload")
+    samples: list[Sample] = []
+    for row in rows:
+        if row[portnum_name] != PORTNUM_NAME or not row[payload]:
+            continue
+        telemetry = telemetry_pb2.Telemetry()
+        try:
+            telemetry.ParseFromString(bytes(row[payload]))
+        except DecodeError:
+            continue
+        samples.extend(samples_from_telemetry(telemetry, row[sender], row[timestamp]))
+    return samples
+
+
+def metric_ids(cursor: sqlite3.Cursor, names: Iterable[str]) -> dict[str, int]:
+    """Ids of the metric *names*, numbering names not seen before."""
+    names = sorted(set(names))
+    cursor.executemany(
+        "INSERT OR IGNORE INTO telemetry_metric (name) VALUES (?)",
+        [(name,) for name in names],
+    )
+    cursor.execute(
+        "SELECT name, metric_id FROM telemetry_metric "
+        f"WHERE name IN ({','.join('?' * len(names))})",
+        names,
+    )
+    return dict(cursor.fetchall())
+
+
+def insert_samples(cursor: sqlite3.Cursor, samples: Sequence[Sample]) -> None:
+    """Store *samples* and mark their time range for the next rollup refresh."""
+    if not samples:
+        return
+    ids = metric_ids(cursor, {name for _, name, _, _ in samples})
+    cursor.executemany(
+        "INSERT OR IGNORE INTO telemetry_sample "
+        "(node_id, metric_id, timestamp, value) VALUES (?, ?, ?, ?)",
+        [
+            (node_id, ids[name], timestamp, value)
+            for node_id, name, timestamp, value in samples
+        ],
+    )
+    mark_dirty(min(timestamp for _, _, timestamp, _ in samples))
+
+
+def rebuild(cursor: sqlite3.Cursor, source: str = "packet_history") -> int:
+    """Store the samples of the TELEMETRY_APP packets in *source*."""
+    cursor.execute(
+        f"SELECT timestamp, from_node_id, portnum_name, raw_payload FROM {source} "
+        "WHERE portnum_name = ?",
+        (PORTNUM_NAME,),
+    )
+    samples = samples_from_rows(
+        ("timestamp", "from_node_id", "portnum_name", "raw_payload"),
+        cursor.fetchall(),
+    )
+    insert_samples(cursor, samples)
+    return len(samples)
+
+
+def mark_dirty(since: float) -> None:
+    """Note that samples from *since* on changed since the last refresh."""
+    global _dirty_since
+    with _dirty_lock:
+        if _dirty_since is None or since < _dirty_since:
+            _dirty_since = since
+
+
+def take_dirty() -> float | None:
+    """Return and reset the oldest changed timestamp (``None`` if unchanged)."""
+    global _dirty_since
+    with _dirty_lock:
+        since, _dirty_since = _dirty_since, None
+    return since
+
+
+def rollup_watermark(cursor: sqlite3.Cursor) -> float:
+    """Start of the newest finest-resolution bucket (0 without rollups)."""
+    row = cursor.execute(
+        "SELECT MAX(bucket) FROM telemetry_rollup WHERE resolution = ?",
+        (RESOLUTIONS[0],),
+    ).fetchone()
+    return float(row[0]) if row and row[0] is not None else 0.0
+
+
+def refresh_rollups(cursor: sqlite3.Cursor, since: float = 0.0) -> None:
+    """
+    Recompute every rollup bucket that contains timestamps >= *since*.
+
+    The 5-minute buckets are aggregated from the samples and each coarser
+    resolution from the one before it, so a refresh reads only the samples
+    since the start of the affected 5-minute bucket.
+    """
+    previous = None
+    for resolution in RESOLUTIONS:
+        start = int(since // resolution * resolution)
+        cursor.execute(
+            "DELETE FROM telemetry_rollup WHERE resolution = ? AND bucket >= ?",
+            (resolution, start),
+        )
+        if previous is None:
+            cursor.execute(
+                """
+                INSERT INTO telemetry_rollup
+                SELECT ?, node_id, metric_id,
+                       CAST(timestamp / ? AS INTEGER) * ? AS bucket,
+                       MIN(value), MAX(value), SUM(value), COUNT(*)
+                FROM telemetry_sample
+                WHERE timestamp >= ?
+                GROUP BY node_id, metric_id, bucket
+                """,
+                (resolution, resolution, resolution, start),
+            )
+        else:
+            cursor.execute(
+                """
+                INSERT INTO telemetry_rollup
+                SELECT ?, node_id, metric_id, bucket / ? * ? AS coarse_bucket,
+                       MIN(min_value), MAX(max_value), SUM(sum_value),
+                       SUM(sample_count)
+                FROM telemetry_rollup
+                WHERE resolution = ? AND bucket >= ?
+                GROUP BY node_id, metric_id, coarse_bucket
+                """,
+                (resolution, resolution, resolution, previous, start),
+            )
+        previous = resolution
+
+
+def choose_resolution(window_seconds: float, max_points: int = MAX_POINTS) -> int:
+    """
+    Finest series that covers *window_seconds* in at most *max_points* points:
+    0 for raw samples, otherwise a rollup resolution in seconds.
+    """
+    if window_seconds / RAW_RESOLUTION <= max_points:
+        return 0
+    for resolution in RESOLUTIONS:
+        if window_seconds / resolution <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
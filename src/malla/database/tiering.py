@@ -0,0 +1,458 @@
+"""
+Hot/cold storage tiering for ``packet_history``.
+
+With ``storage_tiering`` enabled the capture database only holds the last
+``hot_retention_days`` of packets.  :func:`move_aged_packets` (run on a timer by
+``malla-capture`` or on demand by ``malla-archive``) moves older rows in
+batches into one archive database per calendar month (UTC) under
+``archive_dir``::
+
+    archive/packets-2025-01.db
+    archive/packets-2025-02.db
+
+Web connections ATTACH the archives and create a TEMP view named
+``packet_history`` over all tiers, which shadows the hot table for unqualified
+references, so existing queries keep seeing the full history.  Queries that are
+bounded to a recent window use :func:`packet_source` to read the hot table
+(``main.packet_history``) directly and never touch the archive files.
+
+SQLite attaches at most ``SQLITE_LIMIT_ATTACHED`` (usually 10) databases per
+connection.  Connections opened for a time range only attach the months that
+overlap it; beyond the limit the newest months are attached and the older
+ones are left out of the view, with a warning.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import logging
+import re
+import sqlite3
+import sys
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+TABLE = "packet_history"
+HOT_TABLE = f"main.{TABLE}"
+ARCHIVE_PREFIX = "packets-"
+DEFAULT_BATCH_SIZE = 5000
+
+# Generated columns and their expression, selected from tables (old archives
+# and partitions) that predate the column
+GENERATED_COLUMNS = {"hop_count": "hop_start - hop_limit"}
+
+_ARCHIVE_RE = re.compile(rf"^{ARCHIVE_PREFIX}(\d{{4}})-(\d{{2}})\.db$")
+
+
+@dataclass(slots=True)
+class TieringSettings:
+    enabled: bool = False
+    hot_retention_days: float = 14.0
+    archive_dir: Path | None = None
+    batch_size: int = DEFAULT_BATCH_SIZE
+
+
+_settings = TieringSettings()
+_attach_limit_warned = False
+
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+
+def configure(cfg: Any) -> TieringSettings:
+    """Apply the tiering options of an :class:`~malla.config.AppConfig`."""
+    global _settings
+    archive_dir = getattr(cfg, "archive_dir", "")
+    _settings = TieringSettings(
+        enabled=bool(getattr(cfg, "storage_tiering", False)),
+        hot_retention_days=float(getattr(cfg, "hot_retention_days", 14)),
+        archive_dir=Path(archive_dir) if archive_dir else None,
+        batch_size=int(getattr(cfg, "archive_batch_size", DEFAULT_BATCH_SIZE)),
+    )
+    return _settings
+
+
+def is_enabled() -> bool:
+    return _settings.enabled
+
+
+def hot_cutoff(now: float | None = None) -> float:
+    """Timestamp before which packets may have been moved to an archive."""
+    now = time.time() if now is None else now
+    return now - _settings.hot_retention_days * 86400
+
+
+def packet_source(start_time: float | None) -> str:
+    """
+    Table to read for packets with ``timestamp >= start_time``.
+
+    Returns the hot table when tiering is enabled and the whole window is still
+    inside the hot retention period, otherwise the (possibly tiered)
+    ``packet_history``.
+    """
+    if (
+        _settings.enabled
+        and isinstance(start_time, int | float)
+        and start_time >= hot_cutoff()
+    ):
+        return HOT_TABLE
+    return TABLE
+
+
+# ---------------------------------------------------------------------------
+# Archive files
+# ---------------------------------------------------------------------------
+
+
+def archive_directory(db_path: str) -> Path:
+    """Archive directory for the hot database *db_path*."""
+    if _settings.archive_dir is not None:
+        return _settings.archive_dir
+    return Path(db_path).resolve().parent / "archive"
+
+
+def archive_path(directory: Path, month: str) -> Path:
+    return directory / f"{ARCHIVE_PREFIX}{month}.db"
+
+
+def list_archives(directory: Path) -> list[tuple[str, Path]]:
+    """Return ``(YYYY-MM, path)`` for every archive in *directory*, newest first."""
+    if not directory.is_dir():
+        return []
+    archives = []
+    for path in directory.iterdir():
+        match = _ARCHIVE_RE.match(path.name)
+        if match:
+            archives.append((f"{match.group(1)}-{match.group(2)}", path))
+    archives.sort(reverse=True)
+    return archives
+
+
+def _month_start(month: str) -> float:
+    """Start of the ``YYYY-MM`` *month* (UTC)."""
+    year, number = month.split("-")
+    return datetime(int(year), int(number), 1, tzinfo=UTC).timestamp()
+
+
+def overlapping_archives(
+    archives: list[tuple[str, Path]],
+    start_time: float | None = None,
+    end_time: float | None = None,
+) -> list[tuple[str, Path]]:
+    """The *archives* holding months that overlap ``[start_time, end_time]``."""
+    selected = []
+    for month, path in archives:
+        month_start = _month_start(month)
+        if isinstance(end_time, int | float) and month_start > end_time:
+            continue
+        if (
+            isinstance(start_time, int | float)
+            and _month_bounds(month_start)[1] <= start_time
+        ):
+            continue
+        selected.append((month, path))
+    return selected
+
+
+def _month_bounds(timestamp: float) -> tuple[str, float]:
+    """Return the ``YYYY-MM`` month of *timestamp* and the start of the next one."""
+    dt = datetime.fromtimestamp(timestamp, UTC)
+    if dt.month == 12:
+        next_month = datetime(dt.year + 1, 1, 1, tzinfo=UTC)
+    else:
+        next_month = datetime(dt.year, dt.month + 1, 1, tzinfo=UTC)
+    return f"{dt.year:04d}-{dt.month:02d}", next_month.timestamp()
+
+
+def table_columns(
+    conn: sqlite3.Connection, schema: str, table: str = TABLE
+) -> list[tuple[str, str]]:
+    """Return ``(name, declared type)`` of the columns of *schema*.*table*."""
+    return [
+        (row[1], row[2])
+        for row in conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()
+    ]
+
+
+def readable_columns(
+    conn: sqlite3.Connection, schema: str, table: str = TABLE
+) -> list[str]:
+    """Return the columns of *schema*.*table* visible to SELECT, generated included."""
+    return [
+        row[1]
+        for row in conn.execute(f"PRAGMA {schema}.table_xinfo({table})").fetchall()
+        if row[6] in (0, 2, 3)
+    ]
+
+
+def select_list(columns: list[str], present: set[str]) -> str:
+    """Select list producing *columns* from a table that only has *present*."""
+    items = []
+    for name in columns:
+        if name in present:
+            items.append(name)
+        elif name in GENERATED_COLUMNS:
+            items.append(f"({GENERATED_COLUMNS[name]}) AS {name}")
+        else:
+            items.append(f"NULL AS {name}")
+    return ", ".join(items)
+
+
+def _ensure_archive_schema(hot: sqlite3.Connection, path: Path) -> None:
+    """Create (or widen) ``packet_history`` and its indexes in the archive *path*."""
+    definitions = hot.execute(
+        "SELECT type, name, sql FROM main.sqlite_master "
+        "WHERE tbl_name = ? AND sql IS NOT NULL ORDER BY type = 'index'",
+        (TABLE,),
+    ).fetchall()
+    hot_columns = table_columns(hot, "main")
+
+    archive = sqlite3.connect(path, timeout=30.0)
+    try:
+        archive.execute("PRAGMA journal_mode=WAL")
+        existing = {row[0] for row in archive.execute("SELECT name FROM sqlite_master")}
+        for _type, name, sql in definitions:
+            if name not in existing:
+                archive.execute(sql)
+        # Columns added to the hot table after the archive was created
+        archive_columns = {name for name, _ in table_columns(archive, "main")}
+        for name, col_type in hot_columns:
+            if name not in archive_columns:
+                archive.execute(f"ALTER TABLE {TABLE} ADD COLUMN {name} {col_type}")
+        archive.commit()
+    finally:
+        archive.close()
+
+
+# ---------------------------------------------------------------------------
+# Mover
+# ---------------------------------------------------------------------------
+
+
+def move_aged_packets(
+    db_path: str,
+    directory: Path | None = None,
+    *,
+    cutoff: float | None = None,
+    batch_size: int | None = None,
+    lock: Any = None,
+) -> int:
+    """
+    Move packets older than *cutoff* from *db_path* into monthly archives.
+
+    Each batch is copied and deleted in one transaction, holding *lock* (the
+    capture's database lock) only for the duration of that batch so packet
+    writes keep flowing.  Copies use ``INSERT OR IGNORE`` on the packet id,
+    which makes an interrupted run safe to repeat.
+
+    Returns:
+        Number of packets moved
+    """
+    directory = directory or archive_directory(db_path)
+    directory.mkdir(parents=True, exist_ok=True)
+    cutoff = hot_cutoff() if cutoff is None else cutoff
+    batch_size = batch_size or _settings.batch_size
+    guard = lock if lock is not None else contextlib.nullcontext()
+
+    conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None)
+    attached: str | None = None
+    moved = 0
+    try:
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.execute("CREATE TEMP TABLE move_batch (id INTEGER PRIMARY KEY)")
+        while True:
+            with guard:
+                oldest = conn.execute(
+                    f"SELECT MIN(timestamp) FROM main.{TABLE} WHERE timestamp < ?",
+                    (cutoff,),
+                ).fetchone()[0]
+                if oldest is None:
+                    break
+                month, next_month = _month_bounds(oldest)
+
+                if attached != month:
+                    if attached is not None:
+                        conn.execute("DETACH DATABASE archive")
+                    path = archive_path(directory, month)
+                    _ensure_archive_schema(conn, path)
+                    conn.execute("ATTACH DATABASE ? AS archive", (str(path),))
+                    attached = month
+                columns = ", ".join(name for name, _ in table_columns(conn, "main"))
+
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("DELETE FROM temp.move_batch")
+                    conn.execute(
+                        f"INSERT INTO temp.move_batch SELECT id FROM main.{TABLE} "
+                        "WHERE timestamp < ? ORDER BY timestamp LIMIT ?",
+                        (min(cutoff, next_month), batch_size),
+                    )
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO archive.{TABLE} ({columns}) "
+                        f"SELECT {columns} FROM main.{TABLE} "
+                        "WHERE id IN (SELECT id FROM temp.move_batch)"
+                    )
+                    deleted = conn.execute(
+                        f"DELETE FROM main.{TABLE} "
+                        "WHERE id IN (SELECT id FROM temp.move_batch)"
+                    ).rowcount
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+
+            moved += deleted
+            logger.debug(f"Archived {deleted} packets into {month}")
+    finally:
+        conn.close()
+
+    if moved:
+        logger.info(f"Moved {moved} packets older than the hot window to {directory}")
+    return moved
+
+
+# ---------------------------------------------------------------------------
+# Read side
+# ---------------------------------------------------------------------------
+
+
+def _attach_uri(path: Path, read_only: bool) -> str:
+    if not read_only:
+        return str(path)
+    return f"file:{quote(str(path.resolve()), safe='/')}?mode=ro"
+
+
+def attach_archives(
+    conn: sqlite3.Connection,
+    db_path: str,
+    read_only: bool = False,
+    start_time: float | None = None,
+    end_time: float | None = None,
+) -> list[str]:
+    """
+    ATTACH the archives of *db_path* to *conn* and create the tiered view.
+
+    Only the archives overlapping ``[start_time, end_time]`` are attached, all
+    of them without a range.  At most ``SQLITE_LIMIT_ATTACHED`` archives can
+    be attached; the newest ones win and a warning is logged once per process.
+
+    Returns:
+        The attached months, newest first
+    """
+    global _attach_limit_warned
+
+    archives = overlapping_archives(
+        list_archives(archive_directory(db_path)), start_time, end_time
+    )
+    if not archives:
+        return []
+
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(archives) > limit:
+        if not _attach_limit_warned:
+            logger.warning(
+                f"{len(archives)} archive databases overlap the queried range but "
+                f"SQLite can attach only {limit}; months before "
+                f"{archives[limit - 1][0]} are left out, query a narrower time "
+                "range to see them"
+            )
+            _attach_limit_warned = True
+        archives = archives[:limit]
+
+    hot_columns = readable_columns(conn, "main")
+    selects = [f"SELECT {', '.join(hot_columns)} FROM {HOT_TABLE}"]
+    months = []
+    for month, path in archives:
+        schema = f"archive_{month.replace('-', '_')}"
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (_attach_uri(path, read_only),))
+        archive_columns = set(readable_columns(conn, schema))
+        if not archive_columns:
+            conn.execute(f"DETACH DATABASE {schema}")
+            continue
+        selects.append(
+            f"SELECT {select_list(hot_columns, archive_columns)} FROM {schema}.{TABLE}"
+        )
+        months.append(month)
+
+    if months:
+        conn.execute(f"CREATE TEMP VIEW {TABLE} AS " + " UNION ALL ".join(selects))
+    return months
+
+
+def iter_archive_counts(db_path: str) -> Iterator[tuple[str, int]]:
+    """Yield ``(month, packet count)`` for each archive of *db_path*."""
+    for month, path in list_archives(archive_directory(db_path)):
+        conn = sqlite3.connect(_attach_uri(path, True), uri=True)
+        try:
+            yield month, conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+        finally:
+            conn.close()
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Move packets older than the hot window into monthly archives"
+    )
+    parser.add_argument(
+        "--db",
+        dest="db_path",
+        help="Hot database (defaults to the configured database_file)",
+    )
+    parser.add_argument(
+        "--archive-dir", help="Archive directory (default: <database dir>/archive)"
+    )
+    parser.add_argument(
+        "--days",
+        type=float,
+        help="Days of packets to keep in the hot database "
+        "(default: hot_retention_days)",
+    )
+    parser.add_argument("--batch-size", type=int, help="Packets moved per transaction")
+    parser.add_argument(
+        "--list", action="store_true", help="Only list the archives and their sizes"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point for ``malla-archive``."""
+    from ..config import get_config
+
+    args = _parse_args(argv)
+    cfg = get_config()
+    logging.basicConfig(
+        level=getattr(logging, cfg.log_level.upper(), logging.INFO),
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    configure(cfg)
+    if args.archive_dir:
+        _settings.archive_dir = Path(args.archive_dir)
+    if args.days is not None:
+        _settings.hot_retention_days = args.days
+    db_path = args.db_path or cfg.database_file
+
+    if not args.list:
+        moved = move_aged_packets(db_path, batch_size=args.batch_size)
+        print(f"Moved {moved} packets to {archive_directory(db_path)}")
+    for month, count in iter_archive_counts(db_path):
+        print(f"{month}: {count} packets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+Offline bulk ingest of raw Meshtastic ServiceEnvelope archives
+
+Rebuilds (or extends) a capture database from recorded MQTT traffic without a
+broker.  Every envelope goes through the same decode path as the live capture
+(:func:`malla.mqtt_capture.decode_envelope`), so the resulting rows are
+identical to what ``malla-capture`` would have stored.
+
+Supported inputs (picked from the file extension unless ``--format`` is given):
+
+* ``envelopes`` – length-prefixed protobuf: a 4-byte big-endian length followed
+  by one serialized ServiceEnvelope, repeated.
+* ``dump`` – text dumps with one message per line as ``<unix time> <topic>
+  <hex payload>`` (e.g. ``mosquitto_sub -F "%U %t %x"``); the timestamp may be
+  omitted.
+* ``sqlite`` – another capture database; ``raw_service_envelope`` blobs are
+  re-decoded in id order.
+
+Decoding runs in a process pool while the main process writes large batched
+transactions.  During a bulk load the journal and fsyncs are switched off and
+the normal WAL settings are restored afterwards.  With ``--replay-speed`` the
+records are instead written at (accelerated) wall-clock pace, stamped with the
+current time, which is handy for load testing the web UI.
+
+Usage:
+    malla-ingest dump1.txt dump2.bin --db meshtastic_history.db
+    malla-ingest old.db --replay-speed 60
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import sqlite3
+import struct
+import sys
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from . import mqtt_capture
+from .config import get_config
+from .database import neighbors, node_activity, partitions, relays, telemetry
+from .utils.link_analysis import resolve_worker_count
+
+logger = logging.getLogger(__name__)
+
+INPUT_FORMATS = ("envelopes", "dump", "sqlite")
+
+# 4-byte big-endian length prefix of the "envelopes" format
+ENVELOPE_HEADER = struct.Struct(">I")
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+# Records decoded per worker task and rows written per transaction
+DEFAULT_CHUNK_SIZE = 2_000
+DEFAULT_BATCH_SIZE = 50_000
+
+# Seconds between progress reports (and between replay flushes)
+PROGRESS_INTERVAL_SECONDS = 5.0
+REPLAY_FLUSH_SECONDS = 1.0
+
+
+class EnvelopeRecord(NamedTuple):
+    """One archived MQTT message; missing fields are derived from the envelope."""
+
+    timestamp: float | None
+    topic: str | None
+    payload: bytes
+
+
+class NodeUpdate(NamedTuple):
+    """Keyword arguments for ``mqtt_capture._upsert_node_info``."""
+
+    node_id: int
+    timestamp: float
+    fields: dict[str, Any]
+
+
+# ---------------------------------------------------------------------------
+# Readers
+# ---------------------------------------------------------------------------
+
+
+def detect_format(path: Path) -> str:
+    """Guess the input format of *path* from its extension or header."""
+    suffix = path.suffix.lower()
+    if suffix in {".db", ".sqlite", ".sqlite3"}:
+        return "sqlite"
+    if suffix in {".txt", ".log", ".dump", ".hex"}:
+        return "dump"
+
+    with path.open("rb") as f:
+        if f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC:
+            return "sqlite"
+    return "envelopes"
+
+
+def read_envelope_file(path: Path) -> Iterator[EnvelopeRecord]:
+    """Yield envelopes from a length-prefixed protobuf file."""
+    with path.open("rb") as f:
+        while True:
+            header = f.read(ENVELOPE_HEADER.size)
+            if not header:
+                return
+            if len(header) < ENVELOPE_HEADER.size:
+                logger.warning(f"{path}: truncated length prefix at end of file")
+                return
+
+            (length,) = ENVELOPE_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                logger.warning(f"{path}: truncated envelope at end of file")
+                return
+            yield EnvelopeRecord(None, None, payload)
+
+
+def read_text_dump(path: Path) -> Iterator[EnvelopeRecord]:
+    """Yield envelopes from a ``<timestamp> <topic> <hex payload>`` text dump."""
+    with path.open(encoding="utf-8", errors="replace") as f:
+        for line_number, line in enumerate(f, start=1):
+            parts = line.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+
+            try:
+                if len(parts) == 3:
+                    yield EnvelopeRecord(
+                        float(parts[0]), parts[1], bytes.fromhex(parts[2])
+                    )
+                elif len(parts) == 2:
+                    yield EnvelopeRecord(None, parts[0], bytes.fromhex(parts[1]))
+                else:
+                    raise ValueError(f"expected 2 or 3 fields, got {len(parts)}")
+            except ValueError as e:
+                logger.warning(f"{path}:{line_number}: skipping malformed line ({e})")
+
+
+def read_sqlite_source(
+    path: Path, batch_size: int = 10_000
+) -> Iterator[EnvelopeRecord]:
+    """
+    Yield the stored raw envelopes of another capture database in id order,
+    including the rows of its weekly partitions.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        selects = " UNION ALL ".join(
+            f"SELECT id, timestamp, topic, raw_service_envelope FROM {table} "
+            "WHERE raw_service_envelope IS NOT NULL"
+            for table in partitions.packet_tables(conn)
+        )
+        cursor = conn.execute(
+            f"SELECT timestamp, topic, raw_service_envelope FROM ({selects}) "
+            "ORDER BY id"
+        )
+        while rows := cursor.fetchmany(batch_size):
+            for timestamp, topic, payload in rows:
+                yield EnvelopeRecord(timestamp, topic, bytes(payload))
+    finally:
+        conn.close()
+
+
+def iter_records(
+    paths: Iterable[Path], input_format: str = "auto"
+) -> Iterator[EnvelopeRecord]:
+    """Yield the records of all *paths* in order."""
+    readers = {
+        "envelopes": read_envelope_file,
+        "dump": read_text_dump,
+        "sqlite": read_sqlite_source,
+    }
+    for path in paths:
+        path_format = detect_format(path) if input_format == "auto" else input_format
+        logger.info(f"Reading {path} ({path_format})")
+        yield from readers[path_format](path)
+
+
+# ---------------------------------------------------------------------------
+# Decoding (runs in worker processes)
+# ---------------------------------------------------------------------------
+
+
+def _init_worker() -> None:
+    # Per-packet INFO logs from the capture code would swamp the console
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def _synthesize_topic(payload: bytes, topic_prefix: str) -> str:
+    """Build a capture-style topic for envelopes archived without one."""
+    service_envelope = mqtt_capture.mqtt_pb2.ServiceEnvelope()
+    try:
+        service_envelope.ParseFromString(payload)
+    except Exception:
+        return f"{topic_prefix}/ingest/2/e"
+    return (
+        f"{topic_prefix}/ingest/2/e/"
+        f"{service_envelope.channel_id}/{service_envelope.gateway_id}"
+    )
+
+
+def decode_records(
+    records: list[EnvelopeRecord], topic_prefix: str
+) -> tuple[list[tuple[Any, ...]], list[NodeUpdate]]:
+    """
+    Decode a chunk of records into packet_history rows and node_info updates.
+
+    Returns:
+        Tuple of (rows for ``PACKET_INSERT_SQL``, node updates) in input order
+    """
+    rows: list[tuple[Any, ...]] = []
+    node_updates: list[NodeUpdate] = []
+
+    for timestamp, topic, payload in records:
+        if topic is None:
+            topic = _synthesize_topic(payload, topic_prefix)
+        if "/json/" in topic:
+            continue
+
+        decoded = mqtt_capture.decode_envelope(topic, payload)
+        mesh_packet = decoded.mesh_packet
+        if timestamp is None:
+            timestamp = float(getattr(mesh_packet, "rx_time", 0) or 0) or time.time()
+
+        rows.append(
+            mqtt_capture.build_packet_row(
+                topic,
+                decoded.service_envelope,
+                mesh_packet,
+                decoded.processed_successfully,
+                payload,
+                decoded.parsing_error,
+                timestamp=timestamp,
+            )
+        )
+
+        if not decoded.processed_successfully:
+            continue
+        gateway_numeric_id = decoded.gateway_node_id
+        if gateway_numeric_id:
+            node_updates.append(
+                NodeUpdate(
+                    gateway_numeric_id,
+                    timestamp,
+                    {"hex_id": decoded.service_envelope.gateway_id},
+                )
+            )
+        if decoded.node_info is not None:
+            fields = dict(decoded.node_info)
+            node_updates.append(NodeUpdate(fields.pop("node_id"), timestamp, fields))
+
+    return rows, node_updates
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """Group *items* into lists of at most *size* elements."""
+    chunk: list[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def map_chunks(
+    func: Callable[..., Any],
+    chunks: Iterable[list[Any]],
+    *args: Any,
+    workers: int = 1,
+) -> Iterator[Any]:
+    """
+    Yield ``func(chunk, *args)`` for each chunk, in input order.
+
+    With *workers* > 1 the chunks are processed by a spawn process pool with a
+    bounded number of chunks in flight, so memory stays flat for any input size.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield func(chunk, *args)
+        return
+
+    # "spawn" keeps the workers independent of the parent's sqlite handles
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as executor:
+        pending: deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(func, chunk, *args))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_decoded(
+    records: Iterable[EnvelopeRecord],
+    topic_prefix: str,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[tuple[list[tuple[Any, ...]], list[NodeUpdate]]]:
+    """Decode *records* chunk by chunk, in a process pool when *workers* > 1."""
+    return map_chunks(
+        decode_records, chunked(records, chunk_size), topic_prefix, workers=workers
+    )
+
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+
+
+class BulkWriter:
+    """Write decoded packets in large transactions to a capture database."""
+
+    def __init__(self, db_path: str, fast: bool = True):
+        mqtt_capture.init_database(db_path)
+        self.conn = mqtt_capture._open_conn(db_path)
+        self.conn.isolation_level = None  # explicit BEGIN/COMMIT
+        self.fast = fast and self._enable_fast_mode()
+        self._known_gateways: set[int] = set()
+        # Oldest telemetry sample and packet written, for the refreshes on close()
+        self._rollup_since: float | None = None
+        self._oldest_packet: float | None = None
+
+    def _enable_fast_mode(self) -> bool:
+        cursor = self.conn.cursor()
+        try:
+            mode = cursor.execute("PRAGMA journal_mode=OFF").fetchone()[0]
+        except sqlite3.OperationalError as e:
+            mode = str(e)
+        if str(mode).lower() != "off":
+            # Another connection (e.g. a running capture) holds the database
+            logger.warning(
+                f"Could not disable the journal ({mode}); loading with WAL enabled"
+            )
+            return False
+        cursor.execute("PRAGMA synchronous=OFF")
+        logger.info("Bulk load mode: journal_mode=OFF, synchronous=OFF")
+        return True
+
+    def write(
+        self, rows: list[tuple[Any, ...]], node_updates: list[NodeUpdate]
+    ) -> None:
+        """Insert *rows* and apply *node_updates* in a single transaction."""
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            if partitions.is_enabled():
+                partitions.insert_packets(cursor, mqtt_capture.PACKET_COLUMNS, rows)
+            else:
+                cursor.executemany(mqtt_capture.PACKET_INSERT_SQL, rows)
+            neighbors.upsert_edges(
+                cursor, neighbors.edges_from_rows(mqtt_capture.PACKET_COLUMNS, rows)
+            )
+            samples = telemetry.samples_from_rows(mqtt_capture.PACKET_COLUMNS, rows)
+            telemetry.insert_samples(cursor, samples)
+            relays.record(
+                cursor, relays.observations_from_rows(mqtt_capture.PACKET_COLUMNS, rows)
+            )
+            for node_id, timestamp, fields in node_updates:
+                if set(fields) == {"hex_id"}:
+                    # Gateway sighting: only needs a row once per run
+                    if node_id in self._known_gateways:
+                        continue
+                    self._known_gateways.add(node_id)
+                mqtt_capture._upsert_node_info(cursor, node_id, timestamp, **fields)
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        if samples:
+            oldest = min(sample[2] for sample in samples)
+            if self._rollup_since is None or oldest < self._rollup_since:
+                self._rollup_since = oldest
+        if rows:
+            oldest = min(row[0] for row in rows)
+            if self._oldest_packet is None or oldest < self._oldest_packet:
+                self._oldest_packet = oldest
+
+    def close(self) -> None:
+        """Refresh the telemetry rollups and node activity counters for the
+        loaded packets, restore the normal journal settings and close the
+        connection."""
+        if self._rollup_since is not None or self._oldest_packet is not None:
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN")
+            if self._rollup_since is not None:
+                telemetry.refresh_rollups(cursor, self._rollup_since)
+            if self._oldest_packet is not None:
+                since = self._oldest_packet - 1
+                source = "packet_history"
+                if partitions.is_enabled():
+                    partitions.refresh_layout(self.conn)
+                    source = partitions.packet_source(
+                        min(since, time.time() - node_activity.WINDOW_SECONDS)
+                    )
+                node_activity.refresh(cursor, since=since, source=source)
+            cursor.execute("COMMIT")
+        if self.fast:
+            cursor = self.conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            logger.info("Restored journal_mode=WAL, synchronous=NORMAL")
+        self.conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+
+def ingest(
+    records: Iterable[EnvelopeRecord],
+    db_path: str,
+    workers: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    fast: bool = True,
+    replay_speed: float | None = None,
+    topic_prefix: str | None = None,
+) -> dict[str, Any]:
+    """
+    Decode *records* and write them to *db_path*.
+
+    Args:
+        records: Envelope records in the order they should be stored
+        db_path: Capture database to write to (created if missing)
+        workers: Decode processes (1 decodes in-process)
+        batch_size: Rows per write transaction
+        chunk_size: Records per decode task
+        fast: Disable the journal and fsyncs while loading
+        replay_speed: Write at this multiple of the original pace, stamping
+                      rows with the current time, instead of bulk loading
+        topic_prefix: Prefix for topics synthesized for topic-less records
+
+    Returns:
+        Dictionary with packets, seconds and packets_per_second
+    """
+    if topic_prefix is None:
+        topic_prefix = get_config().mqtt_topic_prefix
+    if replay_speed is not None and replay_speed <= 0:
+        raise ValueError("replay_speed must be positive")
+
+    # Replay is meant to run next to a live web UI, so keep the journal
+    writer = BulkWriter(db_path, fast=fast and replay_speed is None)
+    pending_rows: list[tuple[Any, ...]] = []
+    pending_updates: list[NodeUpdate] = []
+    packets = 0
+    start = time.monotonic()
+    last_report = start
+    last_flush = start
+    replay_origin: tuple[float, float] | None = None
+
+    def flush() -> None:
+        nonlocal packets
+        if pending_rows or pending_updates:
+            writer.write(pending_rows, pending_updates)
+            packets += len(pending_rows)
+            pending_rows.clear()
+            pending_updates.clear()
+
+    try:
+        for rows, node_updates in iter_decoded(
+            records, topic_prefix, workers=workers, chunk_size=chunk_size
+        ):
+            if replay_speed is None:
+                pending_rows.extend(rows)
+                pending_updates.extend(node_updates)
+                if len(pending_rows) >= batch_size:
+                    flush()
+            else:
+                for row in rows:
+                    if replay_origin is None:
+                        replay_origin = (row[0], time.monotonic())
+                    due = replay_origin[1] + (row[0] - replay_origin[0]) / replay_speed
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        flush()
+                        last_flush = time.monotonic()
+                        time.sleep(delay)
+                    pending_rows.append((time.time(), *row[1:]))
+                    if time.monotonic() - last_flush >= REPLAY_FLUSH_SECONDS:
+                        flush()
+                        last_flush = time.monotonic()
+                pending_updates.extend(
+                    update._replace(timestamp=time.time()) for update in node_updates
+                )
+
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL_SECONDS:
+                done = packets + len(pending_rows)
+                logger.info(
+                    f"Ingested {done} packets ({done / (now - start):.0f} packets/s)"
+                )
+                last_report = now
+
+        flush()
+    finally:
+        writer.close()
+
+    seconds = time.monotonic() - start
+    return {
+        "packets": packets,
+        "seconds": seconds,
+        "packets_per_second": packets / seconds if seconds > 0 else 0.0,
+    }
+
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Ingest archived Meshtastic ServiceEnvelopes into a capture database"
+    )
+    parser.add_argument("inputs", nargs="+", type=Path, help="Input files")
+    parser.add_argument(
+        "--db",
+        dest="db_path",
+        help="Target database (defaults to the configured database_file)",
+    )
+    parser.add_argument(
+        "--format",
+        dest="input_format",
+        choices=("auto", *INPUT_FORMATS),
+        default="auto",
+        help="Input format (default: guessed per file)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Decode processes (0 = one per CPU, 1 = no process pool)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Rows per write transaction",
+    )
+    parser.add_argument(
+        "--keep-journal",
+        action="store_true",
+        help="Keep WAL and fsyncs enabled while loading (safe with a running capture)",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        help="Replay at N times the recorded pace, stamping packets with the current time",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point for ``malla-ingest``."""
+    args = _parse_args(argv)
+    cfg = get_config()
+    # Channel keys for decrypting; decode workers inherit or rebuild them
+    mqtt_capture.configure(cfg)
+    partitions.configure(cfg)
+    logging.basicConfig(
+        level=getattr(logging, cfg.log_level.upper(), logging.INFO),
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    # Per-packet decode logs are only interesting when debugging
+    logging.getLogger().setLevel(max(logging.getLogger().level, logging.WARNING))
+    logger.setLevel(logging.INFO)
+
+    missing = [str(path) for path in args.inputs if not path.is_file()]
+    if missing:
+        logger.error(f"Input file(s) not found: {', '.join(missing)}")
+        return 1
+
+    db_path = args.db_path or cfg.database_file
+    workers = resolve_worker_count(args.workers)
+    logger.info(f"Ingesting into {db_path} with {workers} decode worker(s)")
+
+    result = ingest(
+        iter_records(args.inputs, args.input_format),
+        db_path,
+        workers=workers,
+        batch_size=args.batch_size,
+        fast=not args.keep_journal,
+        replay_speed=args.replay_speed,
+    )
+    print(
+        f"Ingested {result['packets']} packets in {result['seconds']:.2f}s "
+        f"({result['packets_per_second']:.0f} packets/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
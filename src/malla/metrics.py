@@ -0,0 +1,475 @@
+"""
+Minimal Prometheus-style metrics.
+
+Counters, gauges and histograms with labels, rendered in the Prometheus text
+exposition format (version 0.0.4).  Updating a metric is a dictionary lookup
+and an addition under a lock, and rendering only reads those in-memory values,
+so scrapes never touch the database.
+
+This is intentionally small to avoid a hard dependency on ``prometheus_client``.
+For multi-process servers (Gunicorn) each worker periodically writes a snapshot
+of its registry to a shared directory and the ``/metrics`` endpoint sums the
+snapshots of all live workers plus the counters of the workers that exited;
+see :func:`write_snapshot` and :func:`render_directory`.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets (seconds) suitable for both DB writes and web requests
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Seconds between snapshot writes of a worker
+SNAPSHOT_INTERVAL_SECONDS = 5.0
+
+# Summed counters and histograms of exited workers, and the lock guarding it
+RETIRED_SNAPSHOT = "metrics-retired.json"
+RETIRED_LOCK = "metrics-retired.lock"
+
+# Kinds whose totals outlive the process that counted them
+_CUMULATIVE_KINDS = ("counter", "histogram")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Registry | None = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], Any] = {}
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _key(self, values: tuple[Any, ...]) -> tuple[str, ...]:
+        if len(values) != len(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {values}"
+            )
+        return tuple(str(value) for value in values)
+
+    def samples(self) -> dict[tuple[str, ...], Any]:
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    @staticmethod
+    def _copy(value: Any) -> Any:
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing value; name it ``*_total``."""
+
+    kind = "counter"
+
+    def inc(self, *labels: Any, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed when scraped."""
+
+    kind = "gauge"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._function: Callable[[], float] | None = None
+
+    def set(self, value: float, *labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, *labels: Any, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels: Any, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the (label-less) value on every scrape; keep it cheap."""
+        self._function = function
+
+    def samples(self) -> dict[tuple[str, ...], Any]:
+        if self._function is not None:
+            try:
+                return {(): float(self._function())}
+            except Exception as e:  # pragma: no cover - defensive
+                logger.debug(f"Gauge {self.name} callback failed: {e}")
+                return {}
+        return super().samples()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (e.g. latencies in seconds)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Registry | None = None,
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, *labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @staticmethod
+    def _copy(value: Any) -> Any:
+        return [list(value[0]), value[1], value[2]]
+
+
+class Registry:
+    """A set of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._last_snapshot = 0.0
+
+    def register(self, metric: _Metric) -> None:
+        # A metric of the same name replaces the old one, which keeps module
+        # reloads (config changes in tests) working
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def snapshot(self) -> dict[str, Any]:
+        """JSON-serializable copy of all current values."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                "kind": metric.kind,
+                "help": metric.documentation,
+                "labels": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "samples": [
+                    [list(key), value] for key, value in metric.samples().items()
+                ],
+            }
+            for metric in metrics
+        }
+
+    def render(self) -> str:
+        return render_snapshot(self.snapshot())
+
+
+REGISTRY = Registry()
+
+
+# ---------------------------------------------------------------------------
+# Exposition
+# ---------------------------------------------------------------------------
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return f"{value:.1f}"
+    return repr(float(value))
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_snapshot(snapshot: dict[str, Any]) -> str:
+    """Render a :meth:`Registry.snapshot` in the text exposition format."""
+    lines: list[str] = []
+    for name, metric in snapshot.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        labelnames = metric["labels"]
+        for values, value in sorted(metric["samples"], key=lambda s: s[0]):
+            if metric["kind"] != "histogram":
+                labels = _label_text(labelnames, values)
+                lines.append(f"{name}{labels} {_format_value(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(
+                [*metric["buckets"], math.inf], counts, strict=True
+            ):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                labels = _label_text(labelnames, values, le)
+                lines.append(f"{name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _label_text(labelnames, values)
+            lines.append(f"{name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{name}_count{labels} {_format_value(count)}")
+    return "\n".join(lines) + "\n"
+
+
+def merge_snapshots(snapshots: Iterable[dict[str, Any]]) -> dict[str, Any]:
+    """Sum the samples of several snapshots (one per worker process)."""
+    merged: dict[str, Any] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for values, value in metric["samples"]:
+                key = tuple(values)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif metric["kind"] == "histogram":
+                    if len(current[0]) != len(value[0]):
+                        # Buckets changed since an exited worker counted
+                        continue
+                    target["samples"][key] = [
+                        [a + b for a, b in zip(current[0], value[0], strict=True)],
+                        current[1] + value[1],
+                        current[2] + value[2],
+                    ]
+                else:
+                    target["samples"][key] = current + value
+    for metric in merged.values():
+        metric["samples"] = [[list(k), v] for k, v in metric["samples"].items()]
+    return merged
+
+
+# ---------------------------------------------------------------------------
+# Multi-process support
+# ---------------------------------------------------------------------------
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def write_snapshot(
+    directory: str | Path, registry: Registry = REGISTRY, force: bool = False
+) -> None:
+    """Write this process' values to *directory* (at most every few seconds)."""
+    now = time.monotonic()
+    if not force and now - registry._last_snapshot < SNAPSHOT_INTERVAL_SECONDS:
+        return
+    registry._last_snapshot = now
+    path = Path(directory) / f"metrics-{os.getpid()}.json"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(registry.snapshot()))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics snapshot to {path}: {e}")
+
+
+def _read_snapshot(path: Path) -> dict[str, Any] | None:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _retire(directory: Path, paths: list[Path]) -> None:
+    """
+    Fold the counters and histograms of the exited workers' snapshots *paths*
+    into :data:`RETIRED_SNAPSHOT` and remove the snapshots.
+
+    Runs under an exclusive lock, so a snapshot that several processes find
+    at the same time is only counted once.
+    """
+    import fcntl
+
+    with open(directory / RETIRED_LOCK, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired_path = directory / RETIRED_SNAPSHOT
+        snapshots = [_read_snapshot(retired_path) or {}]
+        retired = []
+        for path in paths:
+            if not path.exists():
+                # Folded by another process meanwhile
+                continue
+            snapshot = _read_snapshot(path) or {}
+            snapshots.append(
+                {
+                    name: metric
+                    for name, metric in snapshot.items()
+                    if metric.get("kind") in _CUMULATIVE_KINDS
+                }
+            )
+            retired.append(path)
+        if not retired:
+            return
+        tmp_path = retired_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(merge_snapshots(snapshots)))
+        os.replace(tmp_path, retired_path)
+        for path in retired:
+            path.unlink(missing_ok=True)
+
+
+def render_directory(directory: str | Path, registry: Registry = REGISTRY) -> str:
+    """
+    Render the summed metrics of all processes sharing *directory*.
+
+    The calling process contributes its current values.  Snapshots of
+    processes that no longer exist are folded into :data:`RETIRED_SNAPSHOT`
+    first: their counters and histograms keep counting in the sums, so a
+    recycled worker does not make them go backwards, while their gauges drop
+    out.
+    """
+    write_snapshot(directory, registry, force=True)
+    directory = Path(directory)
+    live = []
+    dead = []
+    for path in directory.glob("metrics-*.json"):
+        try:
+            pid = int(path.stem.split("-", 1)[1])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _pid_alive(pid):
+            dead.append(path)
+        else:
+            live.append(path)
+    if dead:
+        try:
+            _retire(directory, dead)
+        except OSError as e:
+            logger.warning(f"Could not fold exited worker metrics in {directory}: {e}")
+    snapshots = [
+        snapshot
+        for path in [*live, directory / RETIRED_SNAPSHOT]
+        if (snapshot := _read_snapshot(path)) is not None
+    ]
+    return render_snapshot(merge_snapshots(snapshots))
+
+
+# ---------------------------------------------------------------------------
+# Standalone listener (capture process)
+# ---------------------------------------------------------------------------
+
+
+def start_http_server(
+    port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY
+) -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # Scrapes every few seconds would flood the capture log
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name="metrics-http", daemon=True
+    )
+    thread.start()
+    return server
+
+
+# ---------------------------------------------------------------------------
+# Metrics shared by the web UI
+# ---------------------------------------------------------------------------
+
+CACHE_REQUESTS = Counter(
+    "malla_cache_requests_total",
+    "In-process cache lookups by cache and result (hit or miss)",
+    ("cache", "result"),
+)
+DB_CONNECTIONS_OPENED = Counter(
+    "malla_db_connections_opened_total",
+    "SQLite connections opened by get_db_connection",
+)
+DB_CONNECTIONS = Gauge(
+    "malla_db_connections",
+    "SQLite connections currently alive (open or not yet garbage collected)",
+)
+
+
+def record_cache(cache: str, hit: bool, amount: int = 1) -> None:
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss", amount=amount)
+
+
+REQUEST_DURATION = Histogram(
+    "malla_web_request_duration_seconds",
+    "Web request latency by route",
+    ("method", "route", "status"),
+)
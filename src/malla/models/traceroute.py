@@ -515,8 +515,10 @@ class TraceroutePacket:
         Args:
             calculate_for_all_paths: If True, calculate for forward, return, and RF paths.
                                    If False, only calculate for the display path.
-            location_cache: Optional cache dict to store location lookups and avoid repeated DB queries.
+            location_cache: Optional dict to share lookups between packets.
                           Format: {(node_id, timestamp): location_data}
+                          Lookups are served from the shared LocationTimeline,
+                          so this only avoids re-deriving the result dicts.
         """
         if not self.timestamp:
             logger.warning(
@@ -531,14 +533,14 @@ class TraceroutePacket:
             f"Calculating hop distances for packet {self.packet_id} at timestamp {self.timestamp}"
         )
 
-        # Use provided cache or create a local one
+        # Use provided cache or a per-call one (bounded by this packet's hops)
         if location_cache is None:
             location_cache = {}
 
         def get_cached_location(
             node_id: int, timestamp: float
         ) -> dict[str, Any] | None:
-            """Get location with caching to avoid repeated DB queries."""
+            """Get location, reusing results for nodes seen earlier in this call."""
             cache_key = (node_id, timestamp)
             if cache_key not in location_cache:
                 location_cache[cache_key] = get_node_location_at_timestamp(
@@ -629,7 +631,7 @@ class TraceroutePacket:
         This is a convenience method for templates that need distance data.
 
         Args:
-            location_cache: Optional cache dict to store location lookups and avoid repeated DB queries.
+            location_cache: Optional dict to share location lookups between packets.
         """
         # Calculate distances if not already done
         if self.forward_path.hops and self.forward_path.hops[0].distance_meters is None:
@@ -647,7 +649,7 @@ class TraceroutePacket:
         This is a convenience method for templates that need distance data.
 
         Args:
-            location_cache: Optional cache dict to store location lookups and avoid repeated DB queries.
+            location_cache: Optional dict to share location lookups between packets.
         """
         if not self.return_path:
             return []
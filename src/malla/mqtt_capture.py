@@ -16,19 +16,16 @@ Configuration:
     the old unprefixed environment variables are no longer supported.
 """
 
-import base64
-import hashlib
 import logging
 import os
 import socket
 import sqlite3
 import threading
 import time
+from dataclasses import dataclass
 from typing import Any
 
 import paho.mqtt.client as mqtt
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from meshtastic import (
     config_pb2,
     mesh_pb2,
@@ -41,27 +38,39 @@ from paho.mqtt.enums import CallbackAPIVersion
 # ---------------------------------------------------------------------------
 # Configuration (centralised via malla.config)
 # ---------------------------------------------------------------------------
-from malla.config import get_config  # Import here to avoid circular import issues
+from malla import metrics
+from malla.config import AppConfig, get_config
+from malla.database import (
+    neighbors,
+    node_activity,
+    node_search,
+    node_sync,
+    partitions,
+    relays,
+    telemetry,
+    tiering,
+)
+from malla.utils.keyring import Keyring
 
-# Load the singleton configuration once at module import time.  This ensures the
-# capture tool honours the same YAML + optional environment override mechanism
-# as the web-UI and the rest of the application stack.
+# Settings below are applied by configure() (main() and the CLI tools call
+# it).  Until then they are None and resolved from get_config() on first use,
+# so importing this module neither reads config.yaml nor sets up logging.
 
-_cfg = get_config()
+_cfg: AppConfig | None = None
 
 # MQTT Broker details
-MQTT_BROKER_ADDRESS: str = _cfg.mqtt_broker_address
-MQTT_PORT: int = _cfg.mqtt_port
-MQTT_USERNAME: str | None = _cfg.mqtt_username
-MQTT_PASSWORD: str | None = _cfg.mqtt_password
-MQTT_TOPIC_PREFIX: str = _cfg.mqtt_topic_prefix
-MQTT_TOPIC_SUFFIX: str = _cfg.mqtt_topic_suffix
+MQTT_BROKER_ADDRESS: str | None = None
+MQTT_PORT: int | None = None
+MQTT_USERNAME: str | None = None
+MQTT_PASSWORD: str | None = None
+MQTT_TOPIC_PREFIX: str | None = None
+MQTT_TOPIC_SUFFIX: str | None = None
 
 # Database file path
-DATABASE_FILE: str = _cfg.database_file
+DATABASE_FILE: str | None = None
 
 # Decryption key for secondary channels (optional)
-DEFAULT_CHANNEL_KEY: str = _cfg.default_channel_key
+DEFAULT_CHANNEL_KEY: str | None = None
 
 CAPTURE_STORE_RAW: bool = (
     str(getattr(_cfg, "capture_store_raw", os.getenv("MALLA_CAPTURE_STORE_RAW", "1"))).lower()
@@ -81,164 +90,168 @@ DISABLE_MMAP: bool = str(os.getenv("MALLA_SQLITE_DISABLE_MMAP", "1")).lower() in
     "on",
 }
 
-# Logging configuration – falls back to INFO if an invalid level was supplied
-LOG_LEVEL = _cfg.log_level.upper()
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL, logging.INFO),
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
-
 # --- Global Variables ---
 db_lock = threading.Lock()  # Thread lock for database access
 node_cache: dict[
     int, dict[str, Any]
 ] = {}  # In-memory cache: {node_id_numeric: {'hex_id': '!abc123', 'long_name': 'Name', 'short_name': 'Short', 'last_updated': timestamp}}
 
+# --- Metrics (served on capture_metrics_port when configured) ---
+MESSAGES_RECEIVED = metrics.Counter(
+    "malla_capture_messages_received_total", "MQTT messages received"
+)
+MESSAGES_DECODED = metrics.Counter(
+    "malla_capture_messages_decoded_total",
+    "Envelopes decoded successfully, by portnum",
+    ("portnum",),
+)
+MESSAGES_FAILED = metrics.Counter(
+    "malla_capture_messages_failed_total",
+    "Envelopes that failed to parse or process, by portnum",
+    ("portnum",),
+)
+DECRYPT_ATTEMPTS = metrics.Counter(
+    "malla_capture_decrypt_attempts_total", "Encrypted packets we tried to decrypt"
+)
+DECRYPT_SUCCESSES = metrics.Counter(
+    "malla_capture_decrypt_success_total", "Encrypted packets decrypted successfully"
+)
+DECRYPT_KEY_ATTEMPTS = metrics.Counter(
+    "malla_capture_decrypt_key_attempts_total",
+    "AES attempts per keyring key, by result (hit or miss)",
+    ("key", "result"),
+)
+DB_WRITE_SECONDS = metrics.Histogram(
+    "malla_capture_db_write_seconds",
+    "Time to store one packet, including waiting for the database lock",
+)
+DB_WRITE_ERRORS = metrics.Counter(
+    "malla_capture_db_write_errors_total", "Packets that could not be stored"
+)
+NODE_CACHE_SIZE = metrics.Gauge(
+    "malla_capture_node_cache_size", "Nodes held in the in-memory node cache"
+)
+NODE_CACHE_SIZE.set_function(lambda: len(node_cache))
+
+# Default key plus the configured channel_keys, tried in order of recent hits;
+# built by configure(), on first use if nothing called it
+KEYRING: Keyring | None = None
+
 
-# --- Decryption Functions ---
-def derive_key_from_channel_name(channel_name: str, key_base64: str) -> bytes:
+def configure(cfg: AppConfig | None = None) -> AppConfig:
     """
-    Derive encryption key from channel name and base key.
-    This follows Meshtastic's key derivation algorithm.
+    Apply *cfg* (default: :func:`~malla.config.get_config`) to the capture
+    settings and rebuild the keyring.
     """
-    try:
-        # Decode the base key from base64
-        key_bytes = base64.b64decode(key_base64)
-
-        # If channel name is provided, derive key using SHA256
-        if channel_name and channel_name != "":
-            # Convert channel name to bytes
-            channel_bytes = channel_name.encode("utf-8")
-            # Create SHA256 hash of base key + channel name
-            hasher = hashlib.sha256()
-            hasher.update(key_bytes)
-            hasher.update(channel_bytes)
-            derived_key = hasher.digest()
-            return derived_key
-        else:
-            # For primary channel, use the key as-is (should already be 32 bytes for AES256)
-            return key_bytes
-    except Exception as e:
-        logging.warning(f"Error deriving key: {e}")
-        return b"\x00" * 32  # Return null key on error
+    global _cfg, MQTT_BROKER_ADDRESS, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD
+    global MQTT_TOPIC_PREFIX, MQTT_TOPIC_SUFFIX, DATABASE_FILE, DEFAULT_CHANNEL_KEY
+    global KEYRING
+    cfg = cfg if cfg is not None else get_config()
+    _cfg = cfg
+    MQTT_BROKER_ADDRESS = cfg.mqtt_broker_address
+    MQTT_PORT = cfg.mqtt_port
+    MQTT_USERNAME = cfg.mqtt_username
+    MQTT_PASSWORD = cfg.mqtt_password
+    MQTT_TOPIC_PREFIX = cfg.mqtt_topic_prefix
+    MQTT_TOPIC_SUFFIX = cfg.mqtt_topic_suffix
+    DATABASE_FILE = cfg.database_file
+    DEFAULT_CHANNEL_KEY = cfg.default_channel_key
+    KEYRING = Keyring(
+        DEFAULT_CHANNEL_KEY, cfg.channel_keys, counter=DECRYPT_KEY_ATTEMPTS
+    )
+    return cfg
 
 
-def decrypt_packet(
-    encrypted_payload: bytes, packet_id: int, sender_id: int, key: bytes
-) -> bytes:
-    """
-    Decrypt a Meshtastic packet using AES256-CTR.
+def _config() -> AppConfig:
+    """The configuration applied by configure(), loaded on first use."""
+    global _cfg
+    if _cfg is None:
+        _cfg = get_config()
+    return _cfg
 
-    Args:
-        encrypted_payload: The encrypted payload bytes
-        packet_id: The packet ID for nonce construction
-        sender_id: The sender node ID for nonce construction
-        key: The encryption key (32 bytes for AES256)
 
-    Returns:
-        Decrypted payload bytes or empty bytes if decryption fails
-    """
-    try:
-        if len(encrypted_payload) == 0:
-            logging.debug("Empty encrypted payload, nothing to decrypt")
-            return b""
-
-        # Construct nonce: packet_id (8 bytes) + sender_id (8 bytes) = 16 bytes
-        packet_id_bytes = packet_id.to_bytes(8, byteorder="little")
-        sender_id_bytes = sender_id.to_bytes(8, byteorder="little")
-        nonce = packet_id_bytes + sender_id_bytes
-
-        if len(nonce) != 16:
-            logging.warning(f"Invalid nonce length: {len(nonce)}, expected 16 bytes")
-            return b""
-
-        # Create AES-CTR cipher
-        cipher = Cipher(
-            algorithms.AES(key), modes.CTR(nonce), backend=default_backend()
-        )
-        decryptor = cipher.decryptor()
+def _database_file() -> str:
+    return DATABASE_FILE or _config().database_file
 
-        # Decrypt the payload
-        decrypted = decryptor.update(encrypted_payload) + decryptor.finalize()
 
-        logging.debug(
-            f"Successfully decrypted {len(encrypted_payload)} bytes to {len(decrypted)} bytes"
+def _default_channel_key() -> str:
+    return DEFAULT_CHANNEL_KEY or _config().default_channel_key
+
+
+def _keyring() -> Keyring:
+    global KEYRING
+    if KEYRING is None:
+        KEYRING = Keyring(
+            _default_channel_key(),
+            _config().channel_keys,
+            counter=DECRYPT_KEY_ATTEMPTS,
         )
-        return decrypted
+    return KEYRING
 
-    except Exception as e:
-        logging.warning(f"Decryption failed: {e}")
-        return b""
 
+ACTIVE_WINDOW_SECONDS = 24 * 3600
+# Seconds between telemetry rollup refreshes
+TELEMETRY_ROLLUP_INTERVAL_SECONDS = 60
+# Seconds between recounts of node_info.packet_count_24h and friends
+NODE_ACTIVITY_REFRESH_SECONDS = 300
 
-def try_decrypt_mesh_packet(
-    mesh_packet: Any, channel_name: str = "", key_base64: str = DEFAULT_CHANNEL_KEY
-) -> bool:
-    """
-    Try to decrypt an encrypted MeshPacket and update it with decoded content.
 
-    Args:
-        mesh_packet: The MeshPacket protobuf object
-        channel_name: Channel name for key derivation (empty for primary channel)
-        key_base64: Base64-encoded encryption key
+class CaptureStats:
+    """Running packet counters for the heartbeat log and the ``capture_stats`` row.
 
-    Returns:
-        bool: True if decryption was successful and packet was updated
+    Seeded once at startup and then updated for every stored packet, so the
+    periodic heartbeat never has to scan ``packet_history``.
     """
-    try:
-        # Check if packet already has decoded data
-        if (
-            hasattr(mesh_packet, "decoded")
-            and mesh_packet.decoded.portnum != portnums_pb2.PortNum.UNKNOWN_APP
-        ):
-            logging.debug("Packet already decoded successfully")
-            return False
-
-        # Check if packet has encrypted data
-        if not hasattr(mesh_packet, "encrypted") or not mesh_packet.encrypted:
-            logging.debug("No encrypted payload found in packet")
-            return False
-
-        encrypted_payload = mesh_packet.encrypted
-        packet_id = mesh_packet.id
-        sender_id = getattr(mesh_packet, "from")  # 'from' is a Python keyword
-
-        logging.debug(
-            f"Attempting to decrypt packet {packet_id} from {sender_id}, encrypted payload: {len(encrypted_payload)} bytes"
-        )
 
-        # Derive the decryption key
-        key = derive_key_from_channel_name(channel_name, key_base64)
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.total_packets = 0
+        self.last_seen: dict[int, float] = {}
 
-        # Decrypt the payload
-        decrypted_payload = decrypt_packet(encrypted_payload, packet_id, sender_id, key)
+    def seed(self, cursor: sqlite3.Cursor, source: str = "packet_history") -> None:
+        """Initialise the counters from the database using index lookups only.
 
-        if not decrypted_payload:
-            logging.debug("Decryption returned empty payload")
-            return False
+        *source* is the FROM expression covering the last 24 hours of packets.
+        """
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'packet_history'")
+        # Packet ids come from packet_history's AUTOINCREMENT counter (also
+        # for partitions) and packets are only ever moved with their ids, so
+        # the counter is the number of packets captured without a table scan.
+        row = cursor.fetchone()
+        total = row[0] if row else 0
 
-        # Try to parse the decrypted payload as a Data protobuf
-        try:
-            decoded_data = mesh_pb2.Data()
-            decoded_data.ParseFromString(decrypted_payload)
+        cursor.execute(
+            f"""
+            SELECT from_node_id, MAX(timestamp)
+            FROM {source}
+            WHERE timestamp > ? AND from_node_id IS NOT NULL
+            GROUP BY from_node_id
+        """,
+            (time.time() - ACTIVE_WINDOW_SECONDS,),
+        )
+        last_seen = {row[0]: row[1] for row in cursor.fetchall()}
 
-            # Update the mesh packet with decoded data
-            mesh_packet.decoded.CopyFrom(decoded_data)
+        with self._lock:
+            self.total_packets = total
+            self.last_seen = last_seen
 
-            logging.info(
-                f"✅ Successfully decrypted packet {packet_id} from {sender_id}: {portnums_pb2.PortNum.Name(decoded_data.portnum)}"
-            )
-            return True
+    def record_packet(self, from_node_id: int | None, timestamp: float) -> None:
+        with self._lock:
+            self.total_packets += 1
+            if from_node_id is not None:
+                self.last_seen[from_node_id] = timestamp
 
-        except Exception as parse_error:
-            logging.debug(
-                f"Failed to parse decrypted payload as Data protobuf: {parse_error}"
-            )
-            return False
+    def active_nodes(self, now: float | None = None) -> int:
+        """Count senders seen within the last 24 hours, pruning older entries."""
+        cutoff = (time.time() if now is None else now) - ACTIVE_WINDOW_SECONDS
+        with self._lock:
+            stale = [node for node, ts in self.last_seen.items() if ts <= cutoff]
+            for node in stale:
+                del self.last_seen[node]
+            return len(self.last_seen)
 
-    except Exception as e:
-        logging.warning(f"Error in try_decrypt_mesh_packet: {e}")
-        return False
+
+capture_stats = CaptureStats()
 
 
 # --- Database Functions ---
@@ -270,16 +283,16 @@ def _configure_connection(conn: sqlite3.Connection) -> None:
         pass
 
 
-def _open_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DATABASE_FILE, timeout=30.0)
+def _open_conn(db_path: str | None = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path or _database_file(), timeout=30.0)
     conn.row_factory = sqlite3.Row
     _configure_connection(conn)
     return conn
 
 
-def init_database() -> None:
+def init_database(db_path: str | None = None) -> None:
     """Initialize SQLite database with required tables."""
-    conn = _open_conn()
+    conn = _open_conn(db_path)
     cursor = conn.cursor()
 
     # Connection already configured with PRAGMAs by _open_conn()
@@ -306,7 +319,8 @@ def init_database() -> None:
             processed_successfully BOOLEAN DEFAULT TRUE,
             message_type TEXT,
             raw_service_envelope BLOB,
-            parsing_error TEXT
+            parsing_error TEXT,
+            hop_count INTEGER GENERATED ALWAYS AS (hop_start - hop_limit) VIRTUAL
         )
     """)
 
@@ -335,6 +349,8 @@ def init_database() -> None:
         ("message_type", "TEXT"),
         ("raw_service_envelope", "BLOB"),
         ("parsing_error", "TEXT"),
+        # Computed on read; exists so the hop filter can use an index
+        ("hop_count", "INTEGER GENERATED ALWAYS AS (hop_start - hop_limit) VIRTUAL"),
     ]
 
     for column_name, column_type in new_columns:
@@ -376,6 +392,10 @@ def init_database() -> None:
     cursor.execute(
         "CREATE INDEX IF NOT EXISTS idx_packet_mesh_id ON packet_history(mesh_packet_id)"
     )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_packet_hop_count "
+        "ON packet_history(hop_count, timestamp)"
+    )
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_node_hex_id ON node_info(hex_id)")
 
     # Ensure primary_channel column exists for legacy databases
@@ -393,6 +413,38 @@ def init_database() -> None:
         "CREATE INDEX IF NOT EXISTS idx_node_primary_channel ON node_info(primary_channel)"
     )
 
+    # Latest SNR per directed edge from NEIGHBORINFO reports
+    neighbors.ensure_table(cursor)
+
+    # Telemetry samples and their min/avg/max rollups
+    telemetry.ensure_tables(cursor)
+
+    # Last packet time and 24h packet counts kept on node_info
+    if node_activity.ensure_columns(cursor):
+        node_activity.refresh(cursor, since=0)
+
+    # Packets per relay and next hop, from the packet header
+    if relays.ensure_table(cursor):
+        relays.rebuild(cursor)
+
+    # Trigram index over node names and ids, kept current by triggers
+    node_search.ensure_index(cursor)
+
+    # Versions and tombstones for /api/nodes/sync
+    node_sync.ensure_schema(cursor)
+
+    # Single-row heartbeat snapshot written by the capture for the dashboard
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS capture_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_nodes INTEGER NOT NULL,
+            nodes_with_long_names INTEGER NOT NULL,
+            active_nodes_24h INTEGER NOT NULL,
+            total_packets INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+
     # Backfill primary_channel using last NODEINFO packets if missing
     try:
         cursor.execute(
@@ -416,7 +468,7 @@ def init_database() -> None:
 
     conn.commit()
     conn.close()
-    logging.info(f"Database initialized: {DATABASE_FILE}")
+    logging.info(f"Database initialized: {db_path or _database_file()}")
 
 
 def load_node_cache() -> None:
@@ -519,98 +571,119 @@ def update_node_cache(
     with db_lock:
         conn = _open_conn()
         cursor = conn.cursor()
-
-        # Get existing values from database if node exists
-        cursor.execute(
-            "SELECT hex_id, long_name, short_name, hw_model, role, is_licensed, mac_address, primary_channel, first_seen FROM node_info WHERE node_id = ?",
-            (node_id,),
+        _upsert_node_info(
+            cursor,
+            node_id,
+            current_time,
+            hex_id=hex_id,
+            long_name=long_name,
+            short_name=short_name,
+            hw_model=hw_model,
+            role=role,
+            is_licensed=is_licensed,
+            mac_address=mac_address,
+            primary_channel=primary_channel,
         )
-        existing = cursor.fetchone()
+        conn.commit()
+        conn.close()
 
-        if existing:
-            # Node exists, merge values (keep existing values if new values are None)
-            (
-                existing_hex_id,
-                existing_long_name,
-                existing_short_name,
-                existing_hw_model,
-                existing_role,
-                existing_is_licensed,
-                existing_mac_address,
-                existing_primary_channel,
-                _first_seen,
-            ) = existing
-            final_hex_id = hex_id if hex_id is not None else existing_hex_id
-            final_long_name = long_name if long_name is not None else existing_long_name
-            final_short_name = (
-                short_name if short_name is not None else existing_short_name
-            )
-            final_hw_model = hw_model if hw_model is not None else existing_hw_model
-            final_role = role if role is not None else existing_role
-            final_is_licensed = (
-                is_licensed if is_licensed is not None else existing_is_licensed
-            )
-            final_mac_address = (
-                mac_address if mac_address is not None else existing_mac_address
-            )
-            final_primary_channel = (
-                primary_channel
-                if primary_channel is not None
-                else existing_primary_channel
-            )
 
-            cursor.execute(
-                """
-                UPDATE node_info
-                SET hex_id = ?, long_name = ?, short_name = ?, hw_model = ?, role = ?,
-                    is_licensed = ?, mac_address = ?, primary_channel = ?, last_updated = ?
-                WHERE node_id = ?
-            """,
-                (
-                    final_hex_id,
-                    final_long_name,
-                    final_short_name,
-                    final_hw_model,
-                    final_role,
-                    final_is_licensed,
-                    final_mac_address,
-                    final_primary_channel,
-                    current_time,
-                    node_id,
-                ),
-            )
+def _upsert_node_info(
+    cursor: sqlite3.Cursor,
+    node_id: int,
+    current_time: float,
+    hex_id: str | None = None,
+    long_name: str | None = None,
+    short_name: str | None = None,
+    hw_model: str | None = None,
+    role: str | None = None,
+    is_licensed: bool | None = None,
+    mac_address: str | None = None,
+    primary_channel: str | None = None,
+) -> None:
+    """Insert a node_info row or merge non-None values into the existing one."""
+    # Get existing values from database if node exists
+    cursor.execute(
+        "SELECT hex_id, long_name, short_name, hw_model, role, is_licensed, mac_address, primary_channel, first_seen FROM node_info WHERE node_id = ?",
+        (node_id,),
+    )
+    existing = cursor.fetchone()
+
+    if existing:
+        # Node exists, merge values (keep existing values if new values are None)
+        (
+            existing_hex_id,
+            existing_long_name,
+            existing_short_name,
+            existing_hw_model,
+            existing_role,
+            existing_is_licensed,
+            existing_mac_address,
+            existing_primary_channel,
+            _first_seen,
+        ) = existing
+        final_hex_id = hex_id if hex_id is not None else existing_hex_id
+        final_long_name = long_name if long_name is not None else existing_long_name
+        final_short_name = short_name if short_name is not None else existing_short_name
+        final_hw_model = hw_model if hw_model is not None else existing_hw_model
+        final_role = role if role is not None else existing_role
+        final_is_licensed = (
+            is_licensed if is_licensed is not None else existing_is_licensed
+        )
+        final_mac_address = (
+            mac_address if mac_address is not None else existing_mac_address
+        )
+        final_primary_channel = (
+            primary_channel if primary_channel is not None else existing_primary_channel
+        )
 
-            logging.debug(
-                f"Updated existing node in database: {node_id} ({final_hex_id})"
-            )
-        else:
-            # New node, insert it
-            cursor.execute(
-                """
-                INSERT INTO node_info
-                (node_id, hex_id, long_name, short_name, hw_model, role,
-                 is_licensed, mac_address, primary_channel, first_seen, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    node_id,
-                    hex_id,
-                    long_name,
-                    short_name,
-                    hw_model,
-                    role,
-                    is_licensed,
-                    mac_address,
-                    primary_channel,
-                    current_time,
-                    current_time,
-                ),
-            )
+        cursor.execute(
+            """
+            UPDATE node_info
+            SET hex_id = ?, long_name = ?, short_name = ?, hw_model = ?, role = ?,
+                is_licensed = ?, mac_address = ?, primary_channel = ?, last_updated = ?
+            WHERE node_id = ?
+        """,
+            (
+                final_hex_id,
+                final_long_name,
+                final_short_name,
+                final_hw_model,
+                final_role,
+                final_is_licensed,
+                final_mac_address,
+                final_primary_channel,
+                current_time,
+                node_id,
+            ),
+        )
 
-            logging.debug(f"Added new node to database: {node_id} ({hex_id})")
+        logging.debug(f"Updated existing node in database: {node_id} ({final_hex_id})")
+    else:
+        # New node, insert it
+        cursor.execute(
+            """
+            INSERT INTO node_info
+            (node_id, hex_id, long_name, short_name, hw_model, role,
+             is_licensed, mac_address, primary_channel, first_seen, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+            (
+                node_id,
+                hex_id,
+                long_name,
+                short_name,
+                hw_model,
+                role,
+                is_licensed,
+                mac_address,
+                primary_channel,
+                current_time,
+                current_time,
+            ),
+        )
 
-        conn.commit()
-        conn.close()
+        logging.debug(f"Added new node to database: {node_id} ({hex_id})")
 
 
 def hex_id_to_numeric(hex_id: str) -> int | None:
@@ -672,16 +745,56 @@ def get_gateway_display_name(gateway_hex_id: str) -> str:
     return gateway_hex_id
 
 
-def log_packet_to_database(
+# Column order of the rows built by build_packet_row()
+PACKET_COLUMNS: tuple[str, ...] = (
+    "timestamp",
+    "topic",
+    "from_node_id",
+    "to_node_id",
+    "portnum",
+    "portnum_name",
+    "gateway_id",
+    "channel_id",
+    "mesh_packet_id",
+    "rssi",
+    "snr",
+    "hop_limit",
+    "hop_start",
+    "payload_length",
+    "raw_payload",
+    "processed_successfully",
+    "via_mqtt",
+    "want_ack",
+    "priority",
+    "delayed",
+    "channel_index",
+    "rx_time",
+    "pki_encrypted",
+    "next_hop",
+    "relay_node",
+    "tx_after",
+    "message_type",
+    "raw_service_envelope",
+    "parsing_error",
+)
+
+PACKET_INSERT_SQL = (
+    f"INSERT INTO packet_history ({', '.join(PACKET_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(PACKET_COLUMNS))})"
+)
+
+
+def build_packet_row(
     topic: str,
     service_envelope: Any | None,
     mesh_packet: Any | None,
     processed_successfully: bool = True,
     raw_service_envelope_data: bytes | None = None,
     parsing_error: str | None = None,
-) -> None:
-    """Log received packet to database for history tracking."""
-    current_time = time.time()
+    timestamp: float | None = None,
+) -> tuple[Any, ...]:
+    """Build the parameter tuple for PACKET_INSERT_SQL from a parsed envelope."""
+    current_time = time.time() if timestamp is None else timestamp
 
     from_node_id = getattr(mesh_packet, "from", None) if mesh_packet else None
     to_node_id = getattr(mesh_packet, "to", None) if mesh_packet else None
@@ -747,56 +860,86 @@ def log_packet_to_database(
     relay_node = getattr(mesh_packet, "relay_node", None) if mesh_packet else None
     tx_after = getattr(mesh_packet, "tx_after", None) if mesh_packet else None
 
+    return (
+        current_time,
+        topic,
+        from_node_id,
+        to_node_id,
+        portnum,
+        portnum_name,
+        gateway_id,
+        channel_id,
+        mesh_packet_id,
+        rssi,
+        snr,
+        hop_limit,
+        hop_start,
+        payload_length,
+        raw_payload,
+        processed_successfully,
+        via_mqtt,
+        want_ack,
+        priority,
+        delayed,
+        channel_index,
+        rx_time,
+        pki_encrypted,
+        next_hop,
+        relay_node,
+        tx_after,
+        message_type,
+        raw_service_envelope_data if CAPTURE_STORE_RAW else None,
+        parsing_error,
+    )
+
+
+def log_packet_to_database(
+    topic: str,
+    service_envelope: Any | None,
+    mesh_packet: Any | None,
+    processed_successfully: bool = True,
+    raw_service_envelope_data: bytes | None = None,
+    parsing_error: str | None = None,
+    neighbor_info: Any | None = None,
+    telemetry_report: Any | None = None,
+) -> None:
+    """Log received packet to database for history tracking.
+
+    The edges of a decoded *neighbor_info* report and the samples of a decoded
+    *telemetry_report* are stored in the same transaction.
+    """
+    row = build_packet_row(
+        topic,
+        service_envelope,
+        mesh_packet,
+        processed_successfully,
+        raw_service_envelope_data,
+        parsing_error,
+    )
+
     with db_lock:
         conn = _open_conn()
         cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO packet_history
-            (timestamp, topic, from_node_id, to_node_id, portnum, portnum_name,
-             gateway_id, channel_id, mesh_packet_id, rssi, snr, hop_limit, hop_start, payload_length,
-             raw_payload, processed_successfully, via_mqtt, want_ack, priority, delayed,
-             channel_index, rx_time, pki_encrypted, next_hop, relay_node, tx_after,
-             message_type, raw_service_envelope, parsing_error)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                current_time,
-                topic,
-                from_node_id,
-                to_node_id,
-                portnum,
-                portnum_name,
-                gateway_id,
-                channel_id,
-                mesh_packet_id,
-                rssi,
-                snr,
-                hop_limit,
-                hop_start,
-                payload_length,
-                raw_payload,
-                processed_successfully,
-                via_mqtt,
-                want_ack,
-                priority,
-                delayed,
-                channel_index,
-                rx_time,
-                pki_encrypted,
-                next_hop,
-                relay_node,
-                tx_after,
-                message_type,
-                raw_service_envelope_data if CAPTURE_STORE_RAW else None,
-                parsing_error,
-            ),
-        )
-
+        if partitions.is_enabled():
+            partitions.insert_packet(cursor, PACKET_COLUMNS, row)
+        else:
+            cursor.execute(PACKET_INSERT_SQL, row)
+        if neighbor_info is not None:
+            neighbors.upsert_edges(
+                cursor, neighbors.edges_from_info(neighbor_info, row[2], row[0])
+            )
+        if telemetry_report is not None:
+            telemetry.insert_samples(
+                cursor,
+                telemetry.samples_from_telemetry(telemetry_report, row[2], row[0]),
+            )
+        node_activity.record_packets(cursor, [(row[2], row[6], row[0])])
+        relays.record(cursor, relays.observations_from_rows(PACKET_COLUMNS, [row]))
         conn.commit()
         conn.close()
 
+    capture_stats.record_packet(row[2], row[0])
+
 
 def get_packet_history(
     limit: int = 100, node_id: int | None = None, portnum: int | None = None
@@ -827,45 +970,83 @@ def get_packet_history(
         return rows
 
 
-def get_node_statistics() -> dict[str, Any]:
-    """Get statistics about known nodes."""
+def seed_capture_stats() -> None:
+    """Seed the running packet counters from the database (call once at startup)."""
     with db_lock:
         conn = _open_conn()
-        cursor = conn.cursor()
-
-        # Total nodes
-        cursor.execute("SELECT COUNT(*) FROM node_info")
-        total_nodes = cursor.fetchone()[0]
+        try:
+            source = "packet_history"
+            if partitions.is_enabled():
+                partitions.refresh_layout(conn)
+                source = partitions.packet_source(time.time() - ACTIVE_WINDOW_SECONDS)
+            capture_stats.seed(conn.cursor(), source)
+        finally:
+            conn.close()
 
-        # Nodes with names
-        cursor.execute("SELECT COUNT(*) FROM node_info WHERE long_name IS NOT NULL")
-        nodes_with_long_names = cursor.fetchone()[0]
 
-        # Recent packet senders (last 24 hours)
-        twenty_four_hours_ago = time.time() - (24 * 3600)
-        cursor.execute(
-            """
-            SELECT COUNT(DISTINCT from_node_id)
-            FROM packet_history
-            WHERE timestamp > ? AND from_node_id IS NOT NULL
-        """,
-            (twenty_four_hours_ago,),
-        )
-        active_nodes_24h = cursor.fetchone()[0]
+def backfill_neighbor_edges() -> None:
+    """Fill an empty neighbor_edge table from the last week of stored reports."""
+    with db_lock:
+        conn = _open_conn()
+        try:
+            cursor = conn.cursor()
+            if not neighbors.is_empty(cursor):
+                return
+            since = time.time() - neighbors.BACKFILL_SECONDS
+            source = "packet_history"
+            if partitions.is_enabled():
+                partitions.refresh_layout(conn)
+                source = partitions.packet_source(since)
+            written = neighbors.rebuild(cursor, source, since)
+            conn.commit()
+            if written:
+                logging.info(f"Backfilled {written} neighbor edge reports")
+        finally:
+            conn.close()
 
-        # Total packets received
-        cursor.execute("SELECT COUNT(*) FROM packet_history")
-        total_packets = cursor.fetchone()[0]
 
-        conn.close()
+def get_node_statistics() -> dict[str, Any]:
+    """Get statistics about known nodes from the in-memory counters.
 
-        return {
-            "total_nodes": total_nodes,
-            "nodes_with_long_names": nodes_with_long_names,
-            "active_nodes_24h": active_nodes_24h,
-            "total_packets": total_packets,
-            "cache_size": len(node_cache),
-        }
+    ``node_cache`` mirrors ``node_info`` and ``capture_stats`` is updated on
+    every insert, so this does not touch the database.
+    """
+    nodes = list(node_cache.values())
+    return {
+        "total_nodes": len(nodes),
+        "nodes_with_long_names": sum(
+            1 for node in nodes if node.get("long_name") is not None
+        ),
+        "active_nodes_24h": capture_stats.active_nodes(),
+        "total_packets": capture_stats.total_packets,
+        "cache_size": len(nodes),
+    }
+
+
+def persist_capture_stats(stats: dict[str, Any] | None = None) -> None:
+    """Write the heartbeat statistics to the ``capture_stats`` row."""
+    stats = stats if stats is not None else get_node_statistics()
+    with db_lock:
+        conn = _open_conn()
+        try:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO capture_stats (
+                    id, total_nodes, nodes_with_long_names, active_nodes_24h,
+                    total_packets, updated_at
+                ) VALUES (1, ?, ?, ?, ?, ?)
+            """,
+                (
+                    stats["total_nodes"],
+                    stats["nodes_with_long_names"],
+                    stats["active_nodes_24h"],
+                    stats["total_packets"],
+                    time.time(),
+                ),
+            )
+            conn.commit()
+        finally:
+            conn.close()
 
 
 def format_hop_info(mesh_packet: Any) -> str:
@@ -914,54 +1095,59 @@ def on_connect(
             logging.error("Connection refused: Unknown reason.")
 
 
-def on_message(client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> None:
-    """Callback for when a PUBLISH message is received from the server."""
-    logging.debug(f"Received message on topic {msg.topic}: {len(msg.payload)} bytes")
+@dataclass
+class DecodedEnvelope:
+    """Result of parsing (and if needed decrypting) one raw ServiceEnvelope."""
 
-    # Skip JSON messages - we only want protobuf messages
-    if "/json/" in msg.topic:
-        logging.debug(f"Skipping JSON message on topic {msg.topic}")
-        return
+    service_envelope: Any | None = None
+    mesh_packet: Any | None = None
+    processed_successfully: bool = False
+    parsing_error: str | None = None
+    is_encrypted_packet: bool = False
+    decryption_successful: bool = False
+    # Parsed application payload: text, Position, User, Telemetry or
+    # NeighborInfo
+    payload: Any | None = None
+    # update_node_cache() keyword arguments for NODEINFO packets
+    node_info: dict[str, Any] | None = None
 
-    logging.debug(f"Processing protobuf message on topic {msg.topic}")
+    @property
+    def gateway_node_id(self) -> int | None:
+        """Numeric ID of the gateway that uploaded the envelope, if known."""
+        if self.mesh_packet is None or not self.service_envelope.gateway_id:
+            return None
+        return hex_id_to_numeric(self.service_envelope.gateway_id)
 
-    # Always store the raw message data first, regardless of parsing success
-    raw_service_envelope_data = msg.payload
-    service_envelope = None
-    mesh_packet = None
-    processed_successfully = False
-    parsing_error = None
 
-    # Extract message type from topic for logging
-    message_type = None
-    topic_parts = []
-    try:
-        topic_parts = msg.topic.split("/")
-        if len(topic_parts) >= 4:
-            message_type = topic_parts[3]  # Should be 'e', 'c', 'p', etc.
-            logging.debug(f"Message type from topic: {message_type}")
-    except Exception:
-        pass
+def decode_envelope(topic: str, payload: bytes) -> DecodedEnvelope:
+    """
+    Parse a raw ServiceEnvelope and decode its MeshPacket payload.
+
+    Shared by the live MQTT capture and the offline ingest tool. Neither the
+    node cache nor the database is touched; parsing failures are reported
+    through ``parsing_error`` instead of being raised.
+    """
+    decoded = DecodedEnvelope()
+    topic_parts = topic.split("/")
 
     try:
         # Attempt to parse the ServiceEnvelope
-        service_envelope = mqtt_pb2.ServiceEnvelope()
-        service_envelope.ParseFromString(msg.payload)
-        mesh_packet = service_envelope.packet
+        service_envelope = decoded.service_envelope = mqtt_pb2.ServiceEnvelope()
+        service_envelope.ParseFromString(payload)
+        mesh_packet = decoded.mesh_packet = service_envelope.packet
 
         from_node_id_numeric = getattr(mesh_packet, "from")
-        to_node_id_numeric = mesh_packet.to
 
         # Try to decrypt the packet if it appears to be encrypted
         # Check if this is an UNKNOWN_APP packet that might be encrypted
-        is_encrypted_packet = (
+        decoded.is_encrypted_packet = bool(
             hasattr(mesh_packet, "decoded")
             and mesh_packet.decoded.portnum == portnums_pb2.PortNum.UNKNOWN_APP
             and hasattr(mesh_packet, "encrypted")
             and mesh_packet.encrypted
         )
 
-        if is_encrypted_packet:
+        if decoded.is_encrypted_packet:
             logging.debug(
                 f"Attempting to decrypt UNKNOWN_APP packet {mesh_packet.id} from {from_node_id_numeric}"
             )
@@ -969,32 +1155,26 @@ def on_message(client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> Non
             # Extract channel name from topic if available (for key derivation)
             # Topic format: msh/region/gateway_id/message_type/channel_name/gateway_hex
             channel_name = ""
-            try:
-                if len(topic_parts) >= 5:
-                    # The 5th part (index 4) might be channel name like "LongFast"
-                    potential_channel = topic_parts[4]
-                    if not potential_channel.startswith("!"):
-                        channel_name = potential_channel
-                        logging.debug(f"Using channel name from topic: {channel_name}")
-            except Exception:
-                pass
-
-            # Try decryption with primary channel key (most common case)
-            decryption_successful = try_decrypt_mesh_packet(
-                mesh_packet, channel_name="", key_base64=DEFAULT_CHANNEL_KEY
+            if len(topic_parts) >= 5:
+                # The 5th part (index 4) might be channel name like "LongFast"
+                potential_channel = topic_parts[4]
+                if not potential_channel.startswith("!"):
+                    channel_name = potential_channel
+                    logging.debug(f"Using channel name from topic: {channel_name}")
+
+            # Try the default key (as is and derived with the channel name)
+            # and the configured channel keys, most recently successful first
+            key = _keyring().decrypt(
+                mesh_packet,
+                channel_name=channel_name,
+                channel_id=service_envelope.channel_id,
+                region=topic_parts[1] if len(topic_parts) >= 2 else "",
             )
+            decryption_successful = key is not None
+            if key is not None:
+                logging.debug(f"Decrypted packet {mesh_packet.id} with key {key.label}")
 
-            # If primary channel decryption failed and we have a channel name, try with channel-specific key
-            if not decryption_successful and channel_name:
-                logging.debug(
-                    f"Primary key failed, trying channel-specific key for: {channel_name}"
-                )
-                decryption_successful = try_decrypt_mesh_packet(
-                    mesh_packet,
-                    channel_name=channel_name,
-                    key_base64=DEFAULT_CHANNEL_KEY,
-                )
-
+            decoded.decryption_successful = decryption_successful
             if decryption_successful:
                 logging.info(
                     f"🔓 Successfully decrypted packet from {get_node_display_name(from_node_id_numeric)}"
@@ -1004,211 +1184,269 @@ def on_message(client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> Non
                     f"🔒 Could not decrypt packet {mesh_packet.id} from {from_node_id_numeric}"
                 )
 
-        # Update node cache with gateway hex ID if we can determine the numeric ID
-        if service_envelope.gateway_id:
-            gateway_numeric_id = hex_id_to_numeric(service_envelope.gateway_id)
-            if gateway_numeric_id and gateway_numeric_id not in node_cache:
-                # Add minimal entry for the gateway so we can track it
-                update_node_cache(
-                    node_id=gateway_numeric_id, hex_id=service_envelope.gateway_id
-                )
-
-        # Process different packet types
-        if mesh_packet.decoded.portnum == portnums_pb2.PortNum.TEXT_MESSAGE_APP:
-            text_content = mesh_packet.decoded.payload.decode("utf-8", errors="replace")
-            from_node_display = get_node_display_name(from_node_id_numeric)
-            to_node_display = (
-                get_node_display_name(to_node_id_numeric)
-                if to_node_id_numeric != 0 and to_node_id_numeric != 0xFFFFFFFF
-                else "Broadcast"
+        # Parse the application payload of the packet types we understand
+        portnum = mesh_packet.decoded.portnum
+        if portnum == portnums_pb2.PortNum.TEXT_MESSAGE_APP:
+            decoded.payload = mesh_packet.decoded.payload.decode(
+                "utf-8", errors="replace"
             )
 
-            # Build flags display
-            flags = []
-            if getattr(mesh_packet, "via_mqtt", False):
-                flags.append("via MQTT")
-            if getattr(mesh_packet, "want_ack", False):
-                flags.append("want ACK")
-            if getattr(mesh_packet, "pki_encrypted", False):
-                flags.append("PKI encrypted")
+        elif portnum == portnums_pb2.PortNum.POSITION_APP:
+            decoded.payload = mesh_pb2.Position()
+            decoded.payload.ParseFromString(mesh_packet.decoded.payload)
 
-            flags_str = f" ({', '.join(flags)})" if flags else ""
+        elif portnum == portnums_pb2.PortNum.NODEINFO_APP:
+            user = decoded.payload = mesh_pb2.User()
+            user.ParseFromString(mesh_packet.decoded.payload)
 
-            logging.info(
-                f"💬 Text message from {from_node_display} to {to_node_display}{flags_str}: {text_content[:50]}{'...' if len(text_content) > 50 else ''}"
+            hw_model_str = mesh_pb2.HardwareModel.Name(user.hw_model).replace(
+                "UNSET", "Unknown"
+            )
+            role_str = config_pb2.Config.DeviceConfig.Role.Name(user.role)
+            mac_address = (
+                user.macaddr.hex(":")
+                if hasattr(user, "macaddr") and user.macaddr
+                else None
             )
-            processed_successfully = True
+            decoded.node_info = {
+                "node_id": from_node_id_numeric,
+                "hex_id": user.id,
+                "long_name": user.long_name if user.long_name else None,
+                "short_name": user.short_name if user.short_name else None,
+                "hw_model": hw_model_str,
+                "role": role_str,
+                "is_licensed": user.is_licensed,
+                "mac_address": mac_address,
+                "primary_channel": service_envelope.channel_id,
+            }
 
-        elif mesh_packet.decoded.portnum == portnums_pb2.PortNum.POSITION_APP:
-            position_data = mesh_pb2.Position()
-            position_data.ParseFromString(mesh_packet.decoded.payload)
+        elif portnum == portnums_pb2.PortNum.TELEMETRY_APP:
+            decoded.payload = telemetry_pb2.Telemetry()
+            decoded.payload.ParseFromString(mesh_packet.decoded.payload)
 
-            lat = position_data.latitude_i / 1e7
-            lon = position_data.longitude_i / 1e7
-            alt = position_data.altitude
+        elif portnum == portnums_pb2.PortNum.NEIGHBORINFO_APP:
+            decoded.payload = mesh_pb2.NeighborInfo()
+            decoded.payload.ParseFromString(mesh_packet.decoded.payload)
 
-            from_node_display = get_node_display_name(from_node_id_numeric)
-            via_mqtt_str = (
-                " (via MQTT)" if getattr(mesh_packet, "via_mqtt", False) else ""
-            )
-            logging.info(
-                f"📍 Position from {from_node_display}{via_mqtt_str}: {lat:.5f}, {lon:.5f} (alt: {alt}m)"
-            )
-            processed_successfully = True
+        decoded.processed_successfully = True
 
-        elif mesh_packet.decoded.portnum == portnums_pb2.PortNum.NODEINFO_APP:
-            user = mesh_pb2.User()
-            user.ParseFromString(mesh_packet.decoded.payload)
+    except UnicodeDecodeError as e:
+        decoded.parsing_error = f"Unicode decode error: {str(e)}"
+        logging.warning(f"Could not decode payload as UTF-8 on topic {topic}: {e}")
+    except Exception as e:
+        decoded.parsing_error = f"Parsing error: {str(e)}"
+        logging.error(f"Error processing MQTT protobuf message on topic {topic}: {e}")
+        logging.debug(f"Raw payload length: {len(payload)} bytes")
 
-            node_id_from_payload = user.id
-            long_name = user.long_name
-            short_name = user.short_name
+    return decoded
 
-            hw_model_enum = user.hw_model
-            hw_model_str = mesh_pb2.HardwareModel.Name(hw_model_enum).replace(
-                "UNSET", "Unknown"
-            )
 
-            role_enum = user.role
-            role_str = config_pb2.Config.DeviceConfig.Role.Name(role_enum)
+def _log_packet_summary(decoded: DecodedEnvelope) -> None:
+    """Log a one-line, human readable summary of a decoded packet."""
+    mesh_packet = decoded.mesh_packet
+    from_node_id_numeric = getattr(mesh_packet, "from")
+    to_node_id_numeric = mesh_packet.to
+    portnum = mesh_packet.decoded.portnum
 
-            # Update node cache with received nodeinfo
-            mac_address = (
-                user.macaddr.hex(":")
-                if hasattr(user, "macaddr") and user.macaddr
-                else None
+    from_node_display = get_node_display_name(from_node_id_numeric)
+    via_mqtt_str = " (via MQTT)" if getattr(mesh_packet, "via_mqtt", False) else ""
+
+    if portnum == portnums_pb2.PortNum.TEXT_MESSAGE_APP:
+        text_content = decoded.payload
+        to_node_display = (
+            get_node_display_name(to_node_id_numeric)
+            if to_node_id_numeric != 0 and to_node_id_numeric != 0xFFFFFFFF
+            else "Broadcast"
+        )
+
+        # Build flags display
+        flags = []
+        if getattr(mesh_packet, "via_mqtt", False):
+            flags.append("via MQTT")
+        if getattr(mesh_packet, "want_ack", False):
+            flags.append("want ACK")
+        if getattr(mesh_packet, "pki_encrypted", False):
+            flags.append("PKI encrypted")
+
+        flags_str = f" ({', '.join(flags)})" if flags else ""
+
+        logging.info(
+            f"💬 Text message from {from_node_display} to {to_node_display}{flags_str}: {text_content[:50]}{'...' if len(text_content) > 50 else ''}"
+        )
+
+    elif portnum == portnums_pb2.PortNum.POSITION_APP:
+        position_data = decoded.payload
+        lat = position_data.latitude_i / 1e7
+        lon = position_data.longitude_i / 1e7
+        alt = position_data.altitude
+
+        logging.info(
+            f"📍 Position from {from_node_display}{via_mqtt_str}: {lat:.5f}, {lon:.5f} (alt: {alt}m)"
+        )
+
+    elif portnum == portnums_pb2.PortNum.NODEINFO_APP:
+        user = decoded.payload
+        logging.info(
+            f"ℹ️ NodeInfo for {user.id} from {from_node_display}{via_mqtt_str}: {user.long_name or user.short_name or 'No name'}"
+        )
+
+    elif portnum == portnums_pb2.PortNum.TELEMETRY_APP:
+        telemetry_data = decoded.payload
+        if telemetry_data.HasField("device_metrics"):
+            metrics = telemetry_data.device_metrics
+            battery = (
+                f"{metrics.battery_level}%"
+                if metrics.HasField("battery_level")
+                else "N/A"
             )
-            update_node_cache(
-                node_id=from_node_id_numeric,
-                hex_id=node_id_from_payload,
-                long_name=long_name if long_name else None,
-                short_name=short_name if short_name else None,
-                hw_model=hw_model_str,
-                role=role_str,
-                is_licensed=user.is_licensed,
-                mac_address=mac_address,
-                primary_channel=service_envelope.channel_id
-                if service_envelope
-                else None,
+            voltage = (
+                f"{metrics.voltage / 1000.0:.2f}V"
+                if metrics.HasField("voltage")
+                else "N/A"
             )
-
-            from_node_display = get_node_display_name(from_node_id_numeric)
-            via_mqtt_str = (
-                " (via MQTT)" if getattr(mesh_packet, "via_mqtt", False) else ""
+            logging.info(
+                f"📊 Device telemetry from {from_node_display}{via_mqtt_str}: Battery {battery}, Voltage {voltage}"
             )
+        elif telemetry_data.HasField("environment_metrics"):
+            metrics = telemetry_data.environment_metrics
+            temp = (
+                f"{metrics.temperature:.1f}°C"
+                if metrics.HasField("temperature")
+                else "N/A"
+            )
+            humidity = (
+                f"{metrics.relative_humidity:.1f}%"
+                if metrics.HasField("relative_humidity")
+                else "N/A"
+            )
+            logging.info(
+                f"📊 Environment telemetry from {from_node_display}{via_mqtt_str}: Temp {temp}, Humidity {humidity}"
+            )
+        else:
             logging.info(
-                f"ℹ️ NodeInfo for {node_id_from_payload} from {from_node_display}{via_mqtt_str}: {long_name or short_name or 'No name'}"
+                f"📊 Telemetry from {from_node_display}{via_mqtt_str}: Unknown type"
             )
-            processed_successfully = True
 
-        elif mesh_packet.decoded.portnum == portnums_pb2.PortNum.TELEMETRY_APP:
-            telemetry_data = telemetry_pb2.Telemetry()
-            telemetry_data.ParseFromString(mesh_packet.decoded.payload)
+    elif portnum == portnums_pb2.PortNum.MAP_REPORT_APP:
+        # Log MAP_REPORT packet (protobuf structure may not be available)
+        logging.info(
+            f"🗺️ MAP_REPORT from {from_node_display}{via_mqtt_str}: {len(mesh_packet.decoded.payload)} bytes"
+        )
 
-            from_node_display = get_node_display_name(from_node_id_numeric)
-            via_mqtt_str = (
-                " (via MQTT)" if getattr(mesh_packet, "via_mqtt", False) else ""
-            )
+    else:
+        port_name = portnums_pb2.PortNum.Name(portnum)
 
-            if telemetry_data.HasField("device_metrics"):
-                metrics = telemetry_data.device_metrics
-                battery = (
-                    f"{metrics.battery_level}%"
-                    if metrics.HasField("battery_level")
-                    else "N/A"
-                )
-                voltage = (
-                    f"{metrics.voltage / 1000.0:.2f}V"
-                    if metrics.HasField("voltage")
-                    else "N/A"
-                )
+        # If this is still UNKNOWN_APP after decryption attempt, note it
+        if portnum == portnums_pb2.PortNum.UNKNOWN_APP:
+            if decoded.is_encrypted_packet:
                 logging.info(
-                    f"📊 Device telemetry from {from_node_display}{via_mqtt_str}: Battery {battery}, Voltage {voltage}"
-                )
-            elif telemetry_data.HasField("environment_metrics"):
-                metrics = telemetry_data.environment_metrics
-                temp = (
-                    f"{metrics.temperature:.1f}°C"
-                    if metrics.HasField("temperature")
-                    else "N/A"
-                )
-                humidity = (
-                    f"{metrics.relative_humidity:.1f}%"
-                    if metrics.HasField("relative_humidity")
-                    else "N/A"
-                )
-                logging.info(
-                    f"📊 Environment telemetry from {from_node_display}{via_mqtt_str}: Temp {temp}, Humidity {humidity}"
+                    f"🔒 Encrypted packet {port_name} from {from_node_display}{via_mqtt_str} (decryption failed)"
                 )
             else:
                 logging.info(
-                    f"📊 Telemetry from {from_node_display}{via_mqtt_str}: Unknown type"
+                    f"📦 Unknown packet type {port_name} from {from_node_display}{via_mqtt_str}"
                 )
+        else:
+            logging.info(
+                f"📦 Packet type {port_name} from {from_node_display}{via_mqtt_str}: {len(mesh_packet.decoded.payload) if hasattr(mesh_packet.decoded, 'payload') else 0} bytes"
+            )
 
-            processed_successfully = True
 
-        elif mesh_packet.decoded.portnum == portnums_pb2.PortNum.MAP_REPORT_APP:
-            # Handle MAP_REPORT_APP packets specifically
-            from_node_display = get_node_display_name(from_node_id_numeric)
-            via_mqtt_str = (
-                " (via MQTT)" if getattr(mesh_packet, "via_mqtt", False) else ""
-            )
+def _record_decode_metrics(decoded: DecodedEnvelope) -> None:
+    portnum = "UNKNOWN_APP"
+    if decoded.mesh_packet is not None:
+        number = decoded.mesh_packet.decoded.portnum
+        try:
+            portnum = portnums_pb2.PortNum.Name(number)
+        except ValueError:
+            portnum = str(number)
 
-            # Log MAP_REPORT packet (protobuf structure may not be available)
-            logging.info(
-                f"🗺️ MAP_REPORT from {from_node_display}{via_mqtt_str}: {len(mesh_packet.decoded.payload)} bytes"
-            )
+    if decoded.processed_successfully:
+        MESSAGES_DECODED.inc(portnum)
+    else:
+        MESSAGES_FAILED.inc(portnum)
+    if decoded.is_encrypted_packet:
+        DECRYPT_ATTEMPTS.inc()
+        if decoded.decryption_successful:
+            DECRYPT_SUCCESSES.inc()
 
-            processed_successfully = True
 
-        else:
-            port_name = portnums_pb2.PortNum.Name(mesh_packet.decoded.portnum)
-            from_node_display = get_node_display_name(from_node_id_numeric)
-            via_mqtt_str = (
-                " (via MQTT)" if getattr(mesh_packet, "via_mqtt", False) else ""
-            )
+def on_message(client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> None:
+    """Callback for when a PUBLISH message is received from the server."""
+    logging.debug(f"Received message on topic {msg.topic}: {len(msg.payload)} bytes")
+    MESSAGES_RECEIVED.inc()
 
-            # If this is still UNKNOWN_APP after decryption attempt, note it
-            if mesh_packet.decoded.portnum == portnums_pb2.PortNum.UNKNOWN_APP:
-                if is_encrypted_packet:
-                    logging.info(
-                        f"🔒 Encrypted packet {port_name} from {from_node_display}{via_mqtt_str} (decryption failed)"
-                    )
-                else:
-                    logging.info(
-                        f"📦 Unknown packet type {port_name} from {from_node_display}{via_mqtt_str}"
-                    )
-            else:
-                logging.info(
-                    f"📦 Packet type {port_name} from {from_node_display}{via_mqtt_str}: {len(mesh_packet.decoded.payload) if hasattr(mesh_packet.decoded, 'payload') else 0} bytes"
+    # Skip JSON messages - we only want protobuf messages
+    if "/json/" in msg.topic:
+        logging.debug(f"Skipping JSON message on topic {msg.topic}")
+        return
+
+    logging.debug(f"Processing protobuf message on topic {msg.topic}")
+
+    # Extract message type from topic for logging
+    message_type = None
+    try:
+        topic_parts = msg.topic.split("/")
+        if len(topic_parts) >= 4:
+            message_type = topic_parts[3]  # Should be 'e', 'c', 'p', etc.
+            logging.debug(f"Message type from topic: {message_type}")
+    except Exception:
+        pass
+
+    # The raw message data is always stored, regardless of parsing success
+    decoded = decode_envelope(msg.topic, msg.payload)
+
+    if decoded.processed_successfully:
+        try:
+            # Update node cache with gateway hex ID if we can determine the numeric ID
+            gateway_numeric_id = decoded.gateway_node_id
+            if gateway_numeric_id and gateway_numeric_id not in node_cache:
+                # Add minimal entry for the gateway so we can track it
+                update_node_cache(
+                    node_id=gateway_numeric_id,
+                    hex_id=decoded.service_envelope.gateway_id,
                 )
-            processed_successfully = True
 
-    except UnicodeDecodeError as e:
-        parsing_error = f"Unicode decode error: {str(e)}"
-        logging.warning(f"Could not decode payload as UTF-8 on topic {msg.topic}: {e}")
-    except Exception as e:
-        parsing_error = f"Parsing error: {str(e)}"
-        logging.error(
-            f"Error processing MQTT protobuf message on topic {msg.topic}: {e}"
-        )
-        logging.debug(f"Raw payload length: {len(msg.payload)} bytes")
+            # Update node cache with received nodeinfo
+            if decoded.node_info is not None:
+                update_node_cache(**decoded.node_info)
+
+            _log_packet_summary(decoded)
+        except Exception as e:
+            decoded.processed_successfully = False
+            decoded.parsing_error = f"Parsing error: {str(e)}"
+            logging.error(
+                f"Error processing MQTT protobuf message on topic {msg.topic}: {e}"
+            )
+
+    _record_decode_metrics(decoded)
 
     # Always log packet to database, regardless of parsing success
+    write_started = time.perf_counter()
     try:
         log_packet_to_database(
             msg.topic,
-            service_envelope,
-            mesh_packet,
-            processed_successfully,
-            raw_service_envelope_data,
-            parsing_error,
+            decoded.service_envelope,
+            decoded.mesh_packet,
+            decoded.processed_successfully,
+            msg.payload,
+            decoded.parsing_error,
+            neighbor_info=decoded.payload
+            if decoded.processed_successfully
+            and isinstance(decoded.payload, mesh_pb2.NeighborInfo)
+            else None,
+            telemetry_report=decoded.payload
+            if decoded.processed_successfully
+            and isinstance(decoded.payload, telemetry_pb2.Telemetry)
+            else None,
         )
     except Exception as db_error:
+        DB_WRITE_ERRORS.inc()
         logging.error(f"Failed to log packet to database: {db_error}")
+    DB_WRITE_SECONDS.observe(time.perf_counter() - write_started)
 
     # Log statistics for different message types
-    if message_type and processed_successfully:
+    if message_type and decoded.processed_successfully:
         if message_type == "e":
             logging.debug("📧 Processed encrypted message")
         elif message_type == "c":
@@ -1267,8 +1505,98 @@ def on_disconnect(
 
 
 # --- Main ---
+def _persist_heartbeat(stats: dict[str, Any]) -> None:
+    try:
+        persist_capture_stats(stats)
+    except sqlite3.Error as e:
+        logging.warning(f"Could not persist capture statistics: {e}")
+
+
+def maintain_partitions() -> None:
+    """Create upcoming weekly partitions and drop expired ones."""
+    if not partitions.is_enabled():
+        return
+    with db_lock:
+        conn = _open_conn()
+        try:
+            partitions.maintain(conn, time.time())
+        except sqlite3.Error as e:
+            logging.warning(f"Partition maintenance failed: {e}")
+        finally:
+            conn.close()
+
+
+def refresh_telemetry_rollups(since: float | None = None) -> None:
+    """Recompute the telemetry rollups for the samples written since the last
+    refresh (or from *since*)."""
+    if since is None:
+        since = telemetry.take_dirty()
+        if since is None:
+            return
+    with db_lock:
+        conn = _open_conn()
+        try:
+            telemetry.refresh_rollups(conn.cursor(), since)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _telemetry_rollup_loop() -> None:
+    while True:
+        time.sleep(TELEMETRY_ROLLUP_INTERVAL_SECONDS)
+        try:
+            refresh_telemetry_rollups()
+        except Exception as e:
+            logging.error(f"Telemetry rollup failed: {e}")
+
+
+def refresh_node_activity() -> None:
+    """Recount the 24 hour packet counts on node_info and drop the hourly
+    relay buckets past their retention."""
+    with db_lock:
+        conn = _open_conn()
+        try:
+            source = "packet_history"
+            if partitions.is_enabled():
+                partitions.refresh_layout(conn)
+                source = partitions.packet_source(
+                    time.time() - node_activity.WINDOW_SECONDS
+                )
+            node_activity.refresh(conn.cursor(), source=source)
+            relays.prune(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _node_activity_loop() -> None:
+    while True:
+        time.sleep(NODE_ACTIVITY_REFRESH_SECONDS)
+        try:
+            refresh_node_activity()
+        except Exception as e:
+            logging.error(f"Node activity refresh failed: {e}")
+
+
+def _archive_loop() -> None:
+    """Move packets older than the hot window into the monthly archives."""
+    while True:
+        try:
+            tiering.move_aged_packets(_database_file(), lock=db_lock)
+        except Exception as e:
+            logging.error(f"Failed to archive aged packets: {e}")
+        time.sleep(max(_config().archive_interval_seconds, 60))
+
+
 def main() -> None:
     """Main function to start the MQTT client."""
+    cfg = configure()
+    # Logging configuration – falls back to INFO if an invalid level was supplied
+    logging.basicConfig(
+        level=getattr(logging, cfg.log_level.upper(), logging.INFO),
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
     logging.info("Starting Meshtastic MQTT to SQLite capture tool...")
 
     # Initialize database and load node cache
@@ -1276,6 +1604,50 @@ def main() -> None:
     init_database()
     load_node_cache()
 
+    tiering.configure(cfg)
+    partitions.configure(cfg)
+    if partitions.is_enabled():
+        logging.info("Writing packets to weekly packet_history partitions")
+        maintain_partitions()
+    if tiering.is_enabled():
+        logging.info(
+            f"Storage tiering enabled: keeping {cfg.hot_retention_days} days of "
+            f"packets in {cfg.database_file}, older ones in "
+            f"{tiering.archive_directory(cfg.database_file)}"
+        )
+        threading.Thread(target=_archive_loop, name="archiver", daemon=True).start()
+    seed_capture_stats()
+    backfill_neighbor_edges()
+
+    # Catch up with samples written since the last rollup, then keep up
+    conn = _open_conn()
+    try:
+        rollup_since = telemetry.rollup_watermark(conn.cursor())
+    finally:
+        conn.close()
+    refresh_telemetry_rollups(rollup_since)
+    threading.Thread(
+        target=_telemetry_rollup_loop, name="telemetry-rollups", daemon=True
+    ).start()
+
+    # Packets counted before a restart may have aged out meanwhile
+    refresh_node_activity()
+    threading.Thread(
+        target=_node_activity_loop, name="node-activity", daemon=True
+    ).start()
+
+    if cfg.capture_metrics_port:
+        try:
+            metrics.start_http_server(
+                cfg.capture_metrics_port, cfg.capture_metrics_host
+            )
+            logging.info(
+                f"Serving metrics on http://{cfg.capture_metrics_host}:"
+                f"{cfg.capture_metrics_port}/metrics"
+            )
+        except OSError as e:
+            logging.error(f"Could not start metrics listener: {e}")
+
     # Initialize MQTT Client
     mqtt_client = mqtt.Client(CallbackAPIVersion.VERSION2)
 
@@ -1315,6 +1687,7 @@ def main() -> None:
     logging.info(
         f"Database stats: {stats['total_nodes']} nodes, {stats['total_packets']} packets, {stats['active_nodes_24h']} active nodes (24h)"
     )
+    _persist_heartbeat(stats)
 
     try:
         # Keep the main thread alive
@@ -1324,6 +1697,8 @@ def main() -> None:
             logging.info(
                 f"Stats: {stats['total_nodes']} nodes, {stats['total_packets']} packets, {stats['active_nodes_24h']} active (24h)"
             )
+            _persist_heartbeat(stats)
+            maintain_partitions()
     except KeyboardInterrupt:
         logging.info("Script interrupted by user. Shutting down...")
     finally:
@@ -2,34 +2,47 @@
 API routes for the Meshtastic Mesh Health Web UI
 """
 
+import itertools
 import json
 import logging
 import time
 from typing import Any
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 
+from ..config import get_config
 from ..database import (
     ChatRepository,
     DashboardRepository,
     LocationRepository,
     NodeRepository,
     PacketRepository,
+    TelemetryRepository,
     TracerouteRepository,
     get_db_connection,
+    telemetry,
 )
 from ..models.traceroute import TraceroutePacket
 from ..services.analytics_service import AnalyticsService
 from ..services.location_service import LocationService
 from ..services.meshtastic_service import MeshtasticService
 from ..services.node_service import NodeService
+from ..services.relay_service import RelayService
 from ..services.traceroute_service import TracerouteService
+from ..utils.export_utils import (
+    EXPORT_FORMATS,
+    iter_csv,
+    iter_ndjson,
+    iter_parquet,
+    parquet_available,
+)
 from ..utils.node_utils import (
     convert_node_id,
     get_bulk_node_names,
     get_bulk_node_short_names,
 )
 from ..utils.params import (
+    get_allowed_str,
     get_bool_arg,
     get_int_arg,
     get_iso_ts,
@@ -348,6 +361,12 @@ def api_nodes_search():
     try:
         query = get_str_arg(request, "q", default="", max_len=128)
         limit = get_int_arg(request, "limit", default=20, min_val=1, max_val=100)
+        popular_by = get_allowed_str(
+            request,
+            "order_by",
+            allowed=["packet_count_24h", "gateway_packet_count_24h"],
+            default="packet_count_24h",
+        )
 
         # Check if database tables exist before calling NodeRepository
         db_ready = False
@@ -369,7 +388,7 @@ def api_nodes_search():
                     result = NodeRepository.get_nodes(
                         limit=limit,
                         offset=0,
-                        order_by="packet_count_24h",  # Order by activity
+                        order_by=popular_by,  # Order by activity
                         order_dir="desc",
                     )
                     nodes = result["nodes"]
@@ -402,7 +421,7 @@ def api_nodes_search():
                     limit=limit,
                     offset=0,
                     search=query,
-                    order_by="packet_count_24h",  # Order by activity
+                    order_by="relevance",  # Exact, prefix, then by activity
                     order_dir="desc",
                 )
                 nodes = result["nodes"]
@@ -432,6 +451,27 @@ def api_nodes_search():
         return jsonify({"error": str(e)}), 500
 
 
+@api_bp.route("/nodes/sync")
+def api_nodes_sync():
+    """API endpoint for incremental node directory sync.
+
+    Returns the nodes changed after version ``since`` (0 for all of them) and
+    the ids of deleted nodes. Clients store the returned ``version`` and
+    ``epoch``, ask again while ``more`` is true, and start over from 0 when
+    the epoch changes or the returned ``since`` is not the one they sent.
+    """
+    try:
+        since = get_int_arg(request, "since", default=0, min_val=0)
+        limit = get_int_arg(request, "limit", default=5000, min_val=1, max_val=20000)
+        data = NodeRepository.get_node_changes(since=since, limit=limit)
+        if data is None:
+            return jsonify({"error": "Node sync is not available"}), 503
+        return jsonify(data)
+    except Exception as e:
+        logger.error(f"Error in API nodes sync: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @api_bp.route("/gateways")
 def api_gateways():
     """API endpoint for gateway list."""
@@ -904,6 +944,111 @@ def api_node_neighbors(node_id):
         return jsonify({"error": str(e)}), 500
 
 
+@api_bp.route("/node/<node_id>/telemetry")
+def api_node_telemetry(node_id):
+    """API endpoint for a node's telemetry series, downsampled for charting.
+
+    Query params: ``metric`` (repeatable, e.g. ``device.battery_level``; all
+    metrics if omitted), ``start``/``end`` (ISO 8601) or ``hours`` (default 24),
+    ``resolution`` (``auto``, ``raw`` or a rollup size in seconds) and
+    ``max_points`` per metric for ``auto``.
+    """
+    logger.info(f"API node telemetry endpoint accessed for node {node_id}")
+    try:
+        node_id_int = convert_node_id(node_id)
+        end_time = get_iso_ts(request, "end") or time.time()
+        start_time = get_iso_ts(request, "start")
+        if start_time is None:
+            hours = get_int_arg(request, "hours", default=24, min_val=1, max_val=24 * 3650)
+            start_time = end_time - hours * 3600
+        if start_time >= end_time:
+            return jsonify({"error": "start must be before end"}), 400
+
+        requested = get_allowed_str(
+            request,
+            "resolution",
+            allowed=["auto", "raw", *(str(r) for r in telemetry.RESOLUTIONS)],
+            default="auto",
+        )
+        if requested == "auto":
+            max_points = get_int_arg(
+                request,
+                "max_points",
+                default=telemetry.MAX_POINTS,
+                min_val=10,
+                max_val=telemetry.MAX_POINTS,
+            )
+            resolution = telemetry.choose_resolution(end_time - start_time, max_points)
+        else:
+            resolution = 0 if requested == "raw" else int(requested)
+
+        metrics = [m for m in request.args.getlist("metric") if m] or None
+        series = TelemetryRepository.get_series(
+            node_id_int,
+            metrics=metrics,
+            start_time=start_time,
+            end_time=end_time,
+            resolution=resolution,
+        )
+        return safe_jsonify(
+            {
+                "node_id": node_id_int,
+                "resolution": resolution or "raw",
+                "start_time": start_time,
+                "end_time": end_time,
+                "metrics": TelemetryRepository.get_metric_names(node_id_int),
+                "series": series,
+            }
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in API node telemetry: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@api_bp.route("/node/<node_id>/relays")
+def api_node_relays(node_id):
+    """API endpoint for the gateways, relays and next hops a node's packets
+    went through, from the relay_node / next_hop header fields.
+
+    Query params: ``hours`` (default 24).
+    """
+    logger.info(f"API node relays endpoint accessed for node {node_id}")
+    try:
+        node_id_int = convert_node_id(node_id)
+        hours = get_int_arg(request, "hours", default=24, min_val=1, max_val=24 * 3650)
+        return safe_jsonify(RelayService.get_node_relay_paths(node_id_int, hours=hours))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in API node relays: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@api_bp.route("/relays")
+def api_relays():
+    """API endpoint for the busiest relays and estimated last-hop links.
+
+    Query params: ``hours`` (default 24), ``gateway_id`` and ``limit``.
+    """
+    logger.info("API relays endpoint accessed")
+    try:
+        hours = get_int_arg(request, "hours", default=24, min_val=1, max_val=24 * 3650)
+        limit = get_int_arg(request, "limit", default=25, min_val=1, max_val=500)
+        gateway_id = get_str_arg(request, "gateway_id") or None
+        return safe_jsonify(
+            RelayService.get_relay_analysis(
+                hours=hours, gateway_id=gateway_id, limit=limit
+            )
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in API relays: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @api_bp.route("/longest-links")
 def api_longest_links():
     """API endpoint for longest links analysis."""
@@ -1244,6 +1389,72 @@ def api_traceroute_graph():
         return jsonify({"error": str(e)}), 500
 
 
+def _packet_filters_from_request() -> dict[str, Any]:
+    """Build PacketRepository filters from the packet browser query parameters."""
+    filters: dict[str, Any] = {}
+    gateway_id_arg = request.args.get("gateway_id")
+    node_id_for_gateway: int | None = None
+    if gateway_id_arg:
+        try:
+            node_id_for_gateway = convert_node_id(gateway_id_arg)
+            gateway_hex = f"!{node_id_for_gateway:08x}"
+            filters["gateway_id"] = gateway_hex
+        except ValueError:
+            # Fallback to use raw string if conversion fails (legacy)
+            filters["gateway_id"] = gateway_id_arg
+    from_node = get_int_arg(request, "from_node", default=0, min_val=0, max_val=2**32 - 1)
+    if from_node:
+        filters["from_node"] = from_node
+    to_node = get_int_arg(request, "to_node", default=0, min_val=0, max_val=2**32 - 1)
+    if to_node:
+        filters["to_node"] = to_node
+    portnum = get_str_arg(request, "portnum", default="", max_len=32, pattern=r"[\w.-]+")
+    if portnum:
+        filters["portnum"] = portnum
+    if request.args.get("min_rssi") is not None:
+        filters["min_rssi"] = get_int_arg(request, "min_rssi", default=0, min_val=-200, max_val=0)
+    hop_count = get_int_arg(request, "hop_count", default=-1, min_val=0, max_val=100)
+    if hop_count >= 0:
+        filters["hop_count"] = hop_count
+
+    # New: primary_channel filter (packet channel_id)
+    primary_channel = get_str_arg(request, "primary_channel", default="", max_len=64)
+    if primary_channel:
+        filters["primary_channel"] = primary_channel
+
+    # ------------------------------------------------------------------
+    # Generic exclusion filters (exclude_from, exclude_to)
+    # ------------------------------------------------------------------
+    exclude_from = get_int_arg(request, "exclude_from", default=0, min_val=0, max_val=2**32 - 1)
+    if exclude_from:
+        filters["exclude_from"] = exclude_from
+    exclude_to = get_int_arg(request, "exclude_to", default=0, min_val=0, max_val=2**32 - 1)
+    if exclude_to:
+        filters["exclude_to"] = exclude_to
+
+    # Special convenience flag to exclude self-reported gateway messages
+    exclude_self_flag = get_bool_arg(request, "exclude_self", default=False)
+    if exclude_self_flag and gateway_id_arg:
+        try:
+            if node_id_for_gateway is None:
+                from ..utils.node_utils import convert_node_id as _cni
+
+                node_id_for_gateway = _cni(gateway_id_arg)
+            filters["exclude_from"] = node_id_for_gateway
+        except ValueError:
+            pass
+
+    # Handle time filters
+    start_ts = get_iso_ts(request, "start_time")
+    end_ts = get_iso_ts(request, "end_time")
+    if start_ts is not None:
+        filters["start_time"] = start_ts
+    if end_ts is not None:
+        filters["end_time"] = end_ts
+
+    return filters
+
+
 @api_bp.route("/packets/data", methods=["GET"])
 def api_packets_data():
     """Modern table endpoint for packets with structured JSON response."""
@@ -1259,66 +1470,7 @@ def api_packets_data():
         group_packets = get_bool_arg(request, "group_packets", default=False)
 
         # Build filters from query parameters
-        filters: dict[str, Any] = {}
-        gateway_id_arg = request.args.get("gateway_id")
-        node_id_for_gateway: int | None = None
-        if gateway_id_arg:
-            try:
-                node_id_for_gateway = convert_node_id(gateway_id_arg)
-                gateway_hex = f"!{node_id_for_gateway:08x}"
-                filters["gateway_id"] = gateway_hex
-            except ValueError:
-                # Fallback to use raw string if conversion fails (legacy)
-                filters["gateway_id"] = gateway_id_arg
-        from_node = get_int_arg(request, "from_node", default=0, min_val=0, max_val=2**32 - 1)
-        if from_node:
-            filters["from_node"] = from_node
-        to_node = get_int_arg(request, "to_node", default=0, min_val=0, max_val=2**32 - 1)
-        if to_node:
-            filters["to_node"] = to_node
-        portnum = get_str_arg(request, "portnum", default="", max_len=32, pattern=r"[\w.-]+")
-        if portnum:
-            filters["portnum"] = portnum
-        if request.args.get("min_rssi") is not None:
-            filters["min_rssi"] = get_int_arg(request, "min_rssi", default=0, min_val=-200, max_val=0)
-        hop_count = get_int_arg(request, "hop_count", default=-1, min_val=0, max_val=100)
-        if hop_count >= 0:
-            filters["hop_count"] = hop_count
-
-        # New: primary_channel filter (packet channel_id)
-        primary_channel = get_str_arg(request, "primary_channel", default="", max_len=64)
-        if primary_channel:
-            filters["primary_channel"] = primary_channel
-
-        # ------------------------------------------------------------------
-        # Generic exclusion filters (exclude_from, exclude_to)
-        # ------------------------------------------------------------------
-        exclude_from = get_int_arg(request, "exclude_from", default=0, min_val=0, max_val=2**32 - 1)
-        if exclude_from:
-            filters["exclude_from"] = exclude_from
-        exclude_to = get_int_arg(request, "exclude_to", default=0, min_val=0, max_val=2**32 - 1)
-        if exclude_to:
-            filters["exclude_to"] = exclude_to
-
-        # Special convenience flag to exclude self-reported gateway messages
-        exclude_self_flag = get_bool_arg(request, "exclude_self", default=False)
-        if exclude_self_flag and gateway_id_arg:
-            try:
-                if node_id_for_gateway is None:
-                    from ..utils.node_utils import convert_node_id as _cni
-
-                    node_id_for_gateway = _cni(gateway_id_arg)
-                filters["exclude_from"] = node_id_for_gateway
-            except ValueError:
-                pass
-
-        # Handle time filters
-        start_ts = get_iso_ts(request, "start_time")
-        end_ts = get_iso_ts(request, "end_time")
-        if start_ts is not None:
-            filters["start_time"] = start_ts
-        if end_ts is not None:
-            filters["end_time"] = end_ts
+        filters = _packet_filters_from_request()
 
         # Map sort fields for computed columns
         sort_field_mapping = {
@@ -1502,6 +1654,58 @@ def api_packets_data():
         return jsonify({"error": str(e), "data": [], "total_count": 0}), 500
 
 
+@api_bp.route("/packets/export", methods=["GET"])
+def api_packets_export():
+    """Stream packets matching the packet browser filters as CSV/NDJSON/Parquet.
+
+    Rows are written in packet id order. To resume an interrupted or capped
+    export, pass the ``id`` of the last exported row as ``cursor``; the
+    headers go out before the rows, so they cannot carry it.
+    """
+    export_format = get_allowed_str(
+        request, "format", allowed=EXPORT_FORMATS, default="csv"
+    )
+    if export_format == "parquet" and not parquet_available():
+        return jsonify({"error": "Parquet export requires the pyarrow package"}), 400
+
+    try:
+        max_rows = max(1, int(get_config().export_max_rows))
+        limit = get_int_arg(request, "limit", default=max_rows, min_val=1, max_val=max_rows)
+        cursor = get_int_arg(request, "cursor", default=0, min_val=0, max_val=2**63 - 1)
+        search = get_str_arg(request, "search", default="", max_len=128)
+        filters = _packet_filters_from_request()
+
+        batches = PacketRepository.iter_packets_for_export(
+            filters=filters, search=search, after_id=cursor, max_rows=limit
+        )
+        # Run the query before the response starts so errors still map to a 500
+        first_batch = next(batches, [])
+        batches = itertools.chain([first_batch], batches)
+    except Exception as e:
+        logger.error(f"Error in API packets export: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    columns = PacketRepository.EXPORT_COLUMNS
+    if export_format == "ndjson":
+        chunks = iter_ndjson(batches)
+    elif export_format == "parquet":
+        chunks = iter_parquet(batches, columns)
+    else:
+        chunks = iter_csv(batches, columns)
+
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"packets-{time.strftime('%Y%m%d-%H%M%S')}.{extension}"
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+            "X-Export-Row-Limit": str(limit),
+        },
+    )
+
+
 @api_bp.route("/nodes/data", methods=["GET"])
 def api_nodes_data():
     """Modern table endpoint for nodes with structured JSON response."""
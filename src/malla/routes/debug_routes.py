@@ -11,7 +11,9 @@ import time
 from collections import deque
 from typing import Any
 
-from flask import Blueprint, Response, current_app, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, render_template, request
+
+from ..database import profiler
 
 debug_bp = Blueprint("debug", __name__, url_prefix="/__debug")
 
@@ -84,3 +86,29 @@ def ui() -> Response:
         return Response(status=403)
     # Minimal JSON view; consumers can poll /__debug/logs
     return jsonify({"message": "Browser debug enabled", "endpoint": "/__debug/logs"})
+
+
+@debug_bp.route("/queries")
+def queries() -> Response | str:
+    """Top SQL statements by total time across all workers (needs query_profiler)."""
+    if not _enabled() or not _check_token():
+        return Response(status=403)
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), 500))
+    except ValueError:
+        limit = 50
+    data = profiler.top_queries(limit, request.args.get("order_by", "total_ms"))
+    data["enabled"] = profiler.is_enabled()
+    if request.args.get("format") == "json":
+        return jsonify(data)
+    return render_template(
+        "debug_queries.html", token=request.args.get("token", ""), **data
+    )
+
+
+@debug_bp.route("/queries/reset", methods=["POST"])
+def queries_reset() -> Response:
+    if not _enabled() or not _check_token():
+        return Response(status=403)
+    profiler.reset_stats()
+    return jsonify({"reset": True})
@@ -0,0 +1,31 @@
+"""
+Prometheus metrics endpoint.
+
+Only registered when ``metrics_enabled`` is set.  Gunicorn workers share their
+values through snapshots in ``metrics_dir`` so every scrape sees the totals of
+all workers, whichever one answers it.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+from flask import Blueprint, Response, current_app
+
+from .. import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def metrics_dir() -> str:
+    cfg = current_app.config.get("APP_CONFIG")
+    return getattr(cfg, "metrics_dir", "") or os.path.join(
+        tempfile.gettempdir(), "malla-metrics"
+    )
+
+
+@metrics_bp.route("/metrics")
+def prometheus_metrics() -> Response:
+    body = metrics.render_directory(metrics_dir())
+    return Response(body, mimetype=None, content_type=metrics.CONTENT_TYPE)
@@ -2,16 +2,22 @@
 Packet-related routes for the Meshtastic Mesh Health Web UI
 """
 
+import hashlib
+import json
 import logging
+import threading
+from collections import OrderedDict
 from datetime import UTC, datetime
 from typing import Any
 
 from flask import Blueprint, render_template, request
 
+from .. import warmup
 from ..database.connection import get_db_connection
 
 # Import from the new modular architecture
 from ..database.repositories import LocationRepository
+from ..metrics import record_cache
 from ..models.traceroute import TraceroutePacket
 from ..utils.node_utils import (
     get_bulk_node_names,
@@ -22,6 +28,16 @@ logger = logging.getLogger(__name__)
 
 packet_bp = Blueprint("packet", __name__)
 
+# Decoded payloads of recently viewed packets, as JSON text keyed by
+# (packet id, portnum, payload digest); popular packet pages skip the parse
+DECODE_CACHE_SIZE = 1024
+_decode_cache: OrderedDict[tuple[Any, str, bytes], str] = OrderedDict()
+_decode_cache_lock = threading.Lock()
+
+# Protobuf classes discovered in the meshtastic package, and per portnum
+_message_classes: dict[str, Any] | None = None
+_portnum_message_classes: dict[str, Any] | None = None
+
 
 def get_packet_details(packet_id: int) -> dict[str, Any] | None:
     """Get comprehensive details for a specific packet including all receptions."""
@@ -763,7 +779,16 @@ def protobuf_message_to_dict(message: Any) -> dict[str, Any] | None:
 
 
 def get_all_protobuf_message_classes() -> dict[str, Any]:
-    """Dynamically discover all available protobuf message classes from the Meshtastic package."""
+    """
+    Dynamically discover all available protobuf message classes from the Meshtastic package.
+
+    The modules are scanned once per process (a failed scan is retried on the
+    next call); the result is shared, do not modify it.
+    """
+    global _message_classes
+    if _message_classes is not None:
+        return _message_classes
+
     try:
         import inspect
 
@@ -791,6 +816,7 @@ def get_all_protobuf_message_classes() -> dict[str, Any]:
                 print(f"Warning: Could not import {module_name}: {e}")
                 continue
 
+        _message_classes = all_message_classes
         return all_message_classes
 
     except Exception as e:
@@ -798,64 +824,67 @@ def get_all_protobuf_message_classes() -> dict[str, Any]:
         return {}
 
 
+# Portnum name -> protobuf message class name (None: plain text or custom format)
+PORTNUM_MESSAGE_CLASS_NAMES: dict[str, str | None] = {
+    "TEXT_MESSAGE_APP": None,  # Special case - plain text, not protobuf
+    "TEXT_MESSAGE_COMPRESSED_APP": "Compressed",  # From mesh_pb2
+    "REMOTE_HARDWARE_APP": "HardwareMessage",  # From remote_hardware_pb2
+    "POSITION_APP": "Position",  # From mesh_pb2
+    "NODEINFO_APP": "User",  # From mesh_pb2
+    "ROUTING_APP": "Routing",  # From mesh_pb2
+    "ADMIN_APP": "AdminMessage",  # From admin_pb2
+    "WAYPOINT_APP": "Waypoint",  # From mesh_pb2
+    "AUDIO_APP": None,  # Custom format - no standard protobuf
+    "DETECTION_SENSOR_APP": None,  # Custom format
+    "REPLY_APP": None,  # Custom format
+    "IP_TUNNEL_APP": None,  # Custom format
+    "SERIAL_APP": None,  # Custom format
+    "STORE_FORWARD_APP": "StoreAndForward",  # From storeforward_pb2
+    "RANGE_TEST_APP": None,  # Custom format
+    "TELEMETRY_APP": "Telemetry",  # From telemetry_pb2
+    "ZPS_APP": None,  # Custom format
+    "SIMULATOR_APP": None,  # Custom format
+    "TRACEROUTE_APP": "RouteDiscovery",  # From mesh_pb2
+    "NEIGHBORINFO_APP": "NeighborInfo",  # From mesh_pb2
+    "ATAK_PLUGIN": None,  # Custom format
+    "MAP_REPORT_APP": "MapReport",  # From mesh_pb2 (discovered!)
+    "POWERSTRESS_APP": "PowerStressMessage",  # From mesh_pb2 (discovered!)
+    "ATAK_FORWARDER": None,  # Custom format
+    "PAXCOUNTER_APP": "Paxcount",  # From paxcount_pb2
+    "PRIVATE_APP": None,  # Custom format
+    "RETICULUM_TUNNEL_APP": None,  # Custom format
+    "ALERT_APP": None,  # Custom format or not available
+    "UNKNOWN_APP": None,
+    "MAX": None,
+}
+
+
 def get_protobuf_message_class_for_portnum(portnum_name: str) -> Any | None:
     """Get the appropriate protobuf message class for a given portnum using dynamic discovery."""
+    global _portnum_message_classes
     try:
-        # Get all available message classes
-        all_classes = get_all_protobuf_message_classes()
-
-        # Enhanced mapping that uses the dynamically discovered classes
-        # This maps portnum names to the most likely message class names
-        portnum_to_class_name: dict[str, str | None] = {
-            "TEXT_MESSAGE_APP": None,  # Special case - plain text, not protobuf
-            "TEXT_MESSAGE_COMPRESSED_APP": "Compressed",  # From mesh_pb2
-            "REMOTE_HARDWARE_APP": "HardwareMessage",  # From remote_hardware_pb2
-            "POSITION_APP": "Position",  # From mesh_pb2
-            "NODEINFO_APP": "User",  # From mesh_pb2
-            "ROUTING_APP": "Routing",  # From mesh_pb2
-            "ADMIN_APP": "AdminMessage",  # From admin_pb2
-            "WAYPOINT_APP": "Waypoint",  # From mesh_pb2
-            "AUDIO_APP": None,  # Custom format - no standard protobuf
-            "DETECTION_SENSOR_APP": None,  # Custom format
-            "REPLY_APP": None,  # Custom format
-            "IP_TUNNEL_APP": None,  # Custom format
-            "SERIAL_APP": None,  # Custom format
-            "STORE_FORWARD_APP": "StoreAndForward",  # From storeforward_pb2
-            "RANGE_TEST_APP": None,  # Custom format
-            "TELEMETRY_APP": "Telemetry",  # From telemetry_pb2
-            "ZPS_APP": None,  # Custom format
-            "SIMULATOR_APP": None,  # Custom format
-            "TRACEROUTE_APP": "RouteDiscovery",  # From mesh_pb2
-            "NEIGHBORINFO_APP": "NeighborInfo",  # From mesh_pb2
-            "ATAK_PLUGIN": None,  # Custom format
-            "MAP_REPORT_APP": "MapReport",  # From mesh_pb2 (discovered!)
-            "POWERSTRESS_APP": "PowerStressMessage",  # From mesh_pb2 (discovered!)
-            "ATAK_FORWARDER": None,  # Custom format
-            "PAXCOUNTER_APP": "Paxcount",  # From paxcount_pb2
-            "PRIVATE_APP": None,  # Custom format
-            "RETICULUM_TUNNEL_APP": None,  # Custom format
-            "ALERT_APP": None,  # Custom format or not available
-            "UNKNOWN_APP": None,
-            "MAX": None,
-        }
-
-        # Get the class name for this portnum
-        class_name = portnum_to_class_name.get(portnum_name)
-
-        if class_name is None:
-            return None
-
-        # Try to find the class in our discovered classes
-        message_class = all_classes.get(class_name)
-
-        if message_class is None:
-            # Try with module prefixes if direct lookup failed
-            for full_name, cls in all_classes.items():
-                if full_name.endswith(f".{class_name}"):
-                    message_class = cls
-                    break
-
-        return message_class
+        if _portnum_message_classes is None:
+            all_classes = get_all_protobuf_message_classes()
+            if not all_classes:
+                return None
+
+            # Resolve every portnum once against the discovered classes
+            registry: dict[str, Any] = {}
+            for portnum, class_name in PORTNUM_MESSAGE_CLASS_NAMES.items():
+                if class_name is None:
+                    continue
+                message_class = all_classes.get(class_name)
+                if message_class is None:
+                    # Try with module prefixes if direct lookup failed
+                    for full_name, cls in all_classes.items():
+                        if full_name.endswith(f".{class_name}"):
+                            message_class = cls
+                            break
+                if message_class is not None:
+                    registry[portnum] = message_class
+            _portnum_message_classes = registry
+
+        return _portnum_message_classes.get(portnum_name)
 
     except ImportError as e:
         # Log the import error for debugging
@@ -863,8 +892,60 @@ def get_protobuf_message_class_for_portnum(portnum_name: str) -> Any | None:
         return None
 
 
+@warmup.register("protobuf_classes")
+def _warm_up_protobuf_classes(cfg: Any) -> int:
+    """Scan the protobuf modules and resolve every portnum's message class."""
+    get_protobuf_message_class_for_portnum("TEXT_MESSAGE_APP")
+    return len(_portnum_message_classes or {})
+
+
+def clear_decode_caches() -> None:
+    """Forget the discovered message classes and all cached decodes."""
+    global _message_classes, _portnum_message_classes
+    _message_classes = None
+    _portnum_message_classes = None
+    with _decode_cache_lock:
+        _decode_cache.clear()
+
+
 def decode_protobuf_payload(packet: dict[str, Any]) -> dict[str, Any] | None:
-    """Decode a protobuf payload from a packet."""
+    """
+    Decode a protobuf payload from a packet, caching the result.
+
+    Results are kept in a bounded LRU keyed by packet id, portnum and a digest
+    of the payload, and every call returns a fresh dict.
+    """
+    raw_payload = packet.get("raw_payload")
+    if not raw_payload or not isinstance(raw_payload, bytes | bytearray):
+        return _decode_protobuf_payload(packet)
+
+    key = (
+        packet.get("id"),
+        str(packet.get("portnum_name")),
+        hashlib.blake2b(raw_payload, digest_size=16).digest(),
+    )
+    with _decode_cache_lock:
+        cached = _decode_cache.get(key)
+        if cached is not None:
+            _decode_cache.move_to_end(key)
+    if cached is not None:
+        record_cache("protobuf_decode", hit=True)
+        return json.loads(cached)
+    record_cache("protobuf_decode", hit=False)
+
+    result = _decode_protobuf_payload(packet)
+    try:
+        encoded = json.dumps(result)
+    except (TypeError, ValueError):
+        return result
+    with _decode_cache_lock:
+        _decode_cache[key] = encoded
+        while len(_decode_cache) > DECODE_CACHE_SIZE:
+            _decode_cache.popitem(last=False)
+    return result
+
+
+def _decode_protobuf_payload(packet: dict[str, Any]) -> dict[str, Any] | None:
     if not packet.get("raw_payload"):
         return None
 
@@ -6,6 +6,7 @@ from .analytics_service import AnalyticsService
 from .gateway_service import GatewayService
 from .location_service import LocationService
 from .node_service import NodeNotFoundError, NodeService
+from .relay_service import RelayService
 from .traceroute_service import TracerouteService
 
 __all__ = [
@@ -15,4 +16,5 @@ __all__ = [
     "NodeService",
     "NodeNotFoundError",
     "GatewayService",
+    "RelayService",
 ]
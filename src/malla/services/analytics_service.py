@@ -7,41 +7,28 @@ import time
 from collections import defaultdict
 from typing import Any
 
+from ..database.filters import CompiledFilter, compile_filters
+from ..database.partitions import packet_source
 from ..database.repositories import NodeRepository
+from ..utils import result_cache
 
 logger = logging.getLogger(__name__)
 
-# NOTE: Lightweight, in-process cache so that repeated calls in a short period
-# do not hit the database multiple times. This is intentionally simple to keep
-# dependencies minimal; for a multi-process deployment a proper cache (e.g.
-# Redis) should be used instead.
-
 
 class AnalyticsService:
     """Service for analytics and statistical calculations."""
 
-    # (gateway_id, from_node, hop_count) → (timestamp, data)
-    _CACHE: dict[
-        tuple[str | None, int | None, int | None], tuple[float, dict[str, Any]]
-    ] = {}
-    _CACHE_TTL_SEC: int = 60  # one minute cache window
-
     @staticmethod
+    @result_cache.cached("analytics")
     def get_analytics_data(
         gateway_id: str | None = None,
         from_node: int | None = None,
         hop_count: int | None = None,
     ) -> dict[str, Any]:
-        """Get comprehensive analytics data for the dashboard with simple in-memory caching."""
+        """Get comprehensive analytics data for the dashboard (cached in the result cache)."""
 
-        cache_key = (gateway_id, from_node, hop_count)
         now_ts = time.time()
 
-        # Return cached value if still valid
-        cached = AnalyticsService._CACHE.get(cache_key)
-        if cached and (now_ts - cached[0] < AnalyticsService._CACHE_TTL_SEC):
-            return cached[1]
-
         logger.info(
             "Computing analytics data (cache miss): gateway_id=%s, from_node=%s, hop_count=%s",
             gateway_id,
@@ -92,51 +79,55 @@ class AnalyticsService:
                 "gateway_distribution": gateway_stats,
             }
 
-            # Save to cache
-            AnalyticsService._CACHE[cache_key] = (now_ts, result)
-
-            logger.info("Analytics data computed successfully (cached)")
+            logger.info("Analytics data computed successfully")
             return result
 
         except Exception as e:
             logger.error(f"Error getting analytics data: {e}")
             raise
 
+    @staticmethod
+    def _compile_filters(
+        filters: dict,
+        since_timestamp: float,
+        keys: tuple[str, ...],
+        base: tuple[str, ...] = (),
+        cursor: Any = None,
+    ) -> CompiledFilter:
+        """Compile the analytics window plus the *keys* subset of *filters*."""
+        return compile_filters(
+            {**filters, "start_time": since_timestamp},
+            base=base,
+            keys=("start_time", *keys),
+            cursor=cursor,
+        )
+
     @staticmethod
     def _get_packet_statistics(filters: dict, since_timestamp: float) -> dict[str, Any]:
         """Get basic packet statistics using optimized SQL query."""
         from ..database.connection import get_db_connection
 
-        # Build WHERE clause
-        where_conditions: list[str] = ["timestamp >= ?"]
-        params: list[Any] = [since_timestamp]
-
-        if filters.get("gateway_id"):
-            where_conditions.append("gateway_id = ?")
-            params.append(filters["gateway_id"])
-
-        if filters.get("from_node"):
-            where_conditions.append("from_node_id = ?")
-            params.append(filters["from_node"])
-
-        if filters.get("hop_count") is not None:
-            where_conditions.append("(hop_start - hop_limit) = ?")
-            params.append(filters["hop_count"])
+        conn = get_db_connection()
+        cursor = conn.cursor()
 
-        where_clause = " AND ".join(where_conditions)
+        # Build WHERE clause
+        compiled = AnalyticsService._compile_filters(
+            filters,
+            since_timestamp,
+            ("gateway_id", "from_node", "hop_count"),
+            cursor=cursor,
+        )
 
         query = f"""
             SELECT
                 COUNT(*) as total_packets,
                 SUM(CASE WHEN processed_successfully = 1 THEN 1 ELSE 0 END) as successful_packets,
                 AVG(CASE WHEN payload_length IS NOT NULL AND payload_length > 0 THEN payload_length END) as avg_payload_size
-            FROM packet_history
-            WHERE {where_clause}
+            FROM {packet_source(since_timestamp)}
+            {compiled.where}
         """
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
+        cursor.execute(query, compiled.params)
         row = cursor.fetchone()
         conn.close()
 
@@ -169,14 +160,12 @@ class AnalyticsService:
         total_nodes = cursor.fetchone()["total_nodes"]
 
         # Build WHERE clause for packet filtering
-        where_conditions: list[str] = ["timestamp >= ?"]
-        params: list[Any] = [since_timestamp]
-
-        if filters.get("gateway_id"):
-            where_conditions.append("gateway_id = ?")
-            params.append(filters["gateway_id"])
-
-        where_clause = " AND ".join(where_conditions)
+        compiled = AnalyticsService._compile_filters(
+            filters,
+            since_timestamp,
+            ("gateway_id",),
+            base=("from_node_id IS NOT NULL",),
+        )
 
         # Get node activity distribution using SQL aggregation
         cursor.execute(
@@ -185,8 +174,8 @@ class AnalyticsService:
                 SELECT
                     from_node_id,
                     COUNT(*) as packet_count
-                FROM packet_history
-                WHERE from_node_id IS NOT NULL AND {where_clause}
+                FROM {packet_source(since_timestamp)}
+                {compiled.where}
                 GROUP BY from_node_id
             )
             SELECT
@@ -196,7 +185,7 @@ class AnalyticsService:
                 SUM(CASE WHEN packet_count >= 1 AND packet_count <= 10 THEN 1 ELSE 0 END) as lightly_active
             FROM node_activity
         """,
-            params,
+            compiled.params,
         )
 
         activity_row = cursor.fetchone()
@@ -230,18 +219,9 @@ class AnalyticsService:
         from ..database.connection import get_db_connection
 
         # Build WHERE clause
-        where_conditions: list[str] = ["timestamp >= ?"]
-        params: list[Any] = [since_timestamp]
-
-        if filters.get("gateway_id"):
-            where_conditions.append("gateway_id = ?")
-            params.append(filters["gateway_id"])
-
-        if filters.get("from_node"):
-            where_conditions.append("from_node_id = ?")
-            params.append(filters["from_node"])
-
-        where_clause = " AND ".join(where_conditions)
+        compiled = AnalyticsService._compile_filters(
+            filters, since_timestamp, ("gateway_id", "from_node")
+        )
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -264,10 +244,10 @@ class AnalyticsService:
                 SUM(CASE WHEN snr > 5 AND snr <= 10 THEN 1 ELSE 0 END) as snr_good,
                 SUM(CASE WHEN snr > 0 AND snr <= 5 THEN 1 ELSE 0 END) as snr_fair,
                 SUM(CASE WHEN snr <= 0 THEN 1 ELSE 0 END) as snr_poor
-            FROM packet_history
-            WHERE {where_clause}
+            FROM {packet_source(since_timestamp)}
+            {compiled.where}
         """,
-            params,
+            compiled.params,
         )
 
         row = cursor.fetchone()
@@ -310,39 +290,31 @@ class AnalyticsService:
 
         from ..database.connection import get_db_connection
 
-        # Build WHERE clause similarly to PacketRepository but simplified (only params we care about)
-        where_conditions: list[str] = ["timestamp >= ?"]
-        params: list[Any] = [since_timestamp]
-
-        if filters.get("gateway_id"):
-            where_conditions.append("gateway_id = ?")
-            params.append(filters["gateway_id"])
-
-        if filters.get("from_node"):
-            where_conditions.append("from_node_id = ?")
-            params.append(filters["from_node"])
-
-        if filters.get("hop_count") is not None:
-            where_conditions.append("(hop_start - hop_limit) = ?")
-            params.append(filters["hop_count"])
+        conn = get_db_connection()
+        cursor = conn.cursor()
 
-        where_clause = " AND ".join(where_conditions)
+        # Same filter subset as the packet statistics
+        compiled = AnalyticsService._compile_filters(
+            filters,
+            since_timestamp,
+            ("gateway_id", "from_node", "hop_count"),
+            cursor=cursor,
+        )
 
         query = f"""
             SELECT
                 strftime('%H', datetime(timestamp, 'unixepoch')) AS hour,
                 COUNT(*) AS total_packets,
                 SUM(CASE WHEN processed_successfully = 1 THEN 1 ELSE 0 END) AS successful_packets
-            FROM packet_history
-            WHERE {where_clause}
+            FROM {packet_source(since_timestamp)}
+            {compiled.where}
             GROUP BY hour
         """
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
+        cursor.execute(query, compiled.params)
 
         rows = cursor.fetchall()
+        conn.close()
 
         hourly_counts: dict[int, int] = defaultdict(int)
         hourly_success: dict[int, int] = defaultdict(int)
@@ -423,18 +395,12 @@ class AnalyticsService:
         from ..database.connection import get_db_connection
 
         # Build WHERE clause
-        where_conditions: list[str] = ["timestamp >= ?", "portnum_name IS NOT NULL"]
-        params: list[Any] = [since_timestamp]
-
-        if filters.get("gateway_id"):
-            where_conditions.append("gateway_id = ?")
-            params.append(filters["gateway_id"])
-
-        if filters.get("from_node"):
-            where_conditions.append("from_node_id = ?")
-            params.append(filters["from_node"])
-
-        where_clause = " AND ".join(where_conditions)
+        compiled = AnalyticsService._compile_filters(
+            filters,
+            since_timestamp,
+            ("gateway_id", "from_node"),
+            base=("portnum_name IS NOT NULL",),
+        )
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -446,8 +412,8 @@ class AnalyticsService:
                 SELECT
                     portnum_name,
                     COUNT(*) as count
-                FROM packet_history
-                WHERE {where_clause}
+                FROM {packet_source(since_timestamp)}
+                {compiled.where}
                 GROUP BY portnum_name
             ),
             total_count AS (
@@ -461,7 +427,7 @@ class AnalyticsService:
             ORDER BY tc.count DESC
             LIMIT 15
         """,
-            params,
+            compiled.params,
         )
 
         packet_types = [dict(row) for row in cursor.fetchall()]
@@ -477,14 +443,9 @@ class AnalyticsService:
         from ..database.connection import get_db_connection
 
         # Build WHERE clause (excluding gateway_id filter since we're analyzing gateways)
-        where_conditions: list[str] = ["timestamp >= ?"]
-        params: list[Any] = [since_timestamp]
-
-        if filters.get("from_node"):
-            where_conditions.append("from_node_id = ?")
-            params.append(filters["from_node"])
-
-        where_clause = " AND ".join(where_conditions)
+        compiled = AnalyticsService._compile_filters(
+            filters, since_timestamp, ("from_node",)
+        )
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -497,8 +458,8 @@ class AnalyticsService:
                     COALESCE(gateway_id, 'Unknown') as gateway_id,
                     COUNT(*) as total_packets,
                     SUM(CASE WHEN processed_successfully = 1 THEN 1 ELSE 0 END) as successful_packets
-                FROM packet_history
-                WHERE {where_clause}
+                FROM {packet_source(since_timestamp)}
+                {compiled.where}
                 GROUP BY gateway_id
             ),
             total_count AS (
@@ -514,7 +475,7 @@ class AnalyticsService:
             ORDER BY gs.total_packets DESC
             LIMIT 20
         """,
-            params,
+            compiled.params,
         )
 
         gateway_stats = [dict(row) for row in cursor.fetchall()]
@@ -12,6 +12,7 @@ from typing import Any
 
 from ..database.connection import get_db_connection
 from ..database.repositories import PacketRepository
+from ..metrics import record_cache
 from ..utils.node_utils import get_bulk_node_names
 
 logger = logging.getLogger(__name__)
@@ -46,7 +47,9 @@ class GatewayService:
             cached_time, cached_data = GatewayService._cache[cache_key]
             if now - cached_time < GatewayService._cache_ttl_seconds:
                 logger.debug(f"Returning cached gateway statistics for {hours}h")
+                record_cache("gateway_statistics", hit=True)
                 return cached_data
+        record_cache("gateway_statistics", hit=False)
 
         logger.info(f"Computing gateway statistics for {hours}h (cache miss)")
         start_time = time.time()
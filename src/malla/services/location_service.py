@@ -138,6 +138,7 @@ class LocationService:
                     "neighbor_id": target_id,
                     "avg_snr": avg_snr,
                     "traceroute_count": traceroute_count,
+                    "neighbor_snr": link.get("neighbor_snr"),
                     "packet_count": 0,  # Will be updated if direct packets exist
                 }
             )
@@ -146,6 +147,7 @@ class LocationService:
                     "neighbor_id": source_id,
                     "avg_snr": avg_snr,
                     "traceroute_count": traceroute_count,
+                    "neighbor_snr": link.get("neighbor_snr"),
                     "packet_count": 0,  # Will be updated if direct packets exist
                 }
             )
@@ -372,6 +374,8 @@ class LocationService:
                     "is_bidirectional": True,  # Network graph links are bidirectional by design
                     "total_hops_seen": link["packet_count"],
                     "last_packet_id": link.get("last_packet_id"),
+                    "neighbor_snr": link.get("neighbor_snr"),
+                    "sources": link.get("sources", ["traceroute"]),
                 }
 
                 traceroute_links.append(traceroute_link)
@@ -853,29 +857,21 @@ class LocationService:
             from datetime import datetime
 
             from ..database.connection import get_db_connection
+            from ..database.filters import compile_filters
 
             conn = get_db_connection()
             cursor = conn.cursor()
 
             # ------------------------------------------------------------------
-            # Build WHERE clause based on provided filters.
+            # Build WHERE clause based on provided filters.  The time range is
+            # handled as in get_node_locations / get_traceroute_links; only
+            # 0-hop packets (hop_count = 0) are considered.
             # ------------------------------------------------------------------
-            where_clauses: list[str] = [
-                "from_node_id IS NOT NULL",
-                "gateway_id IS NOT NULL",
-                "hop_start IS NOT NULL",
-                "hop_limit IS NOT NULL",
-                "(hop_start - hop_limit) = 0",  # 0-hop packets only
-            ]
-            params: list[Any] = []
-
-            # Time range – same handling as get_node_locations / get_traceroute_links
-            if filters.get("start_time") is not None:
-                where_clauses.append("timestamp >= ?")
-                params.append(filters["start_time"])
-            if filters.get("end_time") is not None:
-                where_clauses.append("timestamp <= ?")
-                params.append(filters["end_time"])
+            link_filters: dict[str, Any] = {
+                "start_time": filters.get("start_time"),
+                "end_time": filters.get("end_time"),
+                "hop_count": 0,
+            }
 
             # Optional server-side gateway filter.  ``gateway_id`` is stored as the
             # hex node id prefixed with '!'.  Convert here if filter is int.
@@ -887,10 +883,16 @@ class LocationService:
                 except Exception:
                     # Assume caller already supplied the string format
                     gw_hex = str(gw_val)
-                where_clauses.append("gateway_id = ?")
-                params.append(gw_hex)
+                link_filters["gateway_id"] = gw_hex
 
-            where_sql = "WHERE " + " AND ".join(where_clauses)
+            compiled = compile_filters(
+                link_filters,
+                base=("from_node_id IS NOT NULL", "gateway_id IS NOT NULL"),
+                keys=link_filters,
+                cursor=cursor,
+            )
+            where_sql = compiled.where
+            params = compiled.params
 
             query = f"""
                 SELECT
@@ -3,6 +3,9 @@ Meshtastic service for getting hardware models and packet types from protobuf de
 """
 
 import logging
+from typing import Any
+
+from .. import warmup
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +15,7 @@ class MeshtasticService:
 
     _hardware_models_cache = None
     _packet_types_cache = None
+    _node_roles_cache = None
 
     @classmethod
     def get_hardware_models(cls) -> list[tuple[str, str]]:
@@ -158,6 +162,9 @@ class MeshtasticService:
         Returns:
             List of tuples (value, display_name) for node roles
         """
+        if cls._node_roles_cache is not None:
+            return cls._node_roles_cache
+
         try:
             from meshtastic import config_pb2
 
@@ -190,6 +197,7 @@ class MeshtasticService:
             # Sort by display name
             roles.sort(key=lambda x: x[1])
 
+            cls._node_roles_cache = roles
             return roles
 
         except ImportError as e:
@@ -204,3 +212,14 @@ class MeshtasticService:
         """Clear the cached values to force refresh."""
         cls._hardware_models_cache = None
         cls._packet_types_cache = None
+        cls._node_roles_cache = None
+
+
+@warmup.register("meshtastic_enums")
+def _warm_up_enums(cfg: Any) -> int:
+    """Build the hardware model, packet type and role tables."""
+    return (
+        len(MeshtasticService.get_hardware_models())
+        + len(MeshtasticService.get_packet_types())
+        + len(MeshtasticService.get_node_roles())
+    )
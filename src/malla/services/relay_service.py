@@ -0,0 +1,265 @@
+"""
+Relay analytics from the ``relay_node`` / ``next_hop`` packet header fields.
+
+The ``relay_rollup`` counts (see :mod:`malla.database.relays`) give, for every
+packet and not only traceroutes, the last byte of the node that transmitted
+the copy each gateway heard.  That byte is matched against the known nodes
+ending in it:
+
+* a node the same gateway also heard directly (zero hops) wins: it is within
+  radio range of the gateway, which is what relaying to it requires;
+* otherwise a node heard directly by any gateway, then the most recently
+  heard node.
+
+Each resolved relay reports how it was matched (``direct``, ``unique`` when
+only one known node ends in that byte, or ``guess``) and how many known nodes
+share the byte, so the links can be read as the estimates they are.
+"""
+
+import logging
+import time
+from typing import Any
+
+from ..database import RelayRepository, relays
+from ..database.node_activity import gateway_node_id
+from ..utils import result_cache
+from ..utils.node_utils import get_bulk_node_names
+
+logger = logging.getLogger(__name__)
+
+
+class RelayService:
+    """Service for relay and last-hop link analytics."""
+
+    @staticmethod
+    def _window(hours: int) -> tuple[float, int]:
+        start_time = time.time() - hours * 3600
+        return start_time, relays.choose_resolution(start_time)
+
+    @staticmethod
+    def _resolve(
+        last_byte: int,
+        candidates: dict[int, list[dict[str, Any]]],
+        direct: dict[str, set[int]],
+        gateways: list[str] | tuple[str, ...] = (),
+    ) -> dict[str, Any]:
+        """
+        Match a relay byte to a known node.
+
+        Args:
+            last_byte: ``relay_node`` / ``next_hop`` value
+            candidates: Known nodes per last byte, most recently heard first
+            direct: Node ids each gateway heard directly
+            gateways: Gateways that heard the relay
+        """
+        excluded = {gateway_node_id(gateway) for gateway in gateways}
+        nodes = [
+            node
+            for node in candidates.get(last_byte, [])
+            if node["node_id"] not in excluded
+        ]
+        heard_here = set().union(*(direct.get(g, set()) for g in gateways))
+        heard_anywhere = set().union(*direct.values())
+        match = None
+        if nodes:
+            # Stable sort: keeps the most recently heard first within a rank
+            nodes.sort(
+                key=lambda node: (
+                    node["node_id"] not in heard_here,
+                    node["node_id"] not in heard_anywhere,
+                )
+            )
+            if nodes[0]["node_id"] in heard_here:
+                match = "direct"
+            elif len(nodes) == 1:
+                match = "unique"
+            else:
+                match = "guess"
+        return {
+            "relay_byte": last_byte,
+            "relay_hex": f"{last_byte:02x}",
+            "relay_node_id": nodes[0]["node_id"] if nodes else None,
+            "match": match,
+            "candidates": len(nodes),
+        }
+
+    @staticmethod
+    def _direct_receptions(start_time: float, resolution: int) -> dict[str, set[int]]:
+        direct: dict[str, set[int]] = {}
+        for row in RelayRepository.get_direct_receptions(start_time, resolution):
+            direct.setdefault(row["gateway_id"], set()).add(row["from_node_id"])
+        return direct
+
+    @staticmethod
+    def _add_names(items: list[dict[str, Any]], *fields: str) -> None:
+        node_ids = {item[f] for item in items for f in fields if item.get(f)}
+        names = get_bulk_node_names(list(node_ids))
+        for item in items:
+            for field in fields:
+                node_id = item.get(field)
+                prefix = field.removesuffix("_node_id").removesuffix("_id")
+                item[f"{prefix}_name"] = names.get(node_id) if node_id else None
+
+    @staticmethod
+    @result_cache.cached("relay_analysis")
+    def get_relay_analysis(
+        hours: int = 24, gateway_id: str | None = None, limit: int = 25
+    ) -> dict[str, Any]:
+        """
+        Get the busiest relays and the estimated last-hop links to gateways.
+
+        Args:
+            hours: Window, counted back from now
+            gateway_id: Only packets uplinked by this gateway
+            limit: Maximum number of relays and of links
+
+        Returns:
+            Dictionary with the window, the rollup resolution used,
+            ``top_relays`` and ``last_hop_links``
+        """
+        start_time, resolution = RelayService._window(hours)
+        totals = RelayRepository.get_relay_totals(start_time, resolution, gateway_id)
+        links = RelayRepository.get_last_hop_links(start_time, resolution, gateway_id)
+        direct = RelayService._direct_receptions(start_time, resolution)
+        candidates = RelayRepository.get_nodes_by_last_byte(
+            sorted({row["relay_node"] for row in totals})
+        )
+
+        gateways_by_relay: dict[int, list[str]] = {}
+        for link in links:
+            gateways_by_relay.setdefault(link["relay_node"], []).append(
+                link["gateway_id"]
+            )
+
+        top_relays = []
+        for row in totals[:limit]:
+            relay = RelayService._resolve(
+                row["relay_node"],
+                candidates,
+                direct,
+                gateways_by_relay.get(row["relay_node"], []),
+            )
+            relay.update(
+                packets=row["packets"],
+                senders=row["senders"],
+                gateways=row["gateways"],
+                last_seen=row["last_seen"],
+            )
+            top_relays.append(relay)
+
+        last_hop_links = []
+        for row in links[:limit]:
+            link = RelayService._resolve(
+                row["relay_node"], candidates, direct, [row["gateway_id"]]
+            )
+            link.update(
+                gateway_id=row["gateway_id"],
+                gateway_node_id=gateway_node_id(row["gateway_id"]),
+                packets=row["packets"],
+                senders=row["senders"],
+                avg_hops=(
+                    row["hop_sum"] / row["hop_samples"] if row["hop_samples"] else None
+                ),
+                last_seen=row["last_seen"],
+            )
+            last_hop_links.append(link)
+
+        RelayService._add_names(top_relays, "relay_node_id")
+        RelayService._add_names(last_hop_links, "relay_node_id", "gateway_node_id")
+        return {
+            "hours": hours,
+            "start_time": start_time,
+            "resolution": resolution,
+            "gateway_id": gateway_id,
+            "top_relays": top_relays,
+            "last_hop_links": last_hop_links,
+        }
+
+    @staticmethod
+    def get_node_relay_paths(node_id: int, hours: int = 24) -> dict[str, Any]:
+        """
+        Get how a node's packets reached each gateway.
+
+        Returns:
+            Dictionary with the window, the rollup resolution used and per
+            gateway the packets, zero-hop packets, average hops and the relays
+            that delivered them, plus the next hops seen on the node's
+            next-hop routed packets
+        """
+        start_time, resolution = RelayService._window(hours)
+        rows = RelayRepository.get_node_paths(node_id, start_time, resolution)
+        direct = RelayService._direct_receptions(start_time, resolution)
+        candidates = RelayRepository.get_nodes_by_last_byte(
+            sorted(
+                {row["relay_node"] for row in rows}
+                | {row["next_hop"] for row in rows if row["next_hop"]}
+            )
+        )
+        own_byte = node_id & 0xFF
+
+        gateways: dict[str, dict[str, Any]] = {}
+        next_hops: dict[int, int] = {}
+        for row in rows:
+            gateway = gateways.setdefault(
+                row["gateway_id"],
+                {
+                    "gateway_id": row["gateway_id"],
+                    "gateway_node_id": gateway_node_id(row["gateway_id"]),
+                    "packets": 0,
+                    "direct_packets": 0,
+                    "hop_sum": 0,
+                    "hop_samples": 0,
+                    "last_seen": 0.0,
+                    "relays": {},
+                },
+            )
+            gateway["packets"] += row["packets"]
+            gateway["direct_packets"] += row["direct_count"]
+            gateway["hop_sum"] += row["hop_sum"]
+            gateway["hop_samples"] += row["hop_samples"]
+            gateway["last_seen"] = max(gateway["last_seen"], row["last_seen"])
+            if row["relay_node"] and row["relay_node"] != own_byte:
+                relays_seen = gateway["relays"]
+                relays_seen[row["relay_node"]] = (
+                    relays_seen.get(row["relay_node"], 0) + row["packets"]
+                )
+            if row["next_hop"]:
+                next_hops[row["next_hop"]] = (
+                    next_hops.get(row["next_hop"], 0) + row["packets"]
+                )
+
+        paths = []
+        relay_entries = []
+        for gateway in sorted(gateways.values(), key=lambda g: -g["packets"]):
+            hop_sum = gateway.pop("hop_sum")
+            hop_samples = gateway.pop("hop_samples")
+            gateway["avg_hops"] = hop_sum / hop_samples if hop_samples else None
+            relays_seen = gateway.pop("relays")
+            gateway["relays"] = []
+            for last_byte, packets in sorted(
+                relays_seen.items(), key=lambda item: -item[1]
+            ):
+                relay = RelayService._resolve(
+                    last_byte, candidates, direct, [gateway["gateway_id"]]
+                )
+                relay["packets"] = packets
+                gateway["relays"].append(relay)
+                relay_entries.append(relay)
+            paths.append(gateway)
+
+        next_hop_entries = []
+        for last_byte, packets in sorted(next_hops.items(), key=lambda item: -item[1]):
+            hop = RelayService._resolve(last_byte, candidates, direct)
+            hop["packets"] = packets
+            next_hop_entries.append(hop)
+
+        RelayService._add_names(paths, "gateway_node_id")
+        RelayService._add_names(relay_entries + next_hop_entries, "relay_node_id")
+        return {
+            "node_id": node_id,
+            "hours": hours,
+            "start_time": start_time,
+            "resolution": resolution,
+            "gateways": paths,
+            "next_hops": next_hop_entries,
+        }
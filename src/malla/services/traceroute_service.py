@@ -12,16 +12,24 @@ import logging
 import math
 import time
 from datetime import datetime, timedelta
-from typing import Any, cast
+from typing import Any
 
-from ..database.repositories import (
-    LocationRepository,
-    TracerouteRepository,
-)
+from ..config import get_config
+from ..database.repositories import NeighborRepository, TracerouteRepository
 from ..models.traceroute import (
-    RouteData,
     TraceroutePacket,  # Use the correct TraceroutePacket class
 )
+from ..utils import result_cache
+from ..utils.link_analysis import (
+    analyze_partition,
+    map_partitions,
+    merge_partition_results,
+    packet_from_row,
+    parse_partition,
+    partition_by_time_slice,
+    resolve_worker_count,
+)
+from ..utils.location_timeline import get_location_timeline
 from ..utils.node_utils import get_bulk_node_names
 from ..utils.traceroute_utils import parse_traceroute_payload
 
@@ -109,6 +117,7 @@ class TracerouteService:
             raise
 
     @staticmethod
+    @result_cache.cached("traceroute_analysis")
     def get_traceroute_analysis(hours: int = 24) -> dict[str, Any]:
         """
         Get comprehensive traceroute analysis for the specified time period.
@@ -226,6 +235,7 @@ class TracerouteService:
             raise
 
     @staticmethod
+    @result_cache.cached("route_patterns")
     def get_route_patterns(limit: int = 50) -> dict[str, Any]:
         """
         Analyze common route patterns in the mesh network.
@@ -407,16 +417,26 @@ class TracerouteService:
             raise
 
     @staticmethod
+    @result_cache.cached("longest_links", ignore=("workers",))
     def get_longest_links_analysis(
-        min_distance_km: float = 1.0, min_snr: float = -20.0, max_results: int = 100
+        min_distance_km: float = 1.0,
+        min_snr: float = -20.0,
+        max_results: int = 100,
+        workers: int | None = None,
     ) -> dict[str, Any]:
         """
         Analyze the longest RF links in the mesh network.
 
+        Traceroutes are split into time slices that are parsed and analysed
+        independently (in a process pool for large inputs) and merged by link
+        key, so the result does not depend on the number of workers.
+
         Args:
             min_distance_km: Minimum distance in kilometers to consider
             min_snr: Minimum SNR threshold
             max_results: Maximum number of results to return
+            workers: Worker processes to use (defaults to ``analysis_workers``
+                from the configuration; 1 keeps the analysis in-process)
 
         Returns:
             Dictionary with longest links analysis
@@ -432,8 +452,6 @@ class TracerouteService:
             # Fetch raw data (only the last 7 days & successfully processed)
             # ------------------------------------------------------------------
             fetch_start = time.time()
-            from datetime import datetime, timedelta
-
             end_time = datetime.now()
             start_time_filter = end_time - timedelta(days=7)
 
@@ -454,511 +472,291 @@ class TracerouteService:
                 f"TIMING: Data fetch took {fetch_duration:.3f}s for {len(result['packets'])} packets"
             )
 
+            # Early filtering: skip packets that won't contribute any valid hops
+            packets = [
+                packet_from_row(packet)
+                for packet in result["packets"]
+                if packet.get("raw_payload") and packet.get("processed_successfully")
+            ]
+
+            cfg = get_config()
+            if workers is None:
+                workers = resolve_worker_count(cfg.analysis_workers)
+            if len(packets) < cfg.analysis_parallel_min_packets:
+                workers = 1
+
             # ------------------------------------------------------------------
-            # Pre-fetch node location history using a single query per node
-            # (replaces the previous expensive nested node->packet cache fill).
+            # Parse payloads per time slice and collect the referenced nodes
             # ------------------------------------------------------------------
-            # First collect all unique node ids that appear in the packets
-            unique_node_ids: set[int] = set()
-            parsed_route_cache: dict[int, RouteData] = {}
-            for packet in result["packets"]:
-                if not packet.get("raw_payload"):
-                    continue
-                try:
-                    route_data = parse_traceroute_payload(packet["raw_payload"])
-                    parsed_route_cache[packet["id"]] = route_data
-                    nodes_for_packet = {packet["from_node_id"], packet["to_node_id"]}
-                    nodes_for_packet.update(route_data.get("route_nodes", []))
-                    # Remove invalid placeholders
-                    nodes_for_packet.discard(None)
-                    nodes_for_packet.discard(4294967295)
-                    unique_node_ids.update(nodes_for_packet)
-                except Exception as e:
-                    logger.warning(
-                        f"Error parsing packet {packet.get('id', 'unknown')} for node collection: {e}"
-                    )
-                    continue
+            parse_start = time.time()
+            slices = partition_by_time_slice(packets)
+            parsed_slices = map_partitions(
+                parse_partition, [(packet_slice,) for packet_slice in slices], workers
+            )
+            parse_duration = time.time() - parse_start
+            logger.info(
+                f"TIMING: Payload parsing took {parse_duration:.3f}s for "
+                f"{len(packets)} packets in {len(slices)} slices ({workers} workers)"
+            )
 
+            # ------------------------------------------------------------------
+            # Export the part of the shared location timeline each slice needs
+            # (its nodes, within its time range) as a read-only snapshot.
+            # ------------------------------------------------------------------
             prefetch_start = time.time()
-
-            from ..utils import traceroute_utils as _tru  # Local import to avoid cycles
-
-            # Build a dict: node_id -> list[location_dict] (DESC by timestamp)
-            location_history_cache: dict[int, list[dict[str, Any]]] = {}
-            for node_id in unique_node_ids:
-                try:
-                    locations = LocationRepository.get_node_location_history(
-                        node_id, limit=50
-                    )
-                    if locations:
-                        location_history_cache[node_id] = (
-                            locations  # already DESC order
-                        )
-                except Exception as e:
-                    logger.warning(
-                        f"Error fetching location history for node {node_id}: {e}"
+            slice_args = []
+            nodes_with_location: set[int] = set()
+            # Loading the timeline reads every stored position: skip it when
+            # there is no traceroute to place
+            if slices:
+                timeline = get_location_timeline()
+                for packet_slice, (parsed, node_ids) in zip(
+                    slices, parsed_slices, strict=True
+                ):
+                    snapshot = timeline.snapshot(
+                        sorted(node_ids),
+                        start=packet_slice[0].timestamp,
+                        end=packet_slice[-1].timestamp,
                     )
-                    continue
-
+                    nodes_with_location.update(snapshot)
+                    slice_args.append((parsed, snapshot, min_distance_km, min_snr))
             prefetch_duration = time.time() - prefetch_start
             logger.info(
-                f"TIMING: Location history pre-fetch took {prefetch_duration:.3f}s for {len(location_history_cache)} nodes"
+                f"TIMING: Location snapshot took {prefetch_duration:.3f}s for {len(nodes_with_location)} nodes"
             )
 
             # ------------------------------------------------------------------
-            # Inject a fast in-memory location lookup to avoid per-hop DB hits.
+            # Analyse each slice against its snapshot, then merge.
             # ------------------------------------------------------------------
-            _orig_get_location = _tru.get_node_location_at_timestamp  # Backup original
-
-            def _fast_location_lookup(
-                node_id: int, target_ts: float
-            ) -> dict[str, Any] | None:
-                """Return the best location for a node at target_ts from the pre-loaded history.
-
-                Falls back to the original DB implementation if the node isn't in cache
-                (keeps behaviour identical for very old/unknown nodes).
-                """
-                # Use an hour bucket to maximise cache hits without losing much accuracy
-                bucket = int(target_ts // 3600)
-                memo_key = (node_id, bucket)
-                if memo_key in location_cache:
-                    return location_cache[memo_key]
-
-                history = location_history_cache.get(node_id)
-                if not history:
-                    loc = _orig_get_location(node_id, target_ts)
-                    if loc:
-                        location_cache[memo_key] = loc
-                    return loc
-
-                # histories are DESC (newest first). Find first <= ts.
-                best = None
-                for loc in history:
-                    if loc["timestamp"] <= target_ts:
-                        best = loc
-                        break
-                if best is None:
-                    # No past location found – use oldest future record.
-                    best = history[-1]
-
-                age_sec = target_ts - best["timestamp"]
-                age_hours = abs(age_sec) / 3600
-                if age_sec >= 0:  # Past record
-                    if age_hours <= 24:
-                        age_warning = f"from {age_hours:.1f}h ago"
-                    elif age_hours <= 168:
-                        age_warning = f"from {age_hours / 24:.1f}d ago"
-                    else:
-                        age_warning = f"from {age_hours / 168:.1f}w ago"
-                else:  # Future record
-                    if age_hours <= 24:
-                        age_warning = f"from {age_hours:.1f}h later"
-                    elif age_hours <= 168:
-                        age_warning = f"from {age_hours / 24:.1f}d later"
-                    else:
-                        age_warning = f"from {age_hours / 168:.1f}w later"
-
-                loc_dict = {
-                    "latitude": best["latitude"],
-                    "longitude": best["longitude"],
-                    "altitude": best.get("altitude"),
-                    "timestamp": best["timestamp"],
-                    "age_warning": age_warning,
-                }
-                location_cache[memo_key] = loc_dict
-                return loc_dict
-
-            # Override location lookup with fast in-memory version for this analysis
-            _tru.get_node_location_at_timestamp = cast(Any, _fast_location_lookup)
-
-            # Location cache used by TraceroutePacket.calculate_hop_distances
-            location_cache: dict[tuple, Any] = {}
-
-            try:
-                # ------------------------------------------------------------------
-                # Stream-process each hop to avoid holding large intermediate lists.
-                # ------------------------------------------------------------------
-                process_start = time.time()
-                link_stats: dict[tuple, dict[str, Any]] = {}
-                # Track multi-hop path statistics (indirect links)
-                path_stats: dict[tuple, dict[str, Any]] = {}
-
-                logger.info(
-                    f"Processing {len(result['packets'])} packets with pre-populated location cache"
-                )
-
-                packets_processed = 0
-                hops_processed = 0
-                distance_calculations = 0
-                cache_hits = 0
-                cache_misses = 0
-                early_filtered = 0
-
-                for packet in result["packets"]:
-                    packet_start = time.time()
-                    try:
-                        # Early filtering: skip packets that won't contribute any valid hops
-                        if (
-                            not packet["raw_payload"]
-                            or not packet["processed_successfully"]
-                        ):
-                            early_filtered += 1
-                            continue
-
-                        tr_packet = TraceroutePacket(
-                            packet_data=packet,
-                            resolve_names=True,
-                        )
-
-                        # Track cache performance before distance calculation
-                        cache_size_before = len(location_cache)
-
-                        # Populate distance information – uses pre-populated location_cache
-                        distance_calc_start = time.time()
-                        tr_packet.calculate_hop_distances(location_cache=location_cache)
-                        # Track timing (result not used but calculation is important)
-                        _ = time.time() - distance_calc_start
-                        distance_calculations += 1
-
-                        # Track cache performance after distance calculation
-                        cache_size_after = len(location_cache)
-                        if cache_size_after > cache_size_before:
-                            cache_misses += cache_size_after - cache_size_before
-                        else:
-                            cache_hits += 1
-
-                        rf_hops = tr_packet.get_rf_hops()
-                        hops_processed += len(rf_hops)
-
-                        for hop in rf_hops:
-                            # Early filtering: skip hops that won't meet criteria
-                            if (
-                                hop.snr is None
-                                or hop.snr == 0
-                                or hop.snr < min_snr
-                                or not hop.distance_km
-                                or hop.distance_km < min_distance_km
-                                or 4294967295 in [hop.from_node_id, hop.to_node_id]
-                            ):
-                                continue
-
-                            # Use a bidirectional key so A<->B == B<->A
-                            key = tuple(sorted([hop.from_node_id, hop.to_node_id]))
-
-                            if key not in link_stats:
-                                # Determine the correct orientation for names
-                                node1_id, node2_id = key
-                                if hop.from_node_id == node1_id:
-                                    from_name = hop.from_node_name
-                                    to_name = hop.to_node_name
-                                else:
-                                    from_name = hop.to_node_name
-                                    to_name = hop.from_node_name
-
-                                link_stats[key] = {
-                                    "from_node_name": from_name,
-                                    "to_node_name": to_name,
-                                    "total_distance": 0.0,
-                                    "total_snr": 0.0,
-                                    "traceroute_count": 0,
-                                    "max_distance": 0.0,
-                                    "best_snr": None,
-                                    "recent_packets": [],  # keep last 5 ids
-                                }
-
-                            stats_dict = link_stats[key]
-
-                            # Update aggregates
-                            stats_dict["traceroute_count"] += 1
-                            stats_dict["total_distance"] += hop.distance_km
-                            stats_dict["total_snr"] += hop.snr
-                            stats_dict["max_distance"] = max(
-                                stats_dict["max_distance"], hop.distance_km
-                            )
-
-                            if (
-                                stats_dict["best_snr"] is None
-                                or hop.snr > stats_dict["best_snr"]
-                            ):
-                                stats_dict["best_snr"] = hop.snr
-
-                            # Maintain only last 5 packet ids (newest first)
-                            stats_dict["recent_packets"].append(packet["id"])
-                            if len(stats_dict["recent_packets"]) > 5:
-                                stats_dict["recent_packets"].pop(0)
-
-                        packets_processed += 1
-
-                        # Log progress every 100 packets
-                        if packets_processed % 100 == 0:
-                            packet_duration = time.time() - packet_start
-                            logger.info(
-                                f"TIMING: Processed {packets_processed} packets, last packet took {packet_duration:.3f}s"
-                            )
+            process_start = time.time()
+            merged = merge_partition_results(
+                map_partitions(analyze_partition, slice_args, workers)
+            )
+            link_stats = merged["links"]
+            path_stats = merged["paths"]
+            process_duration = time.time() - process_start
+            logger.info(f"TIMING: Packet processing took {process_duration:.3f}s")
+            logger.info(
+                f"TIMING: Processed {merged['packets_processed']} packets, "
+                f"{merged['hops_processed']} hops, "
+                f"{len(result['packets']) - len(packets)} filtered early"
+            )
 
-                        # --------------------------------------------------
-                        # Indirect path processing (entire traceroute path)
-                        # --------------------------------------------------
-                        if len(rf_hops) > 1:
-                            # Calculate total distance of the full path
-                            path_distance_km = sum(
-                                h.distance_km or 0.0 for h in rf_hops
-                            )
+            # ------------------------------------------------------------------
+            # Build the final list from aggregated statistics.
+            # ------------------------------------------------------------------
+            build_start = time.time()
+            name_ids: set[int] = set()
+            for node1_id, node2_id in link_stats:
+                name_ids.update((node1_id, node2_id))
+            for path in path_stats.values():
+                name_ids.update(path["route"][1])
+            node_names = get_bulk_node_names(sorted(name_ids))
 
-                            # Skip if it doesn't meet distance threshold
-                            if path_distance_km < min_distance_km:
-                                pass  # too short – ignore
-                            else:
-                                # Average SNR across hops (ignore None values)
-                                valid_snrs = [
-                                    h.snr for h in rf_hops if h.snr is not None
-                                ]
-                                avg_path_snr = (
-                                    (sum(valid_snrs) / len(valid_snrs))
-                                    if valid_snrs
-                                    else None
-                                )
+            def _name(node_id: int) -> str:
+                return node_names.get(node_id, f"!{node_id:08x}")
 
-                                # Apply SNR filter (only if we actually have a value)
-                                if avg_path_snr is None or avg_path_snr < min_snr:
-                                    pass  # SNR below threshold – ignore
-                                else:
-                                    from_node_id_path = rf_hops[0].from_node_id
-                                    to_node_id_path = rf_hops[-1].to_node_id
-
-                                    path_key = (from_node_id_path, to_node_id_path)
-
-                                    if path_key not in path_stats:
-                                        path_stats[path_key] = {
-                                            "from_node_name": rf_hops[0].from_node_name,
-                                            "to_node_name": rf_hops[-1].to_node_name,
-                                            "total_distance": 0.0,
-                                            "total_snr": 0.0,
-                                            "traceroute_count": 0,
-                                            "hop_count_total": 0,
-                                            "recent_packets": [],
-                                            "route_preview": [
-                                                h.from_node_name for h in rf_hops
-                                            ]
-                                            + [rf_hops[-1].to_node_name],
-                                            "max_distance": 0.0,
-                                        }
-
-                                    pstats = path_stats[path_key]
-
-                                    # Update aggregates
-                                    pstats["traceroute_count"] += 1
-                                    pstats["total_distance"] += path_distance_km
-                                    pstats["hop_count_total"] += len(rf_hops)
-                                    pstats["total_snr"] += avg_path_snr
-                                    pstats["max_distance"] = max(
-                                        pstats["max_distance"], path_distance_km
-                                    )
+            analyzed_links: list[dict[str, Any]] = []
+            analyzed_paths: list[dict[str, Any]] = []
 
-                                    pstats["recent_packets"].append(packet["id"])
-                                    if len(pstats["recent_packets"]) > 5:
-                                        pstats["recent_packets"].pop(0)
+            for (node1_id, node2_id), stats in link_stats.items():
+                avg_distance = stats["total_distance"] / stats["traceroute_count"]
+                avg_snr = stats["total_snr"] / stats["traceroute_count"]
 
-                    except Exception as e:
-                        logger.warning(
-                            f"Error processing packet {packet.get('id', 'unknown')} for longest links: {e}"
-                        )
-                        continue
+                # Newest packet first
+                last_seen, packet_id = stats["recent"][0]
 
-                process_duration = time.time() - process_start
-                logger.info(f"TIMING: Packet processing took {process_duration:.3f}s")
-                logger.info(
-                    f"TIMING: Processed {packets_processed} packets, {hops_processed} hops, {distance_calculations} distance calculations"
-                )
-                logger.info(
-                    f"TIMING: Cache performance - {cache_hits} hits, {cache_misses} misses, final size: {len(location_cache)}"
+                analyzed_links.append(
+                    {
+                        "from_node_id": node1_id,
+                        "to_node_id": node2_id,
+                        "from_node_name": _name(node1_id),
+                        "to_node_name": _name(node2_id),
+                        "distance_km": round(avg_distance, 2),
+                        "avg_snr": round(avg_snr, 1),
+                        "traceroute_count": stats["traceroute_count"],
+                        "recent_packets": [pid for _ts, pid in stats["recent"]],
+                        "packet_id": packet_id,
+                        "packet_url": f"/packet/{packet_id}",
+                        "last_seen": last_seen,
+                    }
                 )
 
-                logger.info(
-                    f"Location cache efficiency: {len(location_cache)} unique location lookups cached"
+            # Build indirect paths results
+            for (from_id, to_id), stats in path_stats.items():
+                avg_distance = stats["total_distance"] / stats["traceroute_count"]
+                avg_snr = (
+                    (stats["total_snr"] / stats["traceroute_count"])
+                    if stats["total_snr"]
+                    else None
                 )
+                last_seen, pkt_id = stats["recent"][0]
 
-                # ------------------------------------------------------------------
-                # Build the final list from aggregated statistics.
-                # ------------------------------------------------------------------
-                build_start = time.time()
-                analyzed_links: list[dict[str, Any]] = []
-                analyzed_paths: list[dict[str, Any]] = []
-
-                for (node1_id, node2_id), stats in link_stats.items():
-                    if stats["traceroute_count"] == 0:
-                        continue
-
-                    avg_distance = stats["total_distance"] / stats["traceroute_count"]
-                    avg_snr = stats["total_snr"] / stats["traceroute_count"]
-
-                    # Get last_seen timestamp from the most recent packet
-                    last_seen = None
-                    if stats["recent_packets"] and len(stats["recent_packets"]) > 0:
-                        packet_id = stats["recent_packets"][0]
-                        pkt = next(
-                            (p for p in result["packets"] if p["id"] == packet_id), None
-                        )
-                        if pkt and "timestamp" in pkt:
-                            last_seen = pkt["timestamp"]
-
-                    packet_id = (
-                        stats["recent_packets"][0] if stats["recent_packets"] else None
-                    )
-                    packet_url = (
-                        f"/packet/{packet_id}" if packet_id is not None else None
-                    )
-
-                    analyzed_links.append(
-                        {
-                            "from_node_id": node1_id,
-                            "to_node_id": node2_id,
-                            "from_node_name": stats["from_node_name"],
-                            "to_node_name": stats["to_node_name"],
-                            "distance_km": round(avg_distance, 2),
-                            "avg_snr": round(avg_snr, 1),
-                            "traceroute_count": stats["traceroute_count"],
-                            "recent_packets": sorted(
-                                stats["recent_packets"], reverse=True
-                            ),
-                            "packet_id": packet_id,
-                            "packet_url": packet_url,
-                            "last_seen": last_seen,
-                        }
-                    )
-
-                # Build indirect paths results
-                for (from_id, to_id), stats in path_stats.items():
-                    if stats["traceroute_count"] == 0:
-                        continue
-
-                    avg_distance = stats["total_distance"] / stats["traceroute_count"]
-                    avg_snr = (
-                        (stats["total_snr"] / stats["traceroute_count"])
-                        if stats["total_snr"]
-                        else None
-                    )
-
-                    # Determine last_seen timestamp
-                    last_seen = None
-                    if stats["recent_packets"]:
-                        pkt_id = stats["recent_packets"][0]
-                        pkt_obj = next(
-                            (p for p in result["packets"] if p["id"] == pkt_id), None
-                        )
-                        if pkt_obj and "timestamp" in pkt_obj:
-                            last_seen = pkt_obj["timestamp"]
-
-                    pkt_id = (
-                        stats["recent_packets"][0] if stats["recent_packets"] else None
-                    )
-                    pkt_url = f"/packet/{pkt_id}" if pkt_id is not None else None
-
-                    analyzed_paths.append(
-                        {
-                            "from_node_id": from_id,
-                            "to_node_id": to_id,
-                            "from_node_name": stats["from_node_name"],
-                            "to_node_name": stats["to_node_name"],
-                            "total_distance_km": round(avg_distance, 2),
-                            "hop_count": int(
-                                round(
-                                    stats["hop_count_total"] / stats["traceroute_count"]
-                                )
-                            ),
-                            "avg_snr": round(avg_snr, 1)
-                            if avg_snr is not None
-                            else None,
-                            "traceroute_count": stats["traceroute_count"],
-                            "route_preview": stats["route_preview"],
-                            "recent_packets": sorted(
-                                stats["recent_packets"], reverse=True
-                            ),
-                            "packet_id": pkt_id,
-                            "packet_url": pkt_url,
-                            "last_seen": last_seen,
-                        }
-                    )
-
-                # Sort and trim results to the requested maximum
-                sort_start = time.time()
-                analyzed_links.sort(key=lambda x: x["distance_km"], reverse=True)
-                analyzed_links = analyzed_links[:max_results]
-                sort_duration = time.time() - sort_start
-
-                # Sort and trim indirect paths
-                analyzed_paths.sort(key=lambda x: x["total_distance_km"], reverse=True)
-                analyzed_paths = analyzed_paths[:max_results]
+                analyzed_paths.append(
+                    {
+                        "from_node_id": from_id,
+                        "to_node_id": to_id,
+                        "from_node_name": _name(from_id),
+                        "to_node_name": _name(to_id),
+                        "total_distance_km": round(avg_distance, 2),
+                        "hop_count": int(
+                            round(stats["hop_count_total"] / stats["traceroute_count"])
+                        ),
+                        "avg_snr": round(avg_snr, 1) if avg_snr is not None else None,
+                        "traceroute_count": stats["traceroute_count"],
+                        "route_preview": [_name(n) for n in stats["route"][1]],
+                        "recent_packets": [pid for _ts, pid in stats["recent"]],
+                        "packet_id": pkt_id,
+                        "packet_url": f"/packet/{pkt_id}",
+                        "last_seen": last_seen,
+                    }
+                )
 
-                build_duration = time.time() - build_start
-                logger.info(
-                    f"TIMING: Result building took {build_duration:.3f}s (sort: {sort_duration:.3f}s)"
+            # Sort (ties broken by node ids for a stable order) and trim results
+            sort_start = time.time()
+            analyzed_links.sort(
+                key=lambda x: (-x["distance_km"], x["from_node_id"], x["to_node_id"])
+            )
+            analyzed_links = analyzed_links[:max_results]
+            sort_duration = time.time() - sort_start
+
+            analyzed_paths.sort(
+                key=lambda x: (
+                    -x["total_distance_km"],
+                    x["from_node_id"],
+                    x["to_node_id"],
                 )
+            )
+            analyzed_paths = analyzed_paths[:max_results]
 
-                # ------------------------------------------------------------------
-                # Compose summary.
-                # ------------------------------------------------------------------
-                summary_start = time.time()
-                total_links = len(analyzed_links) + len(analyzed_paths)
-
-                # Format longest distances as strings for summary
-                longest_direct = None
-                if analyzed_links:
-                    longest_direct = f"{analyzed_links[0]['distance_km']:.2f} km"
-
-                longest_path = None
-                if analyzed_paths:
-                    longest_path = f"{analyzed_paths[0]['total_distance_km']:.2f} km"
-
-                result_dict = {
-                    "summary": {
-                        "total_links": total_links,
-                        "direct_links": len(analyzed_links),
-                        "longest_direct": longest_direct,
-                        "longest_path": longest_path,
-                    },
-                    "direct_links": analyzed_links,
-                    "indirect_links": analyzed_paths,
-                    "criteria": {
-                        "min_distance_km": min_distance_km,
-                        "min_snr": min_snr,
-                        "max_results": max_results,
-                        "analysis_period_days": 7,
-                    },
-                    "cache_stats": {
-                        "location_lookups_cached": len(location_cache),
-                    },
-                }
+            build_duration = time.time() - build_start
+            logger.info(
+                f"TIMING: Result building took {build_duration:.3f}s (sort: {sort_duration:.3f}s)"
+            )
 
-                summary_duration = time.time() - summary_start
-                total_duration = time.time() - start_time
+            # ------------------------------------------------------------------
+            # Compose summary.
+            # ------------------------------------------------------------------
+            total_links = len(analyzed_links) + len(analyzed_paths)
+
+            # Format longest distances as strings for summary
+            longest_direct = None
+            if analyzed_links:
+                longest_direct = f"{analyzed_links[0]['distance_km']:.2f} km"
+
+            longest_path = None
+            if analyzed_paths:
+                longest_path = f"{analyzed_paths[0]['total_distance_km']:.2f} km"
+
+            result_dict = {
+                "summary": {
+                    "total_links": total_links,
+                    "direct_links": len(analyzed_links),
+                    "longest_direct": longest_direct,
+                    "longest_path": longest_path,
+                },
+                "direct_links": analyzed_links,
+                "indirect_links": analyzed_paths,
+                "criteria": {
+                    "min_distance_km": min_distance_km,
+                    "min_snr": min_snr,
+                    "max_results": max_results,
+                    "analysis_period_days": 7,
+                },
+                "cache_stats": {
+                    "nodes_with_location": len(nodes_with_location),
+                    "time_slices": len(slices),
+                    "workers": workers,
+                },
+            }
 
-                logger.info(f"TIMING: Summary creation took {summary_duration:.3f}s")
-                logger.info(f"TIMING: Total function duration: {total_duration:.3f}s")
+            total_duration = time.time() - start_time
+            logger.info(f"TIMING: Total function duration: {total_duration:.3f}s")
+            if total_duration > 0:
                 logger.info(
                     f"TIMING: Breakdown - Fetch: {fetch_duration:.3f}s ({fetch_duration / total_duration * 100:.1f}%), "
+                    f"Parse: {parse_duration:.3f}s ({parse_duration / total_duration * 100:.1f}%), "
                     f"Prefetch: {prefetch_duration:.3f}s ({prefetch_duration / total_duration * 100:.1f}%), "
                     f"Process: {process_duration:.3f}s ({process_duration / total_duration * 100:.1f}%), "
                     f"Build: {build_duration:.3f}s ({build_duration / total_duration * 100:.1f}%)"
                 )
 
-                return result_dict
-
-            finally:
-                # Restore original implementation to avoid side-effects
-                _tru.get_node_location_at_timestamp = cast(Any, _orig_get_location)
+            return result_dict
 
         except Exception as e:
             logger.error(f"Error in longest links analysis: {e}")
             raise
 
     @staticmethod
+    def _merge_neighbor_edges(
+        nodes: dict[int, dict[str, Any]],
+        direct_links: dict[tuple[int, ...], dict[str, Any]],
+        stats: dict[str, int],
+        filters: dict[str, Any],
+        min_snr: float,
+    ) -> None:
+        """Add the neighbor_edge reports of the time range to the graph in place."""
+        edges = NeighborRepository.get_edges(
+            start_time=filters.get("start_time"),
+            end_time=filters.get("end_time"),
+            min_snr=None if min_snr == -200 else min_snr,
+        )
+        stats["neighbor_edges"] = len(edges)
+        if not edges:
+            return
+
+        new_ids = {
+            node_id
+            for edge in edges
+            for node_id in (edge["reporter_id"], edge["neighbor_id"])
+            if node_id not in nodes
+        }
+        names = get_bulk_node_names(list(new_ids)) if new_ids else {}
+
+        for edge in edges:
+            reporter_id, neighbor_id = edge["reporter_id"], edge["neighbor_id"]
+            for node_id in (reporter_id, neighbor_id):
+                node = nodes.get(node_id)
+                if node is None:
+                    nodes[node_id] = {
+                        "id": node_id,
+                        "name": names.get(node_id) or f"!{node_id:08x}",
+                        "packet_count": 0,
+                        "total_snr": 0.0,
+                        "snr_count": 0,
+                        "connections": set(),
+                        "last_seen": edge["last_seen"],
+                    }
+                elif edge["last_seen"] > node["last_seen"]:
+                    node["last_seen"] = edge["last_seen"]
+            nodes[reporter_id]["connections"].add(neighbor_id)
+            nodes[neighbor_id]["connections"].add(reporter_id)
+
+            link_key = tuple(sorted([reporter_id, neighbor_id]))
+            link = direct_links.get(link_key)
+            if link is None:
+                link = direct_links[link_key] = {
+                    "source": link_key[0],
+                    "target": link_key[1],
+                    "snr_values": [],
+                    "packet_count": 0,
+                    "last_seen": edge["last_seen"],
+                    "last_packet_id": None,
+                }
+                stats["links_found"] += 1
+            elif edge["last_seen"] > link["last_seen"]:
+                link["last_seen"] = edge["last_seen"]
+            link.setdefault("neighbor_snr_values", []).append(edge["snr"] or 0.0)
+
+    @staticmethod
+    @result_cache.cached("network_graph")
     def get_network_graph_data(
         hours: int = 24,
         min_snr: float = -200.0,
         include_indirect: bool = False,
         filters: dict | None = None,
         limit_packets: int = 5000,
+        include_neighbors: bool = True,
     ) -> dict[str, Any]:
         """
         Extract RF links from traceroute data to build a network connectivity graph.
@@ -969,6 +767,8 @@ class TracerouteService:
             include_indirect: Whether to include indirect (multi-hop) connections
             filters: Optional filters dict with start_time, end_time, gateway_id, etc.
             limit_packets: Maximum number of packets to analyze
+            include_neighbors: Merge the links reported by NEIGHBORINFO packets
+                (skipped with gateway or channel filters, which they lack)
 
         Returns:
             Dictionary with nodes and links data for graph visualization
@@ -1137,6 +937,15 @@ class TracerouteService:
                     )
                     continue
 
+            if (
+                include_neighbors
+                and not filters.get("gateway_id")
+                and not filters.get("primary_channel")
+            ):
+                TracerouteService._merge_neighbor_edges(
+                    nodes, direct_links, stats, filters, min_snr
+                )
+
             # Get location data for all nodes in the graph
             # Import here to avoid circular dependencies
             from ..database.repositories import LocationRepository
@@ -1157,13 +966,16 @@ class TracerouteService:
             # Process direct links - calculate average SNR and strength
             processed_links = []
             for link_data in direct_links.values():
-                avg_snr = sum(link_data["snr_values"]) / len(link_data["snr_values"])
+                neighbor_snrs = link_data.get("neighbor_snr_values", [])
+                snr_values = link_data["snr_values"] or neighbor_snrs
+                avg_snr = sum(snr_values) / len(snr_values)
+                reports = link_data["packet_count"] + len(neighbor_snrs)
 
                 # Calculate link strength based on SNR and packet count
                 # Higher SNR and more packets = stronger link
                 strength = min(
                     10,
-                    max(1, (avg_snr + 20) / 5 + math.log10(link_data["packet_count"])),
+                    max(1, (avg_snr + 20) / 5 + math.log10(reports)),
                 )
 
                 processed_links.append(
@@ -1176,6 +988,19 @@ class TracerouteService:
                         "strength": round(strength, 1),
                         "last_seen": link_data["last_seen"],
                         "last_packet_id": link_data["last_packet_id"],
+                        "neighbor_snr": round(
+                            sum(neighbor_snrs) / len(neighbor_snrs), 1
+                        )
+                        if neighbor_snrs
+                        else None,
+                        "sources": [
+                            source
+                            for source, present in (
+                                ("traceroute", link_data["packet_count"] > 0),
+                                ("neighborinfo", bool(neighbor_snrs)),
+                            )
+                            if present
+                        ],
                     }
                 )
 
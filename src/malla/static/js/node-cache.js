@@ -1,38 +1,50 @@
 (function () {
-    const CACHE_KEY = 'malla_nodes_cache_v1';
-    const CACHE_TTL_MS = 15 * 60 * 1000; // 15 minutes
+    const CACHE_KEY = 'malla_nodes_cache_v2';
+    const SYNC_INTERVAL_MS = 5 * 60 * 1000; // 5 minutes between delta syncs
 
     // Internal state shared across the page
     let _nodes = null;              // Array of node objects
+    let _byId = new Map();          // node_id -> node object in _nodes
+    let _epoch = null;              // Database the cached list came from
+    let _version = 0;               // Last sync version applied
+    let _syncedAt = 0;              // When the last sync finished (ms)
     let _loaded = false;            // Whether we attempted to load
     let _loadPromise = null;        // Promise that resolves once loading finished
 
+    function _setNodes(nodes) {
+        _nodes = nodes;
+        _byId = new Map(nodes.map((n) => [n.node_id, n]));
+    }
+
     /**
-     * Attempt to restore cached node list from localStorage.
-     * Returns the cached array if it exists and is still fresh, otherwise null.
+     * Restore the cached node list and its sync version from localStorage.
+     * Returns true if a cached list was found.
      */
     function _restoreFromLocalStorage() {
         try {
             const raw = localStorage.getItem(CACHE_KEY);
-            if (!raw) return null;
+            if (!raw) return false;
 
             const parsed = JSON.parse(raw);
-            if (!parsed || !Array.isArray(parsed.nodes)) return null;
-            if (Date.now() - (parsed.timestamp || 0) > CACHE_TTL_MS) return null; // stale
+            if (!parsed || !Array.isArray(parsed.nodes)) return false;
 
-            return parsed.nodes;
+            _setNodes(parsed.nodes);
+            _epoch = parsed.epoch || null;
+            _version = parsed.version || 0;
+            _syncedAt = parsed.timestamp || 0;
+            return true;
         } catch (err) {
             console.warn('NodeCache: Failed to restore from localStorage:', err);
-            return null;
+            return false;
         }
     }
 
     /**
-     * Persist node list to localStorage together with a timestamp.
+     * Persist node list to localStorage together with its sync version.
      */
-    function _persistToLocalStorage(nodes) {
+    function _persistToLocalStorage() {
         try {
-            const payload = { timestamp: Date.now(), nodes };
+            const payload = { timestamp: _syncedAt, epoch: _epoch, version: _version, nodes: _nodes };
             localStorage.setItem(CACHE_KEY, JSON.stringify(payload));
         } catch (err) {
             // If storage quota exceeded or disabled, fail silently.
@@ -40,9 +52,67 @@
         }
     }
 
+    function _merge(node) {
+        const existing = _byId.get(node.node_id);
+        if (existing) {
+            Object.assign(existing, node);
+        } else {
+            _nodes.push(node);
+            _byId.set(node.node_id, node);
+        }
+    }
+
+    /**
+     * Apply the changes since the cached version, paging through
+     * /api/nodes/sync. Starts over when the server reports another database.
+     */
+    async function _sync() {
+        if (!_nodes) _setNodes([]);
+        for (;;) {
+            const resp = await fetch(`/api/nodes/sync?since=${_version}`);
+            if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+            const data = await resp.json();
+
+            if (data.epoch !== _epoch || data.since !== _version) {
+                // Different or rebuilt database: the response is a full list
+                _setNodes([]);
+                _epoch = data.epoch;
+            }
+            (data.nodes || []).forEach(_merge);
+            if (data.deleted && data.deleted.length) {
+                const deleted = new Set(data.deleted);
+                _setNodes(_nodes.filter((n) => !deleted.has(n.node_id)));
+            }
+            _version = data.version;
+            if (!data.more) break;
+        }
+        _syncedAt = Date.now();
+        _persistToLocalStorage();
+    }
+
+    /**
+     * Fetch the popular node list from the server, ordered by *orderBy*.
+     * Falls back to sorting the cached list.
+     */
+    async function _popular(orderBy, limit) {
+        try {
+            const resp = await fetch(`/api/nodes/search?order_by=${orderBy}&limit=${limit}`);
+            if (resp.ok) {
+                const data = await resp.json();
+                if (Array.isArray(data.nodes)) return data.nodes;
+            }
+        } catch (err) {
+            console.warn('NodeCache: popular node request failed', err);
+        }
+        await NodeCache.load();
+        const sorted = [..._nodes].sort((a, b) => (b[orderBy] || 0) - (a[orderBy] || 0));
+        return sorted.slice(0, limit);
+    }
+
     const NodeCache = {
         /**
-         * Load the full node list, restoring from cache if possible.
+         * Load the node list, restoring from cache if possible and fetching
+         * only the changes since the cached version.
          * Always returns a Promise which resolves to the array of nodes.
          */
         load() {
@@ -50,25 +120,22 @@
             if (_loadPromise) return _loadPromise;
 
             _loadPromise = new Promise(async (resolve) => {
-                // 1. Try localStorage first
-                const cached = _restoreFromLocalStorage();
-                if (cached) {
-                    _nodes = cached;
+                // 1. Cached list: usable right away, brought up to date in the background
+                if (_restoreFromLocalStorage()) {
                     _loaded = true;
                     resolve(_nodes);
+                    if (Date.now() - _syncedAt > SYNC_INTERVAL_MS) {
+                        _sync().catch((err) => console.warn('NodeCache: Failed to sync node list:', err));
+                    }
                     return;
                 }
 
-                // 2. Fetch from API
+                // 2. No cache yet: fetch the full list once
                 try {
-                    const resp = await fetch('/api/nodes?limit=1000');
-                    if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
-                    const data = await resp.json();
-                    _nodes = data.nodes || [];
-                    _persistToLocalStorage(_nodes);
+                    await _sync();
                 } catch (err) {
                     console.error('NodeCache: Failed to fetch node list:', err);
-                    _nodes = [];
+                    _setNodes([]);
                 }
 
                 _loaded = true;
@@ -84,74 +151,56 @@
          */
         async getNode(nodeId) {
             await this.load();
-            const idStr = nodeId.toString();
-            return _nodes.find((n) => n.node_id.toString() === idStr) || null;
+            return _byId.get(Number(nodeId)) || null;
         },
 
         /**
-         * Search nodes (client-side). Returns array matching the query.
+         * Search nodes. The server answers from its trigram index and ranks
+         * exact, then prefix, then substring matches; if it cannot be reached
+         * the cached list is filtered instead.
          * Matches against long_name, short_name, decimal ID and hex ID (with leading '!').
          * Limit optional.
          */
         async search(query, limit = 20) {
-            // If we already have the full list, search locally
-            if (_loaded) {
-                const lower = query.toLowerCase();
-                const results = _nodes.filter((node) => {
-                    const nameLong = (node.long_name || '').toLowerCase();
-                    const nameShort = (node.short_name || '').toLowerCase();
-                    const hexId = `!${node.node_id.toString(16).padStart(8, '0')}`.toLowerCase();
-                    const decId = node.node_id.toString();
-                    return (
-                        nameLong.includes(lower) ||
-                        nameShort.includes(lower) ||
-                        hexId.includes(lower) ||
-                        decId.includes(lower)
-                    );
-                });
-                return results.slice(0, limit);
-            }
-
-            // If we're still loading the big list, perform a quick focused query to the API
             try {
-                const resp = await fetch(`/api/nodes?search=${encodeURIComponent(query)}&limit=${limit}`);
+                const resp = await fetch(`/api/nodes/search?q=${encodeURIComponent(query)}&limit=${limit}`);
                 if (resp.ok) {
                     const data = await resp.json();
-                    if (Array.isArray(data.nodes)) {
-                        // Merge the quick results into our cache for future lookups
-                        data.nodes.forEach((n) => {
-                            if (n && n.node_id !== undefined) {
-                                NodeCache.addNode(n);
-                            }
-                        });
-                        return data.nodes;
-                    }
+                    if (Array.isArray(data.nodes)) return data.nodes;
                 }
             } catch (err) {
-                console.warn('NodeCache.search: fallback API search failed', err);
+                console.warn('NodeCache.search: API search failed, searching cached list', err);
             }
 
-            // As a last resort, wait for the full load to finish then search
             await this.load();
-            return this.search(query, limit);
+            const lower = query.toLowerCase();
+            const results = _nodes.filter((node) => {
+                const nameLong = (node.long_name || '').toLowerCase();
+                const nameShort = (node.short_name || '').toLowerCase();
+                const hexId = `!${node.node_id.toString(16).padStart(8, '0')}`.toLowerCase();
+                const decId = node.node_id.toString();
+                return (
+                    nameLong.includes(lower) ||
+                    nameShort.includes(lower) ||
+                    hexId.includes(lower) ||
+                    decId.includes(lower)
+                );
+            });
+            return results.slice(0, limit);
         },
 
         /**
          * Return top nodes ordered by packet_count_24h (desc) – used for "popular" list.
          */
         async topByPackets(limit = 20) {
-            await this.load();
-            const sorted = [..._nodes].sort((a, b) => (b.packet_count_24h || 0) - (a.packet_count_24h || 0));
-            return sorted.slice(0, limit);
+            return _popular('packet_count_24h', limit);
         },
 
         /**
          * Return nodes ordered by gateway_packet_count_24h desc.
          */
         async topByGatewayPackets(limit = 20) {
-            await this.load();
-            const sorted = [..._nodes].sort((a, b) => (b.gateway_packet_count_24h || 0) - (a.gateway_packet_count_24h || 0));
-            return sorted.slice(0, limit);
+            return _popular('gateway_packet_count_24h', limit);
         },
 
         /**
@@ -159,14 +208,9 @@
          */
         addNode(node) {
             if (!node || typeof node.node_id === 'undefined') return;
-            const existingIdx = _nodes ? _nodes.findIndex((n) => n.node_id === node.node_id) : -1;
-            if (existingIdx >= 0) {
-                _nodes[existingIdx] = { ..._nodes[existingIdx], ...node };
-            } else {
-                if (!_nodes) _nodes = [];
-                _nodes.push(node);
-            }
-            _persistToLocalStorage(_nodes);
+            if (!_nodes) _setNodes([]);
+            _merge(node);
+            _persistToLocalStorage();
         },
     };
 
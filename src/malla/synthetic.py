@@ -0,0 +1,761 @@
+"""
+Seeded synthetic mesh traffic for load and benchmark databases
+
+Generates a capture database that looks like real ``malla-capture`` output:
+nodes clustered around towns with positions, names and hardware, a subset of
+them acting as MQTT gateways, a realistic portnum mix, every transmission
+received by one or more gateways (multi-gateway duplicates with hop counts,
+RSSI and SNR derived from distance), traceroute responses following plausible
+multi-hop RF paths over the neighbour graph, and chat.
+
+The same seed always produces the same mesh and traffic, independent of the
+number of worker processes.  Traffic is generated in time slices by worker
+processes that each write a throw-away shard database; the main process merges
+the shards in time order with ``INSERT ... SELECT`` while the secondary indexes
+are dropped, which keeps 10M-100M row databases practical.
+
+The named :data:`PRESETS` (``small``, ``community``, ``country``) are shared by
+the demo database script and every benchmark so results are comparable.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import random
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from meshtastic import config_pb2, mesh_pb2, portnums_pb2, telemetry_pb2
+
+from .database import neighbors, node_activity, relays, telemetry
+from .ingest import BulkWriter, map_chunks
+
+logger = logging.getLogger(__name__)
+
+# Bump when the generated data changes so cached preset databases are rebuilt
+GENERATOR_VERSION = 1
+
+# Upper bound of rows generated per slice (one shard database per slice)
+SLICE_ROWS = 250_000
+
+BROADCAST_ADDR = 0xFFFFFFFF
+
+TELEMETRY_APP = portnums_pb2.PortNum.TELEMETRY_APP
+POSITION_APP = portnums_pb2.PortNum.POSITION_APP
+ROUTING_APP = portnums_pb2.PortNum.ROUTING_APP
+NODEINFO_APP = portnums_pb2.PortNum.NODEINFO_APP
+TEXT_MESSAGE_APP = portnums_pb2.PortNum.TEXT_MESSAGE_APP
+NEIGHBORINFO_APP = portnums_pb2.PortNum.NEIGHBORINFO_APP
+TRACEROUTE_APP = portnums_pb2.PortNum.TRACEROUTE_APP
+# PKI direct messages cannot be decoded by a capture and stay UNKNOWN_APP
+UNKNOWN_APP = portnums_pb2.PortNum.UNKNOWN_APP
+
+DEFAULT_PORTNUM_MIX: tuple[tuple[int, float], ...] = (
+    (TELEMETRY_APP, 0.30),
+    (POSITION_APP, 0.20),
+    (ROUTING_APP, 0.15),
+    (NODEINFO_APP, 0.10),
+    (TEXT_MESSAGE_APP, 0.08),
+    (NEIGHBORINFO_APP, 0.07),
+    (TRACEROUTE_APP, 0.05),
+    (UNKNOWN_APP, 0.05),
+)
+
+HW_MODELS = ("HELTEC_V3", "TBEAM", "RAK4631", "T_ECHO", "STATION_G2", "TLORA_V2_1_1P6")
+CHAT_PHRASES = (
+    "Hello mesh!",
+    "Anyone on frequency?",
+    "Testing new antenna on the roof",
+    "Copy, 5/5 here",
+    "Heading out, back in an hour",
+    "Signal is great today",
+    "Who is running the repeater on the hill?",
+    "Good morning everyone",
+    "Power outage in my area, running on battery",
+    "73",
+)
+
+# Columns written by the generator, in row tuple order
+ROW_COLUMNS: tuple[str, ...] = (
+    "timestamp",
+    "topic",
+    "from_node_id",
+    "to_node_id",
+    "portnum",
+    "portnum_name",
+    "gateway_id",
+    "channel_id",
+    "mesh_packet_id",
+    "rssi",
+    "snr",
+    "hop_limit",
+    "hop_start",
+    "payload_length",
+    "raw_payload",
+    "processed_successfully",
+    "via_mqtt",
+    "want_ack",
+    "channel_index",
+    "rx_time",
+    "relay_node",
+    "message_type",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class MeshPreset:
+    """Size and shape of a synthetic mesh."""
+
+    name: str
+    nodes: int
+    gateways: int
+    days: float
+    packets: int
+    clusters: int
+    radius_km: float
+    center: tuple[float, float] = (55.75, 37.62)
+    region: str = "EU_868"
+    link_range_km: float = 12.0
+    hop_start: int = 3
+    channels: tuple[tuple[str, float], ...] = (("LongFast", 0.9), ("MediumFast", 0.1))
+    portnum_mix: tuple[tuple[int, float], ...] = DEFAULT_PORTNUM_MIX
+
+
+PRESETS: dict[str, MeshPreset] = {
+    "small": MeshPreset(
+        name="small",
+        nodes=60,
+        gateways=6,
+        days=2,
+        packets=20_000,
+        clusters=1,
+        radius_km=15,
+    ),
+    "community": MeshPreset(
+        name="community",
+        nodes=600,
+        gateways=40,
+        days=7,
+        packets=2_000_000,
+        clusters=4,
+        radius_km=60,
+    ),
+    "country": MeshPreset(
+        name="country",
+        nodes=10_000,
+        gateways=800,
+        days=30,
+        packets=50_000_000,
+        clusters=60,
+        radius_km=900,
+    ),
+}
+
+
+def get_preset(name: str, **overrides: Any) -> MeshPreset:
+    """Return the named preset, optionally with some fields overridden."""
+    try:
+        preset = PRESETS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown preset {name!r} (choose from {', '.join(PRESETS)})"
+        ) from None
+    overrides = {key: value for key, value in overrides.items() if value is not None}
+    return replace(preset, **overrides) if overrides else preset
+
+
+# ---------------------------------------------------------------------------
+# Topology
+# ---------------------------------------------------------------------------
+
+
+@dataclass(slots=True)
+class _Topology:
+    node_ids: list[int]
+    hex_ids: list[str]
+    positions: list[tuple[float, float, int]]
+    channels: list[str]
+    gateways: list[int]
+    # Per node: (node index, distance km) of nodes in radio range, nearest first
+    neighbors: list[list[tuple[int, float]]]
+    # Per node: (gateway index, hops, last hop km, reception probability)
+    receptions: list[list[tuple[int, int, float, float]]]
+    # Cumulative transmit activity weights for random.choices()
+    activity: list[float]
+
+
+def _distance_km(a: tuple[float, float, int], b: tuple[float, float, int]) -> float:
+    # Equirectangular approximation, plenty for RF ranges
+    x = math.radians(b[1] - a[1]) * math.cos(math.radians((a[0] + b[0]) / 2))
+    y = math.radians(b[0] - a[0])
+    return 6371.0 * math.hypot(x, y)
+
+
+def _grid_index(
+    positions: list[tuple[float, float, int]],
+    cell_lat: float,
+    cell_lon: float,
+) -> dict[tuple[int, int], list[int]]:
+    grid: dict[tuple[int, int], list[int]] = {}
+    for index, (lat, lon, _alt) in enumerate(positions):
+        grid.setdefault((int(lat // cell_lat), int(lon // cell_lon)), []).append(index)
+    return grid
+
+
+def _nearby(
+    grid: dict[tuple[int, int], list[int]],
+    cell_lat: float,
+    cell_lon: float,
+    position: tuple[float, float, int],
+    cells: int,
+) -> list[int]:
+    row, col = int(position[0] // cell_lat), int(position[1] // cell_lon)
+    found: list[int] = []
+    for d_row in range(-cells, cells + 1):
+        for d_col in range(-cells, cells + 1):
+            found.extend(grid.get((row + d_row, col + d_col), ()))
+    return found
+
+
+@lru_cache(maxsize=4)
+def build_topology(preset: MeshPreset, seed: int) -> _Topology:
+    """Place nodes and gateways and derive radio neighbours (cached per process)."""
+    rng = random.Random(f"{seed}:topology")
+    center_lat, center_lon = preset.center
+    km_lat = 1 / 111.0
+    km_lon = 1 / (111.0 * math.cos(math.radians(center_lat)))
+
+    towns = []
+    for _ in range(max(preset.clusters, 1)):
+        distance = preset.radius_km * math.sqrt(rng.random())
+        bearing = rng.uniform(0, 2 * math.pi)
+        towns.append(
+            (
+                center_lat + distance * math.cos(bearing) * km_lat,
+                center_lon + distance * math.sin(bearing) * km_lon,
+                rng.uniform(3, 12),  # town radius km
+            )
+        )
+
+    # Unique, non-reserved node numbers
+    node_ids: list[int] = []
+    seen: set[int] = set()
+    while len(node_ids) < preset.nodes:
+        node_id = rng.randint(0x10000000, 0xFFFFFFFE)
+        if node_id not in seen:
+            seen.add(node_id)
+            node_ids.append(node_id)
+
+    positions = []
+    for _ in range(preset.nodes):
+        town_lat, town_lon, town_radius = rng.choice(towns)
+        positions.append(
+            (
+                town_lat + rng.gauss(0, town_radius) * km_lat,
+                town_lon + rng.gauss(0, town_radius) * km_lon,
+                int(rng.uniform(80, 400)),
+            )
+        )
+
+    channel_names = [name for name, _ in preset.channels]
+    channel_weights = [weight for _, weight in preset.channels]
+    channels = rng.choices(channel_names, weights=channel_weights, k=preset.nodes)
+    gateways = sorted(
+        rng.sample(range(preset.nodes), min(preset.gateways, preset.nodes))
+    )
+
+    link_range = preset.link_range_km
+    # Grid cells of one link range; longitude cells are sized for the
+    # node furthest from the equator so neighbouring cells always cover it
+    cell_lat = link_range * km_lat
+    min_cos = min(math.cos(math.radians(lat)) for lat, _, _ in positions)
+    cell_lon = link_range / (111.0 * max(min_cos, 0.1))
+    grid = _grid_index(positions, cell_lat, cell_lon)
+
+    neighbors: list[list[tuple[int, float]]] = []
+    for index, position in enumerate(positions):
+        in_range = [
+            (other, distance)
+            for other in _nearby(grid, cell_lat, cell_lon, position, 1)
+            if other != index
+            and (distance := _distance_km(position, positions[other])) <= link_range
+        ]
+        in_range.sort(key=lambda item: item[1])
+        neighbors.append(in_range[:8])
+
+    gateway_grid = _grid_index([positions[g] for g in gateways], cell_lat, cell_lon)
+    gateway_grid = {
+        cell: [gateways[i] for i in members] for cell, members in gateway_grid.items()
+    }
+    max_cells = preset.hop_start + 1
+    receptions: list[list[tuple[int, int, float, float]]] = []
+    for position in positions:
+        reachable = []
+        for gateway in _nearby(gateway_grid, cell_lat, cell_lon, position, max_cells):
+            distance = _distance_km(position, positions[gateway])
+            hops = max(0, math.ceil(distance / link_range) - 1)
+            if hops > preset.hop_start:
+                continue
+            last_hop = distance if hops == 0 else link_range * rng.uniform(0.3, 0.95)
+            reachable.append((gateway, hops, last_hop, 0.9 * 0.55**hops))
+        if not reachable:
+            # Isolated node: heard by the nearest gateway through a long relay chain
+            gateway = min(gateways, key=lambda g: _distance_km(position, positions[g]))
+            reachable.append(
+                (gateway, preset.hop_start, link_range * rng.uniform(0.5, 0.95), 0.3)
+            )
+        reachable.sort(key=lambda item: (item[1], item[2]))
+        receptions.append(reachable[:12])
+
+    # A few chatty nodes and a long tail of quiet ones
+    cumulative = 0.0
+    activity = []
+    for _ in range(preset.nodes):
+        cumulative += rng.lognormvariate(0, 1)
+        activity.append(cumulative)
+
+    return _Topology(
+        node_ids=node_ids,
+        hex_ids=[f"!{node_id:08x}" for node_id in node_ids],
+        positions=positions,
+        channels=channels,
+        gateways=gateways,
+        neighbors=neighbors,
+        receptions=receptions,
+        activity=activity,
+    )
+
+
+def _node_names(index: int, node_id: int) -> tuple[str, str]:
+    return f"Node {index + 1} {node_id & 0xFFFF:04x}", f"{node_id & 0xFFFF:04x}"
+
+
+def node_info_rows(
+    preset: MeshPreset, seed: int, first_seen: float, last_updated: float
+) -> list[tuple[Any, ...]]:
+    """Return node_info rows for every node of the synthetic mesh."""
+    topology = build_topology(preset, seed)
+    rng = random.Random(f"{seed}:nodeinfo")
+    gateways = set(topology.gateways)
+    rows = []
+    for index, node_id in enumerate(topology.node_ids):
+        long_name, short_name = _node_names(index, node_id)
+        rows.append(
+            (
+                node_id,
+                topology.hex_ids[index],
+                long_name,
+                short_name,
+                rng.choice(HW_MODELS),
+                "ROUTER" if index in gateways and rng.random() < 0.5 else "CLIENT",
+                False,
+                None,
+                topology.channels[index],
+                first_seen,
+                last_updated,
+            )
+        )
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Traffic (runs in worker processes)
+# ---------------------------------------------------------------------------
+
+
+def _link_quality(distance_km: float, link_range: float, rng: random.Random):
+    ratio = min(distance_km / link_range, 1.2)
+    snr = max(-20.0, min(12.0, 10.0 - 28.0 * ratio + rng.gauss(0, 1.5)))
+    rssi = int(max(-135.0, min(-30.0, -45.0 - 75.0 * ratio + rng.gauss(0, 3))))
+    return rssi, round(snr * 4) / 4
+
+
+def _trace_path(topology: _Topology, origin: int, rng: random.Random) -> list[int]:
+    """Random walk of 1-4 RF hops over the neighbour graph, without loops."""
+    path = [origin]
+    for _ in range(rng.randint(1, 4)):
+        candidates = [n for n, _ in topology.neighbors[path[-1]] if n not in path]
+        if not candidates:
+            break
+        path.append(rng.choice(candidates))
+    return path
+
+
+def _payload(
+    portnum: int,
+    sender: int,
+    timestamp: float,
+    topology: _Topology,
+    preset: MeshPreset,
+    rng: random.Random,
+) -> tuple[int, bytes, int, bool] | None:
+    """Return (to node, payload, payload length, want_ack) or None to skip."""
+    if portnum == TELEMETRY_APP:
+        telemetry = telemetry_pb2.Telemetry()
+        telemetry.time = int(timestamp)
+        if sender % 10 == 0:
+            metrics = telemetry.environment_metrics
+            metrics.temperature = 15 + 10 * math.sin(timestamp / 86400 * 2 * math.pi)
+            metrics.relative_humidity = rng.uniform(30, 90)
+            metrics.barometric_pressure = rng.uniform(990, 1030)
+        else:
+            # Solar nodes: battery follows the day
+            phase = (sender % 97) / 97 * math.pi
+            battery = int(35 + 65 * abs(math.sin(timestamp / 86400 * math.pi + phase)))
+            metrics = telemetry.device_metrics
+            metrics.battery_level = battery
+            metrics.voltage = 3.3 + battery / 100 * 0.9
+            metrics.channel_utilization = rng.uniform(1, 35)
+            metrics.air_util_tx = rng.uniform(0.1, 5)
+            metrics.uptime_seconds = int(timestamp) % 2_000_000
+        payload = telemetry.SerializeToString()
+        return BROADCAST_ADDR, payload, len(payload), False
+
+    if portnum == POSITION_APP:
+        lat, lon, alt = topology.positions[sender]
+        position = mesh_pb2.Position()
+        position.latitude_i = int((lat + rng.gauss(0, 0.0002)) * 1e7)
+        position.longitude_i = int((lon + rng.gauss(0, 0.0002)) * 1e7)
+        position.altitude = alt
+        position.time = int(timestamp)
+        payload = position.SerializeToString()
+        return BROADCAST_ADDR, payload, len(payload), False
+
+    if portnum == NODEINFO_APP:
+        long_name, short_name = _node_names(sender, topology.node_ids[sender])
+        user = mesh_pb2.User()
+        user.id = topology.hex_ids[sender]
+        user.long_name = long_name
+        user.short_name = short_name
+        user.hw_model = mesh_pb2.HardwareModel.Value(HW_MODELS[sender % len(HW_MODELS)])
+        user.role = config_pb2.Config.DeviceConfig.Role.CLIENT
+        payload = user.SerializeToString()
+        return BROADCAST_ADDR, payload, len(payload), False
+
+    if portnum == TEXT_MESSAGE_APP:
+        payload = rng.choice(CHAT_PHRASES).encode()
+        if rng.random() < 0.15 and topology.neighbors[sender]:
+            to_node = topology.node_ids[rng.choice(topology.neighbors[sender])[0]]
+            return to_node, payload, len(payload), True
+        return BROADCAST_ADDR, payload, len(payload), False
+
+    if portnum == ROUTING_APP:
+        if not topology.neighbors[sender]:
+            return None
+        routing = mesh_pb2.Routing()
+        routing.error_reason = mesh_pb2.Routing.Error.NONE
+        payload = routing.SerializeToString()
+        to_node = topology.node_ids[rng.choice(topology.neighbors[sender])[0]]
+        return to_node, payload, len(payload), False
+
+    if portnum == NEIGHBORINFO_APP:
+        info = mesh_pb2.NeighborInfo()
+        info.node_id = topology.node_ids[sender]
+        info.node_broadcast_interval_secs = 900
+        for neighbor, distance in topology.neighbors[sender][:6]:
+            entry = info.neighbors.add()
+            entry.node_id = topology.node_ids[neighbor]
+            entry.snr = _link_quality(distance, preset.link_range_km, rng)[1]
+        payload = info.SerializeToString()
+        return BROADCAST_ADDR, payload, len(payload), False
+
+    if portnum == UNKNOWN_APP:
+        if not topology.neighbors[sender]:
+            return None
+        to_node = topology.node_ids[rng.choice(topology.neighbors[sender])[0]]
+        return to_node, b"", rng.randint(20, 120), True
+
+    return None
+
+
+def _traceroute(
+    origin: int, topology: _Topology, preset: MeshPreset, rng: random.Random
+) -> tuple[int, int, bytes] | None:
+    """Return (responder, origin node id, RouteDiscovery payload) of a traceroute."""
+    path = _trace_path(topology, origin, rng)
+    if len(path) < 2:
+        return None
+
+    def hop_snrs(nodes: list[int]) -> list[int]:
+        # SNR values are stored scaled by 4, like the firmware does
+        return [
+            int(
+                _link_quality(
+                    _distance_km(topology.positions[a], topology.positions[b]),
+                    preset.link_range_km,
+                    rng,
+                )[1]
+                * 4
+            )
+            for a, b in zip(nodes, nodes[1:], strict=False)
+        ]
+
+    discovery = mesh_pb2.RouteDiscovery()
+    discovery.route.extend(topology.node_ids[n] for n in path[1:-1])
+    discovery.snr_towards.extend(hop_snrs(path))
+    back = path[::-1]
+    discovery.route_back.extend(topology.node_ids[n] for n in back[1:-1])
+    discovery.snr_back.extend(hop_snrs(back))
+    return path[-1], topology.node_ids[origin], discovery.SerializeToString()
+
+
+def generate_slice(
+    task: tuple[MeshPreset, int, int, float, float, int, str],
+) -> tuple[int, str, int]:
+    """
+    Worker task: generate one time slice into a shard database.
+
+    Args:
+        task: (preset, seed, slice index, start, end, row budget, shard dir)
+
+    Returns:
+        Tuple of (slice index, shard path, rows written)
+    """
+    preset, seed, slice_index, start, end, budget, shard_dir = task
+    topology = build_topology(preset, seed)
+    rng = random.Random(f"{seed}:slice:{slice_index}")
+
+    portnums = [portnum for portnum, _ in preset.portnum_mix]
+    portnum_weights = [weight for _, weight in preset.portnum_mix]
+    node_count = len(topology.node_ids)
+
+    # Expected gateway receptions per transmission, to size the slice
+    mean_receptions = sum(
+        max(1.0, sum(r[3] for r in receptions)) for receptions in topology.receptions
+    ) / max(node_count, 1)
+    transmissions = max(1, int(budget / mean_receptions))
+    timestamps = sorted(rng.uniform(start, end) for _ in range(transmissions))
+    senders = rng.choices(
+        range(node_count), cum_weights=topology.activity, k=transmissions
+    )
+    chosen_portnums = rng.choices(portnums, weights=portnum_weights, k=transmissions)
+
+    rows: list[tuple[Any, ...]] = []
+    for timestamp, sender, portnum in zip(
+        timestamps, senders, chosen_portnums, strict=True
+    ):
+        if len(rows) >= budget:
+            break
+
+        if portnum == TRACEROUTE_APP:
+            traceroute = _traceroute(sender, topology, preset, rng)
+            if traceroute is None:
+                continue
+            sender, to_node, payload = traceroute
+            payload_length, want_ack = len(payload), False
+        else:
+            generated = _payload(portnum, sender, timestamp, topology, preset, rng)
+            if generated is None:
+                continue
+            to_node, payload, payload_length, want_ack = generated
+
+        from_node = topology.node_ids[sender]
+        channel = topology.channels[sender]
+        packet_id = rng.getrandbits(32)
+        portnum_name = portnums_pb2.PortNum.Name(portnum)
+        hop_start = preset.hop_start
+
+        receptions = topology.receptions[sender]
+        heard = [r for r in receptions if rng.random() < r[3]] or receptions[:1]
+        for gateway, hops, last_hop_km, _probability in heard:
+            rssi, snr = _link_quality(last_hop_km, preset.link_range_km, rng)
+            if hops:
+                relay = rng.choice(topology.neighbors[gateway] or [(gateway, 0.0)])[0]
+            else:
+                relay = sender
+            gateway_hex = topology.hex_ids[gateway]
+            received = timestamp + hops * 0.4 + rng.uniform(0, 0.25)
+            rows.append(
+                (
+                    received,
+                    f"msh/{preset.region}/2/e/{channel}/{gateway_hex}",
+                    from_node,
+                    to_node,
+                    portnum,
+                    portnum_name,
+                    gateway_hex,
+                    channel,
+                    packet_id,
+                    rssi,
+                    snr,
+                    hop_start - hops,
+                    hop_start,
+                    payload_length,
+                    payload,
+                    True,
+                    False,
+                    want_ack,
+                    0,
+                    int(received),
+                    topology.node_ids[relay] & 0xFF,
+                    "e",
+                )
+            )
+
+    rows.sort(key=lambda row: row[0])
+
+    shard_path = str(Path(shard_dir) / f"slice-{slice_index:06d}.db")
+    conn = sqlite3.connect(shard_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(f"CREATE TABLE packet_history ({', '.join(ROW_COLUMNS)})")
+    conn.executemany(
+        f"INSERT INTO packet_history VALUES ({', '.join('?' * len(ROW_COLUMNS))})",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+    return slice_index, shard_path, len(rows)
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+
+def generate_database(
+    db_path: str | Path,
+    preset: MeshPreset,
+    seed: int = 1,
+    workers: int = 1,
+    end_time: float | None = None,
+) -> dict[str, Any]:
+    """
+    Write a synthetic capture database.
+
+    Args:
+        db_path: Output database (an existing file is replaced)
+        preset: Mesh size and shape
+        seed: Random seed; the same seed and end_time give identical data
+        workers: Generator processes (1 generates in-process)
+        end_time: Timestamp of the end of the generated period (default: now,
+                  rounded down to the hour)
+
+    Returns:
+        Dictionary with rows, nodes, seconds and rows_per_second
+    """
+    db_path = Path(db_path)
+    if end_time is None:
+        end_time = float(int(time.time()) // 3600 * 3600)
+    start_time = end_time - preset.days * 86400
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+    started = time.monotonic()
+    writer = BulkWriter(str(db_path))
+    conn = writer.conn
+    try:
+        # Loading without secondary indexes and rebuilding them once is much
+        # faster than maintaining them row by row
+        index_sql = [
+            sql
+            for (sql,) in conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' "
+                "AND tbl_name = 'packet_history' AND sql IS NOT NULL"
+            )
+        ]
+        for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            "AND tbl_name = 'packet_history' AND sql IS NOT NULL"
+        ).fetchall():
+            conn.execute(f"DROP INDEX {name}")
+
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO node_info
+            (node_id, hex_id, long_name, short_name, hw_model, role,
+             is_licensed, mac_address, primary_channel, first_seen, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            node_info_rows(preset, seed, start_time, end_time),
+        )
+
+        slices = max(math.ceil(preset.packets / SLICE_ROWS), math.ceil(preset.days))
+        slice_seconds = (end_time - start_time) / slices
+        columns = ", ".join(ROW_COLUMNS)
+        rows = 0
+
+        with tempfile.TemporaryDirectory(dir=db_path.parent) as shard_dir:
+            tasks = (
+                (
+                    preset,
+                    seed,
+                    index,
+                    start_time + index * slice_seconds,
+                    start_time + (index + 1) * slice_seconds,
+                    preset.packets // slices
+                    + (1 if index < preset.packets % slices else 0),
+                    shard_dir,
+                )
+                for index in range(slices)
+            )
+            for index, shard_path, count in map_chunks(
+                generate_slice, tasks, workers=workers
+            ):
+                conn.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+                conn.execute(
+                    f"INSERT INTO packet_history ({columns}) "
+                    f"SELECT {columns} FROM shard.packet_history ORDER BY rowid"
+                )
+                neighbors.rebuild(conn.cursor(), "shard.packet_history")
+                telemetry.rebuild(conn.cursor(), "shard.packet_history")
+                conn.execute("DETACH DATABASE shard")
+                Path(shard_path).unlink()
+                rows += count
+                logger.info(
+                    f"Slice {index + 1}/{slices}: {rows} rows "
+                    f"({rows / (time.monotonic() - started):.0f} rows/s)"
+                )
+
+        telemetry.refresh_rollups(conn.cursor())
+        node_activity.refresh(conn.cursor(), since=0)
+        relays.rebuild(conn.cursor())
+
+        index_started = time.monotonic()
+        for sql in index_sql:
+            conn.execute(sql)
+        conn.execute("PRAGMA analysis_limit=1000")
+        conn.execute("ANALYZE")
+        logger.info(f"Indexes rebuilt in {time.monotonic() - index_started:.1f}s")
+    finally:
+        writer.close()
+
+    seconds = time.monotonic() - started
+    return {
+        "rows": rows,
+        "nodes": preset.nodes,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds > 0 else 0.0,
+    }
+
+
+def ensure_preset_database(
+    name: str,
+    seed: int = 1,
+    directory: str | Path = ".bench",
+    workers: int = 1,
+    max_age_hours: float = 24.0,
+) -> Path:
+    """
+    Return the path of a generated database for a preset, building it if needed.
+
+    Databases are cached per preset, seed and generator version and rebuilt
+    once they are older than *max_age_hours* so that "last 24 hours" queries
+    keep finding data.
+    """
+    preset = get_preset(name)
+    path = Path(directory) / f"{preset.name}-seed{seed}-v{GENERATOR_VERSION}.db"
+    if path.exists() and time.time() - path.stat().st_mtime < max_age_hours * 3600:
+        return path
+
+    logger.info(f"Generating '{preset.name}' benchmark database at {path}")
+    generate_database(path, preset, seed=seed, workers=workers)
+    return path
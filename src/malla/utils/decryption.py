@@ -12,7 +12,7 @@ import os
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from meshtastic import mesh_pb2, portnums_pb2
+from meshtastic import mesh_pb2, mqtt_pb2, portnums_pb2
 
 logger = logging.getLogger(__name__)
 
@@ -183,7 +183,9 @@ def try_decrypt_database_packet(
     Try to decrypt a packet stored in the database with encrypted payload.
 
     This function is for packets that were stored in the database as UNKNOWN_APP
-    but may contain encrypted data that can be decrypted.
+    but may contain encrypted data that can be decrypted.  The encrypted payload
+    is taken from the stored ``raw_service_envelope``, so only packets captured
+    with ``capture_store_raw`` enabled can be decrypted.
 
     Args:
         packet_data: Dictionary containing packet data from database
@@ -194,14 +196,22 @@ def try_decrypt_database_packet(
         Tuple of (decrypted_payload, portnum_name) if successful, None if failed
     """
     try:
-        # For database packets, we'd need access to the original encrypted payload
-        # which isn't currently stored. This is a limitation of the current design.
-        # We can only decrypt packets that still have the encrypted field.
+        raw_envelope = packet_data.get("raw_service_envelope")
+        if not raw_envelope:
+            logger.debug("Database packet has no stored raw envelope to decrypt")
+            return None
 
-        logger.debug(
-            "Database packet decryption not currently supported - encrypted data not stored"
+        service_envelope = mqtt_pb2.ServiceEnvelope()
+        service_envelope.ParseFromString(bytes(raw_envelope))
+        mesh_packet = service_envelope.packet
+
+        if not try_decrypt_mesh_packet(mesh_packet, channel_name, key_base64):
+            return None
+
+        return (
+            mesh_packet.decoded.payload,
+            portnums_pb2.PortNum.Name(mesh_packet.decoded.portnum),
         )
-        return None
 
     except Exception as e:
         logger.warning(f"Error in try_decrypt_database_packet: {e}")
@@ -0,0 +1,117 @@
+"""
+Streaming export helpers for Meshtastic Mesh Health Web UI
+
+Each writer consumes an iterator of row batches (lists of dicts, as yielded by
+``PacketRepository.iter_packets_for_export``) and yields encoded chunks, one
+per batch, so a Flask streaming response never holds more than one batch in
+memory.  Parquet support is optional and requires ``pyarrow``.
+"""
+
+import csv
+import importlib.util
+import io
+import json
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Parquet column types for the packet export; unlisted columns are int64
+_PARQUET_FLOAT_COLUMNS = {"timestamp", "rssi", "snr", "rx_time"}
+_PARQUET_STRING_COLUMNS = {
+    "timestamp_str",
+    "portnum_name",
+    "gateway_id",
+    "channel_id",
+    "text_content",
+}
+
+
+def parquet_available() -> bool:
+    """Return True if the optional pyarrow dependency is installed."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def iter_csv(
+    batches: Iterable[list[dict[str, Any]]], columns: Sequence[str]
+) -> Iterator[str]:
+    """Yield a CSV header followed by one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(batches: Iterable[list[dict[str, Any]]]) -> Iterator[str]:
+    """Yield newline-delimited JSON, one chunk per batch."""
+    for batch in batches:
+        yield "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in batch)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the caller."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_parquet(
+    batches: Iterable[list[dict[str, Any]]], columns: Sequence[str]
+) -> Iterator[bytes]:
+    """Yield a Parquet file with one row group per batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            (
+                name,
+                pa.float64()
+                if name in _PARQUET_FLOAT_COLUMNS
+                else pa.string()
+                if name in _PARQUET_STRING_COLUMNS
+                else pa.int64(),
+            )
+            for name in columns
+        ]
+    )
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
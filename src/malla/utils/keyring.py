@@ -0,0 +1,270 @@
+"""
+Channel keyring for decrypting captured Meshtastic packets.
+
+``malla-capture`` may see traffic from many channels with different keys.  The
+keyring holds the default key and every key from ``channel_keys`` with its
+AES algorithm object built once, and tries the candidates for a packet in the
+order of their recent hit rate for the packet's ``(channel_id, channel hash)``,
+so a busy private channel costs one AES attempt per packet instead of one per
+configured key.
+
+A decrypted payload is only accepted when it looks like a ``Data`` protobuf.
+The first plaintext byte must be the ``portnum`` field tag, which is checked
+after decrypting that single byte, so a wrong key is almost always rejected
+before the rest of the payload is decrypted or parsed.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from functools import lru_cache, reduce
+from typing import TYPE_CHECKING, Any
+
+from google.protobuf.message import DecodeError
+from meshtastic import mesh_pb2, portnums_pb2
+
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.ciphers import algorithms
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LABEL = "default"
+DERIVED_LABEL = "default-derived"
+
+# Buckets of hit scores kept; the least recently used bucket is dropped
+MAX_BUCKETS = 4096
+# Weight of older hits relative to the newest one in a bucket's scores
+SCORE_DECAY = 0.9
+
+# A serialized Data message starts with field 1 (portnum) as a varint
+_PORTNUM_TAG = b"\x08"
+_MAX_PORTNUM = portnums_pb2.PortNum.MAX
+
+
+@lru_cache(maxsize=1024)
+def derive_key(channel_name: str, key_base64: str) -> bytes:
+    """
+    Channel key for *channel_name*: the base key itself for the primary channel
+    (empty name), otherwise SHA-256 over the base key and the channel name.
+    Memoized, so a key is derived once per process.
+    """
+    key_bytes = base64.b64decode(key_base64)
+    if not channel_name:
+        return key_bytes
+    return hashlib.sha256(key_bytes + channel_name.encode("utf-8")).digest()
+
+
+@lru_cache(maxsize=256)
+def _aes(key: bytes) -> algorithms.AES:
+    # Imported on first use, so importing the capture skips cryptography
+    from cryptography.hazmat.primitives.ciphers import algorithms
+
+    return algorithms.AES(key)
+
+
+@lru_cache(maxsize=1024)
+def channel_hash(channel_name: str, key: bytes) -> int:
+    """The one-byte channel hash Meshtastic puts in ``MeshPacket.channel``."""
+    xor = reduce(lambda acc, byte: acc ^ byte, channel_name.encode("utf-8"), 0)
+    return reduce(lambda acc, byte: acc ^ byte, key, xor)
+
+
+def plausible_data(data: mesh_pb2.Data) -> bool:
+    """Whether a parsed ``Data`` message can come from a correct key."""
+    return 0 < data.portnum <= _MAX_PORTNUM
+
+
+@dataclass(frozen=True, slots=True)
+class ChannelKey:
+    """One candidate key and the channel it belongs to."""
+
+    label: str
+    key: bytes
+    # Channel name the key is configured for ("" = the primary channel)
+    channel: str = ""
+    # Topic region the key is limited to ("" = any region)
+    region: str = ""
+
+    def decrypt(self, encrypted: bytes, packet_id: int, sender_id: int) -> Any:
+        """Decrypt and parse *encrypted*; ``None`` unless it is plausible."""
+        from cryptography.hazmat.primitives.ciphers import Cipher, modes
+
+        nonce = packet_id.to_bytes(8, "little") + sender_id.to_bytes(8, "little")
+        decryptor = Cipher(_aes(self.key), modes.CTR(nonce)).decryptor()
+        head = decryptor.update(encrypted[:1])
+        if head != _PORTNUM_TAG:
+            return None
+        data = mesh_pb2.Data()
+        try:
+            data.ParseFromString(
+                head + decryptor.update(encrypted[1:]) + decryptor.finalize()
+            )
+        except DecodeError:
+            return None
+        return data if plausible_data(data) else None
+
+
+def parse_channel_keys(value: Mapping[str, str] | str | None) -> list[ChannelKey]:
+    """
+    Parse the ``channel_keys`` option.
+
+    It maps ``channel`` or ``region/channel`` to the channel's base64 PSK; the
+    ``MALLA_CHANNEL_KEYS`` environment variable takes the same pairs as
+    ``channel=key`` separated by commas.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        pairs = [item.partition("=")[::2] for item in value.split(",") if item]
+    else:
+        pairs = list(value.items())
+
+    keys = []
+    for label, key_base64 in pairs:
+        label = label.strip()
+        region, _, channel = label.rpartition("/")
+        try:
+            key = base64.b64decode(str(key_base64).strip(), validate=True)
+            _aes(key)
+        except ValueError as exc:
+            logger.warning("Ignoring channel key %r: %s", label, exc)
+            continue
+        keys.append(ChannelKey(label, key, channel=channel, region=region))
+    return keys
+
+
+class Keyring:
+    """Candidate keys for encrypted packets, ordered by recent hit rate."""
+
+    def __init__(
+        self,
+        default_key_base64: str,
+        channel_keys: Mapping[str, str] | str | None = None,
+        counter: Any | None = None,
+    ) -> None:
+        """
+        Args:
+            default_key_base64: Key tried for every packet, as is and derived
+                with the channel name from the topic
+            channel_keys: Additional keys, see :func:`parse_channel_keys`
+            counter: Optional metrics counter labelled ``(key, result)``
+        """
+        self.default_key_base64 = default_key_base64
+        self.default = ChannelKey(DEFAULT_LABEL, derive_key("", default_key_base64))
+        self.keys = parse_channel_keys(channel_keys)
+        self._counter = counter
+        self._lock = threading.Lock()
+        self._scores: OrderedDict[tuple[str, int], dict[str, float]] = OrderedDict()
+        self._hits: dict[str, int] = {}
+        self._misses: dict[str, int] = {}
+
+    def candidates(
+        self,
+        channel_name: str = "",
+        channel_id: str = "",
+        packet_channel: int | None = None,
+        region: str = "",
+    ) -> list[ChannelKey]:
+        """Keys to try for a packet, most promising first."""
+        candidates = [self.default]
+        if channel_name:
+            candidates.append(
+                ChannelKey(
+                    DERIVED_LABEL,
+                    derive_key(channel_name, self.default_key_base64),
+                    channel=channel_name,
+                )
+            )
+        for key in self.keys:
+            if key.region and key.region != region:
+                continue
+            if (
+                key.channel in (channel_name, channel_id)
+                or channel_hash(key.channel, key.key) == packet_channel
+            ):
+                candidates.append(key)
+
+        with self._lock:
+            scores = self._scores.get((channel_id, packet_channel), {})
+        name = channel_name or channel_id
+
+        def rank(indexed: tuple[int, ChannelKey]) -> tuple[float, bool, int]:
+            index, key = indexed
+            hash_match = channel_hash(key.channel or name, key.key) == packet_channel
+            return (-scores.get(key.label, 0.0), not hash_match, index)
+
+        return [key for _, key in sorted(enumerate(candidates), key=rank)]
+
+    def decrypt(
+        self,
+        mesh_packet: Any,
+        channel_name: str = "",
+        channel_id: str = "",
+        region: str = "",
+    ) -> ChannelKey | None:
+        """
+        Decrypt *mesh_packet* in place with the first key that yields a
+        plausible ``Data`` message.
+
+        Returns:
+            The key that decrypted the packet, or ``None``
+        """
+        encrypted = mesh_packet.encrypted
+        if not encrypted:
+            return None
+        packet_id = mesh_packet.id
+        sender_id = getattr(mesh_packet, "from")
+        bucket = (channel_id, mesh_packet.channel)
+
+        tried = []
+        for key in self.candidates(
+            channel_name, channel_id, mesh_packet.channel, region
+        ):
+            data = key.decrypt(encrypted, packet_id, sender_id)
+            if data is None:
+                tried.append(key.label)
+                continue
+            mesh_packet.decoded.CopyFrom(data)
+            self._record(bucket, key.label, tried)
+            return key
+        self._record(bucket, None, tried)
+        return None
+
+    def _record(
+        self, bucket: tuple[str, int], hit: str | None, misses: list[str]
+    ) -> None:
+        with self._lock:
+            for label in misses:
+                self._misses[label] = self._misses.get(label, 0) + 1
+            if hit is not None:
+                self._hits[hit] = self._hits.get(hit, 0) + 1
+                scores = self._scores.pop(bucket, {})
+                for label in scores:
+                    scores[label] *= SCORE_DECAY
+                scores[hit] = scores.get(hit, 0.0) + 1.0
+                self._scores[bucket] = scores
+                if len(self._scores) > MAX_BUCKETS:
+                    self._scores.popitem(last=False)
+        if self._counter is not None:
+            for label in misses:
+                self._counter.inc(label, "miss")
+            if hit is not None:
+                self._counter.inc(hit, "hit")
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hits and misses per key label since start-up."""
+        with self._lock:
+            labels = sorted(set(self._hits) | set(self._misses))
+            return {
+                label: {
+                    "hits": self._hits.get(label, 0),
+                    "misses": self._misses.get(label, 0),
+                }
+                for label in labels
+            }
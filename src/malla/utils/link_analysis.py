@@ -0,0 +1,420 @@
+"""
+Longest-links analysis helpers for Meshtastic Mesh Health Web UI
+
+The functions in this module are pure and picklable so that
+``TracerouteService.get_longest_links_analysis`` can fan the work out across a
+process pool.  Packets are split into contiguous time slices, each slice is
+parsed and analysed independently against a read-only snapshot of the shared
+location timeline, and the partial statistics are merged back together by
+link key.
+
+Partitioning depends only on the input packets (never on the number of
+workers) and partial results are merged in slice order, so the output is
+identical whether the analysis runs serially or in parallel.
+"""
+
+import atexit
+import bisect
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, NamedTuple
+
+from ..models.traceroute import RouteData, TraceroutePacket
+from .geo_utils import calculate_distance
+from .traceroute_utils import parse_traceroute_payload
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_NODE_ID = 4294967295
+
+# Number of time slices the packet set is split into.  Fixed so that merged
+# floating point aggregates do not depend on the worker count.
+DEFAULT_PARTITIONS = 32
+
+# Number of most recent packet ids kept per link / path
+RECENT_PACKETS_KEPT = 5
+
+
+class LinkPacket(NamedTuple):
+    """Minimal, picklable view of a traceroute packet row."""
+
+    id: int
+    timestamp: float
+    from_node_id: int | None
+    to_node_id: int | None
+    raw_payload: bytes
+    hop_start: int | None
+    hop_limit: int | None
+
+
+class ParsedLinkPacket(NamedTuple):
+    """A :class:`LinkPacket` together with its decoded route data."""
+
+    packet: LinkPacket
+    route_data: RouteData
+
+
+# node_id -> ((timestamp, latitude, longitude), ...) sorted by timestamp ASC,
+# as exported by LocationTimeline.snapshot()
+LocationSnapshot = dict[int, tuple[tuple[float, float, float], ...]]
+
+
+def packet_from_row(row: dict[str, Any]) -> LinkPacket:
+    """Convert a repository packet dict into a :class:`LinkPacket`."""
+    return LinkPacket(
+        id=row["id"],
+        timestamp=row["timestamp"],
+        from_node_id=row.get("from_node_id"),
+        to_node_id=row.get("to_node_id"),
+        raw_payload=bytes(row["raw_payload"]),
+        hop_start=row.get("hop_start"),
+        hop_limit=row.get("hop_limit"),
+    )
+
+
+def partition_by_time_slice(
+    packets: Sequence[LinkPacket], partitions: int = DEFAULT_PARTITIONS
+) -> list[list[LinkPacket]]:
+    """
+    Split packets into contiguous, equally sized time slices.
+
+    Packets are ordered by (timestamp, id) first, so the slices only depend on
+    the packets themselves.
+
+    Returns:
+        List of non-empty slices, oldest slice first
+    """
+    ordered = sorted(packets, key=lambda p: (p.timestamp, p.id))
+    if not ordered:
+        return []
+
+    partitions = max(1, min(partitions, len(ordered)))
+    size, remainder = divmod(len(ordered), partitions)
+
+    slices: list[list[LinkPacket]] = []
+    start = 0
+    for index in range(partitions):
+        end = start + size + (1 if index < remainder else 0)
+        slices.append(ordered[start:end])
+        start = end
+    return slices
+
+
+def parse_partition(
+    packets: Sequence[LinkPacket],
+) -> tuple[list[ParsedLinkPacket], set[int]]:
+    """
+    Parse the traceroute payloads of a time slice.
+
+    Returns:
+        Tuple of (parsed packets, node ids referenced by the slice)
+    """
+    parsed: list[ParsedLinkPacket] = []
+    node_ids: set[int] = set()
+
+    for packet in packets:
+        route_data = parse_traceroute_payload(packet.raw_payload)
+        # The payload is not needed once decoded; drop it to keep IPC cheap
+        parsed.append(ParsedLinkPacket(packet._replace(raw_payload=b""), route_data))
+
+        node_ids.update(route_data["route_nodes"])
+        node_ids.update(route_data["route_back"])
+        if packet.from_node_id is not None:
+            node_ids.add(packet.from_node_id)
+        if packet.to_node_id is not None:
+            node_ids.add(packet.to_node_id)
+
+    node_ids.discard(BROADCAST_NODE_ID)
+    return parsed, node_ids
+
+
+def snapshot_location_at(
+    snapshot: LocationSnapshot, node_id: int, timestamp: float
+) -> tuple[float, float] | None:
+    """
+    Return the (latitude, longitude) of a node at *timestamp*.
+
+    Uses the newest position at or before the timestamp, falling back to the
+    oldest later position when the node had not reported one yet.
+    """
+    points = snapshot.get(node_id)
+    if not points:
+        return None
+
+    index = bisect.bisect_right(points, (timestamp, float("inf"), float("inf")))
+    point = points[index - 1] if index > 0 else points[0]
+    return point[1], point[2]
+
+
+def _remember_recent(recent: list[tuple[float, int]], entry: tuple[float, int]):
+    """Keep the newest RECENT_PACKETS_KEPT (timestamp, packet_id) entries."""
+    recent.append(entry)
+    if len(recent) > RECENT_PACKETS_KEPT:
+        recent.sort(reverse=True)
+        del recent[RECENT_PACKETS_KEPT:]
+
+
+def analyze_partition(
+    parsed_packets: Sequence[ParsedLinkPacket],
+    snapshot: LocationSnapshot,
+    min_distance_km: float,
+    min_snr: float,
+) -> dict[str, Any]:
+    """
+    Aggregate direct link and multi-hop path statistics for one time slice.
+
+    Returns:
+        Dictionary with ``links`` and ``paths`` keyed by link / path key plus
+        ``packets_processed`` and ``hops_processed`` counters.
+    """
+    link_stats: dict[tuple[int, int], dict[str, Any]] = {}
+    path_stats: dict[tuple[int, int], dict[str, Any]] = {}
+    packets_processed = 0
+    hops_processed = 0
+
+    for packet, route_data in parsed_packets:
+        try:
+            tr_packet = TraceroutePacket(
+                packet_data=packet._asdict(),
+                resolve_names=False,
+                pre_parsed_route_data=route_data,
+            )
+            rf_hops = tr_packet.get_rf_hops()
+        except Exception as e:
+            logger.warning(
+                f"Error processing packet {packet.id} for longest links: {e}"
+            )
+            continue
+
+        hops_processed += len(rf_hops)
+        recent_entry = (packet.timestamp, packet.id)
+
+        hop_distances: list[float | None] = []
+        for hop in rf_hops:
+            from_location = snapshot_location_at(
+                snapshot, hop.from_node_id, packet.timestamp
+            )
+            to_location = snapshot_location_at(
+                snapshot, hop.to_node_id, packet.timestamp
+            )
+            distance_km = (
+                calculate_distance(*from_location, *to_location)
+                if from_location and to_location
+                else None
+            )
+            hop_distances.append(distance_km)
+
+            if (
+                hop.snr is None
+                or hop.snr == 0
+                or hop.snr < min_snr
+                or not distance_km
+                or distance_km < min_distance_km
+                or BROADCAST_NODE_ID in (hop.from_node_id, hop.to_node_id)
+            ):
+                continue
+
+            # Bidirectional key so A<->B == B<->A
+            key = (
+                min(hop.from_node_id, hop.to_node_id),
+                max(hop.from_node_id, hop.to_node_id),
+            )
+            stats = link_stats.get(key)
+            if stats is None:
+                stats = link_stats[key] = {
+                    "traceroute_count": 0,
+                    "total_distance": 0.0,
+                    "total_snr": 0.0,
+                    "max_distance": 0.0,
+                    "best_snr": None,
+                    "recent": [],
+                }
+
+            stats["traceroute_count"] += 1
+            stats["total_distance"] += distance_km
+            stats["total_snr"] += hop.snr
+            stats["max_distance"] = max(stats["max_distance"], distance_km)
+            if stats["best_snr"] is None or hop.snr > stats["best_snr"]:
+                stats["best_snr"] = hop.snr
+            _remember_recent(stats["recent"], recent_entry)
+
+        packets_processed += 1
+
+        # Indirect path processing (entire traceroute path)
+        if len(rf_hops) <= 1:
+            continue
+
+        path_distance_km = sum(d or 0.0 for d in hop_distances)
+        if path_distance_km < min_distance_km:
+            continue
+
+        valid_snrs = [h.snr for h in rf_hops if h.snr is not None]
+        avg_path_snr = sum(valid_snrs) / len(valid_snrs) if valid_snrs else None
+        if avg_path_snr is None or avg_path_snr < min_snr:
+            continue
+
+        path_key = (rf_hops[0].from_node_id, rf_hops[-1].to_node_id)
+        pstats = path_stats.get(path_key)
+        if pstats is None:
+            pstats = path_stats[path_key] = {
+                "traceroute_count": 0,
+                "total_distance": 0.0,
+                "total_snr": 0.0,
+                "hop_count_total": 0,
+                "max_distance": 0.0,
+                "recent": [],
+                "route": None,
+            }
+
+        pstats["traceroute_count"] += 1
+        pstats["total_distance"] += path_distance_km
+        pstats["hop_count_total"] += len(rf_hops)
+        pstats["total_snr"] += avg_path_snr
+        pstats["max_distance"] = max(pstats["max_distance"], path_distance_km)
+        _remember_recent(pstats["recent"], recent_entry)
+
+        # Preview the route of the newest traceroute seen for this path
+        if pstats["route"] is None or recent_entry > pstats["route"][0]:
+            route = tuple(h.from_node_id for h in rf_hops) + (rf_hops[-1].to_node_id,)
+            pstats["route"] = (recent_entry, route)
+
+    return {
+        "links": link_stats,
+        "paths": path_stats,
+        "packets_processed": packets_processed,
+        "hops_processed": hops_processed,
+    }
+
+
+def merge_partition_results(results: Iterable[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Merge per-slice statistics by link / path key.
+
+    Results must be supplied in slice order to keep the merged aggregates
+    deterministic.
+    """
+    merged_links: dict[tuple[int, int], dict[str, Any]] = {}
+    merged_paths: dict[tuple[int, int], dict[str, Any]] = {}
+    packets_processed = 0
+    hops_processed = 0
+
+    for result in results:
+        packets_processed += result["packets_processed"]
+        hops_processed += result["hops_processed"]
+
+        for key, stats in result["links"].items():
+            target = merged_links.get(key)
+            if target is None:
+                merged_links[key] = {**stats, "recent": list(stats["recent"])}
+                continue
+            target["traceroute_count"] += stats["traceroute_count"]
+            target["total_distance"] += stats["total_distance"]
+            target["total_snr"] += stats["total_snr"]
+            target["max_distance"] = max(target["max_distance"], stats["max_distance"])
+            if stats["best_snr"] is not None and (
+                target["best_snr"] is None or stats["best_snr"] > target["best_snr"]
+            ):
+                target["best_snr"] = stats["best_snr"]
+            for entry in stats["recent"]:
+                _remember_recent(target["recent"], entry)
+
+        for key, stats in result["paths"].items():
+            target = merged_paths.get(key)
+            if target is None:
+                merged_paths[key] = {**stats, "recent": list(stats["recent"])}
+                continue
+            target["traceroute_count"] += stats["traceroute_count"]
+            target["total_distance"] += stats["total_distance"]
+            target["total_snr"] += stats["total_snr"]
+            target["hop_count_total"] += stats["hop_count_total"]
+            target["max_distance"] = max(target["max_distance"], stats["max_distance"])
+            for entry in stats["recent"]:
+                _remember_recent(target["recent"], entry)
+            if stats["route"][0] > target["route"][0]:
+                target["route"] = stats["route"]
+
+    for stats in (*merged_links.values(), *merged_paths.values()):
+        stats["recent"].sort(reverse=True)
+
+    return {
+        "links": merged_links,
+        "paths": merged_paths,
+        "packets_processed": packets_processed,
+        "hops_processed": hops_processed,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Process pool management
+# ---------------------------------------------------------------------------
+
+_executor: ProcessPoolExecutor | None = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def resolve_worker_count(configured: int) -> int:
+    """Translate the configured worker count (0 = one per CPU) into a number."""
+    if configured and configured > 0:
+        return configured
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except AttributeError:  # pragma: no cover - platform specific
+        return os.cpu_count() or 1
+
+
+def _get_executor(workers: int) -> Executor:
+    """Return a shared process pool with *workers* processes."""
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            # "spawn" avoids inheriting locks / sqlite handles from a threaded
+            # web worker; the pool is reused so start-up cost is paid once.
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _executor_workers = workers
+        return _executor
+
+
+def shutdown_executor() -> None:
+    """Shut down the shared process pool (if one was started)."""
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+            _executor_workers = 0
+
+
+atexit.register(shutdown_executor)
+
+
+def map_partitions(
+    func: Callable[..., Any], arg_lists: Sequence[Sequence[Any]], workers: int
+) -> list[Any]:
+    """
+    Apply *func* to each partition, in a process pool when *workers* > 1.
+
+    Results are returned in partition order.  Falls back to serial execution if
+    the pool cannot be used (e.g. broken pool or restricted environment).
+    """
+    if workers <= 1 or len(arg_lists) <= 1:
+        return [func(*args) for args in arg_lists]
+
+    try:
+        executor = _get_executor(workers)
+        return list(executor.map(func, *zip(*arg_lists, strict=True)))
+    except Exception as e:
+        logger.warning(f"Parallel link analysis failed, running serially: {e}")
+        shutdown_executor()
+        return [func(*args) for args in arg_lists]
@@ -0,0 +1,371 @@
+"""
+Time-indexed node location history for Meshtastic Mesh Health Web UI
+
+A :class:`LocationTimeline` keeps every decoded position report per node in
+sorted arrays so that "where was node X at time T" is a bisect instead of a
+database query.  A single process-wide instance is shared across requests and
+kept in sync with the database using the packet id range as a version:
+
+* new packets (higher max id) are loaded incrementally,
+* deleted packets (higher min id) or a different database file trigger a
+  full rebuild.
+
+Only the last ``location_timeline_days`` of reports are loaded; lookups before
+that fall back to a per-node database query.  With storage tiering the version
+check then reads the recent tiers only.
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+from array import array
+from collections.abc import Iterable
+from typing import Any
+
+from .. import warmup
+
+logger = logging.getLogger(__name__)
+
+# Minimum number of seconds between two version checks against the database
+REFRESH_INTERVAL_SECONDS = 10.0
+
+# Number of packet ids decoded per query while (re)loading the timeline
+LOAD_BATCH_IDS = 200_000
+
+# Days of position reports loaded by default (0 loads every report)
+DEFAULT_LOOKBACK_DAYS = 30
+
+_lookback_seconds = DEFAULT_LOOKBACK_DAYS * 86400.0
+
+
+def configure(cfg: Any) -> None:
+    """Apply ``location_timeline_days`` of an :class:`~malla.config.AppConfig`."""
+    global _lookback_seconds
+    days = getattr(cfg, "location_timeline_days", DEFAULT_LOOKBACK_DAYS)
+    if not isinstance(days, int | float) or days < 0:
+        days = DEFAULT_LOOKBACK_DAYS
+    _lookback_seconds = days * 86400.0
+    invalidate_location_timeline()
+
+
+def format_age_warning(age_seconds: float, later: bool = False) -> str:
+    """Describe how far a location report is from the requested time."""
+    age_hours = age_seconds / 3600
+    suffix = "later" if later else "ago"
+
+    if age_hours <= 24:
+        return f"from {age_hours:.1f}h {suffix}"
+    if age_hours <= 168:  # 1 week
+        return f"from {age_hours / 24:.1f}d {suffix}"
+    return f"from {age_hours / 168:.1f}w {suffix}"
+
+
+class _NodeTrack:
+    """Position reports of a single node as parallel arrays sorted by time."""
+
+    __slots__ = ("timestamps", "latitudes", "longitudes", "altitudes")
+
+    def __init__(self):
+        self.timestamps = array("d")
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        # NaN marks a missing altitude
+        self.altitudes = array("d")
+
+    def add(
+        self, timestamp: float, latitude: float, longitude: float, altitude: Any
+    ) -> None:
+        altitude = math.nan if altitude is None else float(altitude)
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.latitudes.append(latitude)
+            self.longitudes.append(longitude)
+            self.altitudes.append(altitude)
+            return
+
+        # Out-of-order report (e.g. late MQTT delivery)
+        index = bisect.bisect_right(self.timestamps, timestamp)
+        self.timestamps.insert(index, timestamp)
+        self.latitudes.insert(index, latitude)
+        self.longitudes.insert(index, longitude)
+        self.altitudes.insert(index, altitude)
+
+    def index_at(self, timestamp: float) -> int:
+        """Index of the newest report at or before *timestamp*, else the oldest."""
+        index = bisect.bisect_right(self.timestamps, timestamp)
+        return index - 1 if index > 0 else 0
+
+
+def _database_location(node_id: int, timestamp: float) -> dict[str, Any] | None:
+    # Import here to avoid circular dependencies
+    from ..database.repositories import LocationRepository
+
+    return LocationRepository.get_node_location_at_timestamp(node_id, timestamp)
+
+
+class LocationTimeline:
+    """Per-node sorted (timestamp, latitude, longitude) arrays with bisect lookup."""
+
+    def __init__(self, start_time: float | None = None):
+        # Reports before start_time are not loaded (None: all of them are)
+        self.start_time = start_time
+        self._tracks: dict[int, _NodeTrack] = {}
+        self._lock = threading.Lock()
+        # Incremented whenever points are added
+        self.version = 0
+        # Highest packet id whose positions are included
+        self.watermark = 0
+
+    def __len__(self) -> int:
+        return sum(len(track.timestamps) for track in self._tracks.values())
+
+    @property
+    def node_count(self) -> int:
+        return len(self._tracks)
+
+    def add_points(
+        self,
+        points: Iterable[tuple[int, float, float, float, float | None]],
+    ) -> int:
+        """
+        Add (node_id, timestamp, latitude, longitude, altitude) points.
+
+        Returns:
+            Number of points added
+        """
+        added = 0
+        with self._lock:
+            for node_id, timestamp, latitude, longitude, altitude in points:
+                track = self._tracks.get(node_id)
+                if track is None:
+                    track = self._tracks[node_id] = _NodeTrack()
+                track.add(timestamp, latitude, longitude, altitude)
+                added += 1
+            if added:
+                self.version += 1
+        return added
+
+    def coordinates_at(
+        self, node_id: int, timestamp: float
+    ) -> tuple[float, float] | None:
+        """Return the (latitude, longitude) of a node at *timestamp*."""
+        with self._lock:
+            track = self._tracks.get(node_id)
+            if track is None:
+                return None
+            index = track.index_at(timestamp)
+            return track.latitudes[index], track.longitudes[index]
+
+    def _misses(self, track: _NodeTrack | None, timestamp: float | None) -> bool:
+        """Whether reports before start_time may answer a lookup at *timestamp*."""
+        if self.start_time is None:
+            return False
+        if timestamp is None:
+            return True
+        return track is None or track.timestamps[0] > timestamp
+
+    def location_at(self, node_id: int, timestamp: float) -> dict[str, Any] | None:
+        """
+        Get the location of a node at a specific timestamp.
+
+        Uses the most recent report at or before the timestamp, falling back to
+        the earliest later report when the node had not reported one yet.
+        When the timeline holds no report up to the timestamp but older ones
+        were not loaded, the database is queried instead.
+
+        Returns:
+            Dictionary with latitude, longitude, altitude, timestamp and
+            age_warning, or None if the node never reported a position
+        """
+        with self._lock:
+            track = self._tracks.get(node_id)
+            missing = self._misses(track, timestamp)
+        if missing:
+            return _database_location(node_id, timestamp)
+
+        with self._lock:
+            if track is None:
+                return None
+            index = track.index_at(timestamp)
+            location_timestamp = track.timestamps[index]
+            altitude = track.altitudes[index]
+            location = {
+                "latitude": track.latitudes[index],
+                "longitude": track.longitudes[index],
+                "altitude": None if math.isnan(altitude) else int(altitude),
+                "timestamp": location_timestamp,
+            }
+
+        if location_timestamp <= timestamp:
+            location["age_warning"] = format_age_warning(timestamp - location_timestamp)
+        else:
+            location["age_warning"] = format_age_warning(
+                location_timestamp - timestamp, later=True
+            )
+        return location
+
+    def snapshot(
+        self,
+        node_ids: Iterable[int],
+        start: float | None = None,
+        end: float | None = None,
+    ) -> dict[int, tuple[tuple[float, float, float], ...]]:
+        """
+        Export a plain, picklable copy of the given nodes' tracks.
+
+        When *start*/*end* are given only the points needed to answer lookups
+        within that time range are exported.  A node without a loaded report
+        up to *start* gets its location at *start* from the database as its
+        first point, if the timeline does not reach back that far.
+
+        Returns:
+            Dictionary of node_id -> ((timestamp, latitude, longitude), ...)
+            sorted by timestamp
+        """
+        snapshot: dict[int, tuple[tuple[float, float, float], ...]] = {}
+        missing: list[int] = []
+        with self._lock:
+            for node_id in node_ids:
+                track = self._tracks.get(node_id)
+                if self._misses(track, start):
+                    missing.append(node_id)
+                if track is None:
+                    continue
+
+                lo = 0 if start is None else track.index_at(start)
+                hi = len(track.timestamps)
+                if end is not None:
+                    hi = max(bisect.bisect_right(track.timestamps, end), lo + 1)
+
+                snapshot[node_id] = tuple(
+                    zip(
+                        track.timestamps[lo:hi],
+                        track.latitudes[lo:hi],
+                        track.longitudes[lo:hi],
+                        strict=True,
+                    )
+                )
+
+        for node_id in missing:
+            location = _database_location(node_id, start or 0.0)
+            points = snapshot.get(node_id, ())
+            if location is None or (points and location["timestamp"] >= points[0][0]):
+                continue
+            first = (
+                location["timestamp"],
+                location["latitude"],
+                location["longitude"],
+            )
+            snapshot[node_id] = (first, *points)
+        return snapshot
+
+    def load_range(self, after_id: int, up_to_id: int) -> int:
+        """
+        Load the position packets with after_id < id <= up_to_id, stored at or
+        after start_time.
+
+        Returns:
+            Number of points added
+        """
+        # Import here to avoid circular dependencies
+        from ..database.repositories import LocationRepository
+
+        added = 0
+        for batch_start in range(after_id, up_to_id, LOAD_BATCH_IDS):
+            batch_end = min(batch_start + LOAD_BATCH_IDS, up_to_id)
+            added += self.add_points(
+                LocationRepository.get_position_points(
+                    batch_start, batch_end, since=self.start_time
+                )
+            )
+            self.watermark = batch_end
+        return added
+
+
+# ---------------------------------------------------------------------------
+# Shared instance
+# ---------------------------------------------------------------------------
+
+_timeline: LocationTimeline | None = None
+_timeline_key: tuple[str, int | None] | None = None
+_last_check = 0.0
+_refresh_lock = threading.Lock()
+
+
+def get_location_timeline(
+    max_age: float = REFRESH_INTERVAL_SECONDS,
+) -> LocationTimeline:
+    """
+    Return the shared timeline, refreshing it if the database changed.
+
+    Args:
+        max_age: Skip the version check if the last one is younger than this
+                 many seconds (0 forces a check)
+    """
+    global _timeline, _timeline_key, _last_check
+
+    # Import here to avoid circular dependencies
+    from ..database.connection import get_db_path
+    from ..database.repositories import LocationRepository
+
+    db_path = get_db_path()
+    timeline = _timeline
+    if (
+        timeline is not None
+        and _timeline_key is not None
+        and _timeline_key[0] == db_path
+        and time.monotonic() - _last_check < max_age
+    ):
+        return timeline
+
+    with _refresh_lock:
+        refresh_start = time.time()
+        timeline = _timeline
+        if timeline is not None and _timeline_key and _timeline_key[0] == db_path:
+            since = timeline.start_time
+        else:
+            since = refresh_start - _lookback_seconds if _lookback_seconds else None
+        # min_id is the first packet at or after since
+        min_id, max_id = LocationRepository.get_packet_id_bounds(since)
+        max_id = max_id or 0
+
+        if (
+            timeline is None
+            or _timeline_key != (db_path, min_id)
+            or max_id < timeline.watermark
+        ):
+            # New database or rows were deleted: rebuild from scratch
+            timeline = LocationTimeline(start_time=since)
+            timeline.load_range(max((min_id or 1) - 1, 0), max_id)
+            _timeline = timeline
+            _timeline_key = (db_path, min_id)
+            logger.info(
+                f"TIMING: Location timeline built in {time.time() - refresh_start:.3f}s "
+                f"({len(timeline)} points, {timeline.node_count} nodes)"
+            )
+        elif max_id > timeline.watermark:
+            added = timeline.load_range(timeline.watermark, max_id)
+            logger.debug(
+                f"Location timeline refreshed in {time.time() - refresh_start:.3f}s "
+                f"({added} new points)"
+            )
+
+        _last_check = time.monotonic()
+        return timeline
+
+
+def invalidate_location_timeline() -> None:
+    """Drop the shared timeline so the next lookup rebuilds it."""
+    global _timeline, _timeline_key, _last_check
+
+    with _refresh_lock:
+        _timeline = None
+        _timeline_key = None
+        _last_check = 0.0
+
+
+@warmup.register("location_timeline")
+def _warm_up(cfg: Any) -> int:
+    return len(get_location_timeline(max_age=0))
@@ -7,7 +7,9 @@ import logging
 import threading
 from typing import Any
 
+from .. import warmup
 from ..database.connection import get_db_connection
+from ..metrics import record_cache
 
 logger = logging.getLogger(__name__)
 
@@ -113,7 +115,9 @@ def get_node_display_name(node_id: int | str) -> str:
     # Check cache first
     with cache_lock:
         if node_id in node_name_cache:
+            record_cache("node_names", hit=True)
             return node_name_cache[node_id]
+    record_cache("node_names", hit=False)
 
     # Query database for node info
     try:
@@ -293,6 +297,10 @@ def get_bulk_node_names(node_ids: list[int]) -> dict[int, str]:
                 result[node_id] = node_name_cache[node_id]
             else:
                 uncached_ids.append(node_id)
+    if result:
+        record_cache("node_names", hit=True, amount=len(result))
+    if uncached_ids:
+        record_cache("node_names", hit=False, amount=len(uncached_ids))
 
     # Query database for uncached nodes
     if uncached_ids:
@@ -350,6 +358,48 @@ def get_bulk_node_names(node_ids: list[int]) -> dict[int, str]:
     return result
 
 
+def preload_node_names(limit: int) -> int:
+    """
+    Replace the node name cache with the names of the *limit* most recently
+    updated nodes.
+
+    Returns:
+        Number of names loaded
+    """
+    if limit <= 0:
+        return 0
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT node_id, long_name, short_name, hex_id
+            FROM node_info
+            ORDER BY last_updated DESC
+            LIMIT ?
+            """,
+            (limit,),
+        )
+        names = {
+            row["node_id"]: _format_node_display_name(
+                row["node_id"], row["long_name"], row["short_name"], row["hex_id"]
+            )
+            for row in cursor.fetchall()
+        }
+    finally:
+        conn.close()
+
+    with cache_lock:
+        node_name_cache.clear()
+        node_name_cache.update(names)
+    return len(names)
+
+
+@warmup.register("node_names")
+def _warm_up_node_names(cfg: Any) -> int:
+    return preload_node_names(int(getattr(cfg, "warmup_node_names", 0)))
+
+
 def clear_node_name_cache() -> None:
     """Clear the node name cache. Useful for testing or when node info is updated."""
     global node_name_cache
@@ -0,0 +1,499 @@
+"""
+Persistent result cache for the heavy analysis endpoints.
+
+Gunicorn recycles workers every few hundred requests and deploys restart all
+of them, so in-process caches keep starting cold.  This cache keeps the
+results of the expensive service calls (traceroute analysis, route patterns,
+longest links, the network graph and the dashboard analytics) in
+``result_cache_dir`` where every worker, and the workers that replace it,
+can find them.
+
+Entries are keyed by the function name, the database file and the call
+arguments.  Each one records the packet watermark (the ``packet_history``
+AUTOINCREMENT counter, which every writer advances) it was computed at:
+
+* an entry younger than ``result_cache_ttl_seconds`` is always reused, as the
+  analytics dashboard did with its in-process cache;
+* an older entry is reused up to ``result_cache_max_age_seconds`` as long as
+  no packet arrived since, which bounds how far a "last N hours" window can
+  drift.
+
+Results are pickled and zlib-compressed.  Unpickling a planted file would run
+arbitrary code, so the directory (``~/.cache/malla/result-cache`` by default)
+must belong to the current user and be closed to group and other writes, or
+the cache stays disabled.  Files are also signed with HMAC-SHA256 under a key
+kept in the directory; files that fail the check are never unpickled.  The
+directory is kept under
+``result_cache_max_mb`` by removing the least recently used files (a hit
+touches its file), and each worker keeps up to ``result_cache_memory_mb`` of
+compressed entries in memory, filled from the newest files when the app
+starts (:func:`warm_load`, a :mod:`malla.warmup` task).  Every hit returns a
+fresh copy, so callers may modify it.  The cache is best-effort: I/O errors
+are logged and the result is computed as if the entry did not exist.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import hmac
+import inspect
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from stat import S_ISDIR, S_IWGRP, S_IWOTH
+from typing import Any, TypeVar
+
+from .. import warmup
+from ..metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+FILE_SUFFIX = ".rc"
+# Bump when the file layout changes; older files are ignored and evicted
+FORMAT_VERSION = 2
+COMPRESS_LEVEL = 6
+SECRET_FILE = "secret.key"
+SECRET_BYTES = 32
+MAC_BYTES = hashlib.sha256().digest_size
+
+
+def _default_directory() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return Path(cache_home) / "malla" / "result-cache"
+
+
+@dataclass(frozen=True)
+class ResultCacheSettings:
+    enabled: bool = False
+    directory: Path = field(default_factory=_default_directory)
+    max_bytes: int = 256 * 1024 * 1024
+    memory_bytes: int = 32 * 1024 * 1024
+    ttl_seconds: float = 60.0
+    max_age_seconds: float = 3600.0
+    # Signs the files, read from SECRET_FILE by configure()
+    secret: bytes = field(default=b"", repr=False)
+
+
+@dataclass
+class _Entry:
+    key: str
+    watermark: int | None
+    created: float
+    blob: bytes  # zlib-compressed pickle of the result
+
+
+_settings = ResultCacheSettings()
+_lock = threading.Lock()
+# digest -> entry, least recently used first
+_memory: OrderedDict[str, _Entry] = OrderedDict()
+_memory_size = 0
+
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+
+def _option(cfg: Any, name: str, default: Any, kind: type | tuple[type, ...]) -> Any:
+    """Option *name* of *cfg*, or *default* when it is missing or not a *kind*."""
+    value = getattr(cfg, name, default)
+    return value if isinstance(value, kind) else default
+
+
+def configure(cfg: Any) -> ResultCacheSettings:
+    """Apply the result cache options of an :class:`~malla.config.AppConfig`."""
+    global _settings
+    number = (int, float)
+    enabled = _option(cfg, "result_cache_enabled", False, bool)
+    directory = Path(_option(cfg, "result_cache_dir", "", str) or _default_directory())
+    max_mb = _option(cfg, "result_cache_max_mb", 256, number)
+    memory_mb = _option(cfg, "result_cache_memory_mb", 32, number)
+    ttl = _option(cfg, "result_cache_ttl_seconds", 60, number)
+    max_age = _option(cfg, "result_cache_max_age_seconds", 3600, number)
+    secret = _prepare_directory(directory) if enabled else None
+    _settings = ResultCacheSettings(
+        enabled=secret is not None,
+        directory=directory,
+        max_bytes=int(max_mb * 1024 * 1024),
+        memory_bytes=int(memory_mb * 1024 * 1024),
+        ttl_seconds=float(ttl),
+        max_age_seconds=float(max_age),
+        secret=secret or b"",
+    )
+    clear()
+    return _settings
+
+
+def _prepare_directory(directory: Path) -> bytes | None:
+    """
+    Create *directory* and return the key signing its files.
+
+    Returns None, which disables the cache, unless the directory belongs to
+    the current user and only they can write to it: anyone else could plant
+    files there.
+    """
+    try:
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = directory.stat()
+    except OSError as e:
+        logger.warning(f"Result cache disabled, cannot create {directory}: {e}")
+        return None
+    owner = os.getuid() if hasattr(os, "getuid") else st.st_uid
+    if (
+        not S_ISDIR(st.st_mode)
+        or st.st_uid != owner
+        or st.st_mode & (S_IWGRP | S_IWOTH)
+    ):
+        logger.warning(
+            f"Result cache disabled, {directory} must be a directory owned by "
+            "the current user and not writable by group or others"
+        )
+        return None
+    return _load_secret(directory)
+
+
+def _load_secret(directory: Path) -> bytes | None:
+    """Read the signing key of *directory*, creating it on first use."""
+    path = directory / SECRET_FILE
+    try:
+        if not path.exists():
+            tmp_path = directory / f"{SECRET_FILE}.{os.getpid()}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(os.urandom(SECRET_BYTES))
+            try:
+                # Fails if another worker created the key first: use theirs
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        secret = path.read_bytes()
+    except OSError as e:
+        logger.warning(
+            f"Result cache disabled, cannot read the key in {directory}: {e}"
+        )
+        return None
+    if len(secret) != SECRET_BYTES:
+        logger.warning(f"Result cache disabled, invalid key file {path}")
+        return None
+    return secret
+
+
+def is_enabled() -> bool:
+    return _settings.enabled
+
+
+def clear(disk: bool = False) -> None:
+    """Forget the in-memory entries, and with *disk* the cached files too."""
+    global _memory_size
+    with _lock:
+        _memory.clear()
+        _memory_size = 0
+    if disk:
+        for path, _stat in _scan():
+            path.unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# Keys and watermark
+# ---------------------------------------------------------------------------
+
+
+def _make_key(name: str, params: dict[str, Any]) -> str:
+    from ..database.connection import get_db_path
+
+    return json.dumps(
+        [name, os.path.abspath(get_db_path()), params], sort_keys=True, default=repr
+    )
+
+
+def _digest(key: str) -> str:
+    return hashlib.blake2b(key.encode(), digest_size=20).hexdigest()
+
+
+def data_watermark() -> int | None:
+    """Id of the newest stored packet, None if it cannot be read."""
+    from ..database.connection import get_db_connection
+
+    try:
+        conn = get_db_connection()
+    except Exception as e:
+        logger.debug(f"Result cache watermark unavailable: {e}")
+        return None
+    try:
+        row = conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'packet_history'"
+        ).fetchone()
+        return int(row[0]) if row else 0
+    except sqlite3.Error as e:
+        logger.debug(f"Result cache watermark unavailable: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Storage
+# ---------------------------------------------------------------------------
+
+
+def _path(digest: str) -> Path:
+    return _settings.directory / f"{digest}{FILE_SUFFIX}"
+
+
+def _scan() -> list[tuple[Path, os.stat_result]]:
+    """Cache files with their stat, most recently used first."""
+    try:
+        paths = list(_settings.directory.glob(f"*{FILE_SUFFIX}"))
+    except OSError:
+        return []
+    files = []
+    for path in paths:
+        try:
+            files.append((path, path.stat()))
+        except OSError:
+            continue  # removed by another worker
+    files.sort(key=lambda item: item[1].st_mtime, reverse=True)
+    return files
+
+
+def _remember(digest: str, entry: _Entry) -> None:
+    global _memory_size
+    size = len(entry.blob)
+    if size > _settings.memory_bytes:
+        return
+    with _lock:
+        previous = _memory.pop(digest, None)
+        if previous is not None:
+            _memory_size -= len(previous.blob)
+        _memory[digest] = entry
+        _memory_size += size
+        while _memory_size > _settings.memory_bytes:
+            _evicted, old = _memory.popitem(last=False)
+            _memory_size -= len(old.blob)
+
+
+def _recall(digest: str) -> _Entry | None:
+    with _lock:
+        entry = _memory.get(digest)
+        if entry is not None:
+            _memory.move_to_end(digest)
+        return entry
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_settings.secret, payload, hashlib.sha256).digest()
+
+
+def _read_file(path: Path) -> _Entry | None:
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.debug(f"Ignoring unreadable result cache file {path}: {e}")
+        return None
+    mac, payload = data[:MAC_BYTES], data[MAC_BYTES:]
+    if not hmac.compare_digest(mac, _sign(payload)):
+        logger.debug(f"Ignoring result cache file {path} with a bad signature")
+        return None
+    try:
+        version, key, watermark, created, blob = pickle.loads(payload)
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable result cache file {path}: {e}")
+        return None
+    if version != FORMAT_VERSION:
+        return None
+    return _Entry(key, watermark, created, blob)
+
+
+def _write_file(digest: str, entry: _Entry) -> None:
+    directory = _settings.directory
+    path = _path(digest)
+    tmp_path = directory / f"{digest}.{os.getpid()}.tmp"
+    payload = pickle.dumps(
+        (FORMAT_VERSION, entry.key, entry.watermark, entry.created, entry.blob),
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+    try:
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        with tmp_path.open("wb") as fh:
+            fh.write(_sign(payload))
+            fh.write(payload)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write result cache file {path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return
+    _evict_files()
+
+
+def _evict_files() -> None:
+    """Remove the least recently used files beyond ``max_bytes``."""
+    total = 0
+    for path, stat in _scan():
+        total += stat.st_size
+        if total > _settings.max_bytes:
+            path.unlink(missing_ok=True)
+
+
+def _touch(path: Path) -> None:
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def warm_load() -> int:
+    """
+    Fill the in-memory cache from the most recently used files.
+
+    Entries older than ``max_age_seconds`` can never be served again and are
+    removed instead.
+
+    Returns:
+        Number of entries loaded
+    """
+    if not _settings.enabled:
+        return 0
+    now = time.time()
+    loaded = 0
+    size = 0
+    for path, stat in _scan():
+        if now - stat.st_mtime >= _settings.max_age_seconds:
+            path.unlink(missing_ok=True)
+            continue
+        if size + stat.st_size > _settings.memory_bytes:
+            continue
+        entry = _read_file(path)
+        if entry is None or now - entry.created >= _settings.max_age_seconds:
+            continue
+        with _lock:
+            known = path.stem in _memory
+        if not known:
+            _remember(path.stem, entry)
+            loaded += 1
+        size += len(entry.blob)
+    logger.info(f"Result cache: loaded {loaded} entries from {_settings.directory}")
+    return loaded
+
+
+@warmup.register("result_cache")
+def _warm_up(cfg: Any) -> int:
+    return warm_load()
+
+
+# ---------------------------------------------------------------------------
+# Lookup
+# ---------------------------------------------------------------------------
+
+
+def _fresh(entry: _Entry, now: float, watermark: Callable[[], int | None]) -> bool:
+    age = now - entry.created
+    if age < _settings.ttl_seconds:
+        return True
+    if age >= _settings.max_age_seconds or entry.watermark is None:
+        return False
+    return watermark() == entry.watermark
+
+
+def get_or_compute(
+    name: str, params: dict[str, Any], compute: Callable[[], Any]
+) -> Any:
+    """
+    Return the cached result of *name* called with *params*, or ``compute()``.
+
+    Args:
+        name: Name of the cached computation (also the cache metric label)
+        params: JSON-serializable arguments that determine the result
+        compute: Computes the result on a miss; it must be picklable
+    """
+    if not _settings.enabled:
+        return compute()
+
+    key = _make_key(name, params)
+    digest = _digest(key)
+    now = time.time()
+    current: list[int | None] = []
+
+    def watermark() -> int | None:
+        if not current:
+            current.append(data_watermark())
+        return current[0]
+
+    entry = _recall(digest)
+    from_disk = entry is None or not _fresh(entry, now, watermark)
+    if from_disk:
+        # Another worker may have stored a newer result
+        entry = _read_file(_path(digest))
+    if entry is not None and entry.key == key and _fresh(entry, now, watermark):
+        try:
+            result = pickle.loads(zlib.decompress(entry.blob))
+        except Exception as e:
+            logger.debug(f"Dropping undecodable result cache entry {name}: {e}")
+        else:
+            record_cache(name, hit=True)
+            _touch(_path(digest))
+            if from_disk:
+                _remember(digest, entry)
+            return result
+
+    record_cache(name, hit=False)
+    # Read before computing: packets stored meanwhile invalidate the entry
+    entry_watermark = watermark()
+    result = compute()
+    try:
+        blob = zlib.compress(
+            pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), COMPRESS_LEVEL
+        )
+    except Exception as e:
+        logger.warning(f"Result of {name} cannot be cached: {e}")
+        return result
+    entry = _Entry(key, entry_watermark, now, blob)
+    _remember(digest, entry)
+    _write_file(digest, entry)
+    return result
+
+
+def cached(name: str, ignore: tuple[str, ...] = ()) -> Callable[[F], F]:
+    """
+    Decorator caching a function through :func:`get_or_compute`.
+
+    The bound arguments (defaults included) form the key, except the ones
+    named in *ignore* that do not change the result.
+    """
+
+    def decorate(function: F) -> F:
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _settings.enabled:
+                return function(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = {
+                param: value
+                for param, value in bound.arguments.items()
+                if param not in ignore
+            }
+            return get_or_compute(name, params, lambda: function(*args, **kwargs))
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
@@ -5,7 +5,7 @@ Traceroute utility functions for Meshtastic Mesh Health Web UI
 import logging
 from typing import Any, TypedDict
 
-from meshtastic import mesh_pb2
+from .location_timeline import get_location_timeline
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +43,8 @@ def parse_traceroute_payload(raw_payload: bytes) -> RouteData:
     if not raw_payload:
         return RouteData(route_nodes=[], snr_towards=[], route_back=[], snr_back=[])
 
+    from meshtastic import mesh_pb2
+
     try:
         # Try protobuf parsing
         route_discovery = mesh_pb2.RouteDiscovery()
@@ -76,8 +78,10 @@ def get_node_location_at_timestamp(
     """
     Get the most recent location for a node at or before the given timestamp.
 
-    This function is a wrapper around LocationRepository.get_node_location_at_timestamp
-    to maintain backward compatibility.
+    Falls back to the earliest later location if the node had not reported a
+    position yet.  Lookups are served from the shared
+    :class:`~malla.utils.location_timeline.LocationTimeline` instead of
+    querying the database for every (node, timestamp) pair.
 
     Args:
         node_id: The node ID to get location for
@@ -86,13 +90,8 @@ def get_node_location_at_timestamp(
     Returns:
         Dictionary with location data and metadata, or None if no location found
     """
-    # Import here to avoid circular dependencies
-    from ..database.repositories import LocationRepository
-
     try:
-        return LocationRepository.get_node_location_at_timestamp(
-            node_id, target_timestamp
-        )
+        return get_location_timeline().location_at(node_id, target_timestamp)
     except Exception as e:
         logger.error(f"Error getting location for node {node_id}: {e}")
         return None
@@ -0,0 +1,92 @@
+"""
+Warm-up tasks run by ``create_app`` before Gunicorn forks its workers.
+
+``malla-web-gunicorn`` preloads the application, so everything built while
+creating it lives in the master process and is shared copy-on-write by every
+worker, including the ones that replace workers recycled after
+``max_requests``.  Modules register the lookups they would otherwise build on
+the first request of each worker (protobuf class discovery, enum tables, a
+node name snapshot, the result cache) with :func:`register`; :func:`run`
+executes them in registration order and logs how long each one took.
+
+Tasks receive the :class:`~malla.config.AppConfig` and may return a count of
+the items they loaded for the report.  A failing task is logged and skipped:
+the lookup is then built lazily as before.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[[Any], Any])
+
+
+@dataclass(frozen=True)
+class TaskTiming:
+    name: str
+    seconds: float
+    items: int | None = None
+    error: str | None = None
+
+
+# name -> task, in registration order
+_tasks: dict[str, Callable[[Any], Any]] = {}
+_last_report: list[TaskTiming] = []
+
+
+def register(name: str) -> Callable[[F], F]:
+    """Decorator registering ``function(cfg)`` as the warm-up task *name*."""
+
+    def decorate(function: F) -> F:
+        _tasks[name] = function
+        return function
+
+    return decorate
+
+
+def task_names() -> list[str]:
+    return list(_tasks)
+
+
+def run(cfg: Any) -> list[TaskTiming]:
+    """Run every registered task and log a timing report."""
+    global _last_report
+    report = []
+    start = time.perf_counter()
+    for name, task in list(_tasks.items()):
+        task_start = time.perf_counter()
+        items = error = None
+        try:
+            result = task(cfg)
+            if isinstance(result, int) and not isinstance(result, bool):
+                items = result
+        except Exception as e:
+            error = str(e)
+            logger.warning(f"Warm-up task {name} failed: {e}")
+        report.append(TaskTiming(name, time.perf_counter() - task_start, items, error))
+    total = time.perf_counter() - start
+
+    parts = []
+    for timing in report:
+        detail = f"{timing.name} {timing.seconds * 1000:.1f} ms"
+        if timing.items is not None:
+            detail += f" ({timing.items})"
+        elif timing.error is not None:
+            detail += " (failed)"
+        parts.append(detail)
+    logger.info(
+        f"Warm-up finished in {total * 1000:.1f} ms: {', '.join(parts) or 'no tasks'}"
+    )
+    _last_report = report
+    return report
+
+
+def last_report() -> list[TaskTiming]:
+    """Timings of the most recent :func:`run`."""
+    return list(_last_report)
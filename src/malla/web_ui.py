@@ -12,6 +12,7 @@ import logging
 import os
 import secrets
 import sys
+import time
 from pathlib import Path
 from typing import Any
 
@@ -20,40 +21,51 @@ from markupsafe import Markup
 from werkzeug.exceptions import HTTPException
 
 from . import __version__ as package_version
+from . import metrics, warmup
 from .config import AppConfig, get_config
+from .database import partitions, profiler, tiering
 from .database.connection import init_database
-from .routes import register_routes
-from .routes.debug_routes import debug_bp
+from .utils import location_timeline, result_cache
 from .utils.formatting import format_node_id, format_time_ago
 from .utils.node_utils import start_cache_cleanup, stop_cache_cleanup
 
-# Configure logging: prefer stdout; add file handler only if writable
-_handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
-_logfile_candidates: list[str] = []
+logger = logging.getLogger(__name__)
 
-# Explicit path via env, else try /data then /tmp (both writable in our compose)
-env_log = os.getenv("MALLA_LOG_FILE")
-if env_log:
-    _logfile_candidates.append(env_log)
-_logfile_candidates.extend(["/data/app.log", "/tmp/app.log"])
+_logging_configured = False
 
-for path in _logfile_candidates:
-    try:
-        d = os.path.dirname(path) or "."
-        if os.path.isdir(d) and os.access(d, os.W_OK):
-            _handlers.append(logging.FileHandler(path))
-            break
-    except Exception:
-        # Ignore file logging if not possible
-        pass
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=_handlers,
-)
+def configure_logging() -> None:
+    """Log to stdout, plus a log file if one is writable (once per process)."""
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
 
-logger = logging.getLogger(__name__)
+    # Configure logging: prefer stdout; add file handler only if writable
+    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    logfile_candidates: list[str] = []
+
+    # Explicit path via env, else try /data then /tmp (both writable in our compose)
+    env_log = os.getenv("MALLA_LOG_FILE")
+    if env_log:
+        logfile_candidates.append(env_log)
+    logfile_candidates.extend(["/data/app.log", "/tmp/app.log"])
+
+    for path in logfile_candidates:
+        try:
+            d = os.path.dirname(path) or "."
+            if os.path.isdir(d) and os.access(d, os.W_OK):
+                handlers.append(logging.FileHandler(path))
+                break
+        except Exception:
+            # Ignore file logging if not possible
+            pass
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=handlers,
+    )
 
 
 def make_json_safe(obj):
@@ -89,6 +101,7 @@ def create_app(cfg: AppConfig | None = None):  # noqa: D401
     eliminates the need for fiddling with environment variables.
     """
 
+    configure_logging()
     logger.info("Creating Flask application")
 
     # Get the package directory for templates and static files
@@ -244,17 +257,17 @@ def create_app(cfg: AppConfig | None = None):  # noqa: D401
     # Markdown rendering filter & context processor for config variables
     # ------------------------------------------------------------------
 
-    try:
-        import markdown as _markdown  # import locally to avoid hard dependency at runtime until used
-    except ModuleNotFoundError:  # pragma: no cover – dependency should be present
-        _markdown = None  # type: ignore[assignment]
-
     @app.template_filter("markdown")
     def markdown_filter(text: str | None):  # noqa: ANN001
         """Render *text* (Markdown) to HTML for safe embedding."""
 
         if text is None:
             return ""
+        try:
+            # Imported on first use: only the dashboard renders Markdown
+            import markdown as _markdown
+        except ModuleNotFoundError:  # pragma: no cover – dependency should be present
+            _markdown = None  # type: ignore[assignment]
         if _markdown is None:
             logger.warning("markdown package not installed – returning raw text")
             return text
@@ -275,7 +288,12 @@ def create_app(cfg: AppConfig | None = None):  # noqa: D401
 
     # Initialize database
     logger.info("Initializing database connection")
+    profiler.configure(cfg)
+    tiering.configure(cfg)
+    partitions.configure(cfg)
     init_database()
+    result_cache.configure(cfg)
+    location_timeline.configure(cfg)
 
     # Start periodic cache cleanup for node names
     logger.info("Starting node name cache cleanup background thread")
@@ -284,8 +302,13 @@ def create_app(cfg: AppConfig | None = None):  # noqa: D401
     # Register cleanup on app shutdown
     atexit.register(stop_cache_cleanup)
 
-    # Register all routes
+    # Register all routes; the route modules (and the services, repositories
+    # and protobuf modules behind them) are imported only now
     logger.info("Registering application routes")
+    from .routes import register_routes
+    from .routes.debug_routes import debug_bp
+    from .routes.metrics_routes import metrics_bp, metrics_dir
+
     register_routes(app)
     # Optional: browser debug endpoints (dev-only / token-protected)
     try:
@@ -294,6 +317,14 @@ def create_app(cfg: AppConfig | None = None):  # noqa: D401
             app.register_blueprint(debug_bp)
     except Exception as e:  # pragma: no cover
         logger.warning(f"Debug routes not registered: {e}")
+    metrics_enabled = bool(getattr(cfg, "metrics_enabled", False))
+    if metrics_enabled:
+        app.register_blueprint(metrics_bp)
+
+    # Build the shared lookups now: with Gunicorn's preload_app the workers
+    # inherit them instead of each building them on its first requests
+    if getattr(cfg, "prefork_warmup", True):
+        warmup.run(cfg)
 
     # ------------------------------------------------------------------
     # Request guards and identifiers
@@ -322,6 +353,34 @@ def create_app(cfg: AppConfig | None = None):  # noqa: D401
                 if host_only not in allowed:
                     abort(400)
 
+        if profiler.is_enabled() or metrics_enabled:
+            g.request_started = time.perf_counter()  # type: ignore[attr-defined]
+        if profiler.is_enabled():
+            profiler.begin_request()
+
+    # ------------------------------------------------------------------
+    # SQL profiling (slow-query log, Server-Timing header) and metrics
+    # ------------------------------------------------------------------
+    @app.after_request
+    def _record_request_timing(response):  # noqa: ANN001
+        started = getattr(g, "request_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        if profiler.is_enabled():
+            queries = profiler.end_request(f"{request.method} {request.path}")
+            response.headers.setdefault(
+                "Server-Timing", profiler.server_timing(queries, elapsed)
+            )
+        if metrics_enabled:
+            # The route pattern keeps the label set small (no node ids etc.)
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            metrics.REQUEST_DURATION.observe(
+                elapsed, request.method, route, response.status_code
+            )
+            metrics.write_snapshot(metrics_dir())
+        return response
+
     # ------------------------------------------------------------------
     # Global security headers
     # ------------------------------------------------------------------
@@ -463,6 +522,10 @@ def create_app(cfg: AppConfig | None = None):  # noqa: D401
                 "routes": "HTTP request handling",
             },
         }
+        payload["warmup"] = [
+            {"task": t.name, "ms": round(t.seconds * 1000, 1), "items": t.items}
+            for t in warmup.last_report()
+        ]
         # Avoid leaking filesystem paths in non-debug environments
         if cfg.debug:
             payload["database_file"] = app.config["DATABASE_FILE"]
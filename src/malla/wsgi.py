@@ -6,33 +6,15 @@ This module provides the WSGI application factory and a main function
 that starts Gunicorn with appropriate configuration for production deployment.
 """
 
+import gc
 import logging
-import os
 import sys
 
 from .config import get_config
-from .web_ui import create_app
-
-# Configure logging: stdout + optional file in writable location
-_handlers: list[logging.Handler] = [logging.StreamHandler(sys.stdout)]
-_candidates: list[str] = []
-if os.getenv("MALLA_LOG_FILE"):
-    _candidates.append(os.getenv("MALLA_LOG_FILE", ""))
-_candidates.extend(["/data/app.log", "/tmp/app.log"])
-for p in _candidates:
-    try:
-        if p and os.path.isdir(os.path.dirname(p) or ".") and os.access(os.path.dirname(p) or ".", os.W_OK):
-            _handlers.append(logging.FileHandler(p))
-            break
-    except Exception:
-        pass
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=_handlers,
-)
+from .web_ui import configure_logging, create_app
 
+# Logging (stdout + optional file in a writable location) is set up by
+# create_app, or by main() before it prints the startup banner
 logger = logging.getLogger(__name__)
 
 
@@ -62,6 +44,7 @@ def application(*args, **kwargs):
 
 def main():
     """Main entry point for running with Gunicorn."""
+    configure_logging()
     logger.info("Starting Malla Web UI with Gunicorn")
 
     try:
@@ -121,9 +104,15 @@ def main():
             def load(self):
                 return self.application
 
+        # Create (and warm up) the app in the master process, then keep its
+        # objects out of the garbage collector so the forked workers do not
+        # write to, and thereby copy, the shared pages
+        app = get_application()
+        gc.freeze()
+
         # Start Gunicorn
         logger.info(f"Starting Gunicorn server on {cfg.host}:{cfg.port}")
-        MallaWSGIApplication(get_application(), gunicorn_config).run()
+        MallaWSGIApplication(app, gunicorn_config).run()
 
     except ImportError:
         logger.error(
@@ -19,6 +19,18 @@ from tests.fixtures.database_fixtures import DatabaseFixtures
 from tests.fixtures.traceroute_graph_data import get_sample_graph_data
 
 
+@pytest.fixture(scope="session", autouse=True)
+def isolated_cache_home(tmp_path_factory):
+    """Keep apps built with the default result cache out of the real ~/.cache."""
+    previous = os.environ.get("XDG_CACHE_HOME")
+    os.environ["XDG_CACHE_HOME"] = str(tmp_path_factory.mktemp("cache-home"))
+    yield
+    if previous is None:
+        os.environ.pop("XDG_CACHE_HOME", None)
+    else:
+        os.environ["XDG_CACHE_HOME"] = previous
+
+
 @pytest.fixture(scope="session")
 def worker_id(request):
     """Get the worker ID for pytest-xdist parallel execution.
@@ -55,6 +67,7 @@ class TestFlaskApp:
             host="127.0.0.1",
             port=self.port,
             debug=False,
+            result_cache_enabled=False,
         )
 
         # Enable browser debug in tests to allow inline scripts under CSP
@@ -259,7 +272,7 @@ def test_client():
     temp_db.close()
 
     # Build a config object pointing at the temporary DB
-    cfg = AppConfig(database_file=temp_db.name)
+    cfg = AppConfig(database_file=temp_db.name, result_cache_enabled=False)
 
     try:
         # Create the app with injected config
@@ -312,7 +325,7 @@ def app():
     temp_db.close()
 
     # Build a config object pointing at the temporary DB
-    cfg = AppConfig(database_file=temp_db.name)
+    cfg = AppConfig(database_file=temp_db.name, result_cache_enabled=False)
 
     try:
         # Create the app with injected config
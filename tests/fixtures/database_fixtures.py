@@ -86,7 +86,8 @@ class DatabaseFixtures:
                 tx_after INTEGER,
                 message_type TEXT,
                 raw_service_envelope BLOB,
-                parsing_error TEXT
+                parsing_error TEXT,
+                hop_count INTEGER GENERATED ALWAYS AS (hop_start - hop_limit) VIRTUAL
             )
         """)
 
@@ -0,0 +1,254 @@
+"""
+Unit tests for the resumable raw envelope re-decode (backfill) engine.
+"""
+
+import base64
+import sqlite3
+
+from meshtastic import mesh_pb2, mqtt_pb2, portnums_pb2, telemetry_pb2
+
+from src.malla.backfill import load_checkpoint, run_backfill
+from src.malla.config import AppConfig
+from src.malla.database import partitions, tiering
+from src.malla.ingest import EnvelopeRecord, ingest
+from src.malla.utils.decryption import (
+    DEFAULT_CHANNEL_KEY,
+    decrypt_packet_payload,
+    try_decrypt_database_packet,
+)
+
+TOPIC = "msh/EU_868/2/e/LongFast/!000000aa"
+
+
+def _text_envelope(packet_id: int, text: str, encrypted: bool = False) -> bytes:
+    envelope = mqtt_pb2.ServiceEnvelope()
+    envelope.channel_id = "LongFast"
+    envelope.gateway_id = "!000000aa"
+    packet = envelope.packet
+    setattr(packet, "from", 0x22)
+    packet.to = 0xFFFFFFFF
+    packet.id = packet_id
+
+    data = mesh_pb2.Data()
+    data.portnum = portnums_pb2.PortNum.TEXT_MESSAGE_APP
+    data.payload = text.encode()
+    if encrypted:
+        # AES-CTR is symmetric, so "decrypting" the plaintext encrypts it
+        key = base64.b64decode(DEFAULT_CHANNEL_KEY)
+        packet.encrypted = decrypt_packet_payload(
+            data.SerializeToString(), packet_id, 0x22, key
+        )
+    else:
+        packet.decoded.CopyFrom(data)
+    return envelope.SerializeToString()
+
+
+def _decoded_envelope(packet_id: int, portnum: int, payload: bytes) -> bytes:
+    envelope = mqtt_pb2.ServiceEnvelope()
+    envelope.channel_id = "LongFast"
+    envelope.gateway_id = "!000000aa"
+    packet = envelope.packet
+    setattr(packet, "from", 0x22)
+    packet.to = 0xFFFFFFFF
+    packet.id = packet_id
+    packet.decoded.portnum = portnum
+    packet.decoded.payload = payload
+    return envelope.SerializeToString()
+
+
+def _break_rows(db_path, where, table="packet_history"):
+    """Make rows look like they were stored by an older, failing decoder."""
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        f"UPDATE {table} SET processed_successfully = 0, portnum = 0, "
+        f"portnum_name = 'UNKNOWN_APP', parsing_error = 'old error' WHERE {where}"
+    )
+    conn.commit()
+    conn.close()
+
+
+def _decode_state(db_path, table="packet_history"):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT id, processed_successfully, portnum_name, parsing_error "
+        f"FROM {table} ORDER BY id"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_try_decrypt_database_packet_uses_stored_envelope():
+    envelope = _text_envelope(7, "secret", encrypted=True)
+
+    assert try_decrypt_database_packet({"raw_service_envelope": envelope}) == (
+        b"secret",
+        "TEXT_MESSAGE_APP",
+    )
+    assert try_decrypt_database_packet({"raw_service_envelope": None}) is None
+
+
+class TestBackfill:
+    """Test re-decoding, checkpointing and resume."""
+
+    def _database(self, tmp_path, count=20, spacing=1.0):
+        db_path = str(tmp_path / "backfill.db")
+        ingest(
+            [
+                EnvelopeRecord(
+                    1700000000.0 + i * spacing,
+                    TOPIC,
+                    _text_envelope(i, f"msg {i}", encrypted=i % 2 == 0),
+                )
+                for i in range(1, count + 1)
+            ],
+            db_path,
+        )
+        return db_path
+
+    def test_failed_rows_are_redecoded(self, tmp_path):
+        db_path = self._database(tmp_path)
+        expected = _decode_state(db_path)
+        assert all(row[2] == "TEXT_MESSAGE_APP" for row in expected)
+
+        _break_rows(db_path, "id % 3 = 0")
+        state = run_backfill(db_path, scan_ids=4, chunk_size=3, batch_size=2)
+
+        assert _decode_state(db_path) == expected
+        assert state["updated"] == len([row for row in expected if row[0] % 3 == 0])
+        # Only the broken rows were candidates
+        assert state["scanned"] == state["updated"]
+
+        conn = sqlite3.connect(db_path)
+        checkpoint = load_checkpoint(conn, "redecode")
+        conn.close()
+        assert checkpoint["last_id"] == checkpoint["end_id"] == len(expected)
+        assert checkpoint["finished_at"] is not None
+
+    def test_resume_from_checkpoint(self, tmp_path):
+        db_path = self._database(tmp_path)
+        _break_rows(db_path, "1 = 1")
+
+        # Simulate a run that was interrupted after id 10
+        conn = sqlite3.connect(db_path)
+        load_checkpoint(conn, "redecode")
+        conn.execute(
+            "INSERT INTO backfill_state (job, last_id, end_id, scanned, updated, "
+            "started_at, updated_at) VALUES ('redecode', 10, 20, 10, 10, 0, 0)"
+        )
+        conn.commit()
+        conn.close()
+
+        state = run_backfill(db_path, max_rows_per_second=1000)
+        assert state["scanned"] == 20
+
+        decoded = {row[0]: row[1] for row in _decode_state(db_path)}
+        assert not any(decoded[i] for i in range(1, 11))
+        assert all(decoded[i] for i in range(11, 21))
+
+    def test_all_scope_with_worker_processes(self, tmp_path):
+        db_path = self._database(tmp_path, count=6)
+        _break_rows(db_path, "id <= 3")
+
+        state = run_backfill(db_path, scope="all", workers=2, chunk_size=2)
+        assert state["updated"] == 6
+        assert all(row[1] for row in _decode_state(db_path))
+
+    def test_weekly_partitions_are_redecoded(self, tmp_path):
+        partitions.configure(AppConfig(packet_partitioning=True))
+        try:
+            db_path = self._database(tmp_path, count=9, spacing=3 * 86400.0)
+            conn = sqlite3.connect(db_path)
+            tables = partitions.packet_tables(conn)
+            conn.close()
+            assert len(tables) > 2
+            expected = {table: _decode_state(db_path, table) for table in tables}
+            for table in tables:
+                _break_rows(db_path, "1 = 1", table)
+
+            state = run_backfill(db_path, scan_ids=4, chunk_size=3)
+        finally:
+            partitions.configure(AppConfig())
+
+        assert state["updated"] == 9
+        assert {table: _decode_state(db_path, table) for table in tables} == expected
+
+    def test_archives_are_redecoded(self, tmp_path):
+        tiering.configure(AppConfig(storage_tiering=True))
+        try:
+            db_path = self._database(tmp_path, count=6)
+            _break_rows(db_path, "id <= 4")
+            assert tiering.move_aged_packets(db_path, cutoff=1700000005.0) == 4
+            archives = tiering.list_archives(tiering.archive_directory(db_path))
+            assert [month for month, _ in archives] == ["2023-11"]
+
+            state = run_backfill(db_path)
+        finally:
+            tiering.configure(AppConfig())
+
+        # Hot rows were intact; the archived ones were fixed in place
+        assert state["updated"] == 0
+        assert state["archives"]["2023-11"]["updated"] == 4
+        archived = _decode_state(str(archives[0][1]))
+        assert [row[0] for row in archived] == [1, 2, 3, 4]
+        assert all(row[1] and row[3] is None for row in archived)
+
+        conn = sqlite3.connect(db_path)
+        checkpoint = load_checkpoint(conn, "redecode@2023-11")
+        conn.close()
+        assert checkpoint["last_id"] == checkpoint["end_id"] == 4
+
+    def test_redecoded_rows_feed_neighbors_and_telemetry(self, tmp_path):
+        info = mesh_pb2.NeighborInfo()
+        info.node_id = 0x22
+        info.neighbors.add(node_id=0x33, snr=5.5)
+        report = telemetry_pb2.Telemetry()
+        report.device_metrics.battery_level = 80
+        db_path = str(tmp_path / "derived.db")
+        ingest(
+            [
+                EnvelopeRecord(
+                    1700000000.0,
+                    TOPIC,
+                    _decoded_envelope(
+                        1,
+                        portnums_pb2.PortNum.NEIGHBORINFO_APP,
+                        info.SerializeToString(),
+                    ),
+                ),
+                EnvelopeRecord(
+                    1700000060.0,
+                    TOPIC,
+                    _decoded_envelope(
+                        2,
+                        portnums_pb2.PortNum.TELEMETRY_APP,
+                        report.SerializeToString(),
+                    ),
+                ),
+            ],
+            db_path,
+        )
+        # As stored by a decoder that could not read either packet
+        _break_rows(db_path, "1 = 1")
+        conn = sqlite3.connect(db_path)
+        for table in ("neighbor_edge", "telemetry_sample", "telemetry_rollup"):
+            conn.execute(f"DELETE FROM {table}")
+        conn.commit()
+        conn.close()
+
+        assert run_backfill(db_path)["updated"] == 2
+
+        conn = sqlite3.connect(db_path)
+        edges = conn.execute(
+            "SELECT reporter_id, neighbor_id, snr, last_seen FROM neighbor_edge"
+        ).fetchall()
+        samples = conn.execute(
+            "SELECT m.name, s.timestamp, s.value FROM telemetry_sample s "
+            "JOIN telemetry_metric m USING (metric_id)"
+        ).fetchall()
+        rollups = conn.execute(
+            "SELECT COUNT(*) FROM telemetry_rollup WHERE bucket <= 1700000060"
+        ).fetchone()[0]
+        conn.close()
+        assert edges == [(0x22, 0x33, 5.5, 1700000000.0)]
+        assert samples == [("device.battery_level", 1700000060.0, 80.0)]
+        assert rollups > 0
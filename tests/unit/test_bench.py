@@ -0,0 +1,116 @@
+"""
+Unit tests for the malla-bench benchmark suite.
+"""
+
+import json
+
+import pytest
+
+from src.malla.bench import (
+    BENCHMARKS,
+    compare_results,
+    load_results,
+    main,
+    percentile,
+    run_suite,
+    save_results,
+    select_benchmarks,
+)
+from src.malla.synthetic import generate_database, get_preset
+
+
+def _result(benchmark, p50, database="small"):
+    return {
+        "database": database,
+        "benchmark": benchmark,
+        "p50_ms": p50,
+        "p95_ms": p50 * 1.5,
+    }
+
+
+def _document(*results):
+    return {"version": 1, "commit": None, "results": list(results)}
+
+
+def test_percentile_interpolates():
+    assert percentile([4.0], 0.95) == 4.0
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 0.5) == 3.0
+    assert percentile([5.0, 1.0], 0.5) == 3.0
+    assert percentile(list(range(101)), 0.95) == pytest.approx(95.0)
+
+
+def test_select_benchmarks():
+    assert select_benchmarks() == list(BENCHMARKS)
+    assert select_benchmarks(["packets.*"]) == [
+        "packets.list",
+        "packets.list_grouped",
+        "packets.list_by_node",
+    ]
+    with pytest.raises(ValueError):
+        select_benchmarks(["nope"])
+
+
+def test_compare_results_flags_regressions():
+    baseline = _document(
+        _result("packets.list", 10.0),
+        _result("nodes.list", 100.0),
+        _result("chat.recent_messages", 50.0),
+        _result("nodes.details", 1.0),
+        _result("analytics.dashboard", 20.0),
+    )
+    current = _document(
+        _result("packets.list", 10.5),  # within threshold
+        _result("nodes.list", 150.0),  # 50% slower
+        _result("chat.recent_messages", 25.0),  # twice as fast
+        _result("nodes.details", 2.0),  # 100% slower but below min delta
+        _result("ingest.throughput", 300.0),
+    )
+
+    rows = {
+        row["benchmark"]: row
+        for row in compare_results(baseline, current, threshold=0.1, min_delta_ms=2)
+    }
+    assert rows["packets.list"]["status"] == "ok"
+    assert rows["nodes.list"]["status"] == "regression"
+    assert rows["nodes.list"]["change"] == pytest.approx(0.5)
+    assert rows["chat.recent_messages"]["status"] == "improvement"
+    assert rows["nodes.details"]["status"] == "ok"
+    assert rows["analytics.dashboard"]["status"] == "missing"
+    assert rows["ingest.throughput"]["status"] == "new"
+
+
+def test_run_suite_and_compare_cli(tmp_path, capsys):
+    db_path = tmp_path / "mesh.db"
+    generate_database(
+        db_path, get_preset("small", nodes=20, gateways=3, packets=1_500, days=1)
+    )
+
+    document = run_suite(
+        {"tiny": db_path},
+        ["packets.list", "nodes.details", "ingest.throughput"],
+        iterations=3,
+        warmup=0,
+        isolate=False,
+    )
+    results = {r["benchmark"]: r for r in document["results"]}
+    assert set(results) == {"packets.list", "nodes.details", "ingest.throughput"}
+    for result in results.values():
+        assert result["database"] == "tiny"
+        assert result["iterations"] == 3
+        assert 0 < result["min_ms"] <= result["p50_ms"] <= result["p95_ms"]
+    assert results["ingest.throughput"]["items_per_second"] > 0
+    assert results["packets.list"]["items_per_second"] is None
+
+    baseline = tmp_path / "baseline.json"
+    save_results(document, baseline)
+    assert load_results(baseline) == json.loads(baseline.read_text())
+
+    slower = json.loads(baseline.read_text())
+    for result in slower["results"]:
+        result["p50_ms"] = result["p50_ms"] * 3 + 10
+    current = tmp_path / "current.json"
+    save_results(slower, current)
+
+    assert main(["compare", str(baseline), str(baseline)]) == 0
+    assert main(["compare", str(baseline), str(current)]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
@@ -0,0 +1,82 @@
+"""
+Unit tests for the capture's in-memory heartbeat statistics.
+"""
+
+import sqlite3
+import time
+
+import pytest
+from meshtastic import mesh_pb2, mqtt_pb2, portnums_pb2
+
+from src.malla import mqtt_capture as cap
+from src.malla.database.repositories import DashboardRepository
+
+TOPIC = "msh/EU_868/2/e/LongFast/!000000aa"
+
+
+@pytest.fixture
+def capture_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "capture.db")
+    monkeypatch.setattr(cap, "DATABASE_FILE", db_path)
+    monkeypatch.setattr(cap, "node_cache", {})
+    monkeypatch.setattr(cap, "capture_stats", cap.CaptureStats())
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    cap.init_database()
+    return db_path
+
+
+def _log_packet(sender: int) -> None:
+    envelope = mqtt_pb2.ServiceEnvelope(channel_id="LongFast", gateway_id="!000000aa")
+    packet = mesh_pb2.MeshPacket(id=sender, to=0xFFFFFFFF)
+    setattr(packet, "from", sender)
+    packet.decoded.portnum = portnums_pb2.PortNum.TEXT_MESSAGE_APP
+    packet.decoded.payload = b"hi"
+    cap.log_packet_to_database(TOPIC, envelope, packet)
+
+
+def test_statistics_follow_inserts_without_queries(capture_db):
+    conn = sqlite3.connect(capture_db)
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO packet_history (timestamp, topic, from_node_id) VALUES (?, ?, ?)",
+        [(now - 3 * 86400, TOPIC, 1), (now - 60, TOPIC, 2), (now - 30, TOPIC, 2)],
+    )
+    conn.commit()
+    conn.close()
+
+    cap.seed_capture_stats()
+    assert cap.capture_stats.total_packets == 3
+    assert cap.capture_stats.active_nodes() == 1
+
+    cap.update_node_cache(node_id=3, long_name="Three")
+    cap.update_node_cache(node_id=4)
+    _log_packet(3)
+    _log_packet(4)
+
+    stats = cap.get_node_statistics()
+    assert stats["total_packets"] == 5
+    assert stats["active_nodes_24h"] == 3
+    assert stats["total_nodes"] == 2
+    assert stats["nodes_with_long_names"] == 1
+
+    # Senders fall out of the window once their last packet is a day old
+    assert cap.capture_stats.active_nodes(now=now + 86400 - 10) == 2
+
+
+def test_dashboard_uses_fresh_capture_stats(capture_db):
+    _log_packet(5)
+    cap.update_node_cache(node_id=5, long_name="Five")
+    # Pretend far more packets were captured than the table holds so the
+    # dashboard result shows where the total came from.
+    cap.capture_stats.total_packets = 1000
+    cap.persist_capture_stats()
+
+    assert DashboardRepository.get_stats()["total_packets"] == 1000
+    # Gateway-filtered totals still need a real count
+    assert DashboardRepository.get_stats(gateway_id="!000000aa")["total_packets"] == 1
+
+    conn = sqlite3.connect(capture_db)
+    conn.execute("UPDATE capture_stats SET updated_at = ?", (time.time() - 3600,))
+    conn.commit()
+    conn.close()
+    assert DashboardRepository.get_stats()["total_packets"] == 1
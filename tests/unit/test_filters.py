@@ -0,0 +1,89 @@
+"""
+Unit tests for the shared packet filter compiler.
+"""
+
+import sqlite3
+
+import pytest
+
+from src.malla import mqtt_capture
+from src.malla.database.filters import compile_filters
+from src.malla.database.repositories import PacketRepository
+
+
+@pytest.fixture
+def packet_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "filters.db")
+    mqtt_capture.init_database(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO packet_history (timestamp, topic, gateway_id, hop_start, "
+        "hop_limit) VALUES (?, 'msh/test', ?, ?, ?)",
+        [
+            (1000.0, "!00000001", 3, 3),
+            (1001.0, "!00000001", 3, 2),
+            (1002.0, "!00000002", 3, 1),
+            (1003.0, "!00000002", 7, 7),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    return db_path
+
+
+def test_same_filter_set_compiles_to_identical_sql():
+    first = compile_filters(
+        {"gateway_id": "!00000001", "start_time": 10, "portnum": "", "to_node": 5},
+        "abc",
+    )
+    second = compile_filters(
+        {"to_node": 9, "start_time": 20, "gateway_id": "!00000002"}, "xyz"
+    )
+
+    # Canonical order regardless of the mapping's order; empty values are skipped
+    assert first.conditions[:3] == (
+        "timestamp >= ?",
+        "to_node_id = ?",
+        "gateway_id = ?",
+    )
+    assert first.params[:3] == (10, 5, "!00000001")
+    assert first.params[3:] == ("%abc%",) * 5
+    # The condition tuple comes from the per-signature cache
+    assert first.conditions is second.conditions
+
+    assert compile_filters({}).where == ""
+    subset = compile_filters(
+        {"gateway_id": "!00000001", "from_node": 1}, keys=("from_node",)
+    )
+    assert subset.sql == "from_node_id = ?"
+    assert subset.extend("id > ?", params=[7]).params == (1, 7)
+
+
+def test_hop_filter_uses_indexed_column(packet_db):
+    conn = sqlite3.connect(packet_db)
+    compiled = compile_filters({"hop_count": 0}, cursor=conn.cursor())
+    assert compiled.sql == "hop_count = ?"
+    plan = " ".join(
+        row[3]
+        for row in conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT id FROM packet_history {compiled.where}",
+            compiled.params,
+        )
+    )
+    assert "idx_packet_hop_count" in plan
+
+    # Tables without the generated column get the computed form
+    legacy = sqlite3.connect(":memory:")
+    legacy.execute("CREATE TABLE packet_history (hop_start INTEGER, hop_limit INTEGER)")
+    assert compile_filters({"hop_count": 0}, cursor=legacy.cursor()).sql == (
+        "(hop_start - hop_limit) = ?"
+    )
+    conn.close()
+    legacy.close()
+
+    assert PacketRepository.get_packets(filters={"hop_count": 0})["total_count"] == 2
+    result = PacketRepository.get_packets(
+        filters={"hop_count": 0, "gateway_id": "!00000001"}
+    )
+    assert [p["timestamp"] for p in result["packets"]] == [1000.0]
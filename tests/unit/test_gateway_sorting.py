@@ -6,161 +6,64 @@ both at the API level and in the frontend JavaScript logic.
 """
 
 import json
+import sqlite3
 from unittest.mock import MagicMock, patch
 
 import pytest
 
+from src.malla import mqtt_capture
 from src.malla.database.repositories import PacketRepository, TracerouteRepository
 
 
 class TestGatewaySortingAPI:
     """Test gateway sorting at the API/repository level."""
 
-    def test_packet_repository_gateway_sorting_asc(self):
-        """Test that PacketRepository sorts by gateway_count in ascending order when requested."""
-        # Mock database connection and cursor
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-
-        # Mock the count query results (for total_count estimation)
-        # The sample query returns (individual_count, distinct_groups)
-        # The total individual query returns just a count
-        mock_cursor.fetchone.side_effect = [
-            [3, 3],  # Sample query: 3 individual packets, 3 distinct groups
-            [3],  # Total individual query: 3 total packets
-        ]
-
-        # Mock individual packet records that will be grouped in memory
-        # These represent the same packets received by different gateways
-        mock_cursor.fetchall.return_value = [
-            # Group 1: mesh_packet_id "abc123" - 1 gateway
-            {
-                "id": 1,
-                "timestamp": 1000,
-                "from_node_id": 123,
-                "to_node_id": 456,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "abc123",
-                "gateway_id": "!433d0c24",
-                "rssi": -80,
-                "snr": 5,
-                "hop_limit": 3,
-                "hop_start": 5,
-                "hop_count": 2,
-                "payload_length": 50,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:00:00",
-            },
-            # Group 2: mesh_packet_id "def456" - 2 gateways
-            {
-                "id": 2,
-                "timestamp": 2000,
-                "from_node_id": 789,
-                "to_node_id": 456,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "def456",
-                "gateway_id": "!433d0c24",
-                "rssi": -75,
-                "snr": 8,
-                "hop_limit": 2,
-                "hop_start": 3,
-                "hop_count": 1,
-                "payload_length": 75,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:01:00",
-            },
-            {
-                "id": 3,
-                "timestamp": 2001,
-                "from_node_id": 789,
-                "to_node_id": 456,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "def456",
-                "gateway_id": "!da73e9cc",
-                "rssi": -70,
-                "snr": 10,
-                "hop_limit": 0,
-                "hop_start": 3,
-                "hop_count": 3,
-                "payload_length": 75,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:01:01",
-            },
-            # Group 3: mesh_packet_id "ghi789" - 3 gateways
-            {
-                "id": 4,
-                "timestamp": 3000,
-                "from_node_id": 111,
-                "to_node_id": 222,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "ghi789",
-                "gateway_id": "!433d0c24",
-                "rssi": -85,
-                "snr": 3,
-                "hop_limit": 3,
-                "hop_start": 3,
-                "hop_count": 0,
-                "payload_length": 100,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:02:00",
-            },
-            {
-                "id": 5,
-                "timestamp": 3001,
-                "from_node_id": 111,
-                "to_node_id": 222,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "ghi789",
-                "gateway_id": "!da73e9cc",
-                "rssi": -65,
-                "snr": 12,
-                "hop_limit": 0,
-                "hop_start": 4,
-                "hop_count": 4,
-                "payload_length": 100,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:02:01",
-            },
-            {
-                "id": 6,
-                "timestamp": 3002,
-                "from_node_id": 111,
-                "to_node_id": 222,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "ghi789",
-                "gateway_id": "!12345678",
-                "rssi": -75,
-                "snr": 8,
-                "hop_limit": 1,
-                "hop_start": 3,
-                "hop_count": 2,
-                "payload_length": 100,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:02:02",
-            },
-        ]
+    @pytest.fixture
+    def grouped_packet_db(self, tmp_path, monkeypatch):
+        """Packets received by 1, 2 and 3 gateways respectively."""
+        db_path = str(tmp_path / "grouped.db")
+        mqtt_capture.init_database(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            """
+            INSERT INTO packet_history (
+                id, timestamp, topic, from_node_id, to_node_id, portnum,
+                portnum_name, mesh_packet_id, gateway_id, rssi, snr, hop_limit,
+                hop_start, payload_length, processed_successfully
+            ) VALUES (?, ?, 'msh/test', ?, ?, 1, 'TEXT_MESSAGE_APP', ?, ?, ?, ?, ?, ?, ?, 1)
+            """,
+            [
+                # Group 1: mesh_packet_id "abc123" - 1 gateway
+                (1, 1000, 123, 456, "abc123", "!433d0c24", -80, 5, 3, 5, 50),
+                # Group 2: mesh_packet_id "def456" - 2 gateways
+                (2, 2000, 789, 456, "def456", "!433d0c24", -85, 3, 2, 4, 75),
+                (3, 2001, 789, 456, "def456", "!da73e9cc", -70, 10, 1, 4, 75),
+                # Group 3: mesh_packet_id "ghi789" - 3 gateways
+                (4, 3000, 111, 222, "ghi789", "!433d0c24", -90, 2, 2, 3, 100),
+                (5, 3001, 111, 222, "ghi789", "!da73e9cc", -65, 12, 1, 3, 100),
+                (6, 3002, 111, 222, "ghi789", "!12345678", -75, 8, 1, 3, 100),
+            ],
+        )
+        conn.commit()
+        conn.close()
+        monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+        return db_path
 
-        with patch(
-            "src.malla.database.repositories.get_db_connection", return_value=mock_conn
-        ):
-            result = PacketRepository.get_packets(
-                limit=10,
-                offset=0,
-                order_by="gateway_id",
-                order_dir="asc",
-                group_packets=True,
-            )
+    def test_packet_repository_gateway_sorting_asc(self, grouped_packet_db):
+        """Test that PacketRepository sorts by gateway_count in ascending order when requested."""
+        result = PacketRepository.get_packets(
+            limit=10,
+            offset=0,
+            filters={"start_time": 1},
+            order_by="gateway_id",
+            order_dir="asc",
+            group_packets=True,
+        )
 
         # Test the behavior: results should be sorted by gateway count in ascending order
         packets = result["packets"]
         assert len(packets) == 3  # 3 groups
+        assert result["total_count"] == 3
 
         # Verify ascending order by gateway count
         assert packets[0]["gateway_count"] == 1  # abc123 group
@@ -181,146 +84,22 @@ class TestGatewaySortingAPI:
             "!12345678",
         }
 
-    def test_packet_repository_gateway_sorting_desc(self):
-        """Test that PacketRepository sorts by gateway_count in descending order when requested."""
-        # Mock database connection and cursor
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-
-        # Mock the count query results (for total_count estimation)
-        # The sample query returns (individual_count, distinct_groups)
-        # The total individual query returns just a count
-        mock_cursor.fetchone.side_effect = [
-            [3, 3],  # Sample query: 3 individual packets, 3 distinct groups
-            [3],  # Total individual query: 3 total packets
-        ]
+        # Aggregates and the representative (earliest) reception
+        assert packets[2]["rssi_range"] == "-90.0 to -65.0 dBm"
+        assert packets[2]["hop_range"] == "1-2"
+        assert packets[2]["id"] == 4
+        assert packets[2]["timestamp"] == 3000
 
-        # Mock individual packet records (same data as ascending test)
-        mock_cursor.fetchall.return_value = [
-            # Group 1: mesh_packet_id "abc123" - 1 gateway
-            {
-                "id": 1,
-                "timestamp": 1000,
-                "from_node_id": 123,
-                "to_node_id": 456,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "abc123",
-                "gateway_id": "!433d0c24",
-                "rssi": -80,
-                "snr": 5,
-                "hop_limit": 3,
-                "hop_start": 5,
-                "hop_count": 2,
-                "payload_length": 50,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:00:00",
-            },
-            # Group 2: mesh_packet_id "def456" - 2 gateways
-            {
-                "id": 2,
-                "timestamp": 2000,
-                "from_node_id": 789,
-                "to_node_id": 456,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "def456",
-                "gateway_id": "!433d0c24",
-                "rssi": -75,
-                "snr": 8,
-                "hop_limit": 2,
-                "hop_start": 3,
-                "hop_count": 1,
-                "payload_length": 75,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:01:00",
-            },
-            {
-                "id": 3,
-                "timestamp": 2001,
-                "from_node_id": 789,
-                "to_node_id": 456,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "def456",
-                "gateway_id": "!da73e9cc",
-                "rssi": -70,
-                "snr": 10,
-                "hop_limit": 0,
-                "hop_start": 3,
-                "hop_count": 3,
-                "payload_length": 75,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:01:01",
-            },
-            # Group 3: mesh_packet_id "ghi789" - 3 gateways
-            {
-                "id": 4,
-                "timestamp": 3000,
-                "from_node_id": 111,
-                "to_node_id": 222,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "ghi789",
-                "gateway_id": "!433d0c24",
-                "rssi": -85,
-                "snr": 3,
-                "hop_limit": 3,
-                "hop_start": 3,
-                "hop_count": 0,
-                "payload_length": 100,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:02:00",
-            },
-            {
-                "id": 5,
-                "timestamp": 3001,
-                "from_node_id": 111,
-                "to_node_id": 222,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "ghi789",
-                "gateway_id": "!da73e9cc",
-                "rssi": -65,
-                "snr": 12,
-                "hop_limit": 0,
-                "hop_start": 4,
-                "hop_count": 4,
-                "payload_length": 100,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:02:01",
-            },
-            {
-                "id": 6,
-                "timestamp": 3002,
-                "from_node_id": 111,
-                "to_node_id": 222,
-                "portnum": 1,
-                "portnum_name": "TEXT_MESSAGE_APP",
-                "mesh_packet_id": "ghi789",
-                "gateway_id": "!12345678",
-                "rssi": -75,
-                "snr": 8,
-                "hop_limit": 1,
-                "hop_start": 3,
-                "hop_count": 2,
-                "payload_length": 100,
-                "processed_successfully": 1,
-                "timestamp_str": "2024-01-01 12:02:02",
-            },
-        ]
-
-        with patch(
-            "src.malla.database.repositories.get_db_connection", return_value=mock_conn
-        ):
-            result = PacketRepository.get_packets(
-                limit=10,
-                offset=0,
-                order_by="gateway_id",
-                order_dir="desc",
-                group_packets=True,
-            )
+    def test_packet_repository_gateway_sorting_desc(self, grouped_packet_db):
+        """Test that PacketRepository sorts by gateway_count in descending order when requested."""
+        result = PacketRepository.get_packets(
+            limit=10,
+            offset=0,
+            filters={"start_time": 1},
+            order_by="gateway_id",
+            order_dir="desc",
+            group_packets=True,
+        )
 
         # Test the behavior: results should be sorted by gateway count in descending order
         packets = result["packets"]
@@ -336,6 +115,29 @@ class TestGatewaySortingAPI:
         assert packets[1]["mesh_packet_id"] == "def456"
         assert packets[2]["mesh_packet_id"] == "abc123"
 
+    def test_packet_repository_grouped_pagination_is_exact(self, grouped_packet_db):
+        """Later pages and the total come from SQL, not from an estimate."""
+        pages = [
+            PacketRepository.get_packets(
+                limit=2,
+                offset=offset,
+                filters={"start_time": 1},
+                order_by="gateway_id",
+                order_dir="desc",
+                group_packets=True,
+            )
+            for offset in (0, 2, 4)
+        ]
+
+        assert [p["mesh_packet_id"] for p in pages[0]["packets"]] == [
+            "ghi789",
+            "def456",
+        ]
+        assert [p["mesh_packet_id"] for p in pages[1]["packets"]] == ["abc123"]
+        assert pages[2]["packets"] == []
+        assert [page["total_count"] for page in pages] == [3, 3, 3]
+        assert [page["has_more"] for page in pages] == [True, False, False]
+
     def test_traceroute_repository_gateway_sorting_asc(self):
         """Test that TracerouteRepository sorts by gateway_count in ascending order when requested."""
         # Mock database connection and cursor
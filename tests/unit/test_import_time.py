@@ -0,0 +1,139 @@
+"""
+Import-time checks for the CLI entry points.
+
+Each module is imported in a fresh interpreter so the result does not depend
+on what the test session already loaded.  Timings vary with machine load, so
+most tests check that the expensive packages stay out of ``sys.modules``: each
+of them costs tens to hundreds of ms.  The time spent in malla's own modules
+is checked against a generous budget with ``-X importtime``.
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parents[2] / "src"
+
+# Imported by the web app only
+WEB_STACK = {"flask", "werkzeug", "jinja2", "markdown", "malla.routes"}
+# meshtastic/__init__ pulls in protobuf, pubsub and requests
+PROTOBUF_STACK = {"meshtastic", "google.protobuf", "pubsub", "requests"}
+# Imported where they are used
+DEFERRED = {
+    "cryptography",
+    "yaml",
+    "http.server",
+    "multiprocessing.pool",
+    "malla.database.repositories",
+}
+# Self time of all malla.* modules together, in microseconds; a few ms normally
+MALLA_SELF_BUDGET_US = 250_000
+
+
+def _import(module: str) -> dict:
+    """Import *module* in a subprocess and report the interpreter state."""
+    probe = (
+        "import json, logging, sys\n"
+        f"import {module}\n"
+        "from malla import config\n"
+        "print(json.dumps({\n"
+        "    'modules': sorted(sys.modules),\n"
+        "    'handlers': len(logging.getLogger().handlers),\n"
+        "    'config_loaded': config._config_singleton is not None,\n"
+        "}))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["malla", "malla.config", "malla.bench"])
+def test_light_modules_skip_web_and_protobuf_stack(module):
+    loaded = set(_import(module)["modules"])
+    assert not loaded & (WEB_STACK | PROTOBUF_STACK | DEFERRED)
+
+
+@pytest.mark.parametrize("module", ["malla.mqtt_capture", "malla.ingest"])
+def test_capture_modules_have_no_import_side_effects(module):
+    report = _import(module)
+    loaded = set(report["modules"])
+    assert not loaded & (WEB_STACK | DEFERRED)
+    assert "malla.web_ui" not in loaded
+    assert report["handlers"] == 0
+    assert not report["config_loaded"]
+
+
+def test_web_ui_defers_route_modules():
+    report = _import("malla.web_ui")
+    loaded = set(report["modules"])
+    # werkzeug itself imports http.server
+    assert not loaded & (PROTOBUF_STACK | DEFERRED - {"http.server"})
+    assert not loaded & {"malla.routes", "markdown"}
+    assert report["handlers"] == 0
+
+
+@pytest.mark.parametrize(
+    "module", ["malla.mqtt_capture", "malla.ingest", "malla.bench", "malla.web_ui"]
+)
+def test_malla_modules_import_within_budget(module):
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    self_times = {}
+    for line in result.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <indented name>"
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line.removeprefix("import time:").split("|")
+        name = name.strip()
+        if name == "malla" or name.startswith("malla."):
+            self_times[name] = int(own)
+    assert module in self_times
+    assert sum(self_times.values()) < MALLA_SELF_BUDGET_US, sorted(
+        self_times.items(), key=lambda item: -item[1]
+    )[:5]
+
+
+def test_capture_settings_resolve_config_on_first_use(tmp_path):
+    db_path = tmp_path / "lazy.db"
+    probe = (
+        "from malla import mqtt_capture\n"
+        "mqtt_capture.init_database()\n"
+        "print(mqtt_capture._database_file())\n"
+    )
+    env = dict(
+        os.environ,
+        PYTHONPATH=str(SRC_DIR),
+        MALLA_DATABASE_FILE=str(db_path),
+        MALLA_CONFIG_FILE=str(tmp_path / "missing.yaml"),
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=tmp_path,
+        check=True,
+    )
+    assert result.stdout.strip().splitlines()[-1] == str(db_path)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'packet_history'"
+    ).fetchone()
+    conn.close()
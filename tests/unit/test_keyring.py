@@ -0,0 +1,111 @@
+"""
+Unit tests for the multi-key channel keyring.
+"""
+
+import base64
+
+from meshtastic import mesh_pb2, mqtt_pb2, portnums_pb2
+
+from src.malla import metrics, mqtt_capture
+from src.malla.utils.decryption import decrypt_packet_payload
+from src.malla.utils.keyring import (
+    DEFAULT_LABEL,
+    Keyring,
+    channel_hash,
+    parse_channel_keys,
+)
+
+DEFAULT_KEY = "1PG7OiApB1nwvP+rz05pAQ=="
+OPS_KEY = base64.b64encode(bytes(range(32))).decode()
+HIKING_KEY = base64.b64encode(bytes(range(100, 116))).decode()
+UNKNOWN_KEY = base64.b64encode(bytes(range(200, 232))).decode()
+
+
+def _packet(packet_id, key_base64, channel_byte, text="hello"):
+    """An encrypted MeshPacket carrying a text message."""
+    packet = mesh_pb2.MeshPacket()
+    setattr(packet, "from", 0x22)
+    packet.to = 0xFFFFFFFF
+    packet.id = packet_id
+    packet.channel = channel_byte
+
+    data = mesh_pb2.Data()
+    data.portnum = portnums_pb2.PortNum.TEXT_MESSAGE_APP
+    data.payload = text.encode()
+    # AES-CTR is symmetric, so "decrypting" the plaintext encrypts it
+    packet.encrypted = decrypt_packet_payload(
+        data.SerializeToString(), packet_id, 0x22, base64.b64decode(key_base64)
+    )
+    return packet
+
+
+def _hash(channel, key_base64):
+    return channel_hash(channel, base64.b64decode(key_base64))
+
+
+def test_keyring_orders_candidates_by_recent_hits():
+    counter = metrics.Counter(
+        "test_keyring_attempts_total", "test", ("key", "result"), metrics.Registry()
+    )
+    keyring = Keyring(
+        DEFAULT_KEY, {"Ops": OPS_KEY, "EU_868/Hiking": HIKING_KEY}, counter=counter
+    )
+    ops_hash = _hash("Ops", OPS_KEY)
+
+    # The channel hash points straight at the Ops key
+    packet = _packet(1, OPS_KEY, ops_hash)
+    key = keyring.decrypt(packet, channel_name="Ops", channel_id="Ops", region="US")
+    assert key.label == "Ops"
+    assert packet.decoded.payload == b"hello"
+    assert keyring.stats() == {"Ops": {"hits": 1, "misses": 0}}
+
+    # Region-limited keys are only tried for their region
+    labels = [key.label for key in keyring.candidates("Hiking", "Hiking", 0, "US")]
+    assert "EU_868/Hiking" not in labels
+    labels = [key.label for key in keyring.candidates("Hiking", "Hiking", 0, "EU_868")]
+    assert "EU_868/Hiking" in labels
+
+    # Traffic with the same channel byte that the default key decrypts: the
+    # first packet costs a miss on Ops, later ones go to the default key first
+    for packet_id in (2, 3, 4):
+        packet = _packet(packet_id, DEFAULT_KEY, ops_hash)
+        key = keyring.decrypt(packet, channel_name="Ops", channel_id="Ops")
+        assert key.label == DEFAULT_LABEL
+    assert keyring.stats() == {
+        DEFAULT_LABEL: {"hits": 3, "misses": 0},
+        "Ops": {"hits": 1, "misses": 1},
+    }
+    assert keyring.candidates("Ops", "Ops", ops_hash)[0].label == DEFAULT_LABEL
+
+    # A key we do not have is rejected by the plausibility check
+    packet = _packet(5, UNKNOWN_KEY, ops_hash)
+    assert keyring.decrypt(packet, channel_name="Ops", channel_id="Ops") is None
+    assert packet.decoded.portnum == portnums_pb2.PortNum.UNKNOWN_APP
+    assert counter.samples()[(DEFAULT_LABEL, "hit")] == 3
+    assert counter.samples()[("Ops", "miss")] == 2
+
+
+def test_parse_channel_keys():
+    keys = parse_channel_keys(f"Ops={OPS_KEY},EU_868/Hiking={HIKING_KEY},Bad=!!")
+    assert [(key.label, key.region, key.channel) for key in keys] == [
+        ("Ops", "", "Ops"),
+        ("EU_868/Hiking", "EU_868", "Hiking"),
+    ]
+    assert keys[0].key == bytes(range(32))
+    assert parse_channel_keys(None) == []
+
+
+def test_decode_envelope_uses_configured_channel_keys(monkeypatch):
+    monkeypatch.setattr(mqtt_capture, "KEYRING", Keyring(DEFAULT_KEY, {"Ops": OPS_KEY}))
+
+    envelope = mqtt_pb2.ServiceEnvelope()
+    envelope.channel_id = "Ops"
+    envelope.gateway_id = "!000000aa"
+    envelope.packet.CopyFrom(_packet(7, OPS_KEY, _hash("Ops", OPS_KEY), "secret"))
+
+    decoded = mqtt_capture.decode_envelope(
+        "msh/EU_868/2/e/Ops/!000000aa", envelope.SerializeToString()
+    )
+    assert decoded.is_encrypted_packet
+    assert decoded.decryption_successful
+    assert decoded.payload == "secret"
@@ -0,0 +1,137 @@
+"""
+Unit tests for the partitioned longest-links analysis helpers.
+"""
+
+import random
+
+from meshtastic import mesh_pb2
+
+from src.malla.utils.link_analysis import (
+    LinkPacket,
+    analyze_partition,
+    map_partitions,
+    merge_partition_results,
+    parse_partition,
+    partition_by_time_slice,
+    shutdown_executor,
+    snapshot_location_at,
+)
+from src.malla.utils.location_timeline import LocationTimeline
+
+
+def _route_payload(route, snr_towards) -> bytes:
+    discovery = mesh_pb2.RouteDiscovery()
+    discovery.route.extend(route)
+    discovery.snr_towards.extend(int(snr * 4) for snr in snr_towards)
+    return discovery.SerializeToString()
+
+
+def _make_packets(count: int, seed: int = 7) -> list[LinkPacket]:
+    rng = random.Random(seed)
+    nodes = list(range(1000, 1012))
+    packets = []
+    for packet_id in range(1, count + 1):
+        src, dst, *route = rng.sample(nodes, rng.randint(2, 5))
+        snrs = [rng.uniform(-15.0, 10.0) for _ in range(len(route) + 1)]
+        packets.append(
+            LinkPacket(
+                id=packet_id,
+                timestamp=1_700_000_000.0 + rng.randint(0, 7 * 86400),
+                from_node_id=src,
+                to_node_id=dst,
+                raw_payload=_route_payload(route, snrs),
+                hop_start=3,
+                hop_limit=3 - len(route),
+            )
+        )
+    return packets
+
+
+def _make_snapshot():
+    rng = random.Random(3)
+    timeline = LocationTimeline()
+    timeline.add_points(
+        (
+            node_id,
+            1_700_000_000.0 + day * 86400,
+            50.0 + rng.uniform(-0.5, 0.5),
+            10.0 + rng.uniform(-0.5, 0.5),
+            None,
+        )
+        for node_id in range(1000, 1012)
+        for day in range(8)
+    )
+    return timeline.snapshot(range(1000, 1012))
+
+
+def _run(packets, snapshot, partitions, workers=1):
+    slices = partition_by_time_slice(packets, partitions)
+    parsed = map_partitions(parse_partition, [(s,) for s in slices], workers)
+    results = map_partitions(
+        analyze_partition,
+        [(p, snapshot, 0.5, -20.0) for p, _ids in parsed],
+        workers,
+    )
+    return merge_partition_results(results)
+
+
+class TestLocationSnapshot:
+    """Test snapshot construction and timestamp lookups."""
+
+    def test_lookup_prefers_latest_past_position(self):
+        timeline = LocationTimeline()
+        timeline.add_points(
+            [
+                (1, 300.0, 3.0, 3.0, None),
+                (1, 100.0, 1.0, 1.0, None),
+                (1, 200.0, 2.0, 2.0, None),
+            ]
+        )
+        snapshot = timeline.snapshot([1, 2])
+
+        assert snapshot_location_at(snapshot, 1, 250.0) == (2.0, 2.0)
+        assert snapshot_location_at(snapshot, 1, 300.0) == (3.0, 3.0)
+        # Before the first report the oldest future position is used
+        assert snapshot_location_at(snapshot, 1, 50.0) == (1.0, 1.0)
+        assert snapshot_location_at(snapshot, 2, 250.0) is None
+
+
+class TestPartitionedAnalysis:
+    """Test that partitioning and merging do not change the result."""
+
+    def test_partitioning_covers_all_packets_in_time_order(self):
+        packets = _make_packets(100)
+        slices = partition_by_time_slice(packets, 8)
+
+        assert len(slices) == 8
+        flattened = [p for s in slices for p in s]
+        assert sorted(p.id for p in flattened) == list(range(1, 101))
+        assert [p.timestamp for p in flattened] == sorted(p.timestamp for p in packets)
+
+    def test_merge_matches_single_partition_counts(self):
+        packets = _make_packets(200)
+        snapshot = _make_snapshot()
+
+        single = _run(packets, snapshot, partitions=1)
+        sliced = _run(packets, snapshot, partitions=16)
+
+        assert single["packets_processed"] == sliced["packets_processed"]
+        assert single["hops_processed"] == sliced["hops_processed"]
+        assert single["links"].keys() == sliced["links"].keys()
+        for key, stats in single["links"].items():
+            other = sliced["links"][key]
+            assert stats["traceroute_count"] == other["traceroute_count"]
+            assert stats["recent"] == other["recent"]
+            assert abs(stats["total_distance"] - other["total_distance"]) < 1e-9
+
+    def test_process_pool_output_is_identical(self):
+        packets = _make_packets(300)
+        snapshot = _make_snapshot()
+
+        try:
+            serial = _run(packets, snapshot, partitions=8, workers=1)
+            parallel = _run(packets, snapshot, partitions=8, workers=2)
+        finally:
+            shutdown_executor()
+
+        assert serial == parallel
@@ -0,0 +1,179 @@
+"""
+Unit tests for the shared, time-indexed node location timeline.
+"""
+
+import sqlite3
+import time
+
+import pytest
+from meshtastic import mesh_pb2
+
+from src.malla import warmup
+from src.malla.config import AppConfig
+from src.malla.utils import location_timeline
+from src.malla.utils.location_timeline import (
+    LocationTimeline,
+    get_location_timeline,
+)
+
+DAY = 86400.0
+
+
+def _position_payload(latitude: float, longitude: float) -> bytes:
+    position = mesh_pb2.Position()
+    position.latitude_i = int(latitude * 1e7)
+    position.longitude_i = int(longitude * 1e7)
+    position.altitude = 100
+    return position.SerializeToString()
+
+
+@pytest.fixture
+def position_db(tmp_path, monkeypatch):
+    """Minimal packet_history database selected via MALLA_DATABASE_FILE."""
+    db_path = tmp_path / "positions.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE packet_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp REAL,
+            from_node_id INTEGER,
+            portnum INTEGER,
+            raw_payload BLOB
+        )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setenv("MALLA_DATABASE_FILE", str(db_path))
+    # Load every report unless a test sets a lookback window
+    location_timeline.configure(AppConfig(location_timeline_days=0))
+    yield db_path
+    location_timeline.configure(AppConfig())
+
+
+def _insert_position(db_path, node_id, timestamp, latitude, longitude, portnum=3):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO packet_history (timestamp, from_node_id, portnum, raw_payload) "
+        "VALUES (?, ?, ?, ?)",
+        (timestamp, node_id, portnum, _position_payload(latitude, longitude)),
+    )
+    conn.commit()
+    conn.close()
+
+
+class TestLocationTimeline:
+    """Test lookups on an in-memory timeline."""
+
+    def test_location_at_uses_latest_past_then_earliest_future(self):
+        timeline = LocationTimeline()
+        timeline.add_points(
+            [
+                (1, 7200.0, 2.0, 2.0, 20),
+                (1, 3600.0, 1.0, 1.0, None),
+            ]
+        )
+
+        before = timeline.location_at(1, 1800.0)
+        assert (before["latitude"], before["longitude"]) == (1.0, 1.0)
+        assert before["age_warning"] == "from 0.5h later"
+        assert before["altitude"] is None
+
+        between = timeline.location_at(1, 9000.0)
+        assert (between["latitude"], between["timestamp"]) == (2.0, 7200.0)
+        assert between["age_warning"] == "from 0.5h ago"
+        assert between["altitude"] == 20
+
+        assert timeline.location_at(2, 9000.0) is None
+
+    def test_out_of_order_points_stay_sorted(self):
+        timeline = LocationTimeline()
+        timeline.add_points([(1, float(ts), float(ts), 0.0, None) for ts in (5, 1, 3)])
+
+        assert timeline.snapshot([1])[1] == (
+            (1.0, 1.0, 0.0),
+            (3.0, 3.0, 0.0),
+            (5.0, 5.0, 0.0),
+        )
+        assert timeline.coordinates_at(1, 4.0) == (3.0, 0.0)
+
+    def test_windowed_snapshot_keeps_boundary_points(self):
+        timeline = LocationTimeline()
+        timeline.add_points([(1, float(ts), float(ts), 0.0, None) for ts in range(10)])
+
+        window = timeline.snapshot([1], start=3.5, end=6.0)[1]
+        assert [point[0] for point in window] == [3.0, 4.0, 5.0, 6.0]
+
+        # A window after the last report still contains that report
+        assert timeline.snapshot([1], start=20.0, end=30.0)[1] == ((9.0, 9.0, 0.0),)
+
+
+class TestSharedLocationTimeline:
+    """Test database loading and version-based invalidation."""
+
+    def test_incremental_refresh_and_rebuild_on_delete(self, position_db):
+        _insert_position(position_db, 1, 100.0, 1.0, 1.0)
+        _insert_position(position_db, 1, 200.0, 0.0, 0.0, portnum=1)
+
+        timeline = get_location_timeline(max_age=0)
+        assert len(timeline) == 1
+        version = timeline.version
+
+        _insert_position(position_db, 1, 300.0, 3.0, 3.0)
+        refreshed = get_location_timeline(max_age=0)
+        assert refreshed is timeline
+        assert refreshed.version > version
+        assert refreshed.coordinates_at(1, 350.0) == (3.0, 3.0)
+
+        # Without a version check the cached timeline is returned untouched
+        _insert_position(position_db, 2, 400.0, 4.0, 4.0)
+        assert get_location_timeline().coordinates_at(2, 400.0) is None
+
+        conn = sqlite3.connect(position_db)
+        conn.execute("DELETE FROM packet_history WHERE id = 1")
+        conn.commit()
+        conn.close()
+
+        rebuilt = get_location_timeline(max_age=0)
+        assert rebuilt is not timeline
+        assert rebuilt.coordinates_at(1, 150.0) == (3.0, 3.0)
+        assert rebuilt.coordinates_at(2, 400.0) == (4.0, 4.0)
+
+    def test_lookback_window_falls_back_to_the_database(self, position_db):
+        now = time.time()
+        _insert_position(position_db, 1, now - 40 * DAY, 1.0, 1.0)
+        _insert_position(position_db, 1, now - DAY, 2.0, 2.0)
+        _insert_position(position_db, 2, now - 40 * DAY, 5.0, 5.0)
+        location_timeline.configure(AppConfig(location_timeline_days=30))
+
+        timeline = get_location_timeline(max_age=0)
+        assert timeline.start_time == pytest.approx(now - 30 * DAY, abs=60)
+        assert len(timeline) == 1
+
+        # Lookups the loaded reports cannot answer query the node's history
+        assert timeline.location_at(1, now - 35 * DAY)["latitude"] == 1.0
+        assert timeline.location_at(1, now)["latitude"] == 2.0
+        assert timeline.location_at(2, now)["latitude"] == 5.0
+        assert timeline.location_at(3, now) is None
+
+        snapshot = timeline.snapshot([1, 2], start=now - 2 * DAY, end=now)
+        assert [point[1] for point in snapshot[1]] == [1.0, 2.0]
+        assert [point[1] for point in snapshot[2]] == [5.0]
+
+        # Later refreshes keep the window the timeline was built with
+        _insert_position(position_db, 1, now, 3.0, 3.0)
+        assert get_location_timeline(max_age=0) is timeline
+        assert timeline.coordinates_at(1, now) == (3.0, 3.0)
+
+    def test_timeline_is_a_warmup_task(self, position_db):
+        _insert_position(position_db, 1, 100.0, 1.0, 1.0)
+
+        assert "location_timeline" in warmup.task_names()
+        [timing] = [
+            timing
+            for timing in warmup.run(AppConfig())
+            if timing.name == "location_timeline"
+        ]
+        assert timing.items == 1
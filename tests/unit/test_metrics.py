@@ -0,0 +1,183 @@
+"""
+Unit tests for the Prometheus-style metrics subsystem.
+"""
+
+import json
+import os
+import urllib.request
+
+from src.malla import metrics
+from src.malla.config import AppConfig
+from src.malla.web_ui import create_app
+from tests.fixtures.database_fixtures import DatabaseFixtures
+
+
+def _registry():
+    registry = metrics.Registry()
+    counter = metrics.Counter(
+        "test_messages_total", "Messages", ("portnum",), registry=registry
+    )
+    gauge = metrics.Gauge("test_depth", "Depth", registry=registry)
+    histogram = metrics.Histogram(
+        "test_seconds", "Latency", registry=registry, buckets=(0.1, 1.0)
+    )
+    return registry, counter, gauge, histogram
+
+
+def test_text_exposition_format():
+    registry, counter, gauge, histogram = _registry()
+    counter.inc("TEXT_MESSAGE_APP")
+    counter.inc("TEXT_MESSAGE_APP", amount=2)
+    counter.inc('we"ird\\')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_messages_total counter" in lines
+    assert 'test_messages_total{portnum="TEXT_MESSAGE_APP"} 3.0' in lines
+    assert 'test_messages_total{portnum="we\\"ird\\\\"} 1.0' in lines
+    assert "test_depth 1.0" in lines
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{le="0.1"} 1.0' in lines
+    assert 'test_seconds_bucket{le="1.0"} 3.0' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 4.0' in lines
+    assert "test_seconds_sum 4.05" in lines
+    assert "test_seconds_count 4.0" in lines
+
+
+def test_gauge_function_and_label_validation():
+    registry, counter, gauge, _ = _registry()
+    gauge.set_function(lambda: 42)
+    assert "test_depth 42.0" in registry.render()
+    try:
+        counter.inc()
+    except ValueError:
+        pass
+    else:  # pragma: no cover
+        raise AssertionError("missing label accepted")
+
+
+def test_snapshots_of_live_workers_are_summed(tmp_path):
+    registry, counter, _, histogram = _registry()
+    counter.inc("POSITION_APP")
+    histogram.observe(0.5)
+
+    other = json.loads(json.dumps(registry.snapshot()))
+    (tmp_path / f"metrics-{os.getppid()}.json").write_text(json.dumps(other))
+    # Snapshot of a worker that is gone
+    (tmp_path / "metrics-999999999.json").write_text(json.dumps(other))
+
+    text = metrics.render_directory(tmp_path, registry)
+    assert 'test_messages_total{portnum="POSITION_APP"} 3.0' in text
+    assert "test_seconds_count 3.0" in text
+    assert not (tmp_path / "metrics-999999999.json").exists()
+
+
+def test_exited_workers_keep_their_counters(tmp_path):
+    registry, counter, gauge, histogram = _registry()
+    counter.inc("POSITION_APP", amount=5)
+    gauge.set(7)
+    histogram.observe(0.5)
+    exited = json.loads(json.dumps(registry.snapshot()))
+    (tmp_path / "metrics-999999999.json").write_text(json.dumps(exited))
+
+    fresh, _, _, _ = _registry()
+    text = metrics.render_directory(tmp_path, fresh)
+    # Counters and histograms stay in the sums, the gauge drops out
+    assert 'test_messages_total{portnum="POSITION_APP"} 5.0' in text
+    assert "test_seconds_count 1.0" in text
+    assert "test_depth 7.0" not in text
+
+    # ...also on later scrapes, and only once
+    (tmp_path / "metrics-999999998.json").write_text(json.dumps(exited))
+    text = metrics.render_directory(tmp_path, fresh)
+    assert 'test_messages_total{portnum="POSITION_APP"} 10.0' in text
+    assert metrics.render_directory(tmp_path, fresh) == text
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == [
+        f"metrics-{os.getpid()}.json",
+        metrics.RETIRED_SNAPSHOT,
+    ]
+
+
+def test_capture_http_listener():
+    registry, counter, _, _ = _registry()
+    counter.inc("ROUTING_APP")
+    server = metrics.start_http_server(0, registry=registry)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert 'portnum="ROUTING_APP"' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _app(tmp_path, **overrides):
+    db_path = tmp_path / "metrics.db"
+    DatabaseFixtures().create_test_database(str(db_path))
+    return create_app(
+        AppConfig(
+            database_file=str(db_path),
+            metrics_dir=str(tmp_path / "metrics"),
+            **overrides,
+        )
+    )
+
+
+def test_web_metrics_endpoint(tmp_path):
+    app = _app(tmp_path, metrics_enabled=True)
+    with app.test_client() as client:
+        assert client.get("/api/packets?limit=5").status_code == 200
+        assert client.get("/api/analytics").status_code == 200
+        assert client.get("/api/analytics").status_code == 200
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        text = response.get_data(as_text=True)
+
+    assert (
+        'malla_web_request_duration_seconds_count{method="GET",'
+        'route="/api/packets",status="200"} 1.0' in text
+    )
+    assert "malla_db_connections_opened_total" in text
+    assert 'malla_cache_requests_total{cache="analytics",result="hit"}' in text
+
+
+def test_web_metrics_disabled_by_default(tmp_path):
+    app = _app(tmp_path)
+    with app.test_client() as client:
+        assert client.get("/metrics").status_code == 404
+
+
+def test_capture_decode_metrics():
+    from meshtastic import mesh_pb2, mqtt_pb2, portnums_pb2
+
+    from src.malla import mqtt_capture
+
+    envelope = mqtt_pb2.ServiceEnvelope()
+    envelope.gateway_id = "!000000aa"
+    data = mesh_pb2.Data()
+    data.portnum = portnums_pb2.PortNum.TEXT_MESSAGE_APP
+    data.payload = b"hello"
+    envelope.packet.decoded.CopyFrom(data)
+
+    topic = "msh/EU_868/2/e/LongFast/!000000aa"
+    decoded_before = mqtt_capture.MESSAGES_DECODED.samples()
+    failed_before = mqtt_capture.MESSAGES_FAILED.samples()
+
+    mqtt_capture._record_decode_metrics(
+        mqtt_capture.decode_envelope(topic, envelope.SerializeToString())
+    )
+    mqtt_capture._record_decode_metrics(
+        mqtt_capture.decode_envelope(topic, b"\xff not a protobuf")
+    )
+
+    key = ("TEXT_MESSAGE_APP",)
+    decoded = mqtt_capture.MESSAGES_DECODED.samples()
+    assert decoded[key] == decoded_before.get(key, 0) + 1
+    failed = mqtt_capture.MESSAGES_FAILED.samples()
+    assert sum(failed.values()) == sum(failed_before.values()) + 1
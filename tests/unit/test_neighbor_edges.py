@@ -0,0 +1,127 @@
+"""
+Unit tests for the neighbor_edge topology store.
+"""
+
+import sqlite3
+import time
+
+import pytest
+from meshtastic import mesh_pb2, mqtt_pb2, portnums_pb2
+
+from src.malla import mqtt_capture
+from src.malla.database import neighbors
+from src.malla.database.repositories import NeighborRepository
+from src.malla.ingest import EnvelopeRecord, ingest
+from src.malla.services.traceroute_service import TracerouteService
+
+NOW = time.time()
+TOPIC = "msh/EU_868/2/e/LongFast/!000000aa"
+
+
+def _neighbor_envelope(reporter, reports, packet_id=1):
+    info = mesh_pb2.NeighborInfo()
+    info.node_id = reporter
+    for node_id, snr in reports:
+        entry = info.neighbors.add()
+        entry.node_id = node_id
+        entry.snr = snr
+
+    envelope = mqtt_pb2.ServiceEnvelope()
+    envelope.channel_id = "LongFast"
+    envelope.gateway_id = "!000000aa"
+    packet = envelope.packet
+    setattr(packet, "from", reporter)
+    packet.to = 0xFFFFFFFF
+    packet.id = packet_id
+    packet.decoded.portnum = portnums_pb2.PortNum.NEIGHBORINFO_APP
+    packet.decoded.payload = info.SerializeToString()
+    return envelope.SerializeToString()
+
+
+def _edges(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT reporter_id, neighbor_id, snr, last_seen, report_count "
+        "FROM neighbor_edge ORDER BY reporter_id, neighbor_id"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+@pytest.fixture
+def capture_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "neighbors.db")
+    mqtt_capture.init_database(db_path)
+    monkeypatch.setattr(mqtt_capture, "DATABASE_FILE", db_path)
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    return db_path
+
+
+def test_capture_upserts_last_value_per_edge(capture_db):
+    for packet_id, snr in ((1, 4.5), (2, -3.25)):
+        payload = _neighbor_envelope(0x11, [(0x22, snr), (0x33, 6.0)], packet_id)
+        decoded = mqtt_capture.decode_envelope(TOPIC, payload)
+        assert isinstance(decoded.payload, mesh_pb2.NeighborInfo)
+        mqtt_capture.log_packet_to_database(
+            TOPIC,
+            decoded.service_envelope,
+            decoded.mesh_packet,
+            decoded.processed_successfully,
+            payload,
+            neighbor_info=decoded.payload,
+        )
+
+    edges = _edges(capture_db)
+    assert [(r, n, snr, count) for r, n, snr, _, count in edges] == [
+        (0x11, 0x22, -3.25, 2),
+        (0x11, 0x33, 6.0, 2),
+    ]
+
+    # An older report arriving late does not overwrite the latest SNR
+    conn = sqlite3.connect(capture_db)
+    neighbors.upsert_edges(conn.cursor(), [(0x11, 0x22, 9.0, edges[0][3] - 60)])
+    conn.commit()
+    conn.close()
+    assert _edges(capture_db)[0][2:] == (-3.25, edges[0][3], 3)
+
+    # The capture's startup backfill only fills an empty table
+    conn = sqlite3.connect(capture_db)
+    conn.execute("DELETE FROM neighbor_edge")
+    conn.commit()
+    conn.close()
+    mqtt_capture.backfill_neighbor_edges()
+    assert [(r, n) for r, n, *_ in _edges(capture_db)] == [(0x11, 0x22), (0x11, 0x33)]
+
+
+def test_ingest_and_graph_use_neighbor_edges(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "ingested.db")
+    ingest(
+        [
+            EnvelopeRecord(NOW - 600, TOPIC, _neighbor_envelope(0x11, [(0x22, 5.0)])),
+            EnvelopeRecord(NOW - 300, TOPIC, _neighbor_envelope(0x22, [(0x11, 7.0)])),
+            EnvelopeRecord(NOW - 7200, TOPIC, _neighbor_envelope(0x33, [(0x44, 1.0)])),
+        ],
+        db_path,
+    )
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+
+    recent = NeighborRepository.get_edges(start_time=NOW - 3600)
+    assert [(e["reporter_id"], e["neighbor_id"]) for e in recent] == [
+        (0x22, 0x11),
+        (0x11, 0x22),
+    ]
+
+    graph = TracerouteService.get_network_graph_data(hours=1)
+    assert graph["stats"]["neighbor_edges"] == 2
+    [link] = graph["links"]
+    assert (link["source"], link["target"]) == (0x11, 0x22)
+    assert link["sources"] == ["neighborinfo"]
+    assert link["neighbor_snr"] == 6.0
+    assert link["packet_count"] == 0
+    assert {node["id"] for node in graph["nodes"]} == {0x11, 0x22}
+
+    # Gateway-filtered graphs only show what that gateway heard
+    filtered = TracerouteService.get_network_graph_data(
+        hours=1, filters={"gateway_id": "!000000aa"}
+    )
+    assert filtered["links"] == []
@@ -0,0 +1,172 @@
+"""
+Unit tests for the activity counters kept on node_info.
+"""
+
+import sqlite3
+import time
+
+import pytest
+from meshtastic import mqtt_pb2, portnums_pb2
+
+from src.malla import mqtt_capture
+from src.malla.config import AppConfig
+from src.malla.database import node_activity
+from src.malla.database.repositories import NodeRepository
+from src.malla.ingest import EnvelopeRecord, ingest
+
+NOW = time.time()
+GATEWAY = 0x000000AA
+TOPIC = f"msh/EU_868/2/e/LongFast/!{GATEWAY:08x}"
+
+
+def _text_envelope(sender, packet_id):
+    envelope = mqtt_pb2.ServiceEnvelope()
+    envelope.channel_id = "LongFast"
+    envelope.gateway_id = f"!{GATEWAY:08x}"
+    packet = envelope.packet
+    setattr(packet, "from", sender)
+    packet.to = 0xFFFFFFFF
+    packet.id = packet_id
+    packet.decoded.portnum = portnums_pb2.PortNum.TEXT_MESSAGE_APP
+    packet.decoded.payload = b"hi"
+    return envelope.SerializeToString()
+
+
+def _activity(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT node_id, last_packet_time, packet_count_24h, gateway_packet_count_24h "
+        "FROM node_info ORDER BY node_id"
+    ).fetchall()
+    conn.close()
+    return {node_id: tuple(values) for node_id, *values in rows}
+
+
+@pytest.fixture
+def capture_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "activity.db")
+    mqtt_capture.init_database(db_path)
+    monkeypatch.setattr(mqtt_capture, "DATABASE_FILE", db_path)
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    conn = sqlite3.connect(db_path)
+    for node_id in (0x11, 0x22, GATEWAY):
+        mqtt_capture._upsert_node_info(
+            conn.cursor(), node_id, NOW - 7200, long_name=f"Node {node_id:x}"
+        )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_capture_counts_and_refresh_decays(capture_db):
+    for packet_id, sender in enumerate((0x11, 0x11, 0x22), start=1):
+        payload = _text_envelope(sender, packet_id)
+        decoded = mqtt_capture.decode_envelope(TOPIC, payload)
+        mqtt_capture.log_packet_to_database(
+            TOPIC,
+            decoded.service_envelope,
+            decoded.mesh_packet,
+            decoded.processed_successfully,
+            payload,
+        )
+
+    activity = _activity(capture_db)
+    assert [activity[n][1:] for n in (0x11, 0x22, GATEWAY)] == [(2, 0), (1, 0), (0, 3)]
+    assert activity[0x11][0] >= NOW
+    assert activity[GATEWAY][0] is None
+
+    # The node list sorts and filters on the columns alone
+    nodes = NodeRepository.get_nodes(order_by="packet_count_24h")["nodes"]
+    assert [n["node_id"] for n in nodes][:2] == [0x11, 0x22]
+    active = NodeRepository.get_nodes(filters={"active_only": True})
+    assert active["total_count"] == 2
+    assert {n["node_id"] for n in active["nodes"]} == {0x11, 0x22}
+
+    # A day later the packets have aged out of the window
+    conn = sqlite3.connect(capture_db)
+    node_activity.refresh(conn.cursor(), now=NOW + 2 * 86400)
+    conn.commit()
+    conn.close()
+    later = _activity(capture_db)
+    assert [later[n][1:] for n in (0x11, 0x22, GATEWAY)] == [(0, 0)] * 3
+    assert later[0x11][0] == activity[0x11][0]
+
+    # ... and come back when recounted at the current time
+    mqtt_capture.refresh_node_activity()
+    assert _activity(capture_db) == activity
+
+
+def test_refresh_reads_weekly_partitions(capture_db):
+    # The partitions module the capture itself imported
+    partitions = mqtt_capture.partitions
+    partitions.configure(AppConfig(packet_partitioning=True))
+    try:
+        for packet_id, sender in enumerate((0x11, 0x11, 0x22), start=1):
+            payload = _text_envelope(sender, packet_id)
+            decoded = mqtt_capture.decode_envelope(TOPIC, payload)
+            mqtt_capture.log_packet_to_database(
+                TOPIC,
+                decoded.service_envelope,
+                decoded.mesh_packet,
+                decoded.processed_successfully,
+                payload,
+            )
+        recorded = _activity(capture_db)
+        conn = sqlite3.connect(capture_db)
+        assert conn.execute("SELECT COUNT(*) FROM packet_history").fetchone() == (0,)
+        conn.close()
+
+        # The legacy table is empty: the recount must read the partitions
+        mqtt_capture.refresh_node_activity()
+    finally:
+        partitions.configure(AppConfig())
+    assert _activity(capture_db) == recorded
+    assert [recorded[n][1:] for n in (0x11, 0x22, GATEWAY)] == [(2, 0), (1, 0), (0, 3)]
+
+
+def test_ingest_fills_activity_columns(tmp_path):
+    db_path = str(tmp_path / "ingested.db")
+    mqtt_capture.init_database(db_path)
+    conn = sqlite3.connect(db_path)
+    for node_id in (0x11, 0x22):
+        mqtt_capture._upsert_node_info(conn.cursor(), node_id, NOW - 7 * 86400)
+    conn.commit()
+    conn.close()
+
+    ingest(
+        [
+            EnvelopeRecord(NOW - 3 * 86400, TOPIC, _text_envelope(0x11, 1)),
+            EnvelopeRecord(NOW - 600, TOPIC, _text_envelope(0x22, 2)),
+            EnvelopeRecord(NOW - 300, TOPIC, _text_envelope(0x22, 3)),
+        ],
+        db_path,
+    )
+    activity = _activity(db_path)
+    assert activity[0x11] == (pytest.approx(NOW - 3 * 86400), 0, 0)
+    assert activity[0x22] == (pytest.approx(NOW - 300), 2, 0)
+    assert activity[GATEWAY][1:] == (0, 2)
+
+
+def test_ensure_columns_migrates_existing_database(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE node_info (node_id INTEGER PRIMARY KEY, long_name TEXT, "
+        "first_seen REAL NOT NULL, last_updated REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE packet_history (timestamp REAL, from_node_id INTEGER, "
+        "gateway_id TEXT)"
+    )
+    conn.execute("INSERT INTO node_info VALUES (17, 'a', ?, ?)", (NOW, NOW))
+    conn.execute("INSERT INTO packet_history VALUES (?, 17, '!00000011')", (NOW,))
+    cursor = conn.cursor()
+    assert not node_activity.has_columns(cursor)
+    assert node_activity.ensure_columns(cursor)
+    node_activity.refresh(cursor, since=0)
+    assert not node_activity.ensure_columns(cursor)
+    assert conn.execute(
+        "SELECT last_packet_time, packet_count_24h, gateway_packet_count_24h "
+        "FROM node_info"
+    ).fetchone() == (NOW, 1, 1)
+    conn.close()
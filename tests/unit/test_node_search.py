@@ -0,0 +1,112 @@
+"""
+Unit tests for the node search index.
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from src.malla import mqtt_capture
+from src.malla.config import AppConfig
+from src.malla.database import node_search
+from src.malla.database.repositories import NodeRepository
+from src.malla.web_ui import create_app
+
+NOW = time.time()
+NODES = {
+    0x1A2B3C4D: ("Base Station North", "BSN", "RAK4631"),
+    0x00000BA5: ("Basement Relay", "BASE", "TBEAM"),
+    0x0000C0DE: ("Hilltop", "HT", "HELTEC_V3"),
+    0x00ABCDEF: ("Mobile base", "MOB", "T_ECHO"),
+}
+
+
+@pytest.fixture
+def search_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "search.db")
+    mqtt_capture.init_database(db_path)
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    conn = sqlite3.connect(db_path)
+    for node_id, (long_name, short_name, hw_model) in NODES.items():
+        mqtt_capture._upsert_node_info(
+            conn.cursor(),
+            node_id,
+            NOW,
+            long_name=long_name,
+            short_name=short_name,
+            hw_model=hw_model,
+        )
+    conn.execute("UPDATE node_info SET packet_count_24h = node_id % 7")
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def _search(query, **kwargs):
+    result = NodeRepository.get_nodes(search=query, order_by="relevance", **kwargs)
+    return [node["node_id"] for node in result["nodes"]]
+
+
+def test_search_ranks_exact_then_prefix_then_substring(search_db):
+    conn = sqlite3.connect(search_db)
+    assert node_search.is_available(conn.cursor())
+    conn.close()
+
+    # "base": exact short name, then name prefixes, then a substring
+    assert _search("base") == [0x00000BA5, 0x1A2B3C4D, 0x00ABCDEF]
+    # Hex ids with or without "!", and decimal node numbers
+    assert _search("!1a2b3c4d") == [0x1A2B3C4D]
+    assert _search("c0de") == [0x0000C0DE]
+    assert _search(str(0x00ABCDEF)) == [0x00ABCDEF]
+    assert _search("heltec") == [0x0000C0DE]
+    # Queries too short for trigrams match name prefixes
+    assert _search("ht") == [0x0000C0DE]
+    assert set(_search("ba")) == {0x00000BA5, 0x1A2B3C4D}
+    assert _search("%") == []
+
+
+def test_index_follows_node_info_writes(search_db):
+    conn = sqlite3.connect(search_db)
+    cursor = conn.cursor()
+    mqtt_capture._upsert_node_info(cursor, 0x0000C0DE, NOW, long_name="Summit")
+    conn.execute(
+        "INSERT OR REPLACE INTO node_info (node_id, long_name, first_seen, "
+        "last_updated) VALUES (?, 'Harbor Base', ?, ?)",
+        (0x00ABCDEF, NOW, NOW),
+    )
+    conn.execute("DELETE FROM node_info WHERE node_id = ?", (0x00000BA5,))
+    conn.commit()
+    conn.close()
+
+    assert _search("hilltop") == []
+    assert _search("summit") == [0x0000C0DE]
+    assert _search("mobile") == []
+    assert _search("harbor") == [0x00ABCDEF]
+    assert _search("basement") == []
+
+    # A rebuild from node_info gives the same answers
+    conn = sqlite3.connect(search_db)
+    node_search.rebuild(conn.cursor())
+    conn.commit()
+    conn.close()
+    assert _search("base") == [0x1A2B3C4D, 0x00ABCDEF]
+
+
+def test_nodes_search_api_uses_relevance(search_db):
+    client = create_app(AppConfig(database_file=search_db)).test_client()
+    data = client.get("/api/nodes/search?q=base&limit=2").get_json()
+    assert [node["node_id"] for node in data["nodes"]] == [0x00000BA5, 0x1A2B3C4D]
+    assert data["total_count"] == 3
+
+    # Without a query: the most active nodes, as sender or as gateway
+    conn = sqlite3.connect(search_db)
+    conn.execute(
+        "UPDATE node_info SET gateway_packet_count_24h = 9 WHERE node_id = ?",
+        (0x0000C0DE,),
+    )
+    conn.commit()
+    conn.close()
+    data = client.get("/api/nodes/search?order_by=gateway_packet_count_24h").get_json()
+    assert data["is_popular"] is True
+    assert data["nodes"][0]["node_id"] == 0x0000C0DE
@@ -0,0 +1,116 @@
+"""
+Unit tests for the node directory delta sync.
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from src.malla import mqtt_capture
+from src.malla.config import AppConfig
+from src.malla.database import node_sync
+from src.malla.web_ui import create_app
+
+NOW = time.time()
+
+
+@pytest.fixture
+def sync_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "sync.db")
+    mqtt_capture.init_database(db_path)
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    conn = sqlite3.connect(db_path)
+    for node_id in (0x11, 0x22, 0x33):
+        mqtt_capture._upsert_node_info(
+            conn.cursor(), node_id, NOW, long_name=f"Node {node_id:x}"
+        )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def _write(db_path, *statements):
+    conn = sqlite3.connect(db_path)
+    for statement in statements:
+        if callable(statement):
+            statement(conn.cursor())
+        else:
+            conn.execute(*statement)
+    conn.commit()
+    conn.close()
+
+
+def test_sync_returns_only_changes_and_tombstones(sync_db):
+    client = create_app(AppConfig(database_file=sync_db)).test_client()
+
+    full = client.get("/api/nodes/sync").get_json()
+    assert [n["node_id"] for n in full["nodes"]] == [0x11, 0x22, 0x33]
+    assert full["version"] == 3
+    assert full["deleted"] == [] and full["more"] is False
+
+    # Gateway sightings and activity counters do not change the directory
+    _write(
+        sync_db,
+        lambda cursor: mqtt_capture._upsert_node_info(cursor, 0x11, NOW + 60),
+        ("UPDATE node_info SET packet_count_24h = 5",),
+    )
+    unchanged = client.get(f"/api/nodes/sync?since={full['version']}").get_json()
+    assert unchanged["nodes"] == [] and unchanged["version"] == full["version"]
+
+    _write(
+        sync_db,
+        lambda cursor: mqtt_capture._upsert_node_info(
+            cursor, 0x22, NOW + 60, long_name="Renamed"
+        ),
+        ("DELETE FROM node_info WHERE node_id = ?", (0x33,)),
+        lambda cursor: mqtt_capture._upsert_node_info(cursor, 0x44, NOW + 60),
+    )
+    delta = client.get(f"/api/nodes/sync?since={full['version']}").get_json()
+    assert [(n["node_id"], n["long_name"]) for n in delta["nodes"]] == [
+        (0x22, "Renamed"),
+        (0x44, None),
+    ]
+    assert delta["deleted"] == [0x33]
+    assert delta["epoch"] == full["epoch"]
+    assert delta["version"] == 6
+
+    # Paging walks the versions in order
+    page = client.get("/api/nodes/sync?since=0&limit=2").get_json()
+    assert [n["node_id"] for n in page["nodes"]] == [0x11, 0x22]
+    assert page["more"] is True
+    rest = client.get(f"/api/nodes/sync?since={page['version']}").get_json()
+    assert [n["node_id"] for n in rest["nodes"]] == [0x44]
+    assert rest["deleted"] == [0x33]
+
+    # A version from another database starts the client over
+    reset = client.get("/api/nodes/sync?since=1000").get_json()
+    assert reset["since"] == 0
+    assert len(reset["nodes"]) == 3
+
+
+def test_ensure_schema_numbers_existing_nodes(tmp_path):
+    conn = sqlite3.connect(tmp_path / "legacy.db")
+    conn.execute(
+        "CREATE TABLE node_info (node_id INTEGER PRIMARY KEY, hex_id TEXT, "
+        "long_name TEXT, short_name TEXT, hw_model TEXT, role TEXT, "
+        "primary_channel TEXT, is_licensed BOOLEAN, mac_address TEXT, "
+        "first_seen REAL NOT NULL, last_updated REAL NOT NULL)"
+    )
+    conn.executemany(
+        "INSERT INTO node_info (node_id, first_seen, last_updated) VALUES (?, 0, 0)",
+        [(5,), (3,)],
+    )
+    cursor = conn.cursor()
+    node_sync.ensure_schema(cursor)
+    node_sync.ensure_schema(cursor)
+
+    epoch, version = node_sync.state(cursor)
+    assert version == 2
+    changes = node_sync.changes(cursor, since=0, limit=10)
+    assert [(n["node_id"], n["sync_version"]) for n in changes["nodes"]] == [
+        (3, 1),
+        (5, 2),
+    ]
+    assert node_sync.changes(cursor, since=2, limit=10)["nodes"] == []
+    conn.close()
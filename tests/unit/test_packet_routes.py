@@ -6,7 +6,11 @@ from unittest.mock import patch
 
 from meshtastic import mesh_pb2
 
-from src.malla.routes.packet_routes import decode_packet_payload
+from src.malla.routes.packet_routes import (
+    clear_decode_caches,
+    decode_packet_payload,
+    decode_protobuf_payload,
+)
 
 
 class TestDecodePacketPayload:
@@ -298,15 +302,42 @@ class TestDecodePacketPayload:
             "payload_length": 4,
         }
 
+        # Message classes are discovered once per process: force a new scan
+        clear_decode_caches()
         # Patch the import to raise an exception
         with patch("builtins.__import__", side_effect=Exception("Unexpected error")):
             result = decode_packet_payload(packet)
+        clear_decode_caches()
 
-            assert result is not None
-            assert result["portnum"] == "TRACEROUTE_APP"
-            assert result["decoded"] is False
-            assert "No decoder available" in result["error"]
-            assert result["text"] == b"test".hex()
+        assert result is not None
+        assert result["portnum"] == "TRACEROUTE_APP"
+        assert result["decoded"] is False
+        assert "No decoder available" in result["error"]
+        assert result["text"] == b"test".hex()
+
+    def test_decoded_payloads_are_cached_per_packet(self):
+        """Repeated decodes of the same packet are served from the LRU."""
+        position = mesh_pb2.Position(latitude_i=515000000, longitude_i=-1000000)
+        packet = {
+            "id": 42,
+            "portnum_name": "POSITION_APP",
+            "raw_payload": position.SerializeToString(),
+            "payload_length": position.ByteSize(),
+        }
+        clear_decode_caches()
+
+        first = decode_protobuf_payload(packet)
+        first["latitude_i"] = 0  # callers get their own copy
+        with patch.object(mesh_pb2.Position, "ParseFromString") as parse:
+            second = decode_protobuf_payload(packet)
+        parse.assert_not_called()
+        assert second["latitude_i"] == 515000000
+        assert second["message_class"] == "Position"
+
+        # A different payload under the same id is decoded again
+        moved = mesh_pb2.Position(latitude_i=1, longitude_i=2)
+        changed = dict(packet, raw_payload=moved.SerializeToString())
+        assert decode_protobuf_payload(changed)["latitude_i"] == 1
 
 
 class TestNeighborInfoDataStructure:
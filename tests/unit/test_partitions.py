@@ -0,0 +1,113 @@
+"""
+Unit tests for weekly packet_history partitions.
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from src.malla import mqtt_capture
+from src.malla.config import AppConfig
+from src.malla.database import partitions
+from src.malla.database.connection import get_db_connection
+from src.malla.database.repositories import PacketRepository
+
+WEEK = partitions.WEEK_SECONDS
+# Middle of last week, so NOW - 60 and NOW always share a partition
+NOW = partitions.week_start(time.time()).timestamp() - 3.5 * 86400
+LEGACY_TIMESTAMP = NOW - 10 * WEEK
+
+
+@pytest.fixture
+def partitioned_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "partitioned.db")
+    mqtt_capture.init_database(db_path)
+    # A row stored before partitioning was switched on
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO packet_history (timestamp, topic) VALUES (?, 'msh/test')",
+        (LEGACY_TIMESTAMP,),
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    partitions.configure(AppConfig(packet_partitioning=True))
+    yield db_path
+    partitions.configure(AppConfig())
+
+
+def _insert(db_path, timestamps):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    tables = []
+    for ts in timestamps:
+        row = mqtt_capture.build_packet_row("msh/test", None, None, timestamp=ts)
+        tables.append(
+            partitions.insert_packet(cursor, mqtt_capture.PACKET_COLUMNS, row)
+        )
+    conn.commit()
+    conn.close()
+    return tables
+
+
+def test_writes_are_routed_to_weekly_partitions(partitioned_db):
+    inserted = _insert(partitioned_db, [NOW - 3 * WEEK, NOW - 60, NOW])
+
+    assert [table for table, _ in inserted] == [
+        partitions.partition_name(NOW - 3 * WEEK),
+        partitions.partition_name(NOW),
+        partitions.partition_name(NOW),
+    ]
+    # Ids continue the legacy table's AUTOINCREMENT sequence
+    assert [packet_id for _, packet_id in inserted] == [2, 3, 4]
+
+    conn = sqlite3.connect(partitioned_db)
+    indexes = {
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?",
+            (partitions.partition_name(NOW),),
+        )
+    }
+    conn.close()
+    assert any(name.startswith("idx_packet_timestamp_w") for name in indexes)
+
+
+def test_queries_only_read_overlapping_partitions(partitioned_db):
+    _insert(partitioned_db, [NOW - 3 * WEEK, NOW - 60, NOW])
+
+    conn = get_db_connection()
+    assert conn.execute("SELECT COUNT(*) FROM packet_history").fetchone()[0] == 4
+    conn.close()
+
+    recent = partitions.packet_source(NOW - 3600)
+    assert recent == f"main.{partitions.partition_name(NOW)} AS packet_history"
+    everything = partitions.packet_source(None)
+    assert "main.packet_history " in everything
+    assert partitions.partition_name(NOW - 3 * WEEK) in everything
+    bounded = partitions.packet_source(NOW - 4 * WEEK, NOW - 2 * WEEK)
+    assert partitions.partition_name(NOW) not in bounded
+    assert "main.packet_history " not in bounded
+
+    result = PacketRepository.get_packets(filters={"start_time": NOW - 3600})
+    assert result["total_count"] == 2
+    result = PacketRepository.get_packets(
+        filters={"start_time": NOW - 4 * WEEK, "end_time": NOW - 2 * WEEK}
+    )
+    assert result["total_count"] == 1
+    assert PacketRepository.get_packets()["total_count"] == 4
+
+
+def test_expired_partitions_are_dropped(partitioned_db):
+    _insert(partitioned_db, [NOW - 3 * WEEK, NOW])
+
+    conn = sqlite3.connect(partitioned_db)
+    dropped = partitions.drop_partitions_before(conn, NOW - WEEK)
+    conn.close()
+    assert dropped == [partitions.partition_name(NOW - 3 * WEEK)]
+
+    conn = get_db_connection()
+    assert conn.execute("SELECT COUNT(*) FROM packet_history").fetchone()[0] == 2
+    conn.close()
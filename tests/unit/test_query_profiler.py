@@ -0,0 +1,109 @@
+"""
+Unit tests for the per-request SQL profiler.
+"""
+
+import logging
+import sqlite3
+import tempfile
+
+import pytest
+
+from src.malla.config import AppConfig
+from src.malla.database import profiler
+from src.malla.web_ui import create_app
+from tests.fixtures.database_fixtures import DatabaseFixtures
+
+
+@pytest.fixture
+def profiled_app(tmp_path):
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".db", dir=tmp_path)
+    tmp.close()
+    DatabaseFixtures().create_test_database(tmp.name)
+    cfg = AppConfig(
+        database_file=tmp.name,
+        debug=True,
+        query_profiler=True,
+        query_profiler_explain=True,
+        slow_query_ms=0.0,
+        query_stats_dir=str(tmp_path / "stats"),
+    )
+    yield create_app(cfg)
+    profiler.reset_stats()
+    profiler.configure(AppConfig())
+
+
+def test_normalize_sql():
+    assert (
+        profiler.normalize_sql(
+            "SELECT *  FROM packet_history\n WHERE id IN (?, ?,?) AND name = 'it''s' "
+            "AND rssi > -120 AND snr < 2.5 AND gateway_id = 'x1' LIMIT 100"
+        )
+        == "SELECT * FROM packet_history WHERE id IN (?...) AND name = ? "
+        "AND rssi > ? AND snr < ? AND gateway_id = ? LIMIT ?"
+    )
+    # Digits inside identifiers are kept
+    assert profiler.normalize_sql("SELECT col2 FROM t1") == "SELECT col2 FROM t1"
+
+
+def test_profiling_connection_records_statements(tmp_path):
+    profiler.configure(AppConfig(query_profiler=True, query_stats_dir=str(tmp_path)))
+    try:
+        conn = sqlite3.connect(":memory:", factory=profiler.connection_factory())
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+
+        # Outside a request nothing is recorded
+        assert profiler.end_request() == []
+
+        profiler.begin_request()
+        assert conn.execute("SELECT x FROM t WHERE x > 2").fetchall()
+        cursor = conn.cursor()
+        cursor.execute("SELECT x FROM t WHERE x < 5")
+        assert len(list(cursor)) == 5
+        assert cursor.execute("SELECT COUNT(*) FROM t").fetchone() == (10,)
+        conn.execute("UPDATE t SET x = x + 1 WHERE x >= 8")
+        queries = profiler.end_request("test")
+    finally:
+        profiler.configure(AppConfig())
+
+    assert [(q.sql, q.rows) for q in queries] == [
+        ("SELECT x FROM t WHERE x > ?", 7),
+        ("SELECT x FROM t WHERE x < ?", 5),
+        ("SELECT COUNT(*) FROM t", 1),
+        ("UPDATE t SET x = x + ? WHERE x >= ?", 2),
+    ]
+    assert all(q.seconds > 0 for q in queries)
+    assert 'desc="4 queries"' in profiler.server_timing(queries, 0.5)
+    assert "app;dur=500.0" in profiler.server_timing(queries, 0.5)
+
+
+def test_disabled_profiler_uses_plain_connections():
+    profiler.configure(AppConfig())
+    assert profiler.connection_factory() is sqlite3.Connection
+
+
+def test_request_profiling_and_debug_page(profiled_app, caplog):
+    with profiled_app.test_client() as client:
+        with caplog.at_level(logging.WARNING, logger="malla.slow_query"):
+            response = client.get("/api/packets?limit=5")
+        assert response.status_code == 200
+        timing = response.headers["Server-Timing"]
+        assert timing.startswith("db;dur=") and "app;dur=" in timing
+        assert any("Slow query" in r.getMessage() for r in caplog.records)
+
+        data = client.get("/__debug/queries?format=json").get_json()
+        assert data["enabled"] and data["workers"] == 1
+        packets = [q for q in data["queries"] if "FROM packet_history" in q["sql"]]
+        assert packets and packets[0]["calls"] >= 1
+        assert any(q["plan"] for q in packets)
+        totals = [q["total_ms"] for q in data["queries"]]
+        assert totals == sorted(totals, reverse=True)
+
+        page = client.get("/__debug/queries?order_by=calls")
+        assert page.status_code == 200
+        assert b"Top SQL Queries" in page.data
+
+        assert client.post("/__debug/queries/reset").get_json() == {"reset": True}
+        after = client.get("/__debug/queries?format=json").get_json()
+        # Only the statements of the reset request itself may remain
+        assert all(q["calls"] <= 1 for q in after["queries"])
@@ -0,0 +1,144 @@
+"""
+Unit tests for the relay rollups and the relay analytics built on them.
+"""
+
+import sqlite3
+import time
+
+import pytest
+from meshtastic import mqtt_pb2, portnums_pb2
+
+from src.malla import mqtt_capture
+from src.malla.database import relays
+from src.malla.services.relay_service import RelayService
+
+NOW = time.time()
+GATEWAY = 0x000000AA
+GATEWAY_ID = f"!{GATEWAY:08x}"
+FAR_NODE = 0x00001111
+NEAR_RELAY = 0x000200AB  # heard directly by the gateway
+OTHER_AB = 0x000300AB  # shares the last byte, heard more recently
+LONE_RELAY = 0x000400CD
+
+
+def _store(sender, packet_id, relay_node, hop_start, hop_limit, next_hop=0):
+    envelope = mqtt_pb2.ServiceEnvelope()
+    envelope.channel_id = "LongFast"
+    envelope.gateway_id = GATEWAY_ID
+    packet = envelope.packet
+    setattr(packet, "from", sender)
+    packet.to = 0xFFFFFFFF
+    packet.id = packet_id
+    packet.hop_start = hop_start
+    packet.hop_limit = hop_limit
+    packet.relay_node = relay_node
+    packet.next_hop = next_hop
+    packet.decoded.portnum = portnums_pb2.PortNum.TEXT_MESSAGE_APP
+    packet.decoded.payload = b"hi"
+    payload = envelope.SerializeToString()
+    topic = f"msh/EU_868/2/e/LongFast/{GATEWAY_ID}"
+    decoded = mqtt_capture.decode_envelope(topic, payload)
+    mqtt_capture.log_packet_to_database(
+        topic,
+        decoded.service_envelope,
+        decoded.mesh_packet,
+        decoded.processed_successfully,
+        payload,
+    )
+
+
+def _rollup(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT * FROM relay_rollup ORDER BY resolution, from_node_id, relay_node"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+@pytest.fixture
+def relay_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "relays.db")
+    mqtt_capture.init_database(db_path)
+    monkeypatch.setattr(mqtt_capture, "DATABASE_FILE", db_path)
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    conn = sqlite3.connect(db_path)
+    for offset, node_id in enumerate(
+        (GATEWAY, FAR_NODE, NEAR_RELAY, LONE_RELAY, OTHER_AB)
+    ):
+        mqtt_capture._upsert_node_info(
+            conn.cursor(), node_id, NOW - 3600 + offset, long_name=f"Node {node_id:x}"
+        )
+    conn.commit()
+    conn.close()
+
+    # The near relay is heard directly and forwards the far node's packets
+    _store(NEAR_RELAY, 1, NEAR_RELAY & 0xFF, 3, 3)
+    for packet_id in range(2, 5):
+        _store(FAR_NODE, packet_id, NEAR_RELAY & 0xFF, 3, 1, next_hop=0xCD)
+    _store(FAR_NODE, 5, LONE_RELAY & 0xFF, 3, 2)
+    _store(FAR_NODE, 6, 0xEF, 3, 0)
+    return db_path
+
+
+def test_capture_rollups_match_rebuild(relay_db):
+    rows = _rollup(relay_db)
+    hourly = [row for row in rows if row[0] == relays.RESOLUTIONS[0]]
+    # (from, relay, next hop) -> (packets, direct, hop sum, hop samples)
+    assert {(r[2], r[4], r[5]): tuple(r[6:10]) for r in hourly} == {
+        (FAR_NODE, 0xAB, 0xCD): (3, 0, 6, 3),
+        (FAR_NODE, 0xCD, 0): (1, 0, 1, 1),
+        (FAR_NODE, 0xEF, 0): (1, 0, 3, 1),
+        (NEAR_RELAY, 0xAB, 0): (1, 1, 0, 1),
+    }
+    assert len(rows) == 2 * len(hourly)
+
+    conn = sqlite3.connect(relay_db)
+    relays.rebuild(conn.cursor())
+    conn.commit()
+    conn.close()
+    assert _rollup(relay_db) == rows
+
+
+def test_relay_analysis_resolves_relay_bytes(relay_db):
+    analysis = RelayService.get_relay_analysis(hours=24)
+    top = {relay["relay_hex"]: relay for relay in analysis["top_relays"]}
+    assert list(top) == ["ab", "cd", "ef"]
+
+    # Of the two nodes ending in 0xab, the one the gateway hears directly
+    assert top["ab"]["relay_node_id"] == NEAR_RELAY
+    assert (top["ab"]["match"], top["ab"]["candidates"]) == ("direct", 2)
+    assert (top["ab"]["packets"], top["ab"]["senders"]) == (3, 1)
+    assert (top["cd"]["relay_node_id"], top["cd"]["match"]) == (LONE_RELAY, "unique")
+    assert (top["ef"]["relay_node_id"], top["ef"]["match"]) == (None, None)
+
+    link = analysis["last_hop_links"][0]
+    assert (link["relay_node_id"], link["gateway_node_id"]) == (NEAR_RELAY, GATEWAY)
+    assert link["avg_hops"] == 2
+    assert link["relay_name"] == f"Node {NEAR_RELAY:x}"
+
+
+def test_node_relay_paths(relay_db):
+    paths = RelayService.get_node_relay_paths(FAR_NODE, hours=24)
+    [gateway] = paths["gateways"]
+    assert (gateway["gateway_id"], gateway["packets"]) == (GATEWAY_ID, 5)
+    assert gateway["avg_hops"] == 2
+    assert [(r["relay_node_id"], r["packets"]) for r in gateway["relays"]] == [
+        (NEAR_RELAY, 3),
+        (LONE_RELAY, 1),
+        (None, 1),
+    ]
+    assert [(h["relay_node_id"], h["packets"]) for h in paths["next_hops"]] == [
+        (LONE_RELAY, 3)
+    ]
+
+
+def test_hourly_buckets_are_pruned(relay_db):
+    conn = sqlite3.connect(relay_db)
+    later = NOW + relays.HOURLY_RETENTION_SECONDS + 2 * 3600
+    assert relays.prune(conn.cursor(), now=later) > 0
+    conn.commit()
+    resolutions = {row[0] for row in _rollup(relay_db)}
+    conn.close()
+    assert resolutions == {relays.RESOLUTIONS[-1]}
+    assert relays.choose_resolution(NOW, now=later) == relays.RESOLUTIONS[-1]
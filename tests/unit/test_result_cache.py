@@ -0,0 +1,183 @@
+"""
+Unit tests for the persistent result cache.
+"""
+
+import os
+import sqlite3
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.malla import mqtt_capture
+from src.malla.config import AppConfig
+from src.malla.utils import result_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "cache.db")
+    mqtt_capture.init_database(db_path)
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    directory = tmp_path / "result-cache"
+    result_cache.configure(
+        AppConfig(
+            database_file=db_path,
+            result_cache_dir=str(directory),
+            result_cache_max_mb=1,
+            result_cache_ttl_seconds=60,
+            result_cache_max_age_seconds=3600,
+        )
+    )
+    yield directory
+    result_cache.configure(AppConfig(result_cache_enabled=False))
+
+
+def _store_packet(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO packet_history (timestamp, topic) VALUES (?, 'msh/test')",
+        (time.time(),),
+    )
+    conn.commit()
+    conn.close()
+
+
+class _Counter:
+    def __init__(self, value=None):
+        self.calls = 0
+        self.value = value
+
+    def __call__(self):
+        self.calls += 1
+        return self.value if self.value is not None else {"calls": self.calls}
+
+
+def test_entries_follow_ttl_and_watermark(cache_dir, monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    compute = _Counter()
+
+    assert result_cache.get_or_compute("demo", {"hours": 24}, compute) == {"calls": 1}
+    assert result_cache.get_or_compute("demo", {"hours": 24}, compute) == {"calls": 1}
+    assert result_cache.get_or_compute("demo", {"hours": 48}, compute) == {"calls": 2}
+
+    # Past the TTL the entry stays valid while no packet arrives
+    now[0] += 600
+    assert result_cache.get_or_compute("demo", {"hours": 24}, compute) == {"calls": 1}
+
+    _store_packet(os.environ["MALLA_DATABASE_FILE"])
+    assert result_cache.get_or_compute("demo", {"hours": 24}, compute) == {"calls": 3}
+
+    # ...but never beyond the maximum age
+    now[0] += 3600
+    assert result_cache.get_or_compute("demo", {"hours": 24}, compute) == {"calls": 4}
+
+
+def test_new_packets_invalidate_entries_once_the_ttl_has_passed(cache_dir, monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    compute = _Counter()
+    db_path = os.environ["MALLA_DATABASE_FILE"]
+
+    _store_packet(db_path)
+    assert result_cache.get_or_compute("demo", {}, compute) == {"calls": 1}
+
+    # Within the TTL a new packet does not cost a recomputation
+    _store_packet(db_path)
+    now[0] += 30
+    assert result_cache.get_or_compute("demo", {}, compute) == {"calls": 1}
+
+    # Once it has passed, the packet stored meanwhile makes the entry stale,
+    # in memory as well as on disk
+    now[0] += 60
+    assert result_cache.get_or_compute("demo", {}, compute) == {"calls": 2}
+    _store_packet(db_path)
+    now[0] += 120
+    result_cache.clear()
+    assert result_cache.get_or_compute("demo", {}, compute) == {"calls": 3}
+    assert compute.calls == 3
+
+
+def test_entries_survive_restarts_and_are_copied(cache_dir):
+    compute = _Counter({"links": [1, 2]})
+    first = result_cache.get_or_compute("demo", {}, compute)
+    first["links"].append(3)
+
+    # A new worker finds the result on disk, with or without warm-loading
+    result_cache.clear()
+    assert result_cache.get_or_compute("demo", {}, compute) == {"links": [1, 2]}
+    result_cache.clear()
+    assert result_cache.warm_load() == 1
+    assert result_cache.get_or_compute("demo", {}, compute) == {"links": [1, 2]}
+    assert compute.calls == 1
+    assert sorted(path.suffix for path in cache_dir.iterdir()) == [".key", ".rc"]
+
+
+def test_files_with_a_bad_signature_are_ignored(cache_dir):
+    compute = _Counter()
+    assert result_cache.get_or_compute("demo", {}, compute) == {"calls": 1}
+    [path] = cache_dir.glob("*.rc")
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    result_cache.clear()
+    assert result_cache.get_or_compute("demo", {}, compute) == {"calls": 2}
+
+
+def test_directory_writable_by_others_disables_cache(tmp_path):
+    directory = tmp_path / "shared"
+    directory.mkdir()
+    directory.chmod(0o777)
+    try:
+        settings = result_cache.configure(AppConfig(result_cache_dir=str(directory)))
+        assert not settings.enabled
+        assert not any(directory.iterdir())
+    finally:
+        result_cache.configure(AppConfig(result_cache_enabled=False))
+
+
+def test_invalid_options_fall_back_to_defaults(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    settings = result_cache.configure(MagicMock())
+    assert not settings.enabled
+    assert settings.directory == result_cache._default_directory()
+    assert not any(tmp_path.iterdir())
+
+
+def test_directory_evicts_least_recently_used(cache_dir, monkeypatch):
+    # Random bytes do not compress: each entry takes ~400 KB of the 1 MB
+    blobs = {name: os.urandom(400_000) for name in ("a", "b", "c")}
+    for name in ("a", "b"):
+        result_cache.get_or_compute(name, {}, lambda n=name: blobs[n])
+        time.sleep(0.01)
+    # Using "a" makes "b" the least recently used file
+    result_cache.clear()
+    assert result_cache.get_or_compute("a", {}, _Counter()) == blobs["a"]
+    time.sleep(0.01)
+    result_cache.get_or_compute("c", {}, lambda: blobs["c"])
+
+    result_cache.clear()
+    compute = _Counter()
+    assert result_cache.get_or_compute("a", {}, compute) == blobs["a"]
+    assert result_cache.get_or_compute("c", {}, compute) == blobs["c"]
+    assert result_cache.get_or_compute("b", {}, compute) == {"calls": 1}
+
+
+def test_decorator_keys_by_bound_arguments(cache_dir):
+    calls = []
+
+    @result_cache.cached("demo", ignore=("workers",))
+    def analyse(hours=24, workers=None):
+        calls.append((hours, workers))
+        return hours
+
+    assert analyse() == 24
+    assert analyse(24, workers=4) == 24
+    assert analyse(hours=12) == 12
+    assert calls == [(24, None), (12, None)]
+
+    result_cache.configure(AppConfig(result_cache_enabled=False))
+    assert analyse() == 24
+    assert len(calls) == 3
@@ -0,0 +1,96 @@
+"""
+Unit tests for the seeded synthetic mesh generator.
+"""
+
+import sqlite3
+
+from meshtastic import mesh_pb2
+
+from src.malla.synthetic import PRESETS, generate_database, get_preset
+
+END_TIME = 1_700_000_000.0
+
+
+def _preset():
+    return get_preset("small", nodes=25, gateways=4, packets=3_000, days=1)
+
+
+def _summary(db_path):
+    conn = sqlite3.connect(db_path)
+    summary = conn.execute(
+        "SELECT COUNT(*), MIN(timestamp), MAX(timestamp), "
+        "COUNT(DISTINCT gateway_id), SUM(rssi), SUM(mesh_packet_id) "
+        "FROM packet_history"
+    ).fetchone()
+    conn.close()
+    return summary
+
+
+def test_presets_are_ordered_by_size():
+    small, community, country = (PRESETS[n] for n in ("small", "community", "country"))
+    assert small.packets < community.packets < country.packets
+    assert small.nodes < community.nodes < country.nodes
+
+
+def test_same_seed_gives_identical_data_for_any_worker_count(tmp_path):
+    preset = _preset()
+    serial = tmp_path / "serial.db"
+    parallel = tmp_path / "parallel.db"
+
+    result = generate_database(serial, preset, seed=7, end_time=END_TIME)
+    generate_database(parallel, preset, seed=7, workers=2, end_time=END_TIME)
+
+    assert result["rows"] == preset.packets
+    assert _summary(serial) == _summary(parallel)
+
+    count, first, last, gateways, _, _ = _summary(serial)
+    assert count == preset.packets
+    assert END_TIME - 86400 <= first and last <= END_TIME + 5
+    assert gateways <= preset.gateways
+
+    other_seed = tmp_path / "other.db"
+    generate_database(other_seed, preset, seed=8, end_time=END_TIME)
+    assert _summary(other_seed) != _summary(serial)
+
+
+def test_generated_traffic_is_realistic(tmp_path):
+    db_path = tmp_path / "mesh.db"
+    preset = _preset()
+    generate_database(db_path, preset, seed=3, end_time=END_TIME)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM node_info").fetchone()[0] == 25
+
+    # Transmissions are heard by several gateways with the same packet id
+    duplicates = conn.execute(
+        "SELECT MAX(c) FROM (SELECT COUNT(*) AS c FROM packet_history "
+        "GROUP BY mesh_packet_id)"
+    ).fetchone()[0]
+    assert duplicates > 1
+
+    portnums = dict(
+        conn.execute("SELECT portnum_name, COUNT(*) FROM packet_history GROUP BY 1")
+    )
+    assert {"POSITION_APP", "TEXT_MESSAGE_APP", "TRACEROUTE_APP"} <= set(portnums)
+
+    # Traceroute hops are nodes of the mesh and carry one SNR per hop
+    node_ids = {row[0] for row in conn.execute("SELECT node_id FROM node_info")}
+    for (payload,) in conn.execute(
+        "SELECT raw_payload FROM packet_history WHERE portnum_name = 'TRACEROUTE_APP'"
+    ):
+        route = mesh_pb2.RouteDiscovery()
+        route.ParseFromString(payload)
+        assert set(route.route) <= node_ids
+        assert len(route.snr_towards) == len(route.route) + 1
+
+    # Secondary indexes are rebuilt after the bulk load
+    indexes = {
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            "AND tbl_name = 'packet_history'"
+        )
+    }
+    assert "idx_packet_timestamp" in indexes
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
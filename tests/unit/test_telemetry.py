@@ -0,0 +1,186 @@
+"""
+Unit tests for the telemetry time series store and its rollups.
+"""
+
+import sqlite3
+import time
+
+import pytest
+from meshtastic import mqtt_pb2, portnums_pb2, telemetry_pb2
+
+from src.malla import mqtt_capture
+from src.malla.config import AppConfig
+from src.malla.database import telemetry
+from src.malla.database.repositories import TelemetryRepository
+from src.malla.ingest import EnvelopeRecord, ingest
+from src.malla.web_ui import create_app
+
+# Start of a day, so the rollup buckets below are easy to reason about
+DAY = int(time.time() // 86400 * 86400) - 86400
+TOPIC = "msh/EU_868/2/e/LongFast/!000000aa"
+
+
+def _telemetry_envelope(node_id, device_time, battery, voltage, packet_id=1):
+    report = telemetry_pb2.Telemetry()
+    report.time = int(device_time)
+    report.device_metrics.battery_level = battery
+    report.device_metrics.voltage = voltage
+
+    envelope = mqtt_pb2.ServiceEnvelope()
+    envelope.channel_id = "LongFast"
+    envelope.gateway_id = "!000000aa"
+    packet = envelope.packet
+    setattr(packet, "from", node_id)
+    packet.to = 0xFFFFFFFF
+    packet.id = packet_id
+    packet.decoded.portnum = portnums_pb2.PortNum.TELEMETRY_APP
+    packet.decoded.payload = report.SerializeToString()
+    return envelope.SerializeToString()
+
+
+def _rollups(db_path, resolution):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        """
+        SELECT m.name, r.bucket, r.min_value, r.max_value, r.sum_value,
+               r.sample_count
+        FROM telemetry_rollup r JOIN telemetry_metric m USING (metric_id)
+        WHERE r.resolution = ? ORDER BY m.name, r.bucket
+        """,
+        (resolution,),
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+@pytest.fixture
+def capture_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "telemetry.db")
+    mqtt_capture.init_database(db_path)
+    monkeypatch.setattr(mqtt_capture, "DATABASE_FILE", db_path)
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    telemetry.take_dirty()
+    return db_path
+
+
+def test_capture_stores_samples_once_per_report(capture_db):
+    device_time = time.time() - 120
+    payload = _telemetry_envelope(0x11, device_time, 80, 4.0)
+    # The same report relayed by two gateways arrives twice
+    for _ in range(2):
+        decoded = mqtt_capture.decode_envelope(TOPIC, payload)
+        assert isinstance(decoded.payload, telemetry_pb2.Telemetry)
+        mqtt_capture.log_packet_to_database(
+            TOPIC,
+            decoded.service_envelope,
+            decoded.mesh_packet,
+            decoded.processed_successfully,
+            payload,
+            telemetry_report=decoded.payload,
+        )
+
+    series = TelemetryRepository.get_series(0x11)
+    assert series == {
+        "device.battery_level": [{"timestamp": int(device_time), "value": 80.0}],
+        "device.voltage": [{"timestamp": int(device_time), "value": 4.0}],
+    }
+    assert TelemetryRepository.get_metric_names(0x11) == [
+        "device.battery_level",
+        "device.voltage",
+    ]
+
+    # The background refresh rolls up what was written since the last one
+    mqtt_capture.refresh_telemetry_rollups()
+    assert [row[0] for row in _rollups(capture_db, 300)] == [
+        "device.battery_level",
+        "device.voltage",
+    ]
+    assert telemetry.take_dirty() is None
+
+
+def test_rollups_aggregate_each_resolution(tmp_path):
+    db_path = str(tmp_path / "ingested.db")
+    # One battery report a minute for two hours, draining from 100 to 41
+    records = [
+        EnvelopeRecord(
+            DAY + minute * 60,
+            TOPIC,
+            _telemetry_envelope(
+                0x11, DAY + minute * 60, 100 - minute // 2, 4.2, minute + 1
+            ),
+        )
+        for minute in range(120)
+    ]
+    ingest(records, db_path)
+
+    five_minutes = [r for r in _rollups(db_path, 300) if r[0].endswith("battery_level")]
+    assert len(five_minutes) == 24
+    assert five_minutes[0][1:] == (DAY, 98.0, 100.0, 100 + 100 + 99 + 99 + 98, 5)
+
+    hours = [r for r in _rollups(db_path, 3600) if r[0].endswith("battery_level")]
+    assert [(bucket, low, high, count) for _, bucket, low, high, _, count in hours] == [
+        (DAY, 71.0, 100.0, 60),
+        (DAY + 3600, 41.0, 70.0, 60),
+    ]
+    days = [r for r in _rollups(db_path, 86400) if r[0].endswith("battery_level")]
+    assert [(bucket, count) for _, bucket, _, _, _, count in days] == [(DAY, 120)]
+
+    # A late sample only recomputes the buckets from its timestamp on
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    telemetry.insert_samples(cursor, [(0x11, "device.battery_level", DAY + 30, 10)])
+    telemetry.refresh_rollups(cursor, DAY + 30)
+    conn.commit()
+    conn.close()
+    hours = [r for r in _rollups(db_path, 3600) if r[0].endswith("battery_level")]
+    assert [(low, count) for _, _, low, _, _, count in hours] == [
+        (10.0, 61),
+        (41.0, 60),
+    ]
+
+
+def test_choose_resolution():
+    assert telemetry.choose_resolution(24 * 3600) == 0
+    assert telemetry.choose_resolution(7 * 86400) == 300
+    # Ninety days of hourly buckets stay under the point budget
+    assert telemetry.choose_resolution(90 * 86400) == 3600
+    assert 90 * 24 <= telemetry.MAX_POINTS
+    assert telemetry.choose_resolution(20 * 365 * 86400) == 86400
+    assert telemetry.choose_resolution(3 * 3600, max_points=100) == 300
+
+
+def test_telemetry_api_picks_resolution(tmp_path):
+    db_path = str(tmp_path / "api.db")
+    records = [
+        EnvelopeRecord(
+            DAY + minute * 60,
+            TOPIC,
+            _telemetry_envelope(0x11, DAY + minute * 60, 90, 4.1, minute + 1),
+        )
+        for minute in range(180)
+    ]
+    ingest(records, db_path)
+    client = create_app(AppConfig(database_file=db_path)).test_client()
+
+    start = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(DAY))
+    end = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(DAY + 3 * 3600))
+    url = f"/api/node/!00000011/telemetry?start={start}&end={end}"
+
+    data = client.get(f"{url}&metric=device.voltage").get_json()
+    assert data["node_id"] == 0x11
+    assert data["resolution"] == "raw"
+    assert list(data["series"]) == ["device.voltage"]
+    assert len(data["series"]["device.voltage"]) == 180
+    assert data["metrics"] == ["device.battery_level", "device.voltage"]
+
+    data = client.get(f"{url}&max_points=50").get_json()
+    assert data["resolution"] == 300
+    [first, *_] = data["series"]["device.battery_level"]
+    assert first == {"timestamp": DAY, "min": 90, "avg": 90, "max": 90, "count": 5}
+    assert len(data["series"]["device.battery_level"]) == 36
+
+    data = client.get(f"{url}&resolution=3600").get_json()
+    assert [p["count"] for p in data["series"]["device.voltage"]] == [60, 60, 60]
+
+    reversed_url = f"/api/node/!00000011/telemetry?start={end}&end={start}"
+    assert client.get(reversed_url).status_code == 400
@@ -0,0 +1,135 @@
+"""
+Unit tests for hot/cold storage tiering of packet_history.
+"""
+
+import sqlite3
+import time
+from datetime import UTC, datetime
+
+import pytest
+
+from src.malla import mqtt_capture
+from src.malla.config import AppConfig
+from src.malla.database import tiering
+from src.malla.database.connection import get_db_connection
+from src.malla.database.repositories import PacketRepository
+
+NOW = time.time()
+
+
+def _ts(year: int, month: int, day: int) -> float:
+    return datetime(year, month, day, 12, tzinfo=UTC).timestamp()
+
+
+OLD_TIMESTAMPS = [
+    _ts(2024, 11, 3),
+    _ts(2024, 11, 30),
+    _ts(2024, 12, 31),
+    _ts(2025, 1, 1),
+]
+RECENT_TIMESTAMPS = [NOW - 3600, NOW - 60]
+
+
+@pytest.fixture
+def tiered_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "hot.db")
+    mqtt_capture.init_database(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO packet_history (timestamp, topic, from_node_id, portnum_name) "
+        "VALUES (?, 'msh/test', ?, 'TEXT_MESSAGE_APP')",
+        [(ts, i) for i, ts in enumerate(OLD_TIMESTAMPS + RECENT_TIMESTAMPS)],
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    tiering.configure(AppConfig(storage_tiering=True, hot_retention_days=14))
+    yield db_path
+    tiering.configure(AppConfig())
+
+
+def test_mover_splits_aged_packets_by_month(tiered_db, tmp_path):
+    moved = tiering.move_aged_packets(tiered_db, batch_size=1)
+    assert moved == len(OLD_TIMESTAMPS)
+    # Nothing left to move, and a repeated run is a no-op
+    assert tiering.move_aged_packets(tiered_db) == 0
+
+    assert dict(tiering.iter_archive_counts(tiered_db)) == {
+        "2025-01": 1,
+        "2024-12": 1,
+        "2024-11": 2,
+    }
+    hot = sqlite3.connect(tiered_db)
+    assert [row[0] for row in hot.execute("SELECT timestamp FROM packet_history")] == (
+        RECENT_TIMESTAMPS
+    )
+    hot.close()
+
+    # Archives carry the hot table's indexes so attached reads stay indexed
+    archive = sqlite3.connect(tiering.archive_path(tmp_path / "archive", "2024-11"))
+    indexes = {
+        row[0]
+        for row in archive.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    }
+    archive.close()
+    assert "idx_packet_timestamp" in indexes
+
+
+def test_connections_see_all_tiers(tiered_db):
+    tiering.move_aged_packets(tiered_db)
+
+    conn = get_db_connection()
+    total = conn.execute("SELECT COUNT(*) FROM packet_history").fetchone()[0]
+    hot = conn.execute("SELECT COUNT(*) FROM main.packet_history").fetchone()[0]
+    conn.close()
+    assert total == len(OLD_TIMESTAMPS + RECENT_TIMESTAMPS)
+    assert hot == len(RECENT_TIMESTAMPS)
+
+    assert tiering.packet_source(NOW - 86400) == tiering.HOT_TABLE
+    assert tiering.packet_source(NOW - 30 * 86400) == tiering.TABLE
+    assert tiering.packet_source(None) == tiering.TABLE
+
+    recent = PacketRepository.get_packets(filters={"start_time": NOW - 86400})
+    assert recent["total_count"] == len(RECENT_TIMESTAMPS)
+    everything = PacketRepository.get_packets(limit=10)
+    assert everything["total_count"] == len(OLD_TIMESTAMPS + RECENT_TIMESTAMPS)
+    assert {p["timestamp"] for p in everything["packets"]} == set(
+        OLD_TIMESTAMPS + RECENT_TIMESTAMPS
+    )
+
+
+def test_ranged_connections_reach_months_beyond_attach_limit(tiered_db):
+    # One packet per month of 2023: 15 archives with the fixture's months
+    year_2023 = [_ts(2023, month, 15) for month in range(1, 13)]
+    conn = sqlite3.connect(tiered_db)
+    conn.executemany(
+        "INSERT INTO packet_history (timestamp, topic, from_node_id, portnum_name) "
+        "VALUES (?, 'msh/test', 99, 'TEXT_MESSAGE_APP')",
+        [(ts,) for ts in year_2023],
+    )
+    conn.commit()
+    conn.close()
+    tiering.move_aged_packets(tiered_db)
+    archives = tiering.list_archives(tiering.archive_directory(tiered_db))
+    assert len(archives) == 15
+
+    # Without a range only the newest months fit
+    conn = get_db_connection()
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    months = {
+        row[0]
+        for row in conn.execute(
+            "SELECT DISTINCT strftime('%Y-%m', timestamp, 'unixepoch') "
+            "FROM packet_history WHERE timestamp < ?",
+            (tiering.hot_cutoff(),),
+        )
+    }
+    conn.close()
+    assert months == {month for month, _path in archives[:limit]}
+
+    first_quarter = PacketRepository.get_packets(
+        filters={"start_time": _ts(2023, 1, 1), "end_time": _ts(2023, 3, 31)}
+    )
+    assert first_quarter["total_count"] == 3
+    assert {p["timestamp"] for p in first_quarter["packets"]} == set(year_2023[:3])
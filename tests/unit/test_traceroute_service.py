@@ -5,61 +5,66 @@ Tests the business logic and service methods for traceroute analysis.
 """
 
 from datetime import datetime
-from unittest.mock import Mock, patch
+from unittest.mock import patch
+
+from meshtastic import mesh_pb2
 
 from src.malla.services.traceroute_service import TracerouteService
+from src.malla.utils.location_timeline import LocationTimeline
+
+
+def _route_payload(route=(), snr_towards=(), route_back=(), snr_back=()) -> bytes:
+    """Build a serialized RouteDiscovery payload (SNR values in dB)."""
+    discovery = mesh_pb2.RouteDiscovery()
+    discovery.route.extend(route)
+    discovery.snr_towards.extend(int(snr * 4) for snr in snr_towards)
+    discovery.route_back.extend(route_back)
+    discovery.snr_back.extend(int(snr * 4) for snr in snr_back)
+    return discovery.SerializeToString()
 
 
 class TestTracerouteServiceLongestLinks:
     """Test TracerouteService longest links analysis functionality."""
 
+    @patch("src.malla.services.traceroute_service.get_bulk_node_names")
+    @patch("src.malla.services.traceroute_service.get_location_timeline")
     @patch("src.malla.services.traceroute_service.TracerouteRepository")
-    @patch("src.malla.services.traceroute_service.TraceroutePacket")
-    def test_longest_links_analysis_basic(self, mock_traceroute_packet, mock_repo):
+    def test_longest_links_analysis_basic(
+        self, mock_repo, mock_get_timeline, mock_node_names
+    ):
         """Test basic longest links analysis functionality."""
-        # Mock repository response
+        now = datetime.now().timestamp()
         mock_packet_data = {
             "id": 1,
             "from_node_id": 100,
             "to_node_id": 200,
-            "timestamp": datetime.now().timestamp(),
+            "timestamp": now,
             "gateway_id": "!12345678",
-            "raw_payload": b"mock_payload",
+            "raw_payload": _route_payload(snr_towards=[-5.0]),
             "processed_successfully": True,
         }
 
         mock_repo.get_traceroute_packets.return_value = {"packets": [mock_packet_data]}
 
-        # Mock TraceroutePacket
-        mock_packet = Mock()
-        mock_packet.from_node_id = 100
-        mock_packet.to_node_id = 200
-
-        # Mock RF hop
-        mock_hop = Mock()
-        mock_hop.from_node_id = 100
-        mock_hop.to_node_id = 200
-        mock_hop.from_node_name = "Node100"
-        mock_hop.to_node_name = "Node200"
-        mock_hop.distance_km = 5.0  # 5km
-        mock_hop.snr = -5.0
-
-        mock_packet.get_rf_hops.return_value = [mock_hop]
-        mock_packet.get_display_hops.return_value = [mock_hop]
-        mock_packet.calculate_hop_distances = Mock()
-
-        mock_traceroute_packet.return_value = mock_packet
+        # Node 200 is ~5 km north of node 100
+        timeline = LocationTimeline()
+        timeline.add_points(
+            [
+                (100, now - 60, 50.0, 10.0, None),
+                (200, now - 60, 50.045, 10.0, None),
+            ]
+        )
+        mock_get_timeline.return_value = timeline
+        mock_node_names.side_effect = lambda ids: {
+            100: "Node100",
+            200: "Node200",
+        }
 
         # Call the method
         result = TracerouteService.get_longest_links_analysis(
             min_distance_km=1.0, min_snr=-10.0, max_results=10
         )
 
-        # Verify TraceroutePacket was called with correct arguments
-        mock_traceroute_packet.assert_called_with(
-            packet_data=mock_packet_data, resolve_names=True
-        )
-
         # Verify structure
         assert "summary" in result
         assert "direct_links" in result
@@ -77,12 +82,17 @@ class TestTracerouteServiceLongestLinks:
         direct_link = result["direct_links"][0]
         assert direct_link["from_node_id"] == 100
         assert direct_link["to_node_id"] == 200
+        assert direct_link["from_node_name"] == "Node100"
+        assert direct_link["to_node_name"] == "Node200"
         assert direct_link["distance_km"] == 5.0
         assert direct_link["avg_snr"] == -5.0
         assert direct_link["traceroute_count"] == 1
+        assert direct_link["packet_id"] == 1
+        assert direct_link["last_seen"] == now
 
+    @patch("src.malla.services.traceroute_service.get_location_timeline")
     @patch("src.malla.services.traceroute_service.TracerouteRepository")
-    def test_longest_links_analysis_empty_data(self, mock_repo):
+    def test_longest_links_analysis_empty_data(self, mock_repo, mock_timeline):
         """Test analysis with no traceroute data."""
         # Mock empty repository response
         mock_repo.get_traceroute_packets.return_value = {"packets": []}
@@ -97,3 +107,5 @@ class TestTracerouteServiceLongestLinks:
         assert result["summary"]["longest_path"] is None
         assert len(result["direct_links"]) == 0
         assert len(result["indirect_links"]) == 0
+        # Without packets the location timeline is never loaded
+        mock_timeline.assert_not_called()
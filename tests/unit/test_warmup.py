@@ -0,0 +1,74 @@
+"""
+Unit tests for the pre-fork warm-up tasks.
+"""
+
+import sqlite3
+import time
+
+from src.malla import mqtt_capture, warmup
+from src.malla.config import AppConfig
+from src.malla.routes import packet_routes
+from src.malla.services.meshtastic_service import MeshtasticService
+from src.malla.utils import node_utils
+from src.malla.web_ui import create_app
+
+
+def test_create_app_runs_registered_tasks(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "warmup.db")
+    mqtt_capture.init_database(db_path)
+    monkeypatch.setenv("MALLA_DATABASE_FILE", db_path)
+    conn = sqlite3.connect(db_path)
+    now = time.time()
+    for offset, node_id in enumerate((0x11, 0x22, 0x33)):
+        mqtt_capture._upsert_node_info(
+            conn.cursor(), node_id, now + offset, long_name=f"Node {node_id:x}"
+        )
+    conn.commit()
+    conn.close()
+
+    MeshtasticService.clear_cache()
+    packet_routes.clear_decode_caches()
+    node_utils.clear_node_name_cache()
+
+    app = create_app(
+        AppConfig(
+            database_file=db_path,
+            warmup_node_names=2,
+            result_cache_dir=str(tmp_path / "result-cache"),
+        )
+    )
+
+    report = {timing.name: timing for timing in warmup.last_report()}
+    assert {"meshtastic_enums", "protobuf_classes", "node_names", "result_cache"} <= (
+        set(report)
+    )
+    assert all(timing.error is None for timing in report.values())
+    assert report["node_names"].items == 2
+    assert MeshtasticService._node_roles_cache
+    assert packet_routes._portnum_message_classes
+    # The snapshot holds the most recently updated nodes
+    assert set(node_utils.node_name_cache) == {0x22, 0x33}
+
+    info = app.test_client().get("/info").get_json()
+    assert [entry["task"] for entry in info["warmup"]] == list(report)
+
+
+def test_failing_task_does_not_stop_the_others(monkeypatch):
+    calls = []
+    monkeypatch.setattr(warmup, "_tasks", {})
+
+    @warmup.register("broken")
+    def _broken(cfg):
+        raise RuntimeError("boom")
+
+    @warmup.register("counted")
+    def _counted(cfg):
+        calls.append(cfg)
+        return 7
+
+    report = warmup.run("cfg")
+    assert [(t.name, t.items, t.error) for t in report] == [
+        ("broken", None, "boom"),
+        ("counted", 7, None),
+    ]
+    assert calls == ["cfg"]